@@ -6,7 +6,10 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User, Group
 from django.utils.timezone import localtime
 from unfold.admin import ModelAdmin
-from .models import FerramentaBackup, RotinaBackup, ValidacaoBackup
+from .busca import filtrar_por_busca
+from .models import (
+    ArquivoEvidencia, ConformidadeRetencao, FerramentaBackup, RelatorioJob, RotinaBackup, TokenIngestao, ValidacaoBackup,
+)
 from apps.clientes.models import Cliente, Servidor 
 
 admin.site.unregister(User)
@@ -33,7 +36,8 @@ class GroupAdmin(ModelAdmin):
 
 @admin.register(FerramentaBackup)
 class FerramentaBackupAdmin(ModelAdmin):
-    list_display = ('nome',)
+    list_display = ('nome', 'parser')
+    fields = ('nome', 'parser', 'regras_parser')
     search_fields = ('nome',)
 
 # --- FORMULÁRIO CUSTOMIZADO (ROTINAS) ---
@@ -85,8 +89,10 @@ class RotinaBackupAdmin(ModelAdmin):
 class ValidacaoBackupAdmin(ModelAdmin):
     list_display = ('get_status_badge', 'get_cliente_info', 'get_rotina_info', 'get_data_hora', 'get_usuario_avatar', 'get_edit_info')
     list_filter = ('status', 'rotina__ferramenta', 'created_at')
-    search_fields = ('rotina__descricao', 'usuario__username', 'rotina__servidores__cliente__nome_fantasia')
-    readonly_fields = ('created_at', 'updated_at', 'usuario', 'editado_por')
+    # A busca de verdade fica em get_search_results (apps.backups.busca); o campo só liga a caixa de busca
+    search_fields = ('observacao',)
+    search_help_text = "Cliente, CNPJ, servidor, rotina, observação ou usuário."
+    readonly_fields = ('created_at', 'updated_at', 'usuario', 'editado_por', 'chave_idempotencia')
 
     class Media:
         css = {
@@ -96,6 +102,10 @@ class ValidacaoBackupAdmin(ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('rotina', 'rotina__ferramenta', 'usuario', 'editado_por').prefetch_related('rotina__servidores__cliente')
 
+    def get_search_results(self, request, queryset, search_term):
+        # Subconsultas IN em vez do JOIN por rotina__servidores: sem linhas duplicadas (nem DISTINCT)
+        return filtrar_por_busca(queryset, search_term, usuarios=True), False
+
     def get_status_badge(self, obj):
         custom_css = """
         <style>
@@ -184,4 +194,49 @@ class ValidacaoBackupAdmin(ModelAdmin):
     def save_model(self, request, obj, form, change):
         if change:
             obj.editado_por = request.user
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(RelatorioJob)
+class RelatorioJobAdmin(ModelAdmin):
+    list_display = ('id', 'formato', 'status', 'solicitado_por', 'created_at', 'concluido_em')
+    list_filter = ('status', 'formato')
+    readonly_fields = ('formato', 'filtros', 'chave', 'status', 'arquivo', 'erro', 'solicitado_por', 'iniciado_em', 'concluido_em', 'created_at', 'updated_at')
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(ArquivoEvidencia)
+class ArquivoEvidenciaAdmin(ModelAdmin):
+    list_display = ('caminho', 'referencias', 'tamanho', 'created_at')
+    search_fields = ('caminho', 'hash')
+    readonly_fields = ('caminho', 'hash', 'tamanho', 'referencias', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(TokenIngestao)
+class TokenIngestaoAdmin(ModelAdmin):
+    # Tokens são gerados pelo comando criar_token_ingestao (o valor só aparece lá); aqui só se desativa
+    list_display = ('nome', 'prefixo', 'usuario', 'ativo', 'ultimo_uso', 'created_at')
+    list_filter = ('ativo',)
+    search_fields = ('nome', 'prefixo', 'usuario__username')
+    readonly_fields = ('usuario', 'hash', 'prefixo', 'ultimo_uso', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(ConformidadeRetencao)
+class ConformidadeRetencaoAdmin(ModelAdmin):
+    # Mantida por apps.backups.retencao (comando atualizar_conformidade ou ao abrir o dashboard)
+    list_display = ('rotina', 'conforme', 'pontos', 'lacunas', 'maior_intervalo', 'ultimo_ponto', 'calculado_em')
+    list_filter = ('conforme',)
+    search_fields = ('rotina__descricao', 'rotina__cliente__nome_fantasia')
+    list_select_related = ('rotina', 'rotina__ferramenta')
+    readonly_fields = ('rotina', 'conforme', 'pontos', 'lacunas', 'maior_intervalo', 'ultimo_ponto', 'calculado_em', 'valido_ate', 'alterado_em')
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,250 @@
+"""
+Agenda das rotinas: quais execuções eram esperadas num período e quais não foram
+validadas (ou foram validadas com atraso).
+
+Cada rotina executa em `horario_execucao` (hora local):
+- DIARIO: todo dia;
+- SEMANAL: no dia da semana em que a rotina foi cadastrada;
+- MENSAL: no dia do mês em que a rotina foi cadastrada (ou no último dia, em meses
+  mais curtos).
+
+Nenhuma execução é esperada antes do cadastro da rotina. A validação de uma execução é
+a primeira registrada entre o horário dela e o da execução seguinte; feita até
+AGENDA_PRAZO_VALIDACAO_HORAS depois do horário, está em dia; depois disso, atrasada.
+Execução sem validação e com o prazo vencido conta como faltando.
+
+Tudo é calculado em uma passada: as rotinas e as validações do período vêm em duas
+consultas, ordenadas por rotina (a segunda lê só o índice rotina + data, com as datas já
+em segundos), e cada validação é encaixada na execução correspondente por busca binária
+numa lista de horários compartilhada pelas rotinas com a mesma agenda. Nada é consultado
+por rotina nem por dia.
+"""
+import calendar
+import datetime
+from bisect import bisect_right
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BigIntegerField, Func
+from django.utils import timezone
+
+from apps.clientes.models import Cliente
+
+from .models import RotinaBackup, ValidacaoBackup
+
+JANELA_PADRAO_DIAS = 30
+JANELA_MAXIMA_DIAS = 366
+
+# Maior intervalo, em dias, entre duas execuções de cada frequência
+PERIODO_DIAS = {'DIARIO': 1, 'SEMANAL': 7, 'MENSAL': 31}
+
+
+class Epoch(Func):
+    """Data/hora em segundos desde 1970 (UTC), calculada no banco: evita converter
+    centenas de milhares de datetimes no Python."""
+    template = 'CAST(EXTRACT(EPOCH FROM %(expressions)s) AS BIGINT)'
+    output_field = BigIntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # Datas no SQLite são texto em UTC; julianday 2440587.5 = 1970-01-01
+        return self.as_sql(
+            compiler, connection,
+            template='CAST(ROUND((julianday(%(expressions)s) - 2440587.5) * 86400) AS INTEGER)',
+            **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='UNIX_TIMESTAMP(%(expressions)s)', **extra_context)
+
+
+def periodo(inicio=None, fim=None, dias=None):
+    """
+    (inicio, fim) em datas locais, fim incluído. Sem datas: os últimos `dias` até hoje.
+    Levanta ValueError para um período invertido ou maior que JANELA_MAXIMA_DIAS.
+    """
+    hoje = timezone.localdate()
+    fim = fim or hoje
+    inicio = inicio or fim - datetime.timedelta(days=(dias or JANELA_PADRAO_DIAS) - 1)
+    if inicio > fim:
+        raise ValueError("A data inicial é posterior à final.")
+    if (fim - inicio).days >= JANELA_MAXIMA_DIAS:
+        raise ValueError(f"O período máximo é de {JANELA_MAXIMA_DIAS} dias.")
+    return inicio, fim
+
+
+class _Calendario:
+    """
+    Meia-noite local de cada dia do período (mais a folga), em segundos, e as listas
+    de horários de execução por agenda (frequência, dia, horário), montadas uma vez.
+    """
+    def __init__(self, inicio, fim, folga):
+        fuso = timezone.get_current_timezone()
+        self.total_dias = (fim - inicio).days + 1
+        self.datas = [inicio + datetime.timedelta(days=d) for d in range(self.total_dias + folga)]
+        # A hora de execução é somada à meia-noite: no dia da troca de horário de verão
+        # (se o fuso tiver) a execução prevista fica uma hora deslocada
+        self.meias_noites = [
+            int(datetime.datetime.combine(data, datetime.time(), tzinfo=fuso).timestamp()) for data in self.datas
+        ]
+        self._agendas = {}
+
+    def execucoes(self, frequencia, dia, segundos):
+        """
+        (horários, total no período): horários de execução de uma agenda, em segundos,
+        incluindo as execuções seguintes ao período. `dia` é o dia da semana (SEMANAL)
+        ou do mês (MENSAL).
+        """
+        chave = (frequencia, dia, segundos)
+        if chave not in self._agendas:
+            if frequencia == 'SEMANAL':
+                indices = [d for d, data in enumerate(self.datas) if data.weekday() == dia]
+            elif frequencia == 'MENSAL':
+                indices = [
+                    d for d, data in enumerate(self.datas)
+                    if data.day == min(dia, calendar.monthrange(data.year, data.month)[1])
+                ]
+            else:
+                indices = range(len(self.datas))
+            horarios = [self.meias_noites[d] + segundos for d in indices]
+            no_periodo = sum(1 for d in indices if d < self.total_dias)
+            self._agendas[chave] = (horarios, no_periodo)
+        return self._agendas[chave]
+
+
+class _ResultadoRotina:
+    __slots__ = ('rotina', 'esperadas', 'em_dia', 'atrasadas', 'faltando', 'ultima_falta')
+
+    def __init__(self, rotina):
+        self.rotina = rotina
+        self.esperadas = self.em_dia = self.atrasadas = self.faltando = 0
+        self.ultima_falta = None
+
+    def como_dict(self):
+        return {
+            'id': self.rotina['id'],
+            'descricao': self.rotina['descricao'],
+            'frequencia': self.rotina['frequencia'],
+            'esperadas': self.esperadas,
+            'em_dia': self.em_dia,
+            'atrasadas': self.atrasadas,
+            'faltando': self.faltando,
+            'ultima_falta': _data_local(self.ultima_falta),
+        }
+
+
+def _data_local(segundos):
+    if segundos is None:
+        return None
+    return timezone.localtime(datetime.datetime.fromtimestamp(segundos, tz=datetime.timezone.utc))
+
+
+def _avaliar(calendario, rotina, validacoes, agora, prazo):
+    """Encaixa as validações da rotina ((rotina_id, segundos), em ordem) nas execuções esperadas."""
+    resultado = _ResultadoRotina(rotina)
+    criada = timezone.localtime(rotina['created_at'])
+    frequencia = rotina['frequencia']
+    dia = criada.weekday() if frequencia == 'SEMANAL' else criada.day if frequencia == 'MENSAL' else 0
+    horario = rotina['horario_execucao']
+    horarios, ultima = calendario.execucoes(frequencia, dia, horario.hour * 3600 + horario.minute * 60 + horario.second)
+    # Execuções do período: [primeira, ultima); as anteriores ao cadastro não contam.
+    # horarios[ultima], se existir, é a seguinte ao período e fecha a janela da última.
+    primeira = bisect_right(horarios, int(criada.timestamp()) - 1, 0, ultima)
+    limite = min(ultima + 1, len(horarios))
+    # Vencidas: o prazo de validação já passou
+    vencidas = bisect_right(horarios, agora - prazo, primeira, ultima)
+
+    cobertas = []
+    anterior = -1
+    for _, segundos in validacoes:
+        indice = bisect_right(horarios, segundos, primeira, limite) - 1
+        if indice < primeira or indice == anterior:
+            continue  # antes da primeira execução, ou não é a primeira validação desta
+        if indice == ultima:
+            break  # já é da execução seguinte ao período
+        anterior = indice
+        cobertas.append(indice)
+        if segundos - horarios[indice] > prazo:
+            resultado.atrasadas += 1
+        else:
+            resultado.em_dia += 1
+
+    cobertas_vencidas = bisect_right(cobertas, vencidas - 1)
+    resultado.faltando = (vencidas - primeira) - cobertas_vencidas
+    resultado.esperadas = resultado.em_dia + resultado.atrasadas + resultado.faltando
+    if resultado.faltando:
+        # Última execução vencida sem validação: volta pelas cobertas do fim
+        indice, posicao = vencidas - 1, cobertas_vencidas - 1
+        while posicao >= 0 and cobertas[posicao] == indice:
+            indice -= 1
+            posicao -= 1
+        resultado.ultima_falta = horarios[indice]
+    return resultado
+
+
+def verificar_agenda(inicio=None, fim=None, clientes_ids=None, agora=None):
+    """
+    Execuções esperadas x validações de cada rotina dos clientes ativos (ou de
+    `clientes_ids`) entre as datas `inicio` e `fim` (ver `periodo`). Retorna um dict
+    por cliente: {cliente_id: {'cliente', 'esperadas', 'em_dia', 'atrasadas',
+    'faltando', 'rotinas'}}, em que 'rotinas' traz só as que têm falta ou atraso.
+    """
+    if inicio is None or fim is None:
+        inicio, fim = periodo(inicio, fim)
+    agora = int((agora or timezone.now()).timestamp())
+    prazo = int(settings.AGENDA_PRAZO_VALIDACAO_HORAS * 3600)
+
+    clientes = Cliente.objects.filter(ativo=True)
+    if clientes_ids is not None:
+        clientes = clientes.filter(pk__in=clientes_ids)
+    nomes = dict(clientes.values_list('id', 'nome_fantasia'))
+    rotinas = list(
+        RotinaBackup.objects.filter(cliente_id__in=list(nomes)).order_by('id').values(
+            'id', 'cliente_id', 'descricao', 'frequencia', 'horario_execucao', 'created_at'
+        )
+    )
+
+    # Dias além do fim do período com as execuções seguintes (limite da última execução)
+    folga = max((PERIODO_DIAS.get(rotina['frequencia'], 1) for rotina in rotinas), default=1)
+    calendario = _Calendario(inicio, fim, folga)
+    de = _data_local(calendario.meias_noites[0])
+    ate = _data_local(min(agora, calendario.meias_noites[-1] + 86400))
+    validacoes = ValidacaoBackup.objects.filter(
+        rotina_id__in=RotinaBackup.objects.filter(cliente_id__in=list(nomes)).values('id'),
+        created_at__gte=de, created_at__lt=ate,
+    ).order_by('rotina_id', 'created_at').values_list('rotina_id', Epoch('created_at'))
+
+    # Merge das duas listas ordenadas por rotina. As linhas vão direto do cursor: os
+    # conversores do ORM custariam mais que a avaliação inteira em períodos longos.
+    resultados = []
+    posicao = 0
+    sql, parametros = validacoes.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        for rotina_id, linhas in groupby(cursor, key=itemgetter(0)):
+            while posicao < len(rotinas) and rotinas[posicao]['id'] < rotina_id:
+                resultados.append(_avaliar(calendario, rotinas[posicao], (), agora, prazo))
+                posicao += 1
+            if posicao < len(rotinas) and rotinas[posicao]['id'] == rotina_id:
+                resultados.append(_avaliar(calendario, rotinas[posicao], linhas, agora, prazo))
+                posicao += 1
+            # senão: rotina cadastrada entre as duas consultas
+    for rotina in rotinas[posicao:]:
+        resultados.append(_avaliar(calendario, rotina, (), agora, prazo))
+
+    por_cliente = {
+        cliente_id: {
+            'cliente': nome, 'esperadas': 0, 'em_dia': 0, 'atrasadas': 0, 'faltando': 0, 'rotinas': [],
+        }
+        for cliente_id, nome in nomes.items()
+    }
+    for resultado in resultados:
+        cliente = por_cliente[resultado.rotina['cliente_id']]
+        cliente['esperadas'] += resultado.esperadas
+        cliente['em_dia'] += resultado.em_dia
+        cliente['atrasadas'] += resultado.atrasadas
+        cliente['faltando'] += resultado.faltando
+        if resultado.atrasadas or resultado.faltando:
+            cliente['rotinas'].append(resultado.como_dict())
+    return por_cliente
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class BackupsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.backups'
-    verbose_name = "Gerenciador de Backups"
\ No newline at end of file
+    verbose_name = "Gerenciador de Backups"
+
+    def ready(self):
+        from . import signals  # noqa: F401
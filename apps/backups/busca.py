@@ -0,0 +1,164 @@
+"""
+Busca livre do histórico de validações (uma caixa de texto só).
+
+Cada palavra do termo precisa aparecer em algum destes campos (como no admin):
+Cliente.nome_fantasia/razao_social/cnpj, Servidor.hostname, RotinaBackup.descricao/
+conteudo ou ValidacaoBackup.observacao.
+
+Clientes, servidores e rotinas são tabelas pequenas: cada palavra vira um conjunto de
+ids de rotinas (rotina_id IN), sem JOIN pelo M2M de servidores, que duplicava linhas. A
+observação fica na tabela grande e usa o índice criado na migração 0012:
+
+- SQLite: FTS5 com tokenizer trigram (backups_validacao_busca_fts), para palavras com
+  3 ou mais caracteres, mantido por triggers na tabela de validações. Migrações que
+  recriam essa tabela no SQLite descartam os triggers, então cada uma delas os cria de
+  novo (ver a 0018); sem eles a busca volta para o LIKE;
+- PostgreSQL: pg_trgm (GIN em UPPER(coluna)), que atende o icontains direto;
+- demais casos: icontains sem índice.
+"""
+import re
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Replace
+
+from apps.clientes.models import Cliente, Servidor
+
+from .models import RotinaBackup
+
+MAX_PALAVRAS = 5
+
+# O trigram do FTS5 não encontra nada com menos de 3 caracteres
+MIN_CARACTERES_FTS = 3
+
+# Acima disso a palavra é comum demais para um IN com os ids do FTS5 (ver observacao_contem)
+MAX_IDS_FTS = 20000
+
+# Rotinas por palavra passadas como lista de ids; acima disso fica a subconsulta
+MAX_ROTINAS_LITERAIS = 2000
+
+_SO_DIGITOS = re.compile(r'\D')
+
+TABELA_FTS = 'backups_validacao_busca_fts'
+
+# Mantêm o índice FTS5 da observação em dia (criados nas migrações)
+GATILHOS_FTS = ('backups_validacao_busca_ai', 'backups_validacao_busca_ad', 'backups_validacao_busca_au')
+
+_fts_disponivel = {}
+
+
+def palavras(termo):
+    return (termo or '').split()[:MAX_PALAVRAS]
+
+
+def _objetos_fts(cursor):
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE (type = 'table' AND name = %s) OR (type = 'trigger' AND name IN (%s, %s, %s))",
+        [TABELA_FTS, *GATILHOS_FTS],
+    )
+    return {nome for nome, in cursor.fetchall()}
+
+
+def _tem_fts_observacao():
+    """
+    O FTS5 só serve se a tabela existe (SQLite com trigram, 3.34+, na migração) e os
+    triggers que a mantêm também: sem eles o índice não vê as validações novas.
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    if connection.alias not in _fts_disponivel:
+        with connection.cursor() as cursor:
+            _fts_disponivel[connection.alias] = len(_objetos_fts(cursor)) == 1 + len(GATILHOS_FTS)
+    return _fts_disponivel[connection.alias]
+
+
+def _clientes(palavra):
+    filtro = Q(nome_fantasia__icontains=palavra) | Q(razao_social__icontains=palavra) | Q(cnpj__icontains=palavra)
+    digitos = _SO_DIGITOS.sub('', palavra)
+    clientes = Cliente.objects.all()
+    if len(digitos) >= 4:
+        # CNPJ digitado sem pontuação também encontra o cadastrado com máscara
+        cnpj_digitos = Replace(Replace(Replace('cnpj', Value('.'), Value('')), Value('/'), Value('')), Value('-'), Value(''))
+        clientes = clientes.annotate(cnpj_digitos=cnpj_digitos)
+        filtro |= Q(cnpj_digitos__contains=digitos)
+    return clientes.filter(filtro).values('id')
+
+
+def rotinas_com_palavra(palavra):
+    """Rotinas cujo nome/conteúdo, cliente ou algum servidor (hostname ou cliente) contém a palavra."""
+    clientes = _clientes(palavra)
+    servidores = Servidor.objects.filter(Q(hostname__icontains=palavra) | Q(cliente_id__in=clientes)).values('id')
+    por_servidor = RotinaBackup.servidores.through.objects.filter(servidor_id__in=servidores).values('rotinabackup_id')
+    return RotinaBackup.objects.filter(
+        Q(descricao__icontains=palavra)
+        | Q(conteudo__icontains=palavra)
+        | Q(cliente_id__in=clientes)
+        | Q(pk__in=por_servidor)
+    ).values('id')
+
+
+def observacao_contem(palavra):
+    """
+    Q para a observação conter a palavra, ou None se nenhuma contém. No SQLite a
+    quantidade de ocorrências decide o plano: poucas viram um IN com os ids do FTS5;
+    muitas (palavra comum) ficam no LIKE, que percorrendo o índice de data acha a página
+    logo, em vez de ordenar centenas de milhares de ids.
+    """
+    if len(palavra) < MIN_CARACTERES_FTS or not _tem_fts_observacao():
+        return Q(observacao__icontains=palavra)
+    frase = '"' + palavra.replace('"', '""') + '"'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM (SELECT 1 FROM backups_validacao_busca_fts "
+            "WHERE backups_validacao_busca_fts MATCH %s LIMIT %s)",
+            [frase, MAX_IDS_FTS + 1],
+        )
+        encontrados = cursor.fetchone()[0]
+    if not encontrados:
+        return None
+    if encontrados > MAX_IDS_FTS:
+        return Q(observacao__icontains=palavra)
+    return Q(pk__in=RawSQL(
+        "SELECT rowid FROM backups_validacao_busca_fts WHERE backups_validacao_busca_fts MATCH %s",
+        [frase],
+    ))
+
+
+def _ids_ou_subconsulta(rotinas):
+    """Lista de ids quando é curta (o planner estima melhor); senão a própria subconsulta."""
+    ids = list(rotinas.values_list('id', flat=True)[:MAX_ROTINAS_LITERAIS + 1])
+    return ids if len(ids) <= MAX_ROTINAS_LITERAIS else rotinas
+
+
+def filtrar_por_busca(queryset, termo, usuarios=False):
+    """
+    Aplica a busca livre a um queryset de ValidacaoBackup (sem linhas duplicadas).
+    Com `usuarios`, o username de quem validou também conta (usado no admin).
+
+    Palavras que só aparecem em rotinas/clientes/servidores são intersectadas na tabela
+    de rotinas (pequena), e a de validações recebe um único rotina_id IN, que usa o
+    índice (rotina, created_at).
+    """
+    rotinas_comuns = None
+    for palavra in palavras(termo):
+        rotinas = rotinas_com_palavra(palavra)
+
+        alternativas = [observacao_contem(palavra)]
+        if usuarios:
+            alternativas.append(Q(usuario_id__in=User.objects.filter(username__icontains=palavra).values('id')))
+        alternativas = [q for q in alternativas if q is not None]
+
+        if not alternativas:
+            base = RotinaBackup.objects.all() if rotinas_comuns is None else rotinas_comuns
+            rotinas_comuns = base.filter(pk__in=rotinas)
+            continue
+        condicao = Q(rotina_id__in=_ids_ou_subconsulta(rotinas))
+        for alternativa in alternativas:
+            condicao |= alternativa
+        queryset = queryset.filter(condicao)
+
+    if rotinas_comuns is not None:
+        queryset = queryset.filter(rotina_id__in=_ids_ou_subconsulta(rotinas_comuns.values('id')))
+    return queryset
@@ -0,0 +1,276 @@
+"""
+Contagem de referências dos arquivos de evidência.
+
+Com o armazenamento por conteúdo (apps.common.storage) várias validações podem apontar
+para o mesmo arquivo. ArquivoEvidencia guarda quantas apontam para cada caminho; os
+signals de ValidacaoBackup (e o próprio storage, nos uploads) chamam estas funções e o
+arquivo só é apagado quando a última referência some.
+
+Evidências em imagem ganham uma miniatura e uma versão de exibição menor. O upload só
+registra a imagem como PENDENTE; quem gera as versões é o comando
+`processar_imagens_evidencias` (com --continuo, como worker), fora dos processos web.
+Logs de texto são indexados para busca depois do commit, em um pool de threads (ver
+apps.backups.indice_texto).
+"""
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+
+from apps.common.storage import NomeReferenciado, hash_conteudo, hash_do_caminho
+
+from .imagens import eh_imagem
+from .indice_texto import eh_texto, indexar_arquivo, remover_texto_sem_arquivo
+from .models import ArquivoEvidencia, ValidacaoBackup
+
+logger = logging.getLogger(__name__)
+
+# Fora da pasta das evidências: o deduplicar_evidencias trata arquivos soltos lá como órfãos
+PASTA_VERSOES = 'evidencias_versoes'
+
+_executor = None
+_trava_executor = threading.Lock()
+
+
+def _storage():
+    return ValidacaoBackup._meta.get_field('evidencia').storage
+
+
+def _hash_do_arquivo(nome):
+    digest = hash_do_caminho(nome)
+    if digest:
+        return digest
+    # Arquivos antigos (nome uuid4): calcula a partir do conteúdo
+    try:
+        with _storage().open(nome) as arquivo:
+            return hash_conteudo(arquivo)
+    except OSError:
+        return ''
+
+
+def _tamanho(nome):
+    try:
+        return _storage().size(nome)
+    except OSError:
+        return 0
+
+
+def registrar_referencia(nome, quantidade=1, gravar=None):
+    """
+    Soma `quantidade` referências a `nome`, criando o registro se preciso. Com `gravar`
+    (ver reservar_referencia), o arquivo só é gravado depois da referência tomada.
+    """
+    if not nome:
+        return
+    for tentativa in range(2):
+        if ArquivoEvidencia.objects.filter(caminho=nome).update(referencias=F('referencias') + quantidade):
+            if gravar:
+                gravar()
+            return
+        try:
+            with transaction.atomic():
+                arquivo = ArquivoEvidencia.objects.create(
+                    caminho=nome, referencias=quantidade,
+                    # Com `gravar` o arquivo ainda pode não existir: hash e tamanho vêm depois
+                    hash=(hash_do_caminho(nome) or '') if gravar else _hash_do_arquivo(nome),
+                    tamanho=0 if gravar else _tamanho(nome),
+                    processamento='PENDENTE' if eh_imagem(nome) else 'IGNORADO',
+                )
+            break
+        except IntegrityError:
+            # Outra transação criou a linha entre o UPDATE e o INSERT
+            if tentativa:
+                raise
+    if gravar:
+        gravar()
+        arquivo.hash = arquivo.hash or _hash_do_arquivo(nome)
+        arquivo.tamanho = _tamanho(nome)
+        ArquivoEvidencia.objects.filter(pk=arquivo.pk).update(hash=arquivo.hash, tamanho=arquivo.tamanho)
+    if eh_texto(nome):
+        transaction.on_commit(lambda: agendar_indexacao(arquivo.pk))
+
+
+@transaction.atomic(savepoint=False)
+def reservar_referencia(nome, gravar):
+    """
+    Chamada pelo storage das evidências (apps.common.storage) antes de devolver `nome`
+    para um upload. A linha de ArquivoEvidencia (UPDATE ou INSERT na chave única) é o que
+    serializa com _apagar_se_sem_referencias: ou a remoção vê a referência e desiste, ou
+    termina antes e `gravar` grava o arquivo de novo.
+    """
+    registrar_referencia(nome, gravar=gravar)
+
+
+def liberar_referencia(nome, quantidade=1):
+    """Decrementa as referências; sem nenhuma, remove o registro e (após o commit) o arquivo."""
+    if not nome:
+        return
+    ArquivoEvidencia.objects.filter(caminho=nome).update(referencias=F('referencias') - quantidade)
+    sem_referencias = ArquivoEvidencia.objects.filter(caminho=nome, referencias__lte=0)
+    linha = sem_referencias.values('hash', 'miniatura', 'exibicao').first()
+    removidos, _ = sem_referencias.delete()
+    if removidos:
+        versoes = [linha[campo] for campo in ('miniatura', 'exibicao') if linha[campo]]
+        transaction.on_commit(lambda: _apagar_se_sem_referencias(nome, versoes, linha['hash']))
+
+
+@transaction.atomic
+def _apagar_se_sem_referencias(nome, versoes, digest):
+    # Um upload igual pode ter voltado a usar o arquivo entre o delete e o commit: leitura travada
+    if ArquivoEvidencia.objects.select_for_update().filter(caminho=nome, referencias__gt=0).exists():
+        return
+    # Linha inexistente não se trava; um marcador na chave única segura reservar_referencia
+    # até o fim desta transação (e falha se alguém já tiver reservado o arquivo)
+    try:
+        with transaction.atomic():
+            marcador = ArquivoEvidencia.objects.create(caminho=nome, hash='', referencias=0, processamento='IGNORADO')
+    except IntegrityError:
+        return
+    _storage().delete(nome)
+    for versao in versoes:
+        default_storage.delete(versao)
+    marcador.delete()
+    remover_texto_sem_arquivo(digest)
+
+
+@transaction.atomic
+def renomear_evidencia(antigo, novo):
+    """
+    Aponta as validações e a contagem de referências de `antigo` para `novo` (mesmo
+    conteúdo em outro caminho). UPDATE direto: o resto da validação não muda.
+    """
+    ValidacaoBackup.objects.filter(evidencia=antigo).update(evidencia=novo)
+    linha = ArquivoEvidencia.objects.filter(caminho=antigo).first()
+    if linha is None:
+        return
+    if ArquivoEvidencia.objects.filter(caminho=novo).update(referencias=F('referencias') + linha.referencias):
+        linha.delete()
+    else:
+        ArquivoEvidencia.objects.filter(pk=linha.pk).update(
+            caminho=novo, tamanho=_tamanho(novo), hash=hash_do_caminho(novo) or linha.hash
+        )
+
+
+def evidencia_salva(validacao):
+    nome = validacao.evidencia.name
+    anterior = validacao.valor_original('evidencia')
+    # Depois de um save o valor original é o FieldFile; vindo do banco, a string
+    anterior = getattr(anterior, 'name', anterior)
+    if anterior == nome:
+        return
+    # Upload: a referência já foi tomada pelo storage (reservar_referencia)
+    if not isinstance(nome, NomeReferenciado):
+        registrar_referencia(nome)
+    if anterior:
+        liberar_referencia(anterior)
+
+
+def evidencias_criadas(validacoes):
+    """Referências de um lote de validações novas (bulk_create): um UPDATE por arquivo."""
+    quantidades = Counter(
+        v.evidencia.name for v in validacoes if v.evidencia and not isinstance(v.evidencia.name, NomeReferenciado)
+    )
+    for nome, quantidade in quantidades.items():
+        registrar_referencia(nome, quantidade)
+
+
+def evidencia_excluida(validacao):
+    liberar_referencia(validacao.evidencia.name)
+
+
+@transaction.atomic
+def recontar_referencias():
+    """Refaz ArquivoEvidencia a partir das validações (um GROUP BY). Retorna a quantidade de arquivos."""
+    campos_preservados = ('hash', 'processamento', 'miniatura', 'exibicao')
+    existentes = {a['caminho']: a for a in ArquivoEvidencia.objects.values('caminho', *campos_preservados)}
+    ArquivoEvidencia.objects.all().delete()
+
+    contagens = (
+        ValidacaoBackup.objects.exclude(evidencia='').order_by()
+        .values_list('evidencia').annotate(total=Count('id'))
+    )
+    arquivos = []
+    for nome, total in contagens:
+        anterior = existentes.get(nome, {})
+        arquivos.append(ArquivoEvidencia(
+            caminho=nome,
+            hash=anterior.get('hash') or _hash_do_arquivo(nome),
+            tamanho=_tamanho(nome),
+            referencias=total,
+            processamento=anterior.get('processamento') or ('PENDENTE' if eh_imagem(nome) else 'IGNORADO'),
+            miniatura=anterior.get('miniatura', ''),
+            exibicao=anterior.get('exibicao', ''),
+        ))
+    ArquivoEvidencia.objects.bulk_create(arquivos, batch_size=1000)
+    return len(arquivos)
+
+
+# --- VERSÕES REDUZIDAS DAS IMAGENS ---
+
+def _caminho_versao(arquivo, sufixo):
+    return f"{PASTA_VERSOES}/{arquivo.hash[:2]}/{arquivo.hash}_{sufixo}.jpg"
+
+
+def ler_original(arquivo):
+    with _storage().open(arquivo.caminho) as original:
+        return original.read()
+
+
+def salvar_versoes(arquivo, miniatura, exibicao):
+    """Grava as versões geradas por imagens.gerar_versoes e marca o arquivo como concluído."""
+    campos = {'processamento': 'CONCLUIDO', 'miniatura': '', 'exibicao': ''}
+    for campo, conteudo in (('miniatura', miniatura), ('exibicao', exibicao)):
+        if conteudo is None:
+            continue
+        caminho = _caminho_versao(arquivo, campo)
+        if default_storage.exists(caminho):
+            default_storage.delete(caminho)
+        campos[campo] = default_storage.save(caminho, ContentFile(conteudo))
+    ArquivoEvidencia.objects.filter(pk=arquivo.pk).update(**campos)
+
+
+def marcar_erro(arquivo, exc):
+    logger.warning("Não foi possível gerar as versões de %s: %s", arquivo.caminho, exc)
+    ArquivoEvidencia.objects.filter(pk=arquivo.pk).update(processamento='ERRO')
+
+
+def _em_segundo_plano(funcao, arquivo_id):
+    close_old_connections()
+    try:
+        funcao(arquivo_id)
+    except Exception:
+        logger.exception("Falha em %s para o arquivo de evidência %s", funcao.__name__, arquivo_id)
+    finally:
+        # Cada thread do pool tem a sua conexão com o banco
+        connection.close()
+
+
+def _submeter(funcao, arquivo_id):
+    global _executor
+    with _trava_executor:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'EVIDENCIAS_INDEXACAO_WORKERS', 2),
+                thread_name_prefix='evidencias',
+            )
+    _executor.submit(_em_segundo_plano, funcao, arquivo_id)
+
+
+def agendar_indexacao(arquivo_id):
+    """Extrai o texto do log para a busca em uma thread do pool."""
+    _submeter(indexar_arquivo, arquivo_id)
+
+
+def anotar_versoes(queryset):
+    """Anota miniatura/versão de exibição da evidência de cada validação (sem query extra)."""
+    arquivo = ArquivoEvidencia.objects.filter(caminho=OuterRef('evidencia'))
+    return queryset.annotate(
+        evidencia_miniatura=Subquery(arquivo.values('miniatura')[:1]),
+        evidencia_exibicao=Subquery(arquivo.values('exibicao')[:1]),
+    )
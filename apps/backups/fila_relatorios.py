@@ -0,0 +1,211 @@
+"""
+Fila de relatórios em banco de dados (sem broker externo).
+
+A view enfileira um RelatorioJob com os filtros atuais; o comando `processar_relatorios`
+reserva os jobs pendentes, gera o arquivo e o grava no storage padrão.
+
+Os arquivos gerados também servem de cache: a chave do job inclui a versão dos dados
+(apps.backups.versao_dados), então um pedido igual reaproveita o arquivo enquanto
+nada relevante mudar; a versão muda na mesma transação dos dados, então um pedido
+feito depois de uma escrita nunca recebe o arquivo anterior a ela. O espaço em disco é limitado por RELATORIOS_CACHE_MAX_BYTES,
+removendo primeiro os arquivos acessados há mais tempo (LRU).
+"""
+import hashlib
+import json
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.common import contadores
+
+from .models import RelatorioJob
+from .relatorios import escrever_excel, escrever_pdf, filtrar_validacoes
+from .versao_dados import carimbo_versao
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_FILTRO = ('cliente', 'status', 'data_inicio', 'data_fim', 'busca', 'texto_log')
+
+CACHE_MAX_BYTES_PADRAO = 500 * 1024 * 1024
+
+CONTADOR_ACERTOS = 'relatorios:cache:acertos'
+CONTADOR_FALHAS = 'relatorios:cache:falhas'
+CONTADOR_REMOCOES = 'relatorios:cache:remocoes'
+
+EXTENSOES = {
+    'EXCEL': 'xlsx',
+    'PDF': 'pdf',
+}
+
+CONTENT_TYPES = {
+    'EXCEL': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'PDF': 'application/pdf',
+}
+
+
+def normalizar_filtros(filtros):
+    """Mantém só os filtros conhecidos e não vazios, para pedidos iguais gerarem a mesma chave."""
+    normalizados = {}
+    for campo in CAMPOS_FILTRO:
+        valor = (filtros.get(campo) or '').strip()
+        if valor:
+            normalizados[campo] = valor
+    return normalizados
+
+
+def chave_relatorio(formato, filtros, versao):
+    conteudo = json.dumps({'formato': formato, 'filtros': filtros, 'versao': versao}, sort_keys=True)
+    return hashlib.sha256(conteudo.encode()).hexdigest()
+
+
+def buscar_em_cache(chave):
+    """Relatório já gerado para a mesma chave, se o arquivo ainda existir no storage."""
+    job = RelatorioJob.objects.filter(chave=chave, status='CONCLUIDO').exclude(arquivo='').order_by('-concluido_em').first()
+    if job is None or not job.arquivo.storage.exists(job.arquivo.name):
+        return None
+    registrar_acesso(job)
+    return job
+
+
+def registrar_acesso(job):
+    """Atualiza o último acesso (pedido em cache ou download), que ordena a remoção LRU."""
+    job.ultimo_acesso = timezone.now()
+    RelatorioJob.objects.filter(pk=job.pk).update(ultimo_acesso=job.ultimo_acesso)
+
+
+def enfileirar_relatorio(formato, filtros, usuario=None):
+    """
+    Devolve o relatório em cache para os mesmos filtros e versão dos dados; se não houver,
+    cria o job ou devolve o que já está pendente/em processamento.
+    """
+    filtros = normalizar_filtros(filtros)
+    versao = carimbo_versao(filtros.get('cliente'))
+    chave = chave_relatorio(formato, filtros, versao)
+
+    em_cache = buscar_em_cache(chave)
+    if em_cache:
+        contadores.incrementar(CONTADOR_ACERTOS)
+        return em_cache
+    contadores.incrementar(CONTADOR_FALHAS)
+
+    for _tentativa in range(2):
+        existente = RelatorioJob.objects.filter(
+            chave=chave, status__in=RelatorioJob.STATUS_EM_ANDAMENTO
+        ).first()
+        if existente:
+            return existente
+        try:
+            with transaction.atomic():
+                return RelatorioJob.objects.create(
+                    formato=formato, filtros=filtros, chave=chave, versao_dados=versao, solicitado_por=usuario
+                )
+        except IntegrityError:
+            # Outro request criou o mesmo job ao mesmo tempo
+            continue
+    return RelatorioJob.objects.filter(chave=chave, status__in=RelatorioJob.STATUS_EM_ANDAMENTO).first()
+
+
+def reservar_proximo_job():
+    """
+    Marca o job pendente mais antigo como PROCESSANDO. O UPDATE condicional garante
+    que dois workers não peguem o mesmo job.
+    """
+    candidatos = RelatorioJob.objects.filter(status='PENDENTE').order_by('created_at').values_list('id', flat=True)[:10]
+    for job_id in candidatos:
+        reservado = RelatorioJob.objects.filter(pk=job_id, status='PENDENTE').update(
+            status='PROCESSANDO', iniciado_em=timezone.now()
+        )
+        if reservado:
+            return RelatorioJob.objects.select_related('solicitado_por').get(pk=job_id)
+    return None
+
+
+def liberar_jobs_travados(minutos):
+    """Devolve para a fila jobs em PROCESSANDO há mais de `minutos` (ex.: worker derrubado)."""
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return RelatorioJob.objects.filter(status='PROCESSANDO', iniciado_em__lt=limite).update(
+        status='PENDENTE', iniciado_em=None
+    )
+
+
+def processar_job(job):
+    queryset = filtrar_validacoes(job.filtros)
+    usuario = job.solicitado_por.username if job.solicitado_por else "Sistema"
+    nome = f"relatorio_{job.pk}_{job.chave[:12]}.{EXTENSOES[job.formato]}"
+
+    try:
+        with tempfile.TemporaryFile() as arquivo:
+            if job.formato == 'EXCEL':
+                escrever_excel(queryset, arquivo)
+            elif not escrever_pdf(queryset, arquivo, usuario):
+                raise RuntimeError("Erro ao gerar PDF")
+            job.tamanho = arquivo.tell()
+            arquivo.seek(0)
+            job.arquivo.save(nome, File(arquivo), save=False)
+    except Exception as exc:
+        logger.exception("Falha ao gerar o relatório %s", job.pk)
+        job.status = 'ERRO'
+        job.erro = str(exc)
+    else:
+        job.status = 'CONCLUIDO'
+        job.erro = ''
+
+    job.concluido_em = job.ultimo_acesso = timezone.now()
+    job.save(update_fields=['arquivo', 'tamanho', 'status', 'erro', 'concluido_em', 'ultimo_acesso', 'updated_at'])
+
+    if job.status == 'CONCLUIDO':
+        aplicar_limite_cache()
+    return job
+
+
+def aplicar_limite_cache(limite=None):
+    """
+    Remove os relatórios acessados há mais tempo até o total em disco caber no limite.
+    Os jobs ficam como EXPIRADO (sem arquivo) para quem ainda estiver consultando o status.
+    """
+    if limite is None:
+        limite = getattr(settings, 'RELATORIOS_CACHE_MAX_BYTES', CACHE_MAX_BYTES_PADRAO)
+
+    concluidos = RelatorioJob.objects.filter(status='CONCLUIDO').exclude(arquivo='')
+    total = concluidos.aggregate(total=Sum('tamanho'))['total'] or 0
+    removidos = 0
+
+    if total > limite:
+        mais_antigos = concluidos.annotate(
+            acesso=Coalesce('ultimo_acesso', 'concluido_em')
+        ).order_by('acesso', 'id').only('id', 'arquivo', 'tamanho')
+        for job in mais_antigos.iterator():
+            if total <= limite:
+                break
+            job.arquivo.delete(save=False)
+            RelatorioJob.objects.filter(pk=job.pk).update(status='EXPIRADO', arquivo='', updated_at=timezone.now())
+            total -= job.tamanho
+            removidos += 1
+
+    if removidos:
+        contadores.incrementar(CONTADOR_REMOCOES, removidos)
+    return removidos
+
+
+def estatisticas_cache():
+    atuais = contadores.valores([CONTADOR_ACERTOS, CONTADOR_FALHAS, CONTADOR_REMOCOES])
+    return {
+        'acertos': atuais[CONTADOR_ACERTOS],
+        'falhas': atuais[CONTADOR_FALHAS],
+        'remocoes': atuais[CONTADOR_REMOCOES],
+        'bytes_em_disco': RelatorioJob.objects.filter(status='CONCLUIDO').aggregate(
+            total=Sum('tamanho')
+        )['total'] or 0,
+    }
+
+
+def nome_download(job):
+    data = (job.concluido_em or job.created_at).astimezone(timezone.get_current_timezone())
+    return f"Relatorio_Backups_{data.strftime('%d-%m-%Y')}.{EXTENSOES[job.formato]}"
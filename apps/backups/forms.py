@@ -1,7 +1,30 @@
 from django import forms
+from .leitura_logs import analisar_upload
 from .models import ValidacaoBackup, RotinaBackup
 
-class ValidacaoForm(forms.ModelForm):
+
+class StatusPeloLogMixin:
+    """
+    Resultado opcional quando a ferramenta da rotina tem leitor de log: sem status
+    escolhido, o log anexado decide e o resumo da leitura vai para a observação.
+    Sem leitor, o resultado continua obrigatório.
+    """
+
+    def preencher_pelo_log(self, dados, rotina):
+        if dados.get('status') or self.has_error('status') or rotina is None:
+            return
+        if not rotina.ferramenta.parser:
+            self.add_error('status', self.fields['status'].error_messages['required'])
+            return
+        resultado = analisar_upload(rotina.ferramenta, dados.get('evidencia'))
+        if resultado is None or resultado.status is None:
+            self.add_error('status', "Selecione o resultado (não foi possível identificá-lo pelo log anexado).")
+            return
+        dados['status'] = resultado.status
+        dados['observacao'] = '\n\n'.join(filter(None, [dados.get('observacao', '').strip(), resultado.resumo()]))
+
+
+class ValidacaoForm(StatusPeloLogMixin, forms.ModelForm):
     class Meta:
         model = ValidacaoBackup
         fields = ['rotina', 'status', 'observacao', 'evidencia']
@@ -32,9 +55,11 @@ class ValidacaoForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         
         if cliente_id:
-            self.fields['rotina'].queryset = RotinaBackup.objects.filter(cliente_id=cliente_id)
+            self.fields['rotina'].queryset = RotinaBackup.objects.filter(cliente_id=cliente_id).select_related('ferramenta')
             
         self.fields['rotina'].empty_label = "Selecione uma rotina..."
+        # Obrigatório só quando a ferramenta não tem leitor de log (ver StatusPeloLogMixin)
+        self.fields['status'].required = False
         
         # Estilo Dark Mode para o Select
         self.fields['rotina'].widget.attrs.update({
@@ -43,4 +68,97 @@ class ValidacaoForm(forms.ModelForm):
                 'bg-gray-50 border-gray-300 text-gray-900 focus:ring-blue-500 focus:border-blue-500 '
                 'dark:bg-slate-800 dark:border-slate-600 dark:placeholder-gray-400 dark:text-white dark:focus:ring-blue-500 dark:focus:border-blue-500'
             )
-        })
\ No newline at end of file
+        })
+
+    def clean(self):
+        dados = super().clean()
+        self.preencher_pelo_log(dados, dados.get('rotina'))
+        return dados
+
+# --- VALIDAÇÃO EM LOTE (todas as rotinas de um cliente em um envio) ---
+
+class ValidacaoLoteForm(StatusPeloLogMixin, forms.ModelForm):
+    """Uma linha do lote. Linhas deixadas em branco são ignoradas (empty_permitted)."""
+    rotina_id = forms.IntegerField(widget=forms.HiddenInput)
+
+    class Meta:
+        model = ValidacaoBackup
+        fields = ['status', 'observacao', 'evidencia']
+        widgets = {
+            'status': forms.RadioSelect(attrs={'class': 'peer sr-only'}),
+            'observacao': forms.TextInput(attrs={
+                'class': (
+                    'block p-2 w-full text-sm rounded-lg border transition '
+                    'text-gray-900 bg-white border-gray-300 focus:ring-blue-500 focus:border-blue-500 '
+                    'dark:bg-slate-800 dark:border-slate-600 dark:placeholder-gray-400 dark:text-white'
+                ),
+                'placeholder': 'Observação (opcional)',
+            }),
+            'evidencia': forms.FileInput(attrs={
+                'class': 'block w-full text-xs text-gray-500 dark:text-gray-400 file:mr-2 file:py-1 file:px-2 file:rounded file:border-0 file:text-xs file:bg-blue-50 file:text-blue-700 dark:file:bg-slate-700 dark:file:text-blue-300',
+                'accept': '.txt,.jpg,.jpeg,.png',
+            }),
+        }
+
+    def __init__(self, *args, rotinas=None, **kwargs):
+        self.rotinas = rotinas or {}
+        super().__init__(*args, **kwargs)
+        self.fields['status'].choices = ValidacaoBackup.STATUS_CHOICES
+        # Obrigatório só quando a ferramenta não tem leitor de log (ver StatusPeloLogMixin)
+        self.fields['status'].required = False
+        # No lote a evidência é opcional (conferência rápida); o ModelForm então não
+        # aplica a obrigatoriedade do modelo, mas o validate_file_infection continua valendo
+        self.fields['evidencia'].required = False
+
+    @property
+    def rotina(self):
+        return self.rotinas.get(self.initial.get('rotina_id'))
+
+    def clean_rotina_id(self):
+        rotina = self.rotinas.get(self.cleaned_data['rotina_id'])
+        if rotina is None:
+            raise forms.ValidationError("Rotina inválida para este cliente.")
+        # Antes do _post_clean, para a validação do modelo já ver a rotina
+        self.instance.rotina = rotina
+        return rotina.pk
+
+    def clean(self):
+        dados = super().clean()
+        self.preencher_pelo_log(dados, self.rotinas.get(dados.get('rotina_id')))
+        return dados
+
+
+class BaseValidacaoLoteFormSet(forms.BaseModelFormSet):
+    """
+    Uma linha por rotina do cliente. As rotinas vêm da view (uma consulta) e cada linha
+    é ligada à sua pelo id oculto, sem uma consulta por linha.
+    """
+
+    def __init__(self, rotinas, *args, **kwargs):
+        self.rotinas = {rotina.pk: rotina for rotina in rotinas}
+        kwargs.setdefault('queryset', ValidacaoBackup.objects.none())
+        kwargs['initial'] = [{'rotina_id': pk} for pk in self.rotinas]
+        super().__init__(*args, **kwargs)
+        self.extra = len(self.rotinas)
+
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        kwargs['rotinas'] = self.rotinas
+        return kwargs
+
+    def clean(self):
+        super().clean()
+        preenchidas = [form for form in self.forms if form.has_changed()]
+        if not preenchidas:
+            raise forms.ValidationError("Preencha o resultado de pelo menos uma rotina.")
+        vistas = set()
+        for form in preenchidas:
+            rotina_id = form.cleaned_data.get('rotina_id')
+            if rotina_id in vistas:
+                raise forms.ValidationError("A mesma rotina foi enviada mais de uma vez.")
+            vistas.add(rotina_id)
+
+
+ValidacaoLoteFormSet = forms.modelformset_factory(
+    ValidacaoBackup, form=ValidacaoLoteForm, formset=BaseValidacaoLoteFormSet, extra=0, max_num=500,
+)
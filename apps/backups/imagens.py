@@ -0,0 +1,57 @@
+"""
+Versões reduzidas das evidências em imagem (miniatura e versão de exibição).
+
+Assim como apps.backups.pdf, este módulo não importa nada do Django: `gerar_versoes`
+roda nos processos do ProcessPoolExecutor do comando `processar_imagens_evidencias`.
+A orquestração (storage, banco) fica em apps.backups.evidencias.
+"""
+import io
+
+from PIL import Image, ImageOps
+
+EXTENSOES_IMAGEM = ('.png', '.jpg', '.jpeg')
+
+TAMANHO_MINIATURA = (320, 240)
+QUALIDADE_MINIATURA = 75
+
+TAMANHO_EXIBICAO = (1600, 1600)
+QUALIDADE_EXIBICAO = 85
+
+
+def eh_imagem(nome):
+    return nome.lower().endswith(EXTENSOES_IMAGEM)
+
+
+def _rgb(imagem):
+    """Converte para RGB, aplicando transparência sobre fundo branco (JPEG não tem alfa)."""
+    if imagem.mode in ('RGBA', 'LA') or (imagem.mode == 'P' and 'transparency' in imagem.info):
+        imagem = imagem.convert('RGBA')
+        fundo = Image.new('RGB', imagem.size, (255, 255, 255))
+        fundo.paste(imagem, mask=imagem.getchannel('A'))
+        return fundo
+    return imagem.convert('RGB')
+
+
+def _jpeg(imagem, qualidade):
+    buffer = io.BytesIO()
+    imagem.save(buffer, format='JPEG', quality=qualidade, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def gerar_versoes(dados):
+    """
+    Recebe o conteúdo (bytes) de uma imagem e devolve (miniatura, exibicao) em JPEG.
+    `exibicao` é None quando não fica menor que o original (ex.: PNG pequeno).
+    """
+    with Image.open(io.BytesIO(dados)) as original:
+        original.load()
+        imagem = _rgb(ImageOps.exif_transpose(original))
+
+    exibicao = imagem.copy()
+    exibicao.thumbnail(TAMANHO_EXIBICAO, Image.Resampling.LANCZOS)
+    exibicao = _jpeg(exibicao, QUALIDADE_EXIBICAO)
+
+    imagem.thumbnail(TAMANHO_MINIATURA, Image.Resampling.LANCZOS)
+    miniatura = _jpeg(imagem, QUALIDADE_MINIATURA)
+
+    return miniatura, (exibicao if len(exibicao) < len(dados) else None)
@@ -0,0 +1,187 @@
+"""
+Busca textual no conteúdo das evidências de log (.txt).
+
+O texto é extraído depois do upload (em segundo plano, ver evidencias.agendar_indexacao)
+e guardado em TextoEvidencia, uma vez por conteúdo. A migração 0011 cria o índice
+conforme o banco:
+
+- SQLite: tabela FTS5 (backups_textoevidencia_fts) sincronizada por triggers;
+- PostgreSQL: índice GIN sobre to_tsvector('simple', conteudo);
+- outros bancos: LIKE sem índice, sem trecho destacado.
+
+A busca é por frase: as palavras do termo, em sequência, em qualquer ponto do log.
+"""
+import re
+
+from django.conf import settings
+from django.db import IntegrityError, connection
+from django.db.models import OuterRef, Subquery
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from apps.common.storage import nome_original
+
+from .models import ArquivoEvidencia, TextoEvidencia, ValidacaoBackup
+
+EXTENSOES_TEXTO = ('.txt',)
+
+# Marcadores do trecho (não aparecem em texto de log); viram <mark> depois do escape
+_INICIO_DESTAQUE = '\x02'
+_FIM_DESTAQUE = '\x03'
+
+_TEM_PALAVRA = re.compile(r'\w')
+
+_BLOCO_LEITURA = 64 * 1024
+
+
+def eh_texto(nome):
+    return nome_original(nome or '').lower().endswith(EXTENSOES_TEXTO)
+
+
+def _limite_bytes():
+    return getattr(settings, 'EVIDENCIAS_INDICE_MAX_BYTES', 1024 * 1024)
+
+
+def _codificacao(inicio):
+    # Logs do Windows (ex.: wbadmin redirecionado) costumam vir em UTF-16 com BOM
+    if inicio.startswith(b'\xff\xfe'):
+        return 'utf-16-le', 2
+    if inicio.startswith(b'\xfe\xff'):
+        return 'utf-16-be', 2
+    if inicio.startswith(b'\xef\xbb\xbf'):
+        return 'utf-8', 3
+    return 'utf-8', 0
+
+
+def _decodificar(dados, codificacao):
+    # O PostgreSQL não aceita NUL em colunas de texto; os marcadores de destaque saem
+    # para o log não conseguir abrir <mark> por conta própria
+    texto = dados.decode(codificacao, errors='replace')
+    return texto.replace('\x00', '').replace(_INICIO_DESTAQUE, '').replace(_FIM_DESTAQUE, '')
+
+
+def extrair_texto(storage, nome):
+    """
+    Lê o log (descomprimindo se for .gz) e devolve (texto, truncado). Acima do limite,
+    ficam a primeira e a última metade do limite: o erro costuma estar no fim do log.
+    """
+    metade = _limite_bytes() // 2
+    cabeca = bytearray()
+    cauda = bytearray()
+    total = 0
+    with storage.abrir_descomprimido(nome) as arquivo:
+        while bloco := arquivo.read(_BLOCO_LEITURA):
+            total += len(bloco)
+            if len(cabeca) < metade:
+                falta = metade - len(cabeca)
+                cabeca += bloco[:falta]
+                bloco = bloco[falta:]
+            cauda += bloco
+            if len(cauda) > 2 * metade:
+                del cauda[:len(cauda) - metade]
+
+    codificacao, bom = _codificacao(cabeca)
+    if total <= 2 * metade:
+        return _decodificar(bytes(cabeca[bom:] + cauda), codificacao), False
+    cauda = cauda[-metade:]
+    if bom == 2:
+        # Mantém cabeça e cauda alinhadas aos pares de bytes do UTF-16
+        cabeca = cabeca[:len(cabeca) - (len(cabeca) - bom) % 2]
+        if (total - len(cauda)) % 2:
+            cauda = cauda[1:]
+    texto = f"{_decodificar(bytes(cabeca[bom:]), codificacao)}\n[...]\n{_decodificar(bytes(cauda), codificacao)}"
+    return texto, True
+
+
+def indexar_arquivo(arquivo_id):
+    """Extrai e guarda o texto de um ArquivoEvidencia de log, se ainda não indexado."""
+    arquivo = ArquivoEvidencia.objects.filter(pk=arquivo_id).first()
+    if arquivo is None or not eh_texto(arquivo.caminho) or not arquivo.hash:
+        return False
+    if TextoEvidencia.objects.filter(hash=arquivo.hash).exists():
+        return False
+    storage = ValidacaoBackup._meta.get_field('evidencia').storage
+    conteudo, truncado = extrair_texto(storage, arquivo.caminho)
+    try:
+        TextoEvidencia.objects.create(hash=arquivo.hash, conteudo=conteudo, truncado=truncado)
+    except IntegrityError:
+        # Outro upload do mesmo conteúdo indexou primeiro
+        return False
+    return True
+
+
+def remover_texto_sem_arquivo(digest):
+    """Apaga o texto indexado quando nenhum arquivo com esse conteúdo sobrou."""
+    if digest and not ArquivoEvidencia.objects.filter(hash=digest).exists():
+        TextoEvidencia.objects.filter(hash=digest).delete()
+
+
+# --- BUSCA ---
+
+def _frase_fts5(termo):
+    return '"' + termo.replace('"', '""') + '"'
+
+
+def hashes_com_termo(termo):
+    """Expressão SQL com os hashes dos textos que contêm o termo (para usar em __in)."""
+    if connection.vendor == 'sqlite':
+        return RawSQL(
+            "SELECT t.hash FROM backups_textoevidencia_fts f "
+            "JOIN backups_textoevidencia t ON t.id = f.rowid "
+            "WHERE backups_textoevidencia_fts MATCH %s",
+            [_frase_fts5(termo)],
+        )
+    if connection.vendor == 'postgresql':
+        return RawSQL(
+            "SELECT hash FROM backups_textoevidencia "
+            "WHERE to_tsvector('simple', conteudo) @@ phraseto_tsquery('simple', %s)",
+            [termo],
+        )
+    return TextoEvidencia.objects.filter(conteudo__icontains=termo).values('hash')
+
+
+def filtrar_por_texto(queryset, termo):
+    """Restringe as validações às que têm evidência de log contendo o termo."""
+    termo = (termo or '').strip()
+    if not _TEM_PALAVRA.search(termo):
+        return queryset.none() if termo else queryset
+    caminhos = ArquivoEvidencia.objects.filter(hash__in=hashes_com_termo(termo)).values('caminho')
+    return queryset.filter(evidencia__in=caminhos)
+
+
+def anotar_hash(queryset):
+    arquivo = ArquivoEvidencia.objects.filter(caminho=OuterRef('evidencia'))
+    return queryset.annotate(evidencia_hash=Subquery(arquivo.values('hash')[:1]))
+
+
+def _destacar(trecho):
+    html = escape(trecho).replace(_INICIO_DESTAQUE, '<mark>').replace(_FIM_DESTAQUE, '</mark>')
+    return mark_safe(html)
+
+
+def trechos(termo, hashes):
+    """{hash: trecho em HTML com o termo em <mark>} para os hashes informados (uma página)."""
+    termo = (termo or '').strip()
+    hashes = [h for h in set(hashes) if h]
+    if not hashes or not _TEM_PALAVRA.search(termo):
+        return {}
+
+    marcadores = ', '.join(['%s'] * len(hashes))
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT t.hash, snippet(backups_textoevidencia_fts, 0, %s, %s, '…', 24) "
+                "FROM backups_textoevidencia_fts f JOIN backups_textoevidencia t ON t.id = f.rowid "
+                f"WHERE backups_textoevidencia_fts MATCH %s AND t.hash IN ({marcadores})",
+                [_INICIO_DESTAQUE, _FIM_DESTAQUE, _frase_fts5(termo), *hashes],
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                "SELECT hash, ts_headline('simple', conteudo, phraseto_tsquery('simple', %s), %s) "
+                f"FROM backups_textoevidencia WHERE hash IN ({marcadores})",
+                [termo, f"StartSel={_INICIO_DESTAQUE}, StopSel={_FIM_DESTAQUE}, MaxWords=30, MinWords=10, MaxFragments=2", *hashes],
+            )
+        else:
+            return {}
+        return {digest: _destacar(trecho) for digest, trecho in cursor.fetchall()}
@@ -0,0 +1,261 @@
+"""
+Ingestão dos resultados enviados pelos agentes de backup (API com token).
+
+Cada item identifica a rotina por CNPJ do cliente + nome da rotina (e, opcionalmente,
+o hostname do servidor, que desempata rotinas com o mesmo nome) e traz uma chave de
+idempotência: reenviar o mesmo item depois de um timeout não duplica a validação. A chave
+vale por usuário (o dono do token): agentes de clientes diferentes podem gerar a mesma.
+
+Os cadastros são resolvidos por mapas em memória carregados uma vez por cliente (três
+consultas, não uma por item), e as validações são gravadas em lotes com
+apps.backups.lote.criar_sem_duplicar. Cada lote é uma transação; se a requisição cair no
+meio, o agente reenvia tudo e as chaves já gravadas são contadas como duplicadas.
+"""
+import hashlib
+import json
+import re
+import secrets
+
+from django.db.models import Value
+from django.db.models.functions import Replace
+from django.utils import timezone
+
+from apps.clientes.models import Cliente
+
+from .lote import TAMANHO_LOTE, criar_sem_duplicar
+from .models import RotinaBackup, TokenIngestao, ValidacaoBackup
+
+TIPOS_NDJSON = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+# Erros detalhados na resposta; os demais só entram na contagem
+MAX_ERROS_LISTADOS = 100
+
+# Evita um UPDATE por requisição só para registrar o uso do token
+INTERVALO_ULTIMO_USO = 60
+
+STATUS_VALIDOS = {valor for valor, _ in ValidacaoBackup.STATUS_CHOICES}
+TAMANHO_CHAVE = ValidacaoBackup._meta.get_field('chave_idempotencia').max_length
+
+_SO_DIGITOS = re.compile(r'\D')
+
+
+class ItemInvalido(ValueError):
+    pass
+
+
+# --- TOKENS ---
+
+def _hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def gerar_token(usuario, nome):
+    """Cria o token e devolve o valor em claro (não é possível recuperá-lo depois)."""
+    token = secrets.token_urlsafe(32)
+    TokenIngestao.objects.create(nome=nome, usuario=usuario, hash=_hash_token(token), prefixo=token[:8])
+    return token
+
+
+def autenticar(request):
+    """TokenIngestao ativo do cabeçalho `Authorization: Bearer <token>`, ou None."""
+    tipo, _, token = request.headers.get('Authorization', '').partition(' ')
+    if tipo.lower() != 'bearer' or not token.strip():
+        return None
+    # A busca é pelo hash: o token em si nunca é comparado nem guardado
+    registro = TokenIngestao.objects.select_related('usuario').filter(
+        hash=_hash_token(token.strip()), ativo=True, usuario__is_active=True
+    ).first()
+    if registro is None:
+        return None
+    agora = timezone.now()
+    if registro.ultimo_uso is None or (agora - registro.ultimo_uso).total_seconds() > INTERVALO_ULTIMO_USO:
+        TokenIngestao.objects.filter(pk=registro.pk).update(ultimo_uso=agora)
+    return registro
+
+
+# --- LEITURA DO CORPO ---
+
+def itens_json(corpo):
+    """(linha, item) de um array JSON. Levanta ValueError se o corpo não for um array."""
+    dados = json.loads(corpo)
+    if not isinstance(dados, list):
+        raise ValueError("O corpo deve ser um array JSON (ou NDJSON, um objeto por linha).")
+    return enumerate(dados, 1)
+
+
+def itens_ndjson(linhas):
+    """(linha, item) de um NDJSON lido aos poucos; linha inválida vira ItemInvalido no lugar do item."""
+    for numero, linha in enumerate(linhas, 1):
+        if not linha.strip():
+            continue
+        try:
+            yield numero, json.loads(linha)
+        except ValueError:
+            yield numero, ItemInvalido("JSON inválido.")
+
+
+# --- CADASTROS EM MEMÓRIA ---
+
+def _normalizar(texto):
+    return ' '.join(str(texto).split()).casefold()
+
+
+class Resolvedor:
+    """
+    Mapas CNPJ -> cliente, (cliente, nome da rotina) -> rotinas e rotina -> hostnames,
+    carregados sob demanda para os CNPJs que aparecem no lote e mantidos até o fim da
+    requisição.
+    """
+
+    def __init__(self):
+        self.clientes = {}
+        self.rotinas = {}
+        self.hostnames = {}
+
+    def carregar(self, cnpjs):
+        novos = {cnpj for cnpj in cnpjs if cnpj not in self.clientes}
+        if not novos:
+            return
+        # CNPJ com ou sem máscara, dos dois lados
+        cnpj_digitos = Replace(Replace(Replace('cnpj', Value('.'), Value('')), Value('/'), Value('')), Value('-'), Value(''))
+        encontrados = dict(
+            Cliente.objects.annotate(cnpj_digitos=cnpj_digitos)
+            .filter(cnpj_digitos__in=novos).values_list('cnpj_digitos', 'id')
+        )
+        for cnpj in novos:
+            self.clientes[cnpj] = encontrados.get(cnpj)
+        if not encontrados:
+            return
+
+        clientes_ids = list(encontrados.values())
+        rotinas = RotinaBackup.objects.filter(cliente_id__in=clientes_ids).select_related('ferramenta').only(
+            'id', 'cliente_id', 'descricao', 'ferramenta__nome', 'ferramenta__parser', 'ferramenta__regras_parser'
+        )
+        for rotina in rotinas:
+            self.rotinas.setdefault((rotina.cliente_id, _normalizar(rotina.descricao)), []).append(rotina)
+            self.hostnames[rotina.pk] = set()
+        servidores = RotinaBackup.servidores.through.objects.filter(
+            rotinabackup__cliente_id__in=clientes_ids
+        ).values_list('rotinabackup_id', 'servidor__hostname')
+        for rotina_id, hostname in servidores:
+            self.hostnames[rotina_id].add(_normalizar(hostname))
+
+    def rotina(self, cnpj, nome, hostname):
+        cliente_id = self.clientes.get(cnpj)
+        if cliente_id is None:
+            raise ItemInvalido(f"Cliente com CNPJ {cnpj} não encontrado.")
+        candidatas = self.rotinas.get((cliente_id, _normalizar(nome)), [])
+        if hostname:
+            hostname = _normalizar(hostname)
+            candidatas = [rotina for rotina in candidatas if hostname in self.hostnames[rotina.pk]]
+        if not candidatas:
+            raise ItemInvalido("Rotina não encontrada para este cliente" + (" e servidor." if hostname else "."))
+        if len(candidatas) > 1:
+            raise ItemInvalido("Há mais de uma rotina com este nome; informe o servidor.")
+        return candidatas[0]
+
+
+# --- INGESTÃO ---
+
+def _texto(item, campo, obrigatorio=True):
+    valor = item.get(campo)
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        if obrigatorio:
+            raise ItemInvalido(f"Campo '{campo}' é obrigatório.")
+        return ''
+    if not isinstance(valor, (str, int)):
+        raise ItemInvalido(f"Campo '{campo}' deve ser texto.")
+    return str(valor).strip()
+
+
+def _preparar(item):
+    """Valida o formato do item; a rotina é resolvida depois, com os mapas já carregados."""
+    if isinstance(item, ItemInvalido):
+        raise item
+    if not isinstance(item, dict):
+        raise ItemInvalido("Cada item deve ser um objeto JSON.")
+    chave = _texto(item, 'chave')
+    if len(chave) > TAMANHO_CHAVE:
+        raise ItemInvalido(f"A chave deve ter no máximo {TAMANHO_CHAVE} caracteres.")
+    status = _texto(item, 'status').upper()
+    if status not in STATUS_VALIDOS:
+        raise ItemInvalido(f"Status inválido. Use: {', '.join(sorted(STATUS_VALIDOS))}.")
+    cnpj = _SO_DIGITOS.sub('', _texto(item, 'cnpj'))
+    if not cnpj:
+        raise ItemInvalido("CNPJ inválido.")
+    return {
+        'chave': chave,
+        'status': status,
+        'cnpj': cnpj,
+        'rotina': _texto(item, 'rotina'),
+        'servidor': _texto(item, 'servidor', obrigatorio=False),
+        'observacao': _texto(item, 'observacao', obrigatorio=False),
+    }
+
+
+class _Resultado:
+    def __init__(self):
+        self.recebidos = self.criados = self.duplicados = self.com_erro = 0
+        self.erros = []
+
+    def erro(self, linha, chave, mensagem):
+        self.com_erro += 1
+        if len(self.erros) < MAX_ERROS_LISTADOS:
+            self.erros.append({'linha': linha, 'chave': chave, 'erro': mensagem})
+
+    def como_dict(self):
+        return {
+            'recebidos': self.recebidos,
+            'criados': self.criados,
+            'duplicados': self.duplicados,
+            'com_erro': self.com_erro,
+            # Erros de formato saem na leitura e os de cadastro na gravação do lote
+            'erros': sorted(self.erros, key=lambda erro: erro['linha']),
+        }
+
+
+def _gravar_lote(pendentes, usuario, resolvedor, resultado):
+    resolvedor.carregar(dados['cnpj'] for _, dados in pendentes)
+
+    validacoes = {}
+    for linha, dados in pendentes:
+        if dados['chave'] in validacoes:
+            resultado.duplicados += 1
+            continue
+        try:
+            rotina = resolvedor.rotina(dados['cnpj'], dados['rotina'], dados['servidor'])
+        except ItemInvalido as exc:
+            resultado.erro(linha, dados['chave'], str(exc))
+            continue
+        # A rotina do mapa fica presa à validação: os signals do lote leem rotina.cliente_id sem consultar
+        validacoes[dados['chave']] = ValidacaoBackup(
+            rotina=rotina, usuario=usuario, status=dados['status'],
+            observacao=dados['observacao'], chave_idempotencia=dados['chave'],
+        )
+
+    criadas, duplicadas = criar_sem_duplicar(validacoes.values())
+    resultado.criados += len(criadas)
+    resultado.duplicados += len(duplicadas)
+
+
+def ingerir(itens, usuario, tamanho_lote=TAMANHO_LOTE):
+    """
+    Grava os itens (pares linha, objeto) como validações de `usuario`, em lotes.
+    Itens inválidos não impedem os demais; a resposta lista os erros por linha.
+    """
+    resolvedor = Resolvedor()
+    resultado = _Resultado()
+    pendentes = []
+    for linha, item in itens:
+        resultado.recebidos += 1
+        try:
+            pendentes.append((linha, _preparar(item)))
+        except ItemInvalido as exc:
+            resultado.erro(linha, item.get('chave') if isinstance(item, dict) else None, str(exc))
+            continue
+        if len(pendentes) >= tamanho_lote:
+            _gravar_lote(pendentes, usuario, resolvedor, resultado)
+            pendentes = []
+    if pendentes:
+        _gravar_lote(pendentes, usuario, resolvedor, resultado)
+    return resultado.como_dict()
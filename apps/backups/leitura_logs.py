@@ -0,0 +1,196 @@
+"""
+Validação automática a partir do log da ferramenta (leitores em apps.backups.parsers).
+
+- No formulário: se o técnico anexa o log e não escolhe o resultado, o leitor da
+  ferramenta da rotina decide o status e resume o log na observação.
+- No comando `ingerir_logs`: os agentes deixam os logs em uma pasta organizada como
+  <pasta>/<CNPJ do cliente>/<nome da rotina>/<arquivo .log ou .txt>. Cada arquivo vira
+  uma validação com o próprio log como evidência; a leitura roda em paralelo (processos)
+  e a gravação em lotes. Depois, o arquivo vai para processados/ ou com_erro/ (com um
+  .erro.txt ao lado explicando o motivo).
+"""
+import hashlib
+import os
+import shutil
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+
+from apps.common.validators import validate_file_infection
+
+from . import parsers
+from .indice_texto import eh_texto
+from .ingestao import ItemInvalido, Resolvedor
+from .lote import criar_sem_duplicar
+from .models import ValidacaoBackup
+
+EXTENSOES_LOG = ('.log', '.txt')
+PASTA_PROCESSADOS = 'processados'
+PASTA_COM_ERRO = 'com_erro'
+
+# Arquivos modificados há menos tempo que isto podem estar sendo escritos pelo agente
+IDADE_MINIMA_SEGUNDOS = 30
+
+# Arquivos abertos ao mesmo tempo na gravação de um lote
+TAMANHO_LOTE = 100
+
+
+def leitor(ferramenta):
+    if ferramenta is None or not ferramenta.parser:
+        return None
+    return parsers.obter(ferramenta.parser, ferramenta.regras_parser)
+
+
+def analisar_upload(ferramenta, arquivo):
+    """ResultadoLog do log enviado no formulário, ou None se não houver leitor ou não for texto."""
+    instancia = leitor(ferramenta)
+    if instancia is None or not arquivo or not eh_texto(arquivo.name):
+        return None
+    arquivo.seek(0)
+    try:
+        return instancia.analisar(parsers.ler_linhas(arquivo))
+    finally:
+        arquivo.seek(0)
+
+
+# --- PASTA DE LOGS ---
+
+def logs_pendentes(pasta, idade_minima=IDADE_MINIMA_SEGUNDOS):
+    """(caminho, CNPJ, nome da rotina) dos logs em <pasta>/<cnpj>/<rotina>/, mais antigos que `idade_minima`."""
+    limite = time.time() - idade_minima
+    with os.scandir(pasta) as clientes:
+        for cliente in clientes:
+            if not cliente.is_dir() or cliente.name in (PASTA_PROCESSADOS, PASTA_COM_ERRO):
+                continue
+            with os.scandir(cliente.path) as rotinas:
+                for rotina in rotinas:
+                    if not rotina.is_dir():
+                        continue
+                    with os.scandir(rotina.path) as arquivos:
+                        for arquivo in arquivos:
+                            if (arquivo.is_file() and arquivo.name.lower().endswith(EXTENSOES_LOG)
+                                    and arquivo.stat().st_mtime < limite):
+                                yield arquivo.path, cliente.name, rotina.name
+
+
+def _mover(pasta, caminho, destino, erro=None):
+    """Move o log para <pasta>/<destino>/<cnpj>/<rotina>/, sem sobrescrever outro de mesmo nome."""
+    relativo = os.path.relpath(caminho, pasta)
+    alvo = os.path.join(pasta, destino, relativo)
+    os.makedirs(os.path.dirname(alvo), exist_ok=True)
+    if os.path.exists(alvo):
+        base, extensao = os.path.splitext(alvo)
+        alvo = f"{base}.{time.strftime('%Y%m%d%H%M%S')}{extensao}"
+    shutil.move(caminho, alvo)
+    if erro:
+        with open(alvo + '.erro.txt', 'w', encoding='utf-8') as arquivo:
+            arquivo.write(erro + '\n')
+
+
+def _chave(pasta, caminho, digest):
+    """
+    Chave de idempotência: caminho + data de modificação + conteúdo. Reprocessar o mesmo
+    arquivo (ex.: queda antes de movê-lo) não duplica; o log do dia seguinte com o mesmo
+    nome e conteúdo idêntico ainda conta como uma nova execução.
+    """
+    marca = f"{os.path.relpath(caminho, pasta)}|{os.stat(caminho).st_mtime_ns}|{digest}"
+    return 'log:' + hashlib.sha256(marca.encode()).hexdigest()
+
+
+def _analisar(tarefas, executor):
+    """(caminho, rotina, resultado ou exceção) na ordem das tarefas."""
+    if executor is None:
+        for caminho, rotina in tarefas:
+            try:
+                yield caminho, rotina, parsers.analisar_arquivo(caminho, rotina.ferramenta.parser, rotina.ferramenta.regras_parser)
+            except (OSError, ValueError) as exc:
+                yield caminho, rotina, exc
+        return
+    futuros = [
+        (caminho, rotina, executor.submit(
+            parsers.analisar_arquivo, caminho, rotina.ferramenta.parser, rotina.ferramenta.regras_parser
+        ))
+        for caminho, rotina in tarefas
+    ]
+    for caminho, rotina, futuro in futuros:
+        try:
+            yield caminho, rotina, futuro.result()
+        except (OSError, ValueError) as exc:
+            yield caminho, rotina, exc
+
+
+class _Contagem:
+    def __init__(self):
+        self.criados = self.duplicados = self.com_erro = 0
+        self.erros = []
+
+
+def _gravar(pasta, lote, contagem):
+    try:
+        criadas, duplicadas = criar_sem_duplicar([validacao for _, validacao in lote])
+    finally:
+        for _, validacao in lote:
+            validacao.evidencia.close()
+    contagem.criados += len(criadas)
+    contagem.duplicados += len(duplicadas)
+    # Só depois do commit: se algo falhar antes, o arquivo continua na fila
+    for caminho, _ in lote:
+        _mover(pasta, caminho, PASTA_PROCESSADOS)
+
+
+def ingerir_pasta(pasta, usuario, executor=None, idade_minima=IDADE_MINIMA_SEGUNDOS, tamanho_lote=TAMANHO_LOTE):
+    """
+    Processa os logs pendentes em `pasta` (uma passada). `executor` (ProcessPoolExecutor)
+    faz a leitura em paralelo; sem ele, lê no próprio processo. Retorna a contagem.
+    """
+    contagem = _Contagem()
+
+    def falhar(caminho, mensagem):
+        contagem.com_erro += 1
+        contagem.erros.append((os.path.relpath(caminho, pasta), mensagem))
+        _mover(pasta, caminho, PASTA_COM_ERRO, mensagem)
+
+    pendentes = list(logs_pendentes(pasta, idade_minima))
+    resolvedor = Resolvedor()
+    resolvedor.carregar(''.join(filter(str.isdigit, cnpj)) for _, cnpj, _ in pendentes)
+
+    tarefas = []
+    for caminho, cnpj, nome_rotina in pendentes:
+        try:
+            rotina = resolvedor.rotina(''.join(filter(str.isdigit, cnpj)), nome_rotina, None)
+        except ItemInvalido as exc:
+            falhar(caminho, str(exc))
+            continue
+        if not rotina.ferramenta.parser:
+            falhar(caminho, f"A ferramenta {rotina.ferramenta.nome} não tem leitor de log configurado.")
+            continue
+        tarefas.append((caminho, rotina))
+
+    lote = []
+    for caminho, rotina, analise in _analisar(tarefas, executor):
+        if isinstance(analise, Exception):
+            falhar(caminho, f"Não foi possível ler o log: {analise}")
+            continue
+        resultado, digest, _ = analise
+        if resultado.status is None:
+            falhar(caminho, "O leitor não identificou o resultado no log.")
+            continue
+        nome = os.path.splitext(os.path.basename(caminho))[0] + '.txt'
+        evidencia = File(open(caminho, 'rb'), name=nome)
+        try:
+            validate_file_infection(evidencia)
+        except ValidationError as exc:
+            evidencia.close()
+            falhar(caminho, ' '.join(exc.messages))
+            continue
+        lote.append((caminho, ValidacaoBackup(
+            rotina=rotina, usuario=usuario, status=resultado.status, observacao=resultado.resumo(),
+            evidencia=evidencia, chave_idempotencia=_chave(pasta, caminho, digest),
+        )))
+        if len(lote) >= tamanho_lote:
+            _gravar(pasta, lote, contagem)
+            lote = []
+    if lote:
+        _gravar(pasta, lote, contagem)
+    return contagem
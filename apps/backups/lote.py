@@ -0,0 +1,81 @@
+"""
+Gravação de várias validações de uma vez (bulk_create).
+
+bulk_create não dispara post_save, então o que os signals de ValidacaoBackup fazem por
+validação (snapshots, referências das evidências, versão dos dados) é feito pelos
+receivers de `validacoes_criadas`, uma vez para o lote todo (ver apps.backups.signals).
+"""
+from django.db import transaction
+from django.dispatch import Signal
+
+from .evidencias import liberar_referencia
+from .models import ValidacaoBackup
+
+# Enviado com sender=ValidacaoBackup e validacoes=[...] (já com pk) dentro da transação
+validacoes_criadas = Signal()
+
+TAMANHO_LOTE = 500
+
+
+@transaction.atomic
+def criar_validacoes(validacoes, tamanho_lote=TAMANHO_LOTE):
+    """
+    Grava as validações (ainda sem pk) com bulk_create em uma única transação e
+    atualiza o que depende delas. As evidências pendentes são gravadas no storage pelo
+    próprio bulk_create (pre_save do FileField). Retorna as validações criadas.
+    """
+    if not validacoes:
+        return []
+    criadas = ValidacaoBackup.objects.bulk_create(validacoes, batch_size=tamanho_lote)
+    validacoes_criadas.send(sender=ValidacaoBackup, validacoes=criadas)
+    return criadas
+
+
+def _por_chave(pares, *campos):
+    """{(usuario_id, chave): (campos...)} das validações já gravadas com esses pares."""
+    gravadas = {}
+    for usuario_id in {usuario_id for usuario_id, _ in pares}:
+        linhas = ValidacaoBackup.objects.filter(
+            usuario_id=usuario_id, chave_idempotencia__in=[chave for dono, chave in pares if dono == usuario_id],
+        ).values_list('usuario_id', 'chave_idempotencia', *campos)
+        gravadas.update(((usuario_id, chave), resto) for usuario_id, chave, *resto in linhas)
+    return gravadas
+
+
+@transaction.atomic
+def criar_sem_duplicar(validacoes, tamanho_lote=TAMANHO_LOTE):
+    """
+    criar_validacoes para validações com chave_idempotencia (uma por usuário e chave):
+    as chaves que o mesmo usuário já gravou são puladas. Retorna (criadas, pares
+    (usuario_id, chave) duplicados).
+
+    O INSERT ignora conflitos na chave única (validacao_chave_por_usuario): outra
+    requisição gravando a mesma chave ao mesmo tempo não derruba a transação de quem
+    chamou. A linha de cada chave é lida de volta para saber quais INSERTs valeram.
+    """
+    pendentes = {
+        (validacao.usuario_id, validacao.chave_idempotencia): validacao for validacao in validacoes
+    }
+    # Já gravadas antes: ficam de fora sem nem gravar a evidência
+    duplicadas = set(_por_chave(pendentes))
+    for par in duplicadas:
+        del pendentes[par]
+    if not pendentes:
+        return [], duplicadas
+
+    ValidacaoBackup.objects.bulk_create(pendentes.values(), batch_size=tamanho_lote, ignore_conflicts=True)
+    gravadas = _por_chave(pendentes, 'pk', 'created_at')
+    criadas = []
+    for par, validacao in pendentes.items():
+        pk, criada_em = gravadas[par]
+        if criada_em == validacao.created_at:
+            validacao.pk = pk
+            criadas.append(validacao)
+            continue
+        # Gravada por outra requisição entre a consulta e o INSERT (que foi ignorado)
+        duplicadas.add(par)
+        if validacao.evidencia:
+            liberar_referencia(validacao.evidencia.name)
+    if criadas:
+        validacoes_criadas.send(sender=ValidacaoBackup, validacoes=criadas)
+    return criadas, duplicadas
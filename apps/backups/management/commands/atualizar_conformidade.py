@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.backups.retencao import atualizar_conformidade
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula a conformidade de retenção das rotinas alteradas ou com o resultado vencido "
+        "(agendar, ex.: cron a cada 15 minutos; o dashboard só lê o resultado). Com --completo, recalcula todas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true', help="Recalcula todas as rotinas.")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        total = atualizar_conformidade(completo=options['completo'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Conformidade de retenção recalculada para {total} rotina(s) em {time.perf_counter() - inicio:.1f}s."
+        ))
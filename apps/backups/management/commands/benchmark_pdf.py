@@ -0,0 +1,83 @@
+import io
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from apps.backups.pdf import pdf_de_html
+from apps.backups.relatorios import LINHAS_POR_PARTE_PDF, escrever_partes_pdf, htmls_pdf
+
+
+def _linhas_sinteticas(quantidade):
+    agora = timezone.localtime()
+    status = [('✅ Sucesso', 'sucesso'), ('⚠️ Alerta', 'alerta'), ('❌ Erro', 'erro')]
+    for i in range(quantidade):
+        display, classe = status[i % 3]
+        yield {
+            'data': agora - timedelta(minutes=i),
+            'cliente': f"Cliente {i % 400}",
+            'servidor': f"srv-{i % 1000:04d}",
+            'ferramenta': "Veeam",
+            'rotina': f"Rotina diária {i % 50}",
+            'status': display,
+            'status_classe': classe,
+            'usuario': "benchmark",
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a geração de PDF: documento único (como era antes) contra partes renderizadas "
+        "em paralelo e juntadas. Usa linhas sintéticas, sem acessar o banco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, nargs='+', default=[1000, 10000, 50000])
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--linhas-por-parte', type=int, default=LINHAS_POR_PARTE_PDF)
+        parser.add_argument(
+            '--sem-referencia', action='store_true',
+            help="Não mede o documento único (lento demais para muitas linhas)."
+        )
+        parser.add_argument('--json', action='store_true', help="Imprime o resultado em JSON.")
+
+    def handle(self, *args, **options):
+        resultados = []
+        for quantidade in options['linhas']:
+            resultado = {'linhas': quantidade, 'workers': options['workers']}
+
+            if not options['sem_referencia']:
+                inicio = time.perf_counter()
+                html = render_to_string('relatorio_pdf_template.html', {
+                    'linhas': list(_linhas_sinteticas(quantidade)),
+                    'primeira_parte': True,
+                    'usuario': 'benchmark',
+                    'data_geracao': timezone.now(),
+                })
+                pdf_de_html(html)
+                resultado['documento_unico_s'] = round(time.perf_counter() - inicio, 3)
+
+            inicio = time.perf_counter()
+            htmls = htmls_pdf(_linhas_sinteticas(quantidade), 'benchmark', options['linhas_por_parte'])
+            escrever_partes_pdf(htmls, io.BytesIO(), options['workers'])
+            resultado['em_partes_s'] = round(time.perf_counter() - inicio, 3)
+
+            if 'documento_unico_s' in resultado:
+                resultado['aceleracao'] = round(resultado['documento_unico_s'] / resultado['em_partes_s'], 2)
+            resultados.append(resultado)
+
+            if not options['json']:
+                linha = f"{quantidade:>7} linhas | em partes: {resultado['em_partes_s']:>8.2f}s"
+                if 'documento_unico_s' in resultado:
+                    linha += (
+                        f" | documento único: {resultado['documento_unico_s']:>8.2f}s"
+                        f" | aceleração: {resultado['aceleracao']:.2f}x"
+                    )
+                self.stdout.write(linha)
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultados, indent=2))
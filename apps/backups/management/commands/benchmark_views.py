@@ -0,0 +1,175 @@
+import json
+import subprocess
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.backups.models import RotinaBackup, ValidacaoBackup
+from apps.clientes.models import Cliente, Servidor
+
+
+def _casos(dias_exportacao):
+    """(nome, url, parâmetros) de cada tela medida."""
+    periodo = {'data_inicio': (timezone.localdate() - timedelta(days=dias_exportacao)).isoformat()}
+    cliente = Cliente.objects.filter(ativo=True).order_by('pk').values_list('pk', flat=True).first()
+    casos = [
+        ('dashboard', reverse('dashboard'), {}),
+        ('historico_global', reverse('historico_global'), {}),
+        ('historico_global_erros', reverse('historico_global'), {'status': 'ERRO'}),
+        ('historico_global_cliente_az', reverse('historico_global'), {'ordenacao': 'cliente_az'}),
+        ('painel_relatorios', reverse('painel_relatorios'), {}),
+        ('agenda_90_dias', reverse('agenda_validacoes'), {'dias': 90}),
+        ('exportar_csv', reverse('exportar_validacoes'), {'formato': 'csv', **periodo}),
+        ('admin_validacoes', reverse('admin:backups_validacaobackup_changelist'), {}),
+        ('admin_rotinas', reverse('admin:backups_rotinabackup_changelist'), {}),
+        ('admin_clientes', reverse('admin:clientes_cliente_changelist'), {}),
+    ]
+    if cliente:
+        casos.append(('api_rotinas_cliente', reverse('get_rotinas_cliente', args=[cliente]), {}))
+        casos.append(('nova_validacao', reverse('nova_validacao', args=[cliente]), {}))
+    return casos
+
+
+def _consumir(resposta):
+    """Lê a resposta inteira (inclusive streaming) e devolve o tamanho em bytes."""
+    if resposta.streaming:
+        return sum(len(pedaco) for pedaco in resposta.streaming_content)
+    return len(resposta.content)
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede cada tela e exportação pelo test client: tempo, quantidade/tempo de queries, "
+        "pico de memória e tamanho da resposta. Gera JSON comparável entre commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=3, help="Execuções cronometradas por tela.")
+        parser.add_argument('--usuario', help="Usuário usado no login (padrão: primeiro superusuário).")
+        parser.add_argument('--dias-exportacao', type=int, default=7, help="Período filtrado nas exportações.")
+        parser.add_argument('--apenas', nargs='+', help="Mede só as telas informadas.")
+        parser.add_argument('--pular', nargs='+', default=[], help="Telas a ignorar (ex.: exportar_csv).")
+        parser.add_argument('--saida', help="Grava o JSON neste arquivo em vez de imprimir.")
+        parser.add_argument('--comparar', help="JSON de uma execução anterior para comparar os tempos.")
+
+    def handle(self, *args, **options):
+        usuario = self._usuario(options['usuario'])
+        cliente = Client()
+        cliente.force_login(usuario)
+
+        resultados = []
+        for nome, url, parametros in _casos(options['dias_exportacao']):
+            if (options['apenas'] and nome not in options['apenas']) or nome in options['pular']:
+                continue
+            resultado = self._medir(cliente, url, parametros, max(options['repeticoes'], 1))
+            resultado['nome'] = nome
+            resultados.append(resultado)
+            self.stderr.write(
+                f"{nome:<28} {resultado['tempo_mediano_ms']:>10.1f}ms {resultado['queries']:>5} queries "
+                f"{resultado['pico_memoria_kb']:>10.0f}KB  HTTP {resultado['status']}"
+            )
+
+        relatorio = {
+            'commit': _commit_atual(),
+            'gerado_em': timezone.now().isoformat(),
+            'banco': connection.vendor,
+            'volume': {
+                'clientes': Cliente.objects.count(),
+                'servidores': Servidor.objects.count(),
+                'rotinas': RotinaBackup.objects.count(),
+                'validacoes': ValidacaoBackup.objects.count(),
+            },
+            'repeticoes': options['repeticoes'],
+            'resultados': resultados,
+        }
+
+        saida = json.dumps(relatorio, indent=2, ensure_ascii=False)
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                arquivo.write(saida)
+            self.stderr.write(f"Resultado gravado em {options['saida']}")
+        else:
+            self.stdout.write(saida)
+
+        if options['comparar']:
+            self._comparar(options['comparar'], resultados)
+
+    def _usuario(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"Usuário '{username}' não encontrado.")
+        usuario = User.objects.filter(is_superuser=True, is_active=True).order_by('pk').first()
+        if usuario is None:
+            raise CommandError("Nenhum superusuário ativo; crie um ou use --usuario.")
+        return usuario
+
+    def _medir(self, cliente, url, parametros, repeticoes):
+        # Aquecimento: templates, cache de consultas do banco etc.
+        cliente.get(url, parametros)
+
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            resposta = cliente.get(url, parametros)
+            tamanho = _consumir(resposta)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+
+        # Queries e memória numa execução separada: o tracemalloc deixa tudo mais lento
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                resposta = cliente.get(url, parametros)
+                _consumir(resposta)
+            _atual, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        tempos.sort()
+        return {
+            'url': url,
+            'parametros': parametros,
+            'status': resposta.status_code,
+            'tempo_mediano_ms': round(tempos[len(tempos) // 2], 2),
+            'tempo_min_ms': round(tempos[0], 2),
+            'tempo_max_ms': round(tempos[-1], 2),
+            'queries': len(queries),
+            'tempo_queries_ms': round(sum(float(q['time']) for q in queries.captured_queries) * 1000, 2),
+            'pico_memoria_kb': round(pico / 1024, 1),
+            'bytes_resposta': tamanho,
+        }
+
+    def _comparar(self, caminho, resultados):
+        with open(caminho, encoding='utf-8') as arquivo:
+            anteriores = {r['nome']: r for r in json.load(arquivo)['resultados']}
+        self.stderr.write(f"\nComparação com {caminho}:")
+        for resultado in resultados:
+            anterior = anteriores.get(resultado['nome'])
+            if not anterior:
+                continue
+            razao = resultado['tempo_mediano_ms'] / anterior['tempo_mediano_ms'] if anterior['tempo_mediano_ms'] else 0
+            self.stderr.write(
+                f"{resultado['nome']:<28} {anterior['tempo_mediano_ms']:>10.1f}ms -> "
+                f"{resultado['tempo_mediano_ms']:>10.1f}ms ({razao:.2f}x) | queries "
+                f"{anterior['queries']} -> {resultado['queries']}"
+            )
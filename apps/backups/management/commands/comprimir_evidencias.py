@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from apps.backups.evidencias import renomear_evidencia
+from apps.backups.models import ValidacaoBackup
+from apps.common.storage import EXTENSOES_COMPRIMIDAS, tamanho_comprimido
+
+
+class Command(BaseCommand):
+    help = (
+        "Comprime com gzip as evidências de texto gravadas antes da compressão, lendo em "
+        "blocos, e atualiza as validações para o novo caminho (.txt.gz)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help="Só calcula a economia, sem alterar nada.")
+
+    def handle(self, *args, **options):
+        storage = ValidacaoBackup._meta.get_field('evidencia').storage
+        simular = options['simular']
+
+        filtro = Q()
+        for extensao in EXTENSOES_COMPRIMIDAS:
+            filtro |= Q(evidencia__iendswith=extensao)
+        nomes = list(
+            ValidacaoBackup.objects.filter(filtro).order_by()
+            .values_list('evidencia', flat=True).distinct().iterator()
+        )
+        self.stdout.write(f"{len(nomes)} arquivo(s) de texto sem compressão.")
+
+        comprimidos = ausentes = antes = depois = 0
+        for nome in nomes:
+            if not storage.exists(nome):
+                ausentes += 1
+                self.stderr.write(f"Arquivo ausente: {nome}")
+                continue
+
+            tamanho = storage.size(nome)
+            with storage.open(nome, 'rb') as arquivo:
+                if simular:
+                    novo, tamanho_novo = None, tamanho_comprimido(arquivo)
+                else:
+                    novo = storage.save(nome, arquivo, referenciar=False)
+                    tamanho_novo = storage.size(novo)
+            antes += tamanho
+            depois += tamanho_novo
+            comprimidos += 1
+
+            if not simular:
+                renomear_evidencia(nome, novo)
+                storage.delete(nome)
+                self.stdout.write(f"{nome} -> {novo} ({tamanho} -> {tamanho_novo} bytes)")
+
+        taxa = f" ({antes / depois:.1f}x)" if depois else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{comprimidos} arquivo(s) comprimido(s), {ausentes} ausente(s): "
+            f"{antes / 1024 / 1024:.1f}MB -> {depois / 1024 / 1024:.1f}MB{taxa}"
+            f"{' (simulação)' if simular else ''}."
+        ))
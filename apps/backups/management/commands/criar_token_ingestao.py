@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.backups.ingestao import gerar_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera um token para um agente enviar resultados à API de ingestão "
+        "(POST /api/ingestao/validacoes/). As validações ficam em nome do usuário informado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario', help="Username dono das validações enviadas.")
+        parser.add_argument('nome', help="Identificação do agente, ex.: \"Veeam - Cliente X\".")
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f"Usuário {options['usuario']} não encontrado.")
+        token = gerar_token(usuario, options['nome'])
+        self.stdout.write(self.style.SUCCESS(f"Token criado para {options['nome']}:"))
+        self.stdout.write(token)
+        self.stdout.write("Guarde-o agora: só o hash fica no banco e ele não pode ser exibido de novo.")
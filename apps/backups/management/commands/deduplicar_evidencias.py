@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand
+
+from apps.backups.evidencias import recontar_referencias, renomear_evidencia
+from apps.backups.models import ArquivoEvidencia, ValidacaoBackup
+from apps.common.storage import PASTA_EVIDENCIAS, caminho_por_conteudo, hash_conteudo, hash_do_caminho
+
+
+class Command(BaseCommand):
+    help = (
+        "Move as evidências antigas (nomes uuid4) para o caminho do hash do conteúdo, "
+        "juntando arquivos idênticos, e refaz a contagem de referências."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help="Só mostra o que seria feito.")
+        parser.add_argument(
+            '--remover-orfaos', action='store_true',
+            help="Apaga arquivos da pasta de evidências que nenhuma validação usa."
+        )
+
+    def handle(self, *args, **options):
+        self.storage = ValidacaoBackup._meta.get_field('evidencia').storage
+        simular = options['simular']
+
+        nomes = (
+            ValidacaoBackup.objects.exclude(evidencia='').order_by()
+            .values_list('evidencia', flat=True).distinct()
+        )
+        movidos = juntados = ausentes = bytes_liberados = 0
+        gerados = set()  # destinos criados nesta execução (na simulação, nada é gravado)
+        for nome in list(nomes.iterator()):
+            if hash_do_caminho(nome):
+                continue
+            if not self.storage.exists(nome):
+                ausentes += 1
+                self.stderr.write(f"Arquivo ausente: {nome}")
+                continue
+
+            with self.storage.open(nome) as arquivo:
+                destino = caminho_por_conteudo(hash_conteudo(arquivo), nome)
+                ja_existe = destino in gerados or self.storage.exists(destino)
+                tamanho = self.storage.size(nome)
+                if not simular and not ja_existe:
+                    destino = self.storage.save(nome, arquivo, referenciar=False)
+
+            gerados.add(destino)
+            if ja_existe:
+                juntados += 1
+                bytes_liberados += tamanho
+            else:
+                movidos += 1
+            self.stdout.write(f"{nome} -> {destino}{' (duplicado)' if ja_existe else ''}")
+            if simular:
+                continue
+
+            renomear_evidencia(nome, destino)
+            self.storage.delete(nome)
+
+        if not simular:
+            arquivos = recontar_referencias()
+            self.stdout.write(f"Referências recontadas: {arquivos} arquivo(s) em uso.")
+            if options['remover_orfaos']:
+                bytes_liberados += self._remover_orfaos()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{movidos} arquivo(s) movido(s), {juntados} duplicado(s) removido(s), {ausentes} ausente(s); "
+            f"{bytes_liberados / 1024 / 1024:.1f}MB liberados{' (simulação)' if simular else ''}."
+        ))
+
+    def _arquivos(self, pasta):
+        subpastas, arquivos = self.storage.listdir(pasta)
+        for arquivo in arquivos:
+            yield f"{pasta}/{arquivo}"
+        for subpasta in subpastas:
+            yield from self._arquivos(f"{pasta}/{subpasta}")
+
+    def _remover_orfaos(self):
+        if not self.storage.exists(PASTA_EVIDENCIAS):
+            return 0
+        em_uso = set(ArquivoEvidencia.objects.values_list('caminho', flat=True))
+        liberados = 0
+        for nome in self._arquivos(PASTA_EVIDENCIAS):
+            if nome in em_uso:
+                continue
+            liberados += self.storage.size(nome)
+            self.storage.delete(nome)
+            self.stdout.write(f"Órfão removido: {nome}")
+        return liberados
@@ -0,0 +1,222 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import time as horario, timedelta
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.backups.evidencias import liberar_referencia, registrar_referencia
+from apps.backups.models import (
+    FerramentaBackup, RotinaBackup, UltimaValidacaoCliente, UltimaValidacaoRotina, ValidacaoBackup,
+)
+from apps.backups.resumos import reconstruir_resumos
+from apps.backups.snapshots import reconstruir_snapshots
+from apps.backups.versao_dados import registrar_alteracao
+from apps.clientes.models import Cliente, Servidor
+
+# Marca dos registros gerados por este comando (usada por --limpar)
+PREFIXO_CNPJ = 'SINT'
+
+# Gravada pelo storage das evidências (caminho pelo conteúdo) e contada em ArquivoEvidencia
+EVIDENCIA_SINTETICA = ('sintetica.txt', b"Evidencia gerada por gerar_dados_sinteticos\n")
+
+STATUS_PESOS = (('SUCESSO', 85), ('ALERTA', 10), ('ERRO', 5))
+
+FERRAMENTAS = ('Veeam', 'Acronis', 'rsync', 'Windows Server Backup')
+
+
+@contextmanager
+def _sem_datas_automaticas(modelo):
+    """Desliga auto_now/auto_now_add para o bulk_create gravar as datas geradas."""
+    campos = [c for c in modelo._meta.concrete_fields if getattr(c, 'auto_now', False) or getattr(c, 'auto_now_add', False)]
+    originais = [(c, c.auto_now, c.auto_now_add) for c in campos]
+    for campo in campos:
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in originais:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera clientes, servidores, rotinas e validações sintéticos com bulk_create, "
+        "para medir as telas com volume de produção (ver benchmark_views)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=1000)
+        parser.add_argument('--servidores', type=int, default=10000)
+        parser.add_argument('--rotinas-por-servidor', type=int, default=1)
+        parser.add_argument('--validacoes', type=int, default=5_000_000)
+        parser.add_argument('--dias', type=int, default=365, help="Período coberto pelas validações.")
+        parser.add_argument('--lote', type=int, default=5000, help="Registros por bulk_create.")
+        parser.add_argument('--semente', type=int, default=42, help="Semente do gerador aleatório.")
+        parser.add_argument('--limpar', action='store_true', help="Remove os dados sintéticos e encerra.")
+
+    def handle(self, *args, **options):
+        if options['limpar']:
+            self._limpar()
+            return
+
+        if options['clientes'] < 1 or options['servidores'] < 1 or options['rotinas_por_servidor'] < 1:
+            raise CommandError("Informe pelo menos 1 cliente, 1 servidor e 1 rotina por servidor.")
+
+        self.aleatorio = random.Random(options['semente'])
+        self.lote = options['lote']
+        inicio = time.perf_counter()
+
+        usuario, _ = User.objects.get_or_create(username='sintetico', defaults={'is_active': False})
+        ferramentas = [FerramentaBackup.objects.get_or_create(nome=nome)[0].pk for nome in FERRAMENTAS]
+        # Conteúdo igual ao de uma execução anterior: o storage devolve o caminho já existente.
+        # As referências são contadas a cada lote de validações (_gerar_validacoes)
+        nome, conteudo = EVIDENCIA_SINTETICA
+        self.evidencia = ValidacaoBackup._meta.get_field('evidencia').storage.save(
+            nome, ContentFile(conteudo), referenciar=False
+        )
+
+        with transaction.atomic():
+            clientes = self._gerar_clientes(options['clientes'])
+            servidores = self._gerar_servidores(clientes, options['servidores'])
+            rotinas = self._gerar_rotinas(servidores, ferramentas, options['rotinas_por_servidor'])
+        self.stdout.write(
+            f"{len(clientes)} clientes, {len(servidores)} servidores e {len(rotinas)} rotinas criados."
+        )
+
+        total = self._gerar_validacoes(rotinas, usuario, options['validacoes'], options['dias'])
+
+        self.stdout.write("Reconstruindo snapshots e resumos...")
+        reconstruir_snapshots()
+        hoje = timezone.localdate()
+        reconstruir_resumos(hoje - timedelta(days=options['dias']), hoje)
+        registrar_alteracao()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} validações geradas em {time.perf_counter() - inicio:.1f}s."
+        ))
+
+    def _limpar(self):
+        clientes = Cliente.objects.filter(cnpj__startswith=PREFIXO_CNPJ)
+        with transaction.atomic():
+            UltimaValidacaoCliente.objects.filter(cliente__in=clientes).delete()
+            UltimaValidacaoRotina.objects.filter(rotina__cliente__in=clientes).delete()
+            # DELETE direto: o delete() normal dispararia os signals de snapshot validação por validação
+            validacoes = ValidacaoBackup.objects.filter(rotina__cliente__in=clientes)
+            # ...então as referências das evidências são liberadas aqui, uma vez por arquivo
+            referencias = list(
+                validacoes.exclude(evidencia='').order_by().values_list('evidencia').annotate(total=Count('id'))
+            )
+            total = validacoes._raw_delete(validacoes.db)
+            for nome, quantidade in referencias:
+                liberar_referencia(nome, quantidade)
+            # Os resumos por cliente e por rotina saem em cascata; os somados por ferramenta são refeitos
+            clientes.delete()
+        reconstruir_snapshots()
+        reconstruir_resumos()
+        registrar_alteracao()
+        self.stdout.write(self.style.SUCCESS(f"{total} validações sintéticas removidas."))
+
+    def _gerar_clientes(self, quantidade):
+        base = Cliente.objects.filter(cnpj__startswith=PREFIXO_CNPJ).count()
+        Cliente.objects.bulk_create(
+            (
+                Cliente(
+                    razao_social=f"Cliente Sintético {base + i} Ltda",
+                    nome_fantasia=f"Cliente Sintético {base + i}",
+                    cnpj=f"{PREFIXO_CNPJ}{base + i:014d}",
+                    contato_tecnico="Suporte",
+                    email_contato=f"suporte{base + i}@exemplo.com.br",
+                    ativo=self.aleatorio.random() > 0.05,
+                )
+                for i in range(quantidade)
+            ),
+            batch_size=self.lote,
+        )
+        return list(
+            Cliente.objects.filter(cnpj__startswith=PREFIXO_CNPJ).order_by('-id').values_list('id', flat=True)[:quantidade]
+        )
+
+    def _gerar_servidores(self, clientes, quantidade):
+        ultimo = Servidor.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        Servidor.objects.bulk_create(
+            (
+                Servidor(
+                    cliente_id=clientes[i % len(clientes)],
+                    hostname=f"srv-sint-{ultimo + i:06d}",
+                    ip_address=f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+                    sistema_operacional=self.aleatorio.choice(("Windows Server 2019", "Windows Server 2022", "Ubuntu 22.04")),
+                )
+                for i in range(quantidade)
+            ),
+            batch_size=self.lote,
+        )
+        return list(
+            Servidor.objects.filter(id__gt=ultimo).order_by('id').values_list('id', 'cliente_id')
+        )
+
+    def _gerar_rotinas(self, servidores, ferramentas, por_servidor):
+        ultimo = RotinaBackup.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        RotinaBackup.objects.bulk_create(
+            (
+                RotinaBackup(
+                    cliente_id=cliente_id,
+                    ferramenta_id=self.aleatorio.choice(ferramentas),
+                    descricao=f"Backup {('diário', 'semanal', 'mensal')[n % 3]} {servidor_id}-{n}",
+                    frequencia=('DIARIO', 'SEMANAL', 'MENSAL')[n % 3],
+                    horario_execucao=horario(self.aleatorio.randrange(24), self.aleatorio.choice((0, 30))),
+                    retencao_dias=self.aleatorio.choice((7, 14, 30, 90)),
+                )
+                for servidor_id, cliente_id in servidores
+                for n in range(por_servidor)
+            ),
+            batch_size=self.lote,
+        )
+        rotinas = list(RotinaBackup.objects.filter(id__gt=ultimo).order_by('id').values_list('id', flat=True))
+
+        # Tabela intermediária do ManyToMany: cada rotina no servidor que a originou
+        Ligacao = RotinaBackup.servidores.through
+        Ligacao.objects.bulk_create(
+            (
+                Ligacao(rotinabackup_id=rotina_id, servidor_id=servidores[i // por_servidor][0])
+                for i, rotina_id in enumerate(rotinas)
+            ),
+            batch_size=self.lote,
+        )
+        return rotinas
+
+    def _gerar_validacoes(self, rotinas, usuario, quantidade, dias):
+        agora = timezone.now()
+        periodo = dias * 86400
+        status, pesos = zip(*STATUS_PESOS)
+        total = 0
+
+        with _sem_datas_automaticas(ValidacaoBackup):
+            while total < quantidade:
+                tamanho = min(self.lote, quantidade - total)
+                sorteados = self.aleatorio.choices(status, weights=pesos, k=tamanho)
+                lote = []
+                for situacao in sorteados:
+                    criado = agora - timedelta(seconds=self.aleatorio.randrange(periodo))
+                    lote.append(ValidacaoBackup(
+                        rotina_id=self.aleatorio.choice(rotinas),
+                        usuario=usuario,
+                        status=situacao,
+                        observacao="" if situacao == 'SUCESSO' else "Falha registrada no log do job",
+                        evidencia=self.evidencia,
+                        created_at=criado,
+                        updated_at=criado,
+                    ))
+                with transaction.atomic():
+                    ValidacaoBackup.objects.bulk_create(lote)
+                    # bulk_create sem o signal validacoes_criadas: só a referência da evidência é contada
+                    registrar_referencia(self.evidencia, tamanho)
+                total += tamanho
+                if total % (self.lote * 20) == 0 or total == quantidade:
+                    self.stdout.write(f"  {total}/{quantidade} validações...")
+        return total
@@ -0,0 +1,78 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Min, Q
+
+from apps.backups.indice_texto import EXTENSOES_TEXTO, extrair_texto
+from apps.backups.models import ArquivoEvidencia, TextoEvidencia, ValidacaoBackup
+from apps.common.storage import SUFIXO_COMPRIMIDO
+
+
+class Command(BaseCommand):
+    help = (
+        "Extrai o texto das evidências de log ainda não indexadas (ou de todas, com "
+        "--reindexar) para a busca textual. A leitura/descompressão roda em threads e a "
+        "gravação em lotes. Para evidências anteriores à contagem de referências, rode "
+        "antes o deduplicar_evidencias."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Threads de leitura dos arquivos.")
+        parser.add_argument('--lote', type=int, default=100, help="Textos gravados por vez.")
+        parser.add_argument('--reindexar', action='store_true', help="Apaga e refaz todo o índice.")
+
+    def handle(self, *args, **options):
+        if options['reindexar']:
+            removidos, _ = TextoEvidencia.objects.all().delete()
+            self.stdout.write(f"{removidos} texto(s) removido(s) do índice.")
+
+        filtro = Q()
+        for extensao in EXTENSOES_TEXTO:
+            filtro |= Q(caminho__iendswith=extensao) | Q(caminho__iendswith=extensao + SUFIXO_COMPRIMIDO)
+        # Um arquivo por conteúdo: o texto é indexado pelo hash
+        pendentes = list(
+            ArquivoEvidencia.objects.filter(filtro).exclude(hash='')
+            .exclude(hash__in=TextoEvidencia.objects.values('hash'))
+            .order_by().values('hash').annotate(caminho=Min('caminho')).values_list('hash', 'caminho')
+        )
+        self.stdout.write(f"{len(pendentes)} log(s) para indexar com {options['workers']} thread(s).")
+
+        storage = ValidacaoBackup._meta.get_field('evidencia').storage
+
+        def extrair(item):
+            digest, caminho = item
+            try:
+                conteudo, truncado = extrair_texto(storage, caminho)
+            except (OSError, EOFError) as exc:
+                return digest, caminho, exc
+            return digest, caminho, TextoEvidencia(hash=digest, conteudo=conteudo, truncado=truncado)
+
+        inicio = time.perf_counter()
+        indexados = erros = truncados = 0
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            for posicao in range(0, len(pendentes), options['lote']):
+                textos = []
+                for digest, caminho, resultado in pool.map(extrair, pendentes[posicao:posicao + options['lote']]):
+                    if isinstance(resultado, Exception):
+                        erros += 1
+                        self.stderr.write(f"Não foi possível ler {caminho}: {resultado}")
+                        continue
+                    textos.append(resultado)
+                    truncados += resultado.truncado
+                TextoEvidencia.objects.bulk_create(textos, ignore_conflicts=True)
+                indexados += len(textos)
+                self.stdout.write(f"  {indexados + erros}/{len(pendentes)}...")
+
+        if connection.vendor == 'sqlite':
+            # Junta os segmentos do FTS5 criados pelas inserções em lote
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO backups_textoevidencia_fts(backups_textoevidencia_fts) VALUES ('optimize')"
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{indexados} log(s) indexado(s) ({truncados} truncado(s)), {erros} com erro, "
+            f"em {time.perf_counter() - inicio:.1f}s."
+        ))
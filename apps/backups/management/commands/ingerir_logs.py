@@ -0,0 +1,58 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.backups.leitura_logs import IDADE_MINIMA_SEGUNDOS, ingerir_pasta
+
+
+class Command(BaseCommand):
+    help = (
+        "Transforma em validações os logs deixados pelos agentes em uma pasta "
+        "(<pasta>/<CNPJ>/<nome da rotina>/<arquivo .log ou .txt>), usando o leitor de log "
+        "da ferramenta de cada rotina. Com --continuo, fica observando a pasta."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('pasta', help="Pasta monitorada.")
+        parser.add_argument('--usuario', required=True, help="Username em nome de quem as validações são gravadas.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Processos de leitura dos logs.")
+        parser.add_argument('--continuo', action='store_true', help="Repete a leitura da pasta até ser interrompido.")
+        parser.add_argument('--intervalo', type=float, default=10.0, help="Segundos entre as leituras no modo contínuo.")
+        parser.add_argument(
+            '--idade-minima', type=float, default=IDADE_MINIMA_SEGUNDOS,
+            help="Ignora arquivos modificados há menos segundos (ainda sendo escritos)."
+        )
+
+    def handle(self, *args, **options):
+        pasta = options['pasta']
+        if not os.path.isdir(pasta):
+            raise CommandError(f"Pasta {pasta} não encontrada.")
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f"Usuário {options['usuario']} não encontrado.")
+
+        # Leitura de log é CPU (regex linha a linha): processos, não threads
+        executor = ProcessPoolExecutor(max_workers=options['workers']) if options['workers'] > 1 else None
+        try:
+            while True:
+                inicio = time.perf_counter()
+                contagem = ingerir_pasta(pasta, usuario, executor=executor, idade_minima=options['idade_minima'])
+                for arquivo, mensagem in contagem.erros:
+                    self.stderr.write(f"{arquivo}: {mensagem}")
+                if contagem.criados or contagem.duplicados or contagem.com_erro or not options['continuo']:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"{contagem.criados} validação(ões) criada(s), {contagem.duplicados} já registrada(s), "
+                        f"{contagem.com_erro} com erro, em {time.perf_counter() - inicio:.1f}s."
+                    ))
+                if not options['continuo']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if executor is not None:
+                executor.shutdown()
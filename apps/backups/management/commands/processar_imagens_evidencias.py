@@ -0,0 +1,88 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.backups.evidencias import ler_original, marcar_erro, salvar_versoes
+from apps.backups.imagens import EXTENSOES_IMAGEM, gerar_versoes
+from apps.backups.models import ArquivoEvidencia
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera miniatura e versão de exibição das evidências em imagem que ainda não têm "
+        "(ou de todas, com --reprocessar), em paralelo com um pool de processos. Os uploads "
+        "só marcam a imagem como pendente: rode com --continuo como worker, ao lado do "
+        "processar_relatorios. Para evidências anteriores à contagem de referências, rode "
+        "antes o deduplicar_evidencias."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--lote', type=int, default=50, help="Imagens lidas para a memória por vez.")
+        parser.add_argument('--reprocessar', action='store_true', help="Refaz também as já concluídas.")
+        parser.add_argument(
+            '--continuo', action='store_true',
+            help="Depois da primeira passada, continua processando as imagens que forem enviadas.",
+        )
+        parser.add_argument('--intervalo', type=float, default=5.0, help="Segundos entre consultas com --continuo.")
+
+    def handle(self, *args, **options):
+        arquivos = ArquivoEvidencia.objects.exclude(processamento='IGNORADO')
+        if not options['reprocessar']:
+            arquivos = arquivos.filter(processamento__in=['PENDENTE', 'ERRO'])
+        ids = list(arquivos.order_by('id').values_list('id', flat=True))
+        self.stdout.write(f"{len(ids)} imagem(ns) para processar com {options['workers']} processo(s).")
+
+        with ProcessPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            self._processar(pool, ids, options['lote'])
+            if not options['continuo']:
+                return
+            self.stdout.write("Aguardando novas imagens...")
+            try:
+                while True:
+                    close_old_connections()
+                    # As que deram erro ficam para a próxima execução sem --continuo
+                    ids = list(
+                        ArquivoEvidencia.objects.filter(processamento='PENDENTE')
+                        .order_by('id').values_list('id', flat=True)
+                    )
+                    if ids:
+                        self._processar(pool, ids, options['lote'])
+                    else:
+                        time.sleep(options['intervalo'])
+            except KeyboardInterrupt:
+                self.stdout.write("Encerrando.")
+
+    def _processar(self, pool, ids, tamanho_lote):
+        inicio = time.perf_counter()
+        concluidas = erros = 0
+        for posicao in range(0, len(ids), tamanho_lote):
+            lote = ArquivoEvidencia.objects.filter(pk__in=ids[posicao:posicao + tamanho_lote])
+            futuros = []
+            for arquivo in lote:
+                if not arquivo.caminho.lower().endswith(EXTENSOES_IMAGEM):
+                    ArquivoEvidencia.objects.filter(pk=arquivo.pk).update(processamento='IGNORADO')
+                    continue
+                try:
+                    futuros.append((arquivo, pool.submit(gerar_versoes, ler_original(arquivo))))
+                except OSError as exc:
+                    marcar_erro(arquivo, exc)
+                    erros += 1
+
+            for arquivo, futuro in futuros:
+                try:
+                    miniatura, exibicao = futuro.result()
+                except Exception as exc:
+                    marcar_erro(arquivo, exc)
+                    erros += 1
+                else:
+                    salvar_versoes(arquivo, miniatura, exibicao)
+                    concluidas += 1
+            self.stdout.write(f"  {concluidas + erros}/{len(ids)}...")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{concluidas} imagem(ns) processada(s), {erros} com erro, em {time.perf_counter() - inicio:.1f}s."
+        ))
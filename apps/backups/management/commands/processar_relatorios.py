@@ -0,0 +1,71 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from apps.backups.fila_relatorios import (
+    estatisticas_cache, liberar_jobs_travados, processar_job, reservar_proximo_job,
+)
+
+
+class Command(BaseCommand):
+    help = "Worker local da fila de relatórios: gera os PDFs/Excel pendentes em um pool de threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help="Quantidade de threads processando jobs.")
+        parser.add_argument('--intervalo', type=float, default=2.0, help="Segundos entre consultas quando a fila está vazia.")
+        parser.add_argument('--uma-vez', action='store_true', help="Processa os jobs pendentes e encerra.")
+        parser.add_argument(
+            '--timeout-minutos', type=int, default=30,
+            help="Jobs em processamento há mais tempo que isso voltam para a fila."
+        )
+
+    def handle(self, *args, **options):
+        self.parar = threading.Event()
+        self.intervalo = options['intervalo']
+        self.uma_vez = options['uma_vez']
+
+        liberados = liberar_jobs_travados(options['timeout_minutos'])
+        if liberados:
+            self.stdout.write(self.style.WARNING(f"{liberados} job(s) travado(s) devolvido(s) para a fila."))
+
+        cache = estatisticas_cache()
+        self.stdout.write(
+            f"Cache de relatórios: {cache['acertos']} acerto(s), "
+            f"{cache['falhas']} falha(s), {cache['remocoes']} remoção(ões), "
+            f"{cache['bytes_em_disco'] / 1024 / 1024:.1f}MB em disco."
+        )
+
+        workers = max(options['workers'], 1)
+        self.stdout.write(f"Processando relatórios com {workers} worker(s)...")
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futuros = [pool.submit(self._loop_worker) for _ in range(workers)]
+            try:
+                while not all(f.done() for f in futuros):
+                    time.sleep(0.5)
+            except KeyboardInterrupt:
+                self.stdout.write("Encerrando após os jobs em andamento...")
+                self.parar.set()
+            for futuro in futuros:
+                futuro.result()
+
+    def _loop_worker(self):
+        try:
+            while not self.parar.is_set():
+                close_old_connections()
+                job = reservar_proximo_job()
+                if job is None:
+                    if self.uma_vez:
+                        return
+                    self.parar.wait(self.intervalo)
+                    continue
+
+                job = processar_job(job)
+                estilo = self.style.SUCCESS if job.status == 'CONCLUIDO' else self.style.ERROR
+                self.stdout.write(estilo(f"Relatório {job.pk} ({job.formato}): {job.get_status_display()}"))
+        finally:
+            # Cada thread tem a sua conexão com o banco
+            connections.close_all()
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from apps.backups.snapshots import reconstruir_snapshots
+
+
+class Command(BaseCommand):
+    help = "Reconstrói em lote os snapshots de última validação por cliente e por rotina."
+
+    def handle(self, *args, **options):
+        rotinas, clientes = reconstruir_snapshots()
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshots reconstruídos: {rotinas} rotinas, {clientes} clientes."
+        ))
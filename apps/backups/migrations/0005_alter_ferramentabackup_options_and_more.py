@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def popular_snapshots(apps, schema_editor):
+    ValidacaoBackup = apps.get_model('backups', 'ValidacaoBackup')
+    UltimaValidacaoRotina = apps.get_model('backups', 'UltimaValidacaoRotina')
+    UltimaValidacaoCliente = apps.get_model('backups', 'UltimaValidacaoCliente')
+
+    ultimas_rotinas = {}
+    ultimas_clientes = {}
+    validacoes = ValidacaoBackup.objects.order_by('created_at', 'id').values_list(
+        'id', 'rotina_id', 'rotina__cliente_id', 'status', 'created_at'
+    )
+    for validacao_id, rotina_id, cliente_id, status, created_at in validacoes.iterator():
+        ultimas_rotinas[rotina_id] = (validacao_id, status, created_at)
+        if cliente_id:
+            ultimas_clientes[cliente_id] = (validacao_id, status, created_at)
+
+    UltimaValidacaoRotina.objects.bulk_create([
+        UltimaValidacaoRotina(rotina_id=chave, validacao_id=v, status=s, validado_em=em)
+        for chave, (v, s, em) in ultimas_rotinas.items()
+    ], batch_size=1000)
+    UltimaValidacaoCliente.objects.bulk_create([
+        UltimaValidacaoCliente(cliente_id=chave, validacao_id=v, status=s, validado_em=em)
+        for chave, (v, s, em) in ultimas_clientes.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backups', '0004_alter_ferramentabackup_options_and_more'),
+        ('clientes', '0002_alter_cliente_cnpj_alter_cliente_contato_tecnico_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='ferramentabackup',
+            options={'verbose_name': 'Ferramenta de Backup', 'verbose_name_plural': 'Ferramentas de Backup'},
+        ),
+        migrations.AlterField(
+            model_name='rotinabackup',
+            name='horario_execucao',
+            field=models.TimeField(verbose_name='Horário de Execução'),
+        ),
+        migrations.AlterField(
+            model_name='rotinabackup',
+            name='retencao_dias',
+            field=models.IntegerField(verbose_name='Retenção (dias)'),
+        ),
+        migrations.CreateModel(
+            name='UltimaValidacaoCliente',
+            fields=[
+                ('status', models.CharField(choices=[('SUCESSO', '✅ Sucesso'), ('ALERTA', '⚠️ Alerta'), ('ERRO', '❌ Erro')], max_length=20)),
+                ('validado_em', models.DateTimeField(verbose_name='Validado em')),
+                ('cliente', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ultima_validacao', serialize=False, to='clientes.cliente')),
+                ('validacao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backups.validacaobackup')),
+            ],
+            options={
+                'verbose_name': 'Última Validação do Cliente',
+                'verbose_name_plural': 'Últimas Validações dos Clientes',
+            },
+        ),
+        migrations.CreateModel(
+            name='UltimaValidacaoRotina',
+            fields=[
+                ('status', models.CharField(choices=[('SUCESSO', '✅ Sucesso'), ('ALERTA', '⚠️ Alerta'), ('ERRO', '❌ Erro')], max_length=20)),
+                ('validado_em', models.DateTimeField(verbose_name='Validado em')),
+                ('rotina', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ultima_validacao', serialize=False, to='backups.rotinabackup')),
+                ('validacao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backups.validacaobackup')),
+            ],
+            options={
+                'verbose_name': 'Última Validação da Rotina',
+                'verbose_name_plural': 'Últimas Validações das Rotinas',
+            },
+        ),
+        migrations.RunPython(popular_snapshots, migrations.RunPython.noop),
+    ]
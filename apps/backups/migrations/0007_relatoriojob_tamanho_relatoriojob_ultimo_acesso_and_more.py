@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backups', '0006_relatoriojob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='relatoriojob',
+            name='tamanho',
+            field=models.BigIntegerField(default=0, verbose_name='Tamanho (bytes)'),
+        ),
+        migrations.AddField(
+            model_name='relatoriojob',
+            name='ultimo_acesso',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Último acesso'),
+        ),
+        migrations.AddField(
+            model_name='relatoriojob',
+            name='versao_dados',
+            field=models.CharField(blank=True, max_length=50, verbose_name='Versão dos dados'),
+        ),
+        migrations.AlterField(
+            model_name='relatoriojob',
+            name='chave',
+            field=models.CharField(db_index=True, help_text='Hash do formato + filtros normalizados + versão dos dados', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='relatoriojob',
+            name='status',
+            field=models.CharField(choices=[('PENDENTE', 'Pendente'), ('PROCESSANDO', 'Processando'), ('CONCLUIDO', 'Concluído'), ('ERRO', 'Erro'), ('EXPIRADO', 'Expirado')], db_index=True, default='PENDENTE', max_length=20),
+        ),
+    ]
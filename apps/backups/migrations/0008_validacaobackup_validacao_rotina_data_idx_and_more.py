@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backups', '0007_relatoriojob_tamanho_relatoriojob_ultimo_acesso_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='validacaobackup',
+            index=models.Index(fields=['rotina', 'created_at'], name='validacao_rotina_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='validacaobackup',
+            index=models.Index(fields=['status', 'created_at'], name='validacao_status_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='validacaobackup',
+            index=models.Index(fields=['created_at', 'id'], name='validacao_data_id_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:20
+
+import apps.common.storage
+import apps.common.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backups', '0008_validacaobackup_validacao_rotina_data_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArquivoEvidencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('caminho', models.CharField(max_length=255, unique=True)),
+                ('hash', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256')),
+                ('tamanho', models.BigIntegerField(default=0, verbose_name='Tamanho (bytes)')),
+                ('referencias', models.IntegerField(default=0, verbose_name='Referências')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+            ],
+            options={
+                'verbose_name': 'Arquivo de Evidência',
+                'verbose_name_plural': 'Arquivos de Evidência',
+            },
+        ),
+        migrations.AlterField(
+            model_name='validacaobackup',
+            name='evidencia',
+            field=models.FileField(storage=apps.common.storage.armazenamento_evidencias, upload_to=apps.common.validators.evidence_upload_path, validators=[apps.common.validators.validate_file_infection]),
+        ),
+    ]
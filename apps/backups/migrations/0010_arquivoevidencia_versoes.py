@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:22
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def ignorar_nao_imagens(apps, schema_editor):
+    ArquivoEvidencia = apps.get_model('backups', 'ArquivoEvidencia')
+    imagens = Q(caminho__iendswith='.png') | Q(caminho__iendswith='.jpg') | Q(caminho__iendswith='.jpeg')
+    ArquivoEvidencia.objects.exclude(imagens).update(processamento='IGNORADO')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backups', '0009_arquivoevidencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='arquivoevidencia',
+            name='exibicao',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Versão de exibição'),
+        ),
+        migrations.AddField(
+            model_name='arquivoevidencia',
+            name='miniatura',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='arquivoevidencia',
+            name='processamento',
+            field=models.CharField(choices=[('PENDENTE', 'Pendente'), ('CONCLUIDO', 'Concluído'), ('ERRO', 'Erro'), ('IGNORADO', 'Não é imagem')], default='PENDENTE', max_length=20),
+        ),
+        migrations.RunPython(ignorar_nao_imagens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:28
+
+from django.db import migrations, models
+
+# O índice de busca depende do banco; outros bancos ficam só com o LIKE (ver indice_texto)
+SQL_SQLITE = [
+    """CREATE VIRTUAL TABLE backups_textoevidencia_fts USING fts5(
+        conteudo, content='backups_textoevidencia', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER backups_textoevidencia_ai AFTER INSERT ON backups_textoevidencia BEGIN
+        INSERT INTO backups_textoevidencia_fts(rowid, conteudo) VALUES (new.id, new.conteudo);
+    END""",
+    """CREATE TRIGGER backups_textoevidencia_ad AFTER DELETE ON backups_textoevidencia BEGIN
+        INSERT INTO backups_textoevidencia_fts(backups_textoevidencia_fts, rowid, conteudo)
+        VALUES ('delete', old.id, old.conteudo);
+    END""",
+    """CREATE TRIGGER backups_textoevidencia_au AFTER UPDATE ON backups_textoevidencia BEGIN
+        INSERT INTO backups_textoevidencia_fts(backups_textoevidencia_fts, rowid, conteudo)
+        VALUES ('delete', old.id, old.conteudo);
+        INSERT INTO backups_textoevidencia_fts(rowid, conteudo) VALUES (new.id, new.conteudo);
+    END""",
+]
+DESFAZER_SQLITE = [
+    "DROP TRIGGER IF EXISTS backups_textoevidencia_au",
+    "DROP TRIGGER IF EXISTS backups_textoevidencia_ad",
+    "DROP TRIGGER IF EXISTS backups_textoevidencia_ai",
+    "DROP TABLE IF EXISTS backups_textoevidencia_fts",
+]
+
+SQL_POSTGRESQL = [
+    "CREATE INDEX backups_textoevidencia_busca_idx ON backups_textoevidencia "
+    "USING GIN (to_tsvector('simple', conteudo))",
+]
+DESFAZER_POSTGRESQL = ["DROP INDEX IF EXISTS backups_textoevidencia_busca_idx"]
+
+
+def _executar(schema_editor, comandos):
+    for sql in comandos.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def criar_indice_busca(apps, schema_editor):
+    _executar(schema_editor, {'sqlite': SQL_SQLITE, 'postgresql': SQL_POSTGRESQL})
+
+
+def remover_indice_busca(apps, schema_editor):
+    _executar(schema_editor, {'sqlite': DESFAZER_SQLITE, 'postgresql': DESFAZER_POSTGRESQL})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backups', '0010_arquivoevidencia_versoes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextoEvidencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('conteudo', models.TextField(verbose_name='Conteúdo')),
+                ('truncado', models.BooleanField(default=False, help_text='Log maior que o limite: só o início e o fim foram indexados.')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Indexado em')),
+            ],
+            options={
+                'verbose_name': 'Texto de Evidência',
+                'verbose_name_plural': 'Textos de Evidência',
+            },
+        ),
+        migrations.RunPython(criar_indice_busca, remover_indice_busca),
+    ]
@@ -0,0 +1,75 @@
+from django.db import migrations
+
+# Índices da busca livre do histórico (ver apps.backups.busca)
+SQL_SQLITE = [
+    """CREATE VIRTUAL TABLE backups_validacao_busca_fts USING fts5(
+        observacao, content='backups_validacaobackup', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER backups_validacao_busca_ai AFTER INSERT ON backups_validacaobackup BEGIN
+        INSERT INTO backups_validacao_busca_fts(rowid, observacao) VALUES (new.id, new.observacao);
+    END""",
+    """CREATE TRIGGER backups_validacao_busca_ad AFTER DELETE ON backups_validacaobackup BEGIN
+        INSERT INTO backups_validacao_busca_fts(backups_validacao_busca_fts, rowid, observacao)
+        VALUES ('delete', old.id, old.observacao);
+    END""",
+    """CREATE TRIGGER backups_validacao_busca_au AFTER UPDATE OF observacao ON backups_validacaobackup BEGIN
+        INSERT INTO backups_validacao_busca_fts(backups_validacao_busca_fts, rowid, observacao)
+        VALUES ('delete', old.id, old.observacao);
+        INSERT INTO backups_validacao_busca_fts(rowid, observacao) VALUES (new.id, new.observacao);
+    END""",
+    "INSERT INTO backups_validacao_busca_fts(backups_validacao_busca_fts) VALUES ('rebuild')",
+]
+DESFAZER_SQLITE = [
+    "DROP TRIGGER IF EXISTS backups_validacao_busca_au",
+    "DROP TRIGGER IF EXISTS backups_validacao_busca_ad",
+    "DROP TRIGGER IF EXISTS backups_validacao_busca_ai",
+    "DROP TABLE IF EXISTS backups_validacao_busca_fts",
+]
+
+# UPPER(coluna): é a expressão que o icontains gera no PostgreSQL
+COLUNAS_TRIGRAMA = [
+    ('backups_validacaobackup', 'observacao'),
+    ('backups_rotinabackup', 'descricao'),
+    ('backups_rotinabackup', 'conteudo'),
+    ('clientes_cliente', 'nome_fantasia'),
+    ('clientes_cliente', 'razao_social'),
+    ('clientes_cliente', 'cnpj'),
+    ('clientes_servidor', 'hostname'),
+]
+SQL_POSTGRESQL = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+    f"CREATE INDEX {tabela}_{coluna}_trgm_idx ON {tabela} USING GIN (UPPER({coluna}) gin_trgm_ops)"
+    for tabela, coluna in COLUNAS_TRIGRAMA
+]
+DESFAZER_POSTGRESQL = [
+    f"DROP INDEX IF EXISTS {tabela}_{coluna}_trgm_idx" for tabela, coluna in COLUNAS_TRIGRAMA
+]
+
+
+def criar_indices(apps, schema_editor):
+    conexao = schema_editor.connection
+    if conexao.vendor == 'sqlite':
+        # O tokenizer trigram do FTS5 existe a partir do SQLite 3.34; sem ele a busca usa LIKE
+        if conexao.Database.sqlite_version_info >= (3, 34):
+            for sql in SQL_SQLITE:
+                schema_editor.execute(sql)
+    elif conexao.vendor == 'postgresql':
+        for sql in SQL_POSTGRESQL:
+            schema_editor.execute(sql)
+
+
+def remover_indices(apps, schema_editor):
+    comandos = {'sqlite': DESFAZER_SQLITE, 'postgresql': DESFAZER_POSTGRESQL}
+    for sql in comandos.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backups', '0011_textoevidencia'),
+        ('clientes', '0002_alter_cliente_cnpj_alter_cliente_contato_tecnico_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indices, remover_indices),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Triggers do FTS5 da observação (mesmo SQL da 0012): alterar a tabela de validações no
+# SQLite pode recriá-la, o que os descarta. SQL copiado aqui de propósito, para a migração
+# não mudar junto com o código da aplicação.
+GATILHOS_SQLITE = [
+    "DROP TRIGGER IF EXISTS backups_validacao_busca_ai",
+    "DROP TRIGGER IF EXISTS backups_validacao_busca_ad",
+    "DROP TRIGGER IF EXISTS backups_validacao_busca_au",
+    """CREATE TRIGGER backups_validacao_busca_ai AFTER INSERT ON backups_validacaobackup BEGIN
+        INSERT INTO backups_validacao_busca_fts(rowid, observacao) VALUES (new.id, new.observacao);
+    END""",
+    """CREATE TRIGGER backups_validacao_busca_ad AFTER DELETE ON backups_validacaobackup BEGIN
+        INSERT INTO backups_validacao_busca_fts(backups_validacao_busca_fts, rowid, observacao)
+        VALUES ('delete', old.id, old.observacao);
+    END""",
+    """CREATE TRIGGER backups_validacao_busca_au AFTER UPDATE OF observacao ON backups_validacaobackup BEGIN
+        INSERT INTO backups_validacao_busca_fts(backups_validacao_busca_fts, rowid, observacao)
+        VALUES ('delete', old.id, old.observacao);
+        INSERT INTO backups_validacao_busca_fts(rowid, observacao) VALUES (new.id, new.observacao);
+    END""",
+    # Validações gravadas enquanto os triggers faltavam
+    "INSERT INTO backups_validacao_busca_fts(backups_validacao_busca_fts) VALUES ('rebuild')",
+]
+
+
+def recriar_gatilhos(apps, schema_editor):
+    conexao = schema_editor.connection
+    if conexao.vendor != 'sqlite':
+        return
+    with conexao.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'backups_validacao_busca_fts'")
+        if cursor.fetchone() is None:
+            return  # SQLite sem trigram: a 0012 não criou o FTS5
+    for sql in GATILHOS_SQLITE:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backups', '0012_indices_busca'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='validacaobackup',
+            name='chave_idempotencia',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True, verbose_name='Chave de idempotência'),
+        ),
+        migrations.AddConstraint(
+            model_name='validacaobackup',
+            constraint=models.UniqueConstraint(condition=models.Q(('chave_idempotencia__isnull', False)), fields=('usuario', 'chave_idempotencia'), name='validacao_chave_por_usuario'),
+        ),
+        migrations.CreateModel(
+            name='TokenIngestao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(help_text='Ex: Agente Veeam - Cliente X', max_length=100)),
+                ('hash', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('prefixo', models.CharField(help_text='Início do token, para identificá-lo.', max_length=8)),
+                ('ativo', models.BooleanField(default=True)),
+                ('ultimo_uso', models.DateTimeField(blank=True, null=True, verbose_name='Último uso')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='tokens_ingestao', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Token de Ingestão',
+                'verbose_name_plural': 'Tokens de Ingestão',
+            },
+        ),
+        migrations.RunPython(recriar_gatilhos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:59
+
+import apps.backups.parsers
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backups', '0013_ingestao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ferramentabackup',
+            name='parser',
+            field=models.CharField(blank=True, choices=apps.backups.parsers.escolhas, help_text='Com um leitor, o resultado pode ser preenchido automaticamente a partir do log anexado.', max_length=30, verbose_name='Leitor de log'),
+        ),
+        migrations.AddField(
+            model_name='ferramentabackup',
+            name='regras_parser',
+            field=models.JSONField(blank=True, default=dict, help_text='Só para o leitor "Regras (regex)". Ex.: {"sucesso": "Backup finalizado", "erro": "^ERRO"}', verbose_name='Regras do leitor'),
+        ),
+    ]
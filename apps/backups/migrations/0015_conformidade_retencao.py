@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backups', '0014_leitor_de_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConformidadeRetencao',
+            fields=[
+                ('rotina', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='conformidade_retencao', serialize=False, to='backups.rotinabackup')),
+                ('conforme', models.BooleanField()),
+                ('pontos', models.IntegerField(help_text='Validações com sucesso dentro da retenção.', verbose_name='Pontos de restauração')),
+                ('lacunas', models.IntegerField(help_text='Intervalos sem ponto de restauração maiores que o esperado pela frequência.')),
+                ('maior_intervalo', models.DurationField(verbose_name='Maior intervalo')),
+                ('ultimo_ponto', models.DateTimeField(blank=True, null=True, verbose_name='Último ponto')),
+                ('calculado_em', models.DateTimeField(verbose_name='Calculado em')),
+                ('valido_ate', models.DateTimeField(blank=True, null=True, verbose_name='Válido até')),
+                ('alterado_em', models.DateTimeField(blank=True, null=True, verbose_name='Alterado em')),
+            ],
+            options={
+                'verbose_name': 'Conformidade de Retenção',
+                'verbose_name_plural': 'Conformidade de Retenção',
+            },
+        ),
+    ]
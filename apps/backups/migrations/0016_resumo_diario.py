@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def popular_resumos(apps, schema_editor):
+    ValidacaoBackup = apps.get_model('backups', 'ValidacaoBackup')
+    ResumoDiario = apps.get_model('backups', 'ResumoDiario')
+
+    linhas = ValidacaoBackup.objects.annotate(
+        dia=TruncDate('created_at', tzinfo=timezone.get_current_timezone())
+    ).values('dia', 'rotina__cliente_id', 'rotina__ferramenta_id', 'status').annotate(quantidade=Count('id')).order_by()
+    ResumoDiario.objects.bulk_create((
+        ResumoDiario(
+            dia=linha['dia'], cliente_id=linha['rotina__cliente_id'], ferramenta_id=linha['rotina__ferramenta_id'],
+            status=linha['status'], quantidade=linha['quantidade'],
+        )
+        for linha in linhas.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backups', '0015_conformidade_retencao'),
+        ('clientes', '0002_alter_cliente_cnpj_alter_cliente_contato_tecnico_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('status', models.CharField(choices=[('SUCESSO', '✅ Sucesso'), ('ALERTA', '⚠️ Alerta'), ('ERRO', '❌ Erro')], max_length=20)),
+                ('quantidade', models.IntegerField(default=0)),
+                ('cliente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumos_diarios', to='clientes.cliente')),
+                ('ferramenta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos_diarios', to='backups.ferramentabackup')),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário',
+                'verbose_name_plural': 'Resumos Diários',
+                'indexes': [models.Index(fields=['cliente', 'dia'], name='resumo_cliente_dia_idx'), models.Index(fields=['ferramenta', 'dia'], name='resumo_ferramenta_dia_idx')],
+                'constraints': [models.UniqueConstraint(fields=('dia', 'cliente', 'ferramenta', 'status'), name='resumo_diario_chave_unica')],
+            },
+        ),
+        migrations.RunPython(popular_resumos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+
+def popular_resumos(apps, schema_editor):
+    ValidacaoBackup = apps.get_model('backups', 'ValidacaoBackup')
+    ResumoDiario = apps.get_model('backups', 'ResumoDiario')
+    ResumoDiarioFerramenta = apps.get_model('backups', 'ResumoDiarioFerramenta')
+    ResumoMensalRotina = apps.get_model('backups', 'ResumoMensalRotina')
+
+    por_ferramenta = ResumoDiario.objects.values('dia', 'ferramenta_id', 'status').annotate(
+        soma=Sum('quantidade')
+    ).order_by()
+    ResumoDiarioFerramenta.objects.bulk_create((
+        ResumoDiarioFerramenta(
+            dia=linha['dia'], ferramenta_id=linha['ferramenta_id'], status=linha['status'], quantidade=linha['soma'],
+        )
+        for linha in por_ferramenta.iterator()
+    ), batch_size=1000)
+
+    por_rotina = ValidacaoBackup.objects.filter(status__in=('ALERTA', 'ERRO')).annotate(
+        mes=TruncMonth('created_at', tzinfo=timezone.get_current_timezone())
+    ).values('mes', 'rotina_id', 'status').annotate(quantidade=Count('id')).order_by()
+    ResumoMensalRotina.objects.bulk_create((
+        ResumoMensalRotina(
+            mes=timezone.localtime(linha['mes']).date(), rotina_id=linha['rotina_id'],
+            status=linha['status'], quantidade=linha['quantidade'],
+        )
+        for linha in por_rotina.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backups', '0016_resumo_diario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoDiarioFerramenta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('status', models.CharField(choices=[('SUCESSO', '✅ Sucesso'), ('ALERTA', '⚠️ Alerta'), ('ERRO', '❌ Erro')], max_length=20)),
+                ('quantidade', models.IntegerField(default=0)),
+                ('ferramenta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos_diarios_gerais', to='backups.ferramentabackup')),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário por Ferramenta',
+                'verbose_name_plural': 'Resumos Diários por Ferramenta',
+                'constraints': [models.UniqueConstraint(fields=('dia', 'ferramenta', 'status'), name='resumo_ferramenta_chave_unica')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumoMensalRotina',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField()),
+                ('status', models.CharField(choices=[('SUCESSO', '✅ Sucesso'), ('ALERTA', '⚠️ Alerta'), ('ERRO', '❌ Erro')], max_length=20)),
+                ('quantidade', models.IntegerField(default=0)),
+                ('rotina', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos_mensais', to='backups.rotinabackup')),
+            ],
+            options={
+                'verbose_name': 'Resumo Mensal da Rotina',
+                'verbose_name_plural': 'Resumos Mensais das Rotinas',
+                'indexes': [models.Index(fields=['status', 'mes', 'rotina', 'quantidade'], name='resumo_rotina_ranking_idx')],
+                'constraints': [models.UniqueConstraint(fields=('rotina', 'mes', 'status'), name='resumo_rotina_chave_unica')],
+            },
+        ),
+        migrations.RunPython(popular_resumos, migrations.RunPython.noop),
+    ]
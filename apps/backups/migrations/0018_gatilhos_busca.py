@@ -0,0 +1,51 @@
+from django.db import migrations
+
+# Triggers do FTS5 da observação (mesmo SQL da 0012). No SQLite, migrações que recriam a
+# tabela de validações os descartam: cada uma delas executa este SQL de novo no final.
+# Fica aqui (e não importado de apps.backups.busca) para a migração não mudar junto com o código.
+GATILHOS_SQLITE = [
+    "DROP TRIGGER IF EXISTS backups_validacao_busca_ai",
+    "DROP TRIGGER IF EXISTS backups_validacao_busca_ad",
+    "DROP TRIGGER IF EXISTS backups_validacao_busca_au",
+    """CREATE TRIGGER backups_validacao_busca_ai AFTER INSERT ON backups_validacaobackup BEGIN
+        INSERT INTO backups_validacao_busca_fts(rowid, observacao) VALUES (new.id, new.observacao);
+    END""",
+    """CREATE TRIGGER backups_validacao_busca_ad AFTER DELETE ON backups_validacaobackup BEGIN
+        INSERT INTO backups_validacao_busca_fts(backups_validacao_busca_fts, rowid, observacao)
+        VALUES ('delete', old.id, old.observacao);
+    END""",
+    """CREATE TRIGGER backups_validacao_busca_au AFTER UPDATE OF observacao ON backups_validacaobackup BEGIN
+        INSERT INTO backups_validacao_busca_fts(backups_validacao_busca_fts, rowid, observacao)
+        VALUES ('delete', old.id, old.observacao);
+        INSERT INTO backups_validacao_busca_fts(rowid, observacao) VALUES (new.id, new.observacao);
+    END""",
+    # Validações gravadas enquanto os triggers faltavam
+    "INSERT INTO backups_validacao_busca_fts(backups_validacao_busca_fts) VALUES ('rebuild')",
+]
+
+
+def recriar_gatilhos(apps, schema_editor):
+    conexao = schema_editor.connection
+    if conexao.vendor != 'sqlite':
+        return
+    with conexao.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'backups_validacao_busca_fts'")
+        if cursor.fetchone() is None:
+            return  # SQLite sem trigram: a 0012 não criou o FTS5
+    for sql in GATILHOS_SQLITE:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    """
+    A primeira versão da 0013 recriava a tabela de validações no SQLite: os bancos
+    migrados com ela ficaram sem os triggers do FTS5 da 0012.
+    """
+
+    dependencies = [
+        ('backups', '0017_resumos_ferramenta_rotina'),
+    ]
+
+    operations = [
+        migrations.RunPython(recriar_gatilhos, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,24 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User
-from apps.common.models import TimeStampedModel
+from apps.common.models import TimeStampedModel, ValoresOriginaisMixin
+from apps.common.storage import armazenamento_evidencias
 from apps.common.validators import evidence_upload_path, validate_file_infection
 from apps.clientes.models import Cliente, Servidor
+from . import parsers
+from .parsers.regex import RegexParser, validar_regras
 
 class FerramentaBackup(models.Model):
     nome = models.CharField(max_length=50, unique=True)
+    # Leitor do log da ferramenta (apps.backups.parsers): decide o resultado a partir da evidência
+    parser = models.CharField(
+        max_length=30, blank=True, choices=parsers.escolhas, verbose_name="Leitor de log",
+        help_text="Com um leitor, o resultado pode ser preenchido automaticamente a partir do log anexado."
+    )
+    regras_parser = models.JSONField(
+        default=dict, blank=True, verbose_name="Regras do leitor",
+        help_text='Só para o leitor "Regras (regex)". Ex.: {"sucesso": "Backup finalizado", "erro": "^ERRO"}'
+    )
     
     class Meta:
         verbose_name = "Ferramenta de Backup"
@@ -14,7 +27,14 @@ class FerramentaBackup(models.Model):
     def __str__(self):
         return self.nome
 
-class RotinaBackup(TimeStampedModel):
+    def clean(self):
+        if self.parser == RegexParser.chave:
+            try:
+                validar_regras(self.regras_parser)
+            except ValueError as exc:
+                raise ValidationError({'regras_parser': str(exc)})
+
+class RotinaBackup(ValoresOriginaisMixin, TimeStampedModel):
     FREQUENCIA_CHOICES = [
         ('DIARIO', 'Diário'),
         ('SEMANAL', 'Semanal'),
@@ -48,7 +68,7 @@ class RotinaBackup(TimeStampedModel):
     def __str__(self):
         return f"{self.ferramenta} - {self.descricao}"
 
-class ValidacaoBackup(TimeStampedModel):
+class ValidacaoBackup(ValoresOriginaisMixin, TimeStampedModel):
     STATUS_CHOICES = [
         ('SUCESSO', '✅ Sucesso'),
         ('ALERTA', '⚠️ Alerta'),
@@ -71,13 +91,280 @@ class ValidacaoBackup(TimeStampedModel):
     observacao = models.TextField(blank=True)
     evidencia = models.FileField(
         upload_to=evidence_upload_path, 
+        storage=armazenamento_evidencias,
         validators=[validate_file_infection]
     )
+    # Enviada pelos agentes na API de ingestão: reenviar o mesmo resultado não duplica a validação.
+    # Única por usuário (dono do token), não na tabela toda: agentes diferentes podem repetir chaves
+    chave_idempotencia = models.CharField(
+        max_length=100, null=True, blank=True, editable=False,
+        verbose_name="Chave de idempotência"
+    )
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Validação Realizada"
         verbose_name_plural = "Validações Realizadas"
+        # Caminhos de acesso do histórico, relatórios e dashboard (ver IndicesValidacaoTests em apps.backups.tests)
+        indexes = [
+            models.Index(fields=['rotina', 'created_at'], name='validacao_rotina_data_idx'),
+            models.Index(fields=['status', 'created_at'], name='validacao_status_data_idx'),
+            models.Index(fields=['created_at', 'id'], name='validacao_data_id_idx'),
+        ]
+        constraints = [
+            # Índice único parcial: criado sem recriar a tabela de validações no SQLite
+            models.UniqueConstraint(
+                fields=['usuario', 'chave_idempotencia'], condition=models.Q(chave_idempotencia__isnull=False),
+                name='validacao_chave_por_usuario',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Validação {self.id} - {self.status}"
+
+class ArquivoEvidencia(models.Model):
+    """
+    Arquivo de evidência no storage por conteúdo e quantas validações o usam
+    (ver apps.backups.evidencias). O arquivo é apagado quando não sobra nenhuma.
+    """
+    PROCESSAMENTO_CHOICES = [
+        ('PENDENTE', 'Pendente'),
+        ('CONCLUIDO', 'Concluído'),
+        ('ERRO', 'Erro'),
+        ('IGNORADO', 'Não é imagem'),
+    ]
+
+    caminho = models.CharField(max_length=255, unique=True)
+    hash = models.CharField(max_length=64, db_index=True, verbose_name="SHA-256")
+    tamanho = models.BigIntegerField(default=0, verbose_name="Tamanho (bytes)")
+    referencias = models.IntegerField(default=0, verbose_name="Referências")
+    # Versões reduzidas das imagens (ver apps.backups.imagens); vazias = usar o original
+    processamento = models.CharField(max_length=20, choices=PROCESSAMENTO_CHOICES, default='PENDENTE')
+    miniatura = models.CharField(max_length=255, blank=True)
+    exibicao = models.CharField(max_length=255, blank=True, verbose_name="Versão de exibição")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+
+    class Meta:
+        verbose_name = "Arquivo de Evidência"
+        verbose_name_plural = "Arquivos de Evidência"
+
+    def __str__(self):
+        return f"{self.caminho} ({self.referencias} ref.)"
+
+class TextoEvidencia(models.Model):
+    """
+    Texto extraído de uma evidência de log, por conteúdo (hash): validações com o mesmo
+    arquivo compartilham o registro. O índice de busca (FTS5 no SQLite, tsvector + GIN
+    no PostgreSQL) é criado na migração; a busca fica em apps.backups.indice_texto.
+    """
+    hash = models.CharField(max_length=64, unique=True, verbose_name="SHA-256")
+    conteudo = models.TextField(verbose_name="Conteúdo")
+    truncado = models.BooleanField(default=False, help_text="Log maior que o limite: só o início e o fim foram indexados.")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Indexado em")
+
+    class Meta:
+        verbose_name = "Texto de Evidência"
+        verbose_name_plural = "Textos de Evidência"
+
+    def __str__(self):
+        return self.hash
+
+class UltimaValidacaoBase(models.Model):
+    """
+    Snapshot da validação mais recente, mantido a cada escrita em ValidacaoBackup
+    (ver apps.backups.snapshots) para que a leitura do estado atual seja O(1).
+    """
+    validacao = models.ForeignKey(ValidacaoBackup, on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20, choices=ValidacaoBackup.STATUS_CHOICES)
+    validado_em = models.DateTimeField(verbose_name="Validado em")
+
+    class Meta:
+        abstract = True
+
+class UltimaValidacaoCliente(UltimaValidacaoBase):
+    cliente = models.OneToOneField(Cliente, on_delete=models.CASCADE, primary_key=True, related_name='ultima_validacao')
+
+    class Meta:
+        verbose_name = "Última Validação do Cliente"
+        verbose_name_plural = "Últimas Validações dos Clientes"
+
+class UltimaValidacaoRotina(UltimaValidacaoBase):
+    rotina = models.OneToOneField(RotinaBackup, on_delete=models.CASCADE, primary_key=True, related_name='ultima_validacao')
+
+    class Meta:
+        verbose_name = "Última Validação da Rotina"
+        verbose_name_plural = "Últimas Validações das Rotinas"
+
+class ResumoDiario(models.Model):
+    """
+    Quantidade de validações por dia (data local de created_at), cliente, ferramenta e
+    status. Mantido a cada escrita em ValidacaoBackup (apps.backups.resumos) para que
+    as perguntas por período não percorram a tabela de validações; o comando
+    `reconstruir_resumos` refaz um intervalo de datas.
+    """
+    dia = models.DateField()
+    # Nulo para rotinas sem cliente
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, null=True, blank=True, related_name='resumos_diarios')
+    ferramenta = models.ForeignKey(FerramentaBackup, on_delete=models.CASCADE, related_name='resumos_diarios')
+    status = models.CharField(max_length=20, choices=ValidacaoBackup.STATUS_CHOICES)
+    quantidade = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Resumo Diário"
+        verbose_name_plural = "Resumos Diários"
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'cliente', 'ferramenta', 'status'], name='resumo_diario_chave_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['cliente', 'dia'], name='resumo_cliente_dia_idx'),
+            models.Index(fields=['ferramenta', 'dia'], name='resumo_ferramenta_dia_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.dia} - {self.cliente_id} - {self.ferramenta_id} - {self.status}: {self.quantidade}"
+
+class ResumoDiarioFerramenta(models.Model):
+    """
+    ResumoDiario somado entre todos os clientes: séries e indicadores sem filtro de
+    cliente leem poucas linhas por dia em vez de uma por cliente. Mantido junto com o
+    ResumoDiario (apps.backups.resumos).
+    """
+    dia = models.DateField()
+    ferramenta = models.ForeignKey(FerramentaBackup, on_delete=models.CASCADE, related_name='resumos_diarios_gerais')
+    status = models.CharField(max_length=20, choices=ValidacaoBackup.STATUS_CHOICES)
+    quantidade = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Resumo Diário por Ferramenta"
+        verbose_name_plural = "Resumos Diários por Ferramenta"
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'ferramenta', 'status'], name='resumo_ferramenta_chave_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.dia} - {self.ferramenta_id} - {self.status}: {self.quantidade}"
+
+class ResumoMensalRotina(models.Model):
+    """
+    Validações com alerta ou erro por mês (primeiro dia, data local) e rotina: o ranking
+    de rotinas com mais falhas soma no máximo uma linha por rotina e mês. Validações com
+    sucesso não entram. Mantido junto com o ResumoDiario (apps.backups.resumos).
+    """
+    mes = models.DateField()
+    rotina = models.ForeignKey(RotinaBackup, on_delete=models.CASCADE, related_name='resumos_mensais')
+    status = models.CharField(max_length=20, choices=ValidacaoBackup.STATUS_CHOICES)
+    quantidade = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Resumo Mensal da Rotina"
+        verbose_name_plural = "Resumos Mensais das Rotinas"
+        constraints = [
+            models.UniqueConstraint(fields=['rotina', 'mes', 'status'], name='resumo_rotina_chave_unica'),
+        ]
+        indexes = [
+            # Cobre o ranking (status + meses -> soma por rotina) sem ler a tabela
+            models.Index(fields=['status', 'mes', 'rotina', 'quantidade'], name='resumo_rotina_ranking_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.mes:%Y-%m} - {self.rotina_id} - {self.status}: {self.quantidade}"
+
+class ConformidadeRetencao(models.Model):
+    """
+    Resultado guardado da verificação de retenção da rotina (apps.backups.retencao).
+    Recalculado só quando as validações ou a agenda da rotina mudam (`alterado_em`,
+    marcado pelos signals) ou quando o passar do tempo pode mudar o resultado (`valido_ate`).
+    """
+    rotina = models.OneToOneField(RotinaBackup, on_delete=models.CASCADE, primary_key=True, related_name='conformidade_retencao')
+    conforme = models.BooleanField()
+    pontos = models.IntegerField(verbose_name="Pontos de restauração", help_text="Validações com sucesso dentro da retenção.")
+    lacunas = models.IntegerField(help_text="Intervalos sem ponto de restauração maiores que o esperado pela frequência.")
+    maior_intervalo = models.DurationField(verbose_name="Maior intervalo")
+    ultimo_ponto = models.DateTimeField(null=True, blank=True, verbose_name="Último ponto")
+    calculado_em = models.DateTimeField(verbose_name="Calculado em")
+    valido_ate = models.DateTimeField(null=True, blank=True, verbose_name="Válido até")
+    alterado_em = models.DateTimeField(null=True, blank=True, verbose_name="Alterado em")
+
+    class Meta:
+        verbose_name = "Conformidade de Retenção"
+        verbose_name_plural = "Conformidade de Retenção"
+
+    def __str__(self):
+        return f"{self.rotina_id} - {'conforme' if self.conforme else 'não conforme'}"
+
+
+class TokenIngestao(models.Model):
+    """
+    Credencial de um agente de backup para a API de ingestão (apps.backups.ingestao).
+    Só o SHA-256 do token é guardado; o valor aparece uma única vez, ao ser gerado
+    pelo comando `criar_token_ingestao`. As validações recebidas ficam em nome de `usuario`.
+    """
+    nome = models.CharField(max_length=100, help_text="Ex: Agente Veeam - Cliente X")
+    usuario = models.ForeignKey(User, on_delete=models.PROTECT, related_name='tokens_ingestao', verbose_name="Usuário")
+    hash = models.CharField(max_length=64, unique=True, verbose_name="SHA-256")
+    prefixo = models.CharField(max_length=8, help_text="Início do token, para identificá-lo.")
+    ativo = models.BooleanField(default=True)
+    ultimo_uso = models.DateTimeField(null=True, blank=True, verbose_name="Último uso")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+
+    class Meta:
+        verbose_name = "Token de Ingestão"
+        verbose_name_plural = "Tokens de Ingestão"
+
+    def __str__(self):
+        return f"{self.nome} ({self.prefixo}...)"
+
+
+class RelatorioJob(TimeStampedModel):
+    """
+    Pedido de geração de relatório (Excel/PDF) processado fora do request
+    pelo comando `processar_relatorios`.
+    """
+    FORMATO_CHOICES = [
+        ('EXCEL', 'Excel'),
+        ('PDF', 'PDF'),
+    ]
+    STATUS_CHOICES = [
+        ('PENDENTE', 'Pendente'),
+        ('PROCESSANDO', 'Processando'),
+        ('CONCLUIDO', 'Concluído'),
+        ('ERRO', 'Erro'),
+        ('EXPIRADO', 'Expirado'),
+    ]
+    STATUS_EM_ANDAMENTO = ['PENDENTE', 'PROCESSANDO']
+
+    formato = models.CharField(max_length=10, choices=FORMATO_CHOICES)
+    filtros = models.JSONField(default=dict, blank=True)
+    chave = models.CharField(max_length=64, db_index=True, help_text="Hash do formato + filtros normalizados + versão dos dados")
+    versao_dados = models.CharField(max_length=50, blank=True, verbose_name="Versão dos dados")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDENTE', db_index=True)
+    arquivo = models.FileField(upload_to='relatorios/', blank=True)
+    tamanho = models.BigIntegerField(default=0, verbose_name="Tamanho (bytes)")
+    ultimo_acesso = models.DateTimeField(null=True, blank=True, verbose_name="Último acesso")
+    erro = models.TextField(blank=True)
+    solicitado_por = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='relatorios_solicitados',
+        verbose_name="Solicitado por"
+    )
+    iniciado_em = models.DateTimeField(null=True, blank=True, verbose_name="Iniciado em")
+    concluido_em = models.DateTimeField(null=True, blank=True, verbose_name="Concluído em")
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Relatório Solicitado"
+        verbose_name_plural = "Relatórios Solicitados"
+        constraints = [
+            # Pedidos idênticos ainda não concluídos viram um único job
+            models.UniqueConstraint(
+                fields=['chave'],
+                condition=models.Q(status__in=['PENDENTE', 'PROCESSANDO']),
+                name='relatorio_job_em_andamento_unico',
+            ),
+        ]
 
     def __str__(self):
-        return f"Validação {self.id} - {self.status}"
\ No newline at end of file
+        return f"Relatório {self.id} ({self.formato}) - {self.status}"
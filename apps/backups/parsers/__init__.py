@@ -0,0 +1,45 @@
+"""
+Leitores de log das ferramentas de backup, escolhidos em FerramentaBackup.parser.
+
+Cada leitor recebe as linhas do log uma a uma (o arquivo nunca é carregado inteiro) e
+devolve um ResultadoLog com status, nome do job, bytes transferidos, duração e as
+mensagens de erro/alerta. Novos leitores: subclasse de Parser com @registrar, em um
+módulo importado abaixo.
+
+Este pacote não importa nada do Django de propósito: `analisar_arquivo` roda nos
+processos do ProcessPoolExecutor do comando `ingerir_logs`.
+"""
+import hashlib
+
+from .base import REGISTRO, Parser, ResultadoLog, ler_linhas, registrar
+from . import regex, rsync, veeam, wsb  # noqa: F401 (registram os leitores)
+
+_BLOCO_LEITURA = 1024 * 1024
+
+__all__ = ['Parser', 'ResultadoLog', 'analisar_arquivo', 'escolhas', 'ler_linhas', 'obter', 'registrar']
+
+
+def escolhas():
+    return [(chave, classe.rotulo) for chave, classe in sorted(REGISTRO.items())]
+
+
+def obter(chave, regras=None):
+    """Instância do leitor registrado com `chave`, ou None."""
+    classe = REGISTRO.get(chave)
+    return classe(regras) if classe else None
+
+
+def analisar_arquivo(caminho, chave, regras=None):
+    """
+    Lê o log em `caminho` com o leitor `chave`. Retorna (ResultadoLog, sha256, tamanho);
+    o hash serve de chave de idempotência. Executado em processo separado.
+    """
+    digest = hashlib.sha256()
+    tamanho = 0
+    with open(caminho, 'rb') as arquivo:
+        while bloco := arquivo.read(_BLOCO_LEITURA):
+            digest.update(bloco)
+            tamanho += len(bloco)
+        arquivo.seek(0)
+        resultado = obter(chave, regras).analisar(ler_linhas(arquivo))
+    return resultado, digest.hexdigest(), tamanho
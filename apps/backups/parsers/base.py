@@ -0,0 +1,182 @@
+"""Base dos leitores de log: registro, leitura em streaming e o ResultadoLog."""
+import codecs
+import io
+import re
+from datetime import datetime
+
+REGISTRO = {}
+
+UNIDADES = {
+    'B': 1, 'BYTE': 1, 'BYTES': 1,
+    'K': 1024, 'KB': 1024, 'KIB': 1024,
+    'M': 1024 ** 2, 'MB': 1024 ** 2, 'MIB': 1024 ** 2,
+    'G': 1024 ** 3, 'GB': 1024 ** 3, 'GIB': 1024 ** 3,
+    'T': 1024 ** 4, 'TB': 1024 ** 4, 'TIB': 1024 ** 4,
+}
+
+# Mensagens guardadas por tipo (o total continua sendo contado)
+MAX_MENSAGENS = 20
+TAMANHO_MENSAGEM = 300
+
+
+def registrar(classe):
+    """Decorator: disponibiliza o leitor em FerramentaBackup.parser pela sua `chave`."""
+    REGISTRO[classe.chave] = classe
+    return classe
+
+
+def ler_linhas(arquivo):
+    """
+    Linhas de texto de um arquivo binário aberto, decodificadas aos poucos (o arquivo
+    nunca é lido inteiro). Logs do Windows costumam vir em UTF-16 com BOM.
+    """
+    inicio = arquivo.read(4)
+    arquivo.seek(0)
+    if inicio.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        codificacao = 'utf-16'
+    else:
+        codificacao = 'utf-8-sig'
+    texto = io.TextIOWrapper(arquivo, encoding=codificacao, errors='replace')
+    try:
+        for linha in texto:
+            yield linha.rstrip('\n').replace('\x00', '')
+    finally:
+        # Devolve o arquivo aberto a quem chamou (o TextIOWrapper o fecharia)
+        texto.detach()
+
+
+def para_bytes(numero, unidade='B'):
+    """'1,234,567' / '10.5' / '10,5' + unidade ('GB', 'G', 'bytes'...) -> int, ou None."""
+    numero = numero.strip()
+    if ',' in numero and '.' in numero:
+        # O último separador é o decimal
+        if numero.rfind(',') > numero.rfind('.'):
+            numero = numero.replace('.', '').replace(',', '.')
+        else:
+            numero = numero.replace(',', '')
+    elif ',' in numero:
+        grupos = numero.split(',')[1:]
+        numero = numero.replace(',', '' if all(len(g) == 3 for g in grupos) else '.')
+    multiplicador = UNIDADES.get((unidade or 'B').upper())
+    try:
+        return int(float(numero) * multiplicador) if multiplicador else None
+    except ValueError:
+        return None
+
+
+def tamanho_legivel(valor):
+    for unidade in ('B', 'KB', 'MB', 'GB'):
+        if valor < 1024:
+            return f"{valor:.0f} {unidade}" if unidade == 'B' else f"{valor:.1f} {unidade}"
+        valor /= 1024
+    return f"{valor:.1f} TB"
+
+
+def duracao_legivel(segundos):
+    horas, resto = divmod(int(segundos), 3600)
+    return f"{horas}:{resto // 60:02d}:{resto % 60:02d}"
+
+
+class ResultadoLog:
+    """O que um leitor extraiu do log. `status` fica None quando o log não é conclusivo."""
+
+    def __init__(self, leitor):
+        self.leitor = leitor
+        self.status = None
+        self.job = None
+        self.bytes_transferidos = None
+        self.duracao = None
+        self.erros = []
+        self.alertas = []
+        self.total_erros = 0
+        self.total_alertas = 0
+        self.linhas = 0
+        self.primeiro_horario = None
+        self.ultimo_horario = None
+
+    def _guardar(self, mensagens, linha):
+        if len(mensagens) < MAX_MENSAGENS:
+            mensagens.append(linha.strip()[:TAMANHO_MENSAGEM])
+
+    def erro(self, linha):
+        self.total_erros += 1
+        self._guardar(self.erros, linha)
+
+    def alerta(self, linha):
+        self.total_alertas += 1
+        self._guardar(self.alertas, linha)
+
+    def horario(self, texto):
+        # Guardado como texto: só o primeiro e o último são convertidos, no fim
+        if self.primeiro_horario is None:
+            self.primeiro_horario = texto
+        self.ultimo_horario = texto
+
+    def resumo(self):
+        """Texto para a observação da validação."""
+        partes = [f"Leitura automática do log ({self.leitor}): {self.status or 'inconclusiva'}."]
+        if self.job:
+            partes.append(f"Job: {self.job}")
+        if self.bytes_transferidos is not None:
+            partes.append(f"Transferido: {tamanho_legivel(self.bytes_transferidos)}")
+        if self.duracao is not None:
+            partes.append(f"Duração: {duracao_legivel(self.duracao)}")
+        for titulo, total, mensagens in (
+            ('Erros', self.total_erros, self.erros),
+            ('Alertas', self.total_alertas, self.alertas),
+        ):
+            if total:
+                partes.append(f"{titulo} ({total}):")
+                partes.extend(f"- {mensagem}" for mensagem in mensagens[:5])
+        return '\n'.join(partes)
+
+
+class Parser:
+    """
+    Base dos leitores: `ler_linha` é chamado para cada linha do log e anota o
+    ResultadoLog; `concluir` decide o status quando o log não trouxe um resultado final
+    explícito (erros -> ERRO, alertas -> ALERTA).
+    """
+    chave = ''
+    rotulo = ''
+    # Formato (strptime) do horário no início das linhas, para calcular a duração
+    formato_horario = None
+
+    def __init__(self, regras=None):
+        self.regras = regras or {}
+
+    def analisar(self, linhas):
+        resultado = ResultadoLog(self.rotulo)
+        for linha in linhas:
+            resultado.linhas += 1
+            self.ler_linha(linha, resultado)
+        self.concluir(resultado)
+        return resultado
+
+    def ler_linha(self, linha, resultado):
+        raise NotImplementedError
+
+    def concluir(self, resultado):
+        if resultado.status is None:
+            if resultado.total_erros:
+                resultado.status = 'ERRO'
+            elif resultado.total_alertas:
+                resultado.status = 'ALERTA'
+        if resultado.duracao is None and resultado.primeiro_horario and self.formato_horario:
+            try:
+                inicio = datetime.strptime(resultado.primeiro_horario, self.formato_horario)
+                fim = datetime.strptime(resultado.ultimo_horario, self.formato_horario)
+            except ValueError:
+                return
+            resultado.duracao = (fim - inicio).total_seconds()
+
+
+def horario_da_linha(padrao, linha, resultado):
+    """Anota o horário do início da linha, se `padrao` (regex com o grupo `horario`) casar."""
+    encontrado = padrao.match(linha)
+    if encontrado:
+        resultado.horario(encontrado.group('horario'))
+
+
+def compilar(padrao):
+    return re.compile(padrao, re.IGNORECASE)
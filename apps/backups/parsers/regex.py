@@ -0,0 +1,82 @@
+"""
+Leitor genérico configurado por expressões regulares (FerramentaBackup.regras_parser),
+para ferramentas sem leitor próprio. Todas as regras são opcionais:
+
+    {
+        "sucesso": "Backup finalizado",             linha que indica o fim normal do job
+        "erro": "^ERRO|falha",                      cada linha que casar conta como erro
+        "alerta": "^AVISO",                         cada linha que casar conta como alerta
+        "job": "Tarefa: (.+)",                      1º grupo = nome do job
+        "bytes": "Copiados ([\\d.,]+) ?(\\w+)",     1º grupo = número, 2º (opcional) = unidade
+        "duracao": "Tempo: (\\d+):(\\d+):(\\d+)"    H:M:S em três grupos, ou segundos em um
+    }
+
+A comparação ignora maiúsculas/minúsculas.
+"""
+import re
+
+from .base import Parser, compilar, para_bytes, registrar
+
+REGRAS = ('sucesso', 'erro', 'alerta', 'job', 'bytes', 'duracao')
+REGRAS_COM_GRUPO = ('job', 'bytes', 'duracao')
+
+
+def validar_regras(regras):
+    """Levanta ValueError com uma mensagem legível se alguma regra for inválida."""
+    if not isinstance(regras, dict):
+        raise ValueError("As regras devem ser um objeto JSON.")
+    desconhecidas = set(regras) - set(REGRAS)
+    if desconhecidas:
+        raise ValueError(f"Regras desconhecidas: {', '.join(sorted(desconhecidas))}. Use: {', '.join(REGRAS)}.")
+    for nome, padrao in regras.items():
+        if not isinstance(padrao, str) or not padrao:
+            raise ValueError(f"A regra '{nome}' deve ser um texto não vazio.")
+        try:
+            compilado = compilar(padrao)
+        except re.error as exc:
+            raise ValueError(f"Expressão inválida na regra '{nome}': {exc}.")
+        if nome in REGRAS_COM_GRUPO and not compilado.groups:
+            raise ValueError(f"A regra '{nome}' precisa de um grupo entre parênteses.")
+
+
+@registrar
+class RegexParser(Parser):
+    chave = 'regex'
+    rotulo = 'Regras (regex)'
+
+    def __init__(self, regras=None):
+        super().__init__(regras)
+        self.padroes = {nome: compilar(padrao) for nome, padrao in self.regras.items() if nome in REGRAS}
+        self.concluido = False
+
+    def ler_linha(self, linha, resultado):
+        padroes = self.padroes
+        if 'job' in padroes and resultado.job is None:
+            encontrado = padroes['job'].search(linha)
+            if encontrado:
+                resultado.job = encontrado.group(1).strip()
+        if 'bytes' in padroes:
+            encontrado = padroes['bytes'].search(linha)
+            if encontrado:
+                unidade = encontrado.group(2) if padroes['bytes'].groups > 1 else 'B'
+                resultado.bytes_transferidos = para_bytes(encontrado.group(1), unidade)
+        if 'duracao' in padroes:
+            encontrado = padroes['duracao'].search(linha)
+            if encontrado:
+                partes = [int(grupo) if grupo and grupo.isdigit() else 0 for grupo in encontrado.groups()[:3]]
+                segundos = 0
+                for parte in partes:
+                    segundos = segundos * 60 + parte
+                resultado.duracao = segundos
+
+        if 'erro' in padroes and padroes['erro'].search(linha):
+            resultado.erro(linha)
+        elif 'alerta' in padroes and padroes['alerta'].search(linha):
+            resultado.alerta(linha)
+        elif 'sucesso' in padroes and padroes['sucesso'].search(linha):
+            self.concluido = True
+
+    def concluir(self, resultado):
+        if self.concluido and not resultado.total_erros:
+            resultado.status = 'ALERTA' if resultado.total_alertas else 'SUCESSO'
+        super().concluir(resultado)
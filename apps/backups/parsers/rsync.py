@@ -0,0 +1,75 @@
+"""
+rsync com --stats (e, opcionalmente, --log-file, que prefixa as linhas com data/hora).
+
+    2024/10/08 22:00:01 [4120] building file list
+    rsync: [sender] send_files failed to open "/dados/x.db": Permission denied (13)
+    Total transferred file size: 1,234,567 bytes
+    sent 1.30M bytes  received 1.02K bytes  866.67K bytes/sec
+    rsync error: some files/attrs were not transferred (see previous errors) (code 23)
+
+Códigos 23 e 24 (transferência parcial, arquivo sumiu durante a cópia) viram ALERTA;
+os demais códigos, ERRO.
+"""
+import re
+
+from .base import Parser, compilar, horario_da_linha, para_bytes, registrar
+
+# Sem IGNORECASE (bem mais lento com alternativas): a linha é comparada em minúsculas
+_RELEVANTE = re.compile(r'rsync|total|sent|warning|vanished')
+_HORARIO = compilar(r'^(?P<horario>\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2})')
+_CODIGO = compilar(r'\brsync error:.*\(code (?P<codigo>\d+)\)')
+_MENSAGEM = compilar(r'\brsync(?:\s*\[\w+\])?:\s')
+_SUMIU = compilar(r'file has vanished')
+_ALERTA = compilar(r'\bwarning\b')
+_TOTAL_TRANSFERIDO = compilar(r'total transferred file size:\s*(?P<numero>[\d.,]+)\s*(?P<unidade>[KMGT]?)')
+_ENVIADO = compilar(r'\bsent (?P<numero>[\d.,]+)\s*(?P<unidade>[KMGT]?) bytes\s+received')
+_CONCLUIDO = compilar(r'\b(?:sent [\d.,]+\s*[KMGT]? bytes\s+received|total size is)\b')
+
+CODIGOS_PARCIAIS = {'23', '24'}
+
+
+@registrar
+class RsyncParser(Parser):
+    chave = 'rsync'
+    rotulo = 'rsync'
+    formato_horario = '%Y/%m/%d %H:%M:%S'
+
+    def __init__(self, regras=None):
+        super().__init__(regras)
+        self.concluido = False
+
+    def ler_linha(self, linha, resultado):
+        horario_da_linha(_HORARIO, linha, resultado)
+        # Com -v, cada arquivo copiado vira uma linha sem nada a extrair
+        if not _RELEVANTE.search(linha.lower()):
+            return
+
+        codigo = _CODIGO.search(linha)
+        if codigo:
+            # O código de saída é a palavra final do rsync
+            resultado.status = 'ALERTA' if codigo.group('codigo') in CODIGOS_PARCIAIS else 'ERRO'
+            resultado.erro(linha)
+            return
+
+        total = _TOTAL_TRANSFERIDO.search(linha)
+        if total:
+            resultado.bytes_transferidos = para_bytes(total.group('numero'), total.group('unidade') or 'B')
+            return
+        enviado = _ENVIADO.search(linha)
+        if enviado and resultado.bytes_transferidos is None:
+            resultado.bytes_transferidos = para_bytes(enviado.group('numero'), enviado.group('unidade') or 'B')
+        if _CONCLUIDO.search(linha):
+            self.concluido = True
+            return
+
+        if _SUMIU.search(linha):
+            resultado.alerta(linha)
+        elif _MENSAGEM.search(linha):
+            resultado.erro(linha)
+        elif _ALERTA.search(linha):
+            resultado.alerta(linha)
+
+    def concluir(self, resultado):
+        if resultado.status is None and self.concluido and not resultado.total_erros:
+            resultado.status = 'ALERTA' if resultado.total_alertas else 'SUCESSO'
+        super().concluir(resultado)
@@ -0,0 +1,70 @@
+"""
+Veeam Backup & Replication / Agent: log da sessão do job ou relatório por e-mail
+salvo como texto.
+
+    [08.10.2024 22:00:05] <01> Info     Job [Backup Diário SRV01] started
+    [08.10.2024 22:41:37] <01> Error    Failed to process VM APP02
+    Job 'Backup Diário SRV01' finished with Warning
+    Transferred: 10,5 GB (2.1x)    Duration: 0:41:32
+"""
+import re
+
+from .base import Parser, compilar, horario_da_linha, para_bytes, registrar
+
+# Sem IGNORECASE (bem mais lento com alternativas): a linha é comparada em minúsculas
+_RELEVANTE = re.compile(r'job|session|transferred|duration|error|failed|warning|status|result|success')
+_HORARIO = compilar(r'^\[(?P<horario>\d{2}\.\d{2}\.\d{4} \d{2}:\d{2}:\d{2})\]')
+_JOB = compilar(r"\bjob\s*(?:name)?\s*:?\s*['\"\[](?P<job>[^'\"\]]+)['\"\]]")
+_JOB_RELATORIO = compilar(r'^\s*(?:backup|backup copy|replication|agent backup)\s+job\s*:\s*(?P<job>.+?)\s*$')
+_FINAL = compilar(r'\b(?:job|session)\b.*\b(?:finished|completed|ended)\s+with\s+(?P<status>success|warning|failed|error)')
+_FINAL_RELATORIO = compilar(r'^\s*(?:status|result)\s*:?\s*(?P<status>success|warning|failed|error)\s*$')
+_TRANSFERIDO = compilar(r'\btransferred\s*:?\s*(?P<numero>[\d.,]+)\s*(?P<unidade>[KMGT]?B)\b')
+_DURACAO = compilar(r'\bduration\s*:?\s*(?:(?P<dias>\d+)\.)?(?P<h>\d+):(?P<m>\d{2}):(?P<s>\d{2})')
+# Contadores do relatório ("Error 0", "Warnings: 2") não são mensagens de erro
+_CONTADOR = compilar(r'^\s*(?:success|warning|warnings|error|errors|failed)\s*:?\s*\d+\s*$')
+_ERRO = compilar(r'\b(?:error|failed)\b')
+_ALERTA = compilar(r'\bwarning\b')
+
+_STATUS = {'success': 'SUCESSO', 'warning': 'ALERTA', 'failed': 'ERRO', 'error': 'ERRO'}
+
+
+@registrar
+class VeeamParser(Parser):
+    chave = 'veeam'
+    rotulo = 'Veeam'
+    formato_horario = '%d.%m.%Y %H:%M:%S'
+
+    def ler_linha(self, linha, resultado):
+        horario_da_linha(_HORARIO, linha, resultado)
+        # Quase todas as linhas (objetos processados) não interessam: um search as descarta
+        if not _RELEVANTE.search(linha.lower()):
+            return
+
+        self._job(linha, resultado)
+        final = _FINAL.search(linha) or _FINAL_RELATORIO.match(linha)
+        if final:
+            resultado.status = _STATUS[final.group('status').lower()]
+            return
+
+        transferido = _TRANSFERIDO.search(linha)
+        if transferido:
+            resultado.bytes_transferidos = para_bytes(transferido.group('numero'), transferido.group('unidade'))
+        duracao = _DURACAO.search(linha)
+        if duracao:
+            resultado.duracao = (
+                int(duracao.group('dias') or 0) * 86400 + int(duracao.group('h')) * 3600
+                + int(duracao.group('m')) * 60 + int(duracao.group('s'))
+            )
+        if transferido or duracao or _CONTADOR.match(linha):
+            return
+
+        if _ERRO.search(linha):
+            resultado.erro(linha)
+        elif _ALERTA.search(linha):
+            resultado.alerta(linha)
+
+    def _job(self, linha, resultado):
+        if resultado.job is None:
+            job = _JOB.search(linha) or _JOB_RELATORIO.match(linha)
+            if job:
+                resultado.job = job.group('job').strip()
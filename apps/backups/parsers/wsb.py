@@ -0,0 +1,50 @@
+"""
+Windows Server Backup: saída do `wbadmin start backup` redirecionada para arquivo
+(em inglês ou português; o PowerShell costuma gravar em UTF-16).
+
+    Creating a backup of volume (C:), copied (100%).
+    The backup operation successfully completed.
+    Summary of the backup operation:
+    ERROR - Access is denied. (0x80070005)
+"""
+from .base import Parser, compilar, horario_da_linha, registrar
+
+_HORARIO = compilar(r'^(?P<horario>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})')
+_SUCESSO = compilar(
+    r'backup operation (?:successfully completed|completed successfully)'
+    r'|opera[çc][ãa]o de backup (?:foi )?conclu[íi]da com [êe]xito'
+)
+_PARCIAL = compilar(
+    r'backup operation (?:successfully )?completed with warnings'
+    r'|opera[çc][ãa]o de backup (?:foi )?conclu[íi]da com avisos'
+)
+_FALHA = compilar(
+    r'backup operation (?:completed with errors|stopped before completing|failed)'
+    r'|opera[çc][ãa]o de backup (?:foi )?(?:conclu[íi]da com erros|interrompida|falhou)'
+)
+_ERRO = compilar(r'^\s*(?:error|erro)\b|\b(?:failed|falhou|access is denied|acesso negado)\b')
+_ALERTA = compilar(r'^\s*(?:warning|aviso)\b')
+
+
+@registrar
+class WindowsServerBackupParser(Parser):
+    chave = 'wsb'
+    rotulo = 'Windows Server Backup'
+    formato_horario = '%Y-%m-%d %H:%M:%S'
+
+    def ler_linha(self, linha, resultado):
+        horario_da_linha(_HORARIO, linha, resultado)
+
+        if _FALHA.search(linha):
+            resultado.status = 'ERRO'
+            resultado.erro(linha)
+        elif _PARCIAL.search(linha):
+            resultado.status = 'ALERTA'
+        elif _SUCESSO.search(linha):
+            # Uma falha registrada antes (ex.: de outro volume) prevalece
+            if resultado.status is None:
+                resultado.status = 'SUCESSO'
+        elif _ERRO.search(linha):
+            resultado.erro(linha)
+        elif _ALERTA.search(linha):
+            resultado.alerta(linha)
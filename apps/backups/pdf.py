@@ -0,0 +1,55 @@
+"""
+Renderização de PDF em partes, usada por apps.backups.relatorios.
+
+Este módulo não importa nada do Django de propósito: `pdf_de_html` roda nos processos
+do ProcessPoolExecutor e precisa ser importável sem as apps configuradas.
+"""
+import io
+
+from pypdf import PdfReader, PdfWriter
+from reportlab.pdfgen import canvas
+from xhtml2pdf import pisa
+
+
+def pdf_de_html(html):
+    """Converte um pedaço de HTML em PDF (bytes). Executado em processo separado."""
+    buffer = io.BytesIO()
+    pisa_status = pisa.CreatePDF(html, dest=buffer)
+    if pisa_status.err:
+        raise RuntimeError("Erro ao gerar PDF")
+    return buffer.getvalue()
+
+
+def _numeracao(tamanhos):
+    """Gera um PDF com "Página X de Y" no rodapé, uma página para cada tamanho informado."""
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer)
+    total = len(tamanhos)
+    for numero, (largura, altura) in enumerate(tamanhos, start=1):
+        pdf.setPageSize((largura, altura))
+        pdf.setFont("Helvetica", 8)
+        pdf.setFillColorRGB(0.58, 0.64, 0.72)
+        pdf.drawRightString(largura - 28, 16, f"Página {numero} de {total}")
+        pdf.showPage()
+    pdf.save()
+    buffer.seek(0)
+    return PdfReader(buffer)
+
+
+def juntar_pdfs(partes, destino):
+    """
+    Junta as partes (arquivos binários, abertos até a gravação) em um único documento,
+    aplicando a numeração de páginas contínua depois da junção (cada parte foi renderizada
+    sem saber das outras).
+    """
+    writer = PdfWriter()
+    for parte in partes:
+        for pagina in PdfReader(parte).pages:
+            writer.add_page(pagina)
+
+    tamanhos = [(float(p.mediabox.width), float(p.mediabox.height)) for p in writer.pages]
+    numeracao = _numeracao(tamanhos)
+    for pagina, rodape in zip(writer.pages, numeracao.pages):
+        pagina.merge_page(rodape)
+
+    writer.write(destino)
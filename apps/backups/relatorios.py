@@ -0,0 +1,303 @@
+"""
+Geração dos relatórios de validações (Excel/PDF).
+
+As funções recebem um dicionário de filtros (request.GET ou equivalente) e escrevem
+em um arquivo de destino, para poderem rodar tanto na view quanto fora do request.
+"""
+import contextlib
+import itertools
+import multiprocessing
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from apps.clientes.models import Servidor
+from .busca import filtrar_por_busca
+from .indice_texto import filtrar_por_texto
+from .models import ValidacaoBackup
+from .pdf import juntar_pdfs, pdf_de_html
+from .resumos import contagens
+
+TAMANHO_LOTE = 2000
+
+# Linhas por parte do PDF: cada parte é renderizada separadamente pelo xhtml2pdf
+LINHAS_POR_PARTE_PDF = 500
+
+CABECALHOS = ["Data/Hora", "Cliente", "Servidor", "Ferramenta", "Rotina", "Status", "Usuário"]
+
+CAMPOS_EXPORTACAO = [
+    "id", "created_at", "cliente_id", "cliente", "servidor", "ferramenta",
+    "rotina_id", "rotina", "status", "usuario", "observacao",
+]
+
+# Larguras fixas: calcular pelo conteúdo exigiria percorrer todas as células de novo
+LARGURAS_EXCEL = [18, 32, 26, 22, 42, 14, 18]
+
+
+def filtrar_validacoes(filtros):
+    queryset = ValidacaoBackup.objects.all().select_related(
+        'rotina', 'rotina__ferramenta', 'rotina__cliente', 'usuario'
+    ).order_by('-created_at', '-id')
+
+    cliente_id = filtros.get('cliente')
+    status = filtros.get('status')
+    data_inicio = filtros.get('data_inicio')
+    data_fim = filtros.get('data_fim')
+
+    if cliente_id:
+        queryset = queryset.filter(rotina__cliente_id=cliente_id)
+    if status:
+        queryset = queryset.filter(status=status)
+    inicio, fim = intervalo_datas(data_inicio, data_fim)
+    if inicio:
+        queryset = queryset.filter(created_at__gte=inicio)
+    if fim:
+        queryset = queryset.filter(created_at__lt=fim)
+    if filtros.get('busca'):
+        queryset = filtrar_por_busca(queryset, filtros['busca'])
+    if filtros.get('texto_log'):
+        queryset = filtrar_por_texto(queryset, filtros['texto_log'])
+    return queryset
+
+
+def contar_validacoes(filtros):
+    """
+    Total de validações que `filtrar_validacoes(filtros)` devolveria. Sem filtros de
+    texto, a soma sai dos resumos diários (apps.backups.resumos) em vez de um COUNT
+    sobre as validações do período.
+    """
+    if filtros.get('busca') or filtros.get('texto_log'):
+        return filtrar_validacoes(filtros).count()
+    data_inicio = filtros.get('data_inicio')
+    data_fim = filtros.get('data_fim')
+    totais = contagens(
+        parse_date(data_inicio) if data_inicio else None,
+        parse_date(data_fim) if data_fim else None,
+        clientes_ids=[filtros['cliente']] if filtros.get('cliente') else None,
+    )[0]
+    status = filtros.get('status')
+    if not status:
+        return totais['total']
+    return totais[status.lower()] if status in ('SUCESSO', 'ALERTA', 'ERRO') else 0
+
+
+def intervalo_datas(data_inicio, data_fim):
+    """
+    Converte as datas do filtro (dias no fuso do projeto) em um intervalo semiaberto
+    [início, fim) de timestamps. Diferente de created_at__date, a comparação direta
+    com a coluna permite usar os índices.
+    """
+    inicio = fim = None
+    data_i = parse_date(data_inicio) if data_inicio else None
+    data_f = parse_date(data_fim) if data_fim else None
+    if data_i:
+        inicio = timezone.make_aware(datetime.combine(data_i, time.min))
+    if data_f:
+        fim = timezone.make_aware(datetime.combine(data_f + timedelta(days=1), time.min))
+    return inicio, fim
+
+
+def com_servidor(queryset):
+    """Anota o hostname do primeiro servidor da rotina via subquery (sem consulta extra por linha)."""
+    primeiro_servidor = Servidor.objects.filter(rotinas=OuterRef('rotina_id')).order_by('pk')
+    return queryset.annotate(servidor_hostname=Subquery(primeiro_servidor.values('hostname')[:1]))
+
+
+def linhas_relatorio(queryset, chunk_size=TAMANHO_LOTE):
+    """
+    Percorre o queryset em lotes devolvendo tuplas já resolvidas
+    (data local, cliente, servidor, ferramenta, rotina, status, usuário).
+    """
+    status_display = dict(ValidacaoBackup.STATUS_CHOICES)
+
+    linhas = com_servidor(queryset).values_list(
+        'created_at', 'rotina__cliente__nome_fantasia', 'servidor_hostname',
+        'rotina__ferramenta__nome', 'rotina__descricao', 'status', 'usuario__username',
+    )
+
+    for created_at, cliente, hostname, ferramenta, rotina, status, usuario in linhas.iterator(chunk_size=chunk_size):
+        yield (
+            timezone.localtime(created_at),
+            cliente or "-",
+            hostname or "-",
+            ferramenta,
+            rotina,
+            status_display.get(status, status),
+            usuario,
+        )
+
+
+def linhas_exportacao(queryset, chunk_size=TAMANHO_LOTE):
+    """
+    Linhas "cruas" para integração (CSV/NDJSON), na ordem de CAMPOS_EXPORTACAO.
+    Usa values_list + iterator: no PostgreSQL isso vira um cursor no servidor.
+    """
+    linhas = com_servidor(queryset).values_list(
+        'id', 'created_at', 'rotina__cliente_id', 'rotina__cliente__nome_fantasia', 'servidor_hostname',
+        'rotina__ferramenta__nome', 'rotina_id', 'rotina__descricao', 'status', 'usuario__username', 'observacao',
+    )
+    for validacao_id, created_at, *resto in linhas.iterator(chunk_size=chunk_size):
+        yield (validacao_id, created_at.isoformat(), *resto)
+
+
+def escrever_excel(queryset, destino):
+    """
+    Escreve o relatório em `destino` (caminho ou arquivo binário) usando uma planilha
+    write-only do openpyxl: as linhas vão direto para disco, a memória não cresce
+    com a quantidade de registros.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Relatório de Backups")
+
+    for indice, largura in enumerate(LARGURAS_EXCEL, start=1):
+        ws.column_dimensions[get_column_letter(indice)].width = largura
+
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="1e293b", end_color="1e293b", fill_type="solid")
+    cabecalho = []
+    for titulo in CABECALHOS:
+        cell = WriteOnlyCell(ws, value=titulo)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = Alignment(horizontal="center")
+        cabecalho.append(cell)
+    ws.append(cabecalho)
+
+    for data, *resto in linhas_relatorio(queryset):
+        ws.append([data.strftime("%d/%m/%Y %H:%M"), *resto])
+
+    wb.save(destino)
+
+
+def _partes(linhas, tamanho):
+    parte = []
+    for linha in linhas:
+        parte.append(linha)
+        if len(parte) >= tamanho:
+            yield parte
+            parte = []
+    if parte:
+        yield parte
+
+
+def linhas_pdf(queryset):
+    """Linhas do relatório como dicionários para o template do PDF."""
+    codigo_status = {display: codigo for codigo, display in ValidacaoBackup.STATUS_CHOICES}
+    for data, cliente, servidor, ferramenta, rotina, status, usuario in linhas_relatorio(queryset):
+        yield {
+            'data': data,
+            'cliente': cliente,
+            'servidor': servidor,
+            'ferramenta': ferramenta,
+            'rotina': rotina,
+            'status': status,
+            'status_classe': codigo_status.get(status, status).lower(),
+            'usuario': usuario,
+        }
+
+
+def htmls_pdf(linhas, usuario, linhas_por_parte=LINHAS_POR_PARTE_PDF):
+    """
+    Renderiza o template em partes de `linhas_por_parte` linhas. Só a primeira parte
+    leva o título; o cabeçalho da tabela se repete em todas as páginas.
+    """
+    contexto = {'usuario': usuario, 'data_geracao': timezone.now()}
+    vazio = True
+    for indice, parte in enumerate(_partes(linhas, linhas_por_parte)):
+        vazio = False
+        yield render_to_string('relatorio_pdf_template.html', {
+            **contexto,
+            'linhas': parte,
+            'primeira_parte': indice == 0,
+        })
+    if vazio:
+        yield render_to_string('relatorio_pdf_template.html', {**contexto, 'linhas': [], 'primeira_parte': True})
+
+
+def _contexto_processos():
+    """
+    forkserver (ou spawn onde não existe): com fork cada worker levaria uma cópia do
+    processo do Django inteiro, com conexões abertas e threads do servidor/fila.
+    """
+    metodo = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    contexto = multiprocessing.get_context(metodo)
+    if metodo == 'forkserver':
+        # Só vale na primeira subida do forkserver, que fica ativo para os próximos relatórios
+        contexto.set_forkserver_preload(['apps.backups.pdf'])
+    return contexto
+
+
+def _em_ordem(pool, funcao, itens, janela):
+    """
+    Como pool.map, mas com no máximo `janela` tarefas pendentes: os itens são lidos à
+    medida que os resultados saem, em vez de todos os HTMLs irem para a fila de uma vez.
+    """
+    pendentes = deque()
+    try:
+        for item in itens:
+            if len(pendentes) >= janela:
+                yield pendentes.popleft().result()
+            pendentes.append(pool.submit(funcao, item))
+        while pendentes:
+            yield pendentes.popleft().result()
+    finally:
+        for tarefa in pendentes:
+            tarefa.cancel()
+
+
+def _pdfs_das_partes(htmls, workers):
+    primeira = next(htmls)
+    segunda = next(htmls, None)
+    if segunda is None or workers <= 1:
+        # Relatório pequeno (ou paralelismo desligado): não compensa subir processos
+        for html in itertools.chain([primeira], [] if segunda is None else [segunda], htmls):
+            yield pdf_de_html(html)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_contexto_processos()) as pool:
+        yield from _em_ordem(pool, pdf_de_html, itertools.chain([primeira, segunda], htmls), 2 * workers)
+
+
+def escrever_partes_pdf(htmls, destino, workers):
+    """
+    Renderiza as partes (HTML) em até `workers` processos e junta tudo em `destino`.
+    Cada parte pronta vai para um arquivo temporário: nem os HTMLs nem os PDFs
+    intermediários ficam todos na memória. Levanta RuntimeError se o xhtml2pdf falhar.
+    """
+    with contextlib.ExitStack() as pilha:
+        partes = []
+        for pdf in _pdfs_das_partes(htmls, workers):
+            parte = pilha.enter_context(tempfile.TemporaryFile())
+            parte.write(pdf)
+            parte.seek(0)
+            partes.append(parte)
+        juntar_pdfs(partes, destino)
+
+
+def escrever_pdf(queryset, destino, usuario, workers=None, linhas_por_parte=LINHAS_POR_PARTE_PDF):
+    """
+    Renderiza o relatório em PDF no arquivo `destino`. Retorna False se o xhtml2pdf falhar.
+
+    O xhtml2pdf fica muito lento com tabelas longas, então o relatório é dividido em partes
+    renderizadas em paralelo (escrever_partes_pdf) e depois juntadas com numeração contínua.
+    """
+    if workers is None:
+        workers = getattr(settings, 'RELATORIOS_PDF_WORKERS', None) or os.cpu_count() or 1
+
+    htmls = htmls_pdf(linhas_pdf(queryset), usuario, linhas_por_parte)
+    try:
+        escrever_partes_pdf(htmls, destino, workers)
+    except RuntimeError:
+        return False
+    return True
@@ -0,0 +1,348 @@
+"""
+Resumos de validações, mantidos a cada escrita para que as perguntas por período não
+percorram a tabela de validações:
+- ResumoDiario: quantidade por dia, cliente, ferramenta e status;
+- ResumoDiarioFerramenta: o mesmo somado entre os clientes (consultas sem filtro de
+  cliente);
+- ResumoMensalRotina: alertas e erros por mês e rotina (ranking de rotinas com falha).
+
+Manutenção incremental, chamada pelos signals (apps.backups.signals):
+- validação criada/editada/excluída: +1/-1 nas chaves afetadas (edição de status ou de
+  rotina tira de uma chave e põe em outra);
+- lote (validacoes_criadas): os incrementos são somados por chave antes de gravar;
+- rotina que muda de cliente ou ferramenta: as contagens dela migram de chave.
+
+`reconstruir_resumos` refaz um intervalo de datas com um GROUP BY por bloco de dias (e
+um por mês para o resumo das rotinas); `contagens` e `rotinas_com_falha` respondem às
+consultas por período só com os resumos.
+"""
+import datetime
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import (
+    FerramentaBackup, ResumoDiario, ResumoDiarioFerramenta, ResumoMensalRotina, RotinaBackup, ValidacaoBackup,
+)
+
+DIAS_POR_BLOCO = 31
+TAMANHO_LOTE = 1000
+
+PERIODOS = {'dia': None, 'semana': TruncWeek, 'mes': TruncMonth}
+AGRUPAMENTOS = {'cliente': 'cliente_id', 'ferramenta': 'ferramenta_id', 'status': 'status'}
+
+# Status que entram no ResumoMensalRotina
+STATUS_FALHA = ('ALERTA', 'ERRO')
+
+
+def _dia(data_hora):
+    return timezone.localtime(data_hora).date()
+
+
+def _gravar_variacoes(modelo, campos, variacoes):
+    """
+    Soma as variações ({chave: +n/-n}, chave na ordem de `campos`) às linhas do modelo.
+    UPDATE com F() (atômico entre processos); a linha é criada na primeira validação
+    da chave e removida quando a contagem chega a zero.
+    """
+    for chave, variacao in variacoes.items():
+        if not variacao:
+            continue
+        linha = modelo.objects.filter(**dict(zip(campos, chave)))
+        if linha.update(quantidade=F('quantidade') + variacao):
+            if variacao < 0:
+                linha.filter(quantidade__lte=0).delete()
+            continue
+        if variacao < 0:
+            continue  # nada a descontar (resumo ainda não reconstruído para esse dia)
+        try:
+            with transaction.atomic():
+                modelo.objects.create(quantidade=variacao, **dict(zip(campos, chave)))
+        except IntegrityError:
+            # Criada por outra transação entre o UPDATE e o INSERT
+            linha.update(quantidade=F('quantidade') + variacao)
+
+
+@transaction.atomic(savepoint=False)
+def aplicar(variacoes):
+    """
+    Soma as variações ({(dia, rotina_id, cliente_id, ferramenta_id, status): +n/-n})
+    aos três resumos. Variações que se anulam num resumo (ex.: rotina que troca de
+    cliente, no resumo por ferramenta) não chegam ao banco.
+    """
+    diarios, por_ferramenta, mensais = Counter(), Counter(), Counter()
+    for (dia, rotina_id, cliente_id, ferramenta_id, status), variacao in variacoes.items():
+        diarios[(dia, cliente_id, ferramenta_id, status)] += variacao
+        por_ferramenta[(dia, ferramenta_id, status)] += variacao
+        if status in STATUS_FALHA:
+            mensais[(dia.replace(day=1), rotina_id, status)] += variacao
+    _gravar_variacoes(ResumoDiario, ('dia', 'cliente_id', 'ferramenta_id', 'status'), diarios)
+    _gravar_variacoes(ResumoDiarioFerramenta, ('dia', 'ferramenta_id', 'status'), por_ferramenta)
+    _gravar_variacoes(ResumoMensalRotina, ('mes', 'rotina_id', 'status'), mensais)
+
+
+def validacao_salva(validacao, created, chave_original):
+    """`chave_original`: (cliente_id, ferramenta_id) da rotina antes da edição, ou None se não existe mais."""
+    variacoes = Counter()
+    if not created:
+        if validacao.valor_original('id') is None:
+            return  # instância não lida do banco: sem como saber o que mudou (reconstruir_resumos corrige)
+        original = (
+            validacao.valor_original('rotina_id'), validacao.valor_original('status'), validacao.valor_original('created_at')
+        )
+        if original == (validacao.rotina_id, validacao.status, validacao.created_at):
+            return
+        rotina_id, status, criada = original
+        if chave_original:
+            variacoes[(_dia(criada), rotina_id, *chave_original, status)] -= 1
+    rotina = validacao.rotina
+    variacoes[(_dia(validacao.created_at), rotina.pk, rotina.cliente_id, rotina.ferramenta_id, validacao.status)] += 1
+    aplicar(variacoes)
+
+
+def validacao_excluida(validacao, chave):
+    """`chave`: (cliente_id, ferramenta_id) da rotina da validação, ou None se não existe mais."""
+    if chave:
+        aplicar({(_dia(validacao.created_at), validacao.rotina_id, *chave, validacao.status): -1})
+
+
+def validacoes_criadas(validacoes):
+    """Equivalente a validacao_salva para um lote de validações novas (bulk_create)."""
+    aplicar(Counter(
+        (_dia(v.created_at), v.rotina_id, v.rotina.cliente_id, v.rotina.ferramenta_id, v.status) for v in validacoes
+    ))
+
+
+def rotina_alterada(rotina):
+    """Rotina mudou de cliente ou ferramenta: as contagens dela passam para a nova chave."""
+    cliente_original = rotina.valor_original('cliente_id')
+    ferramenta_original = rotina.valor_original('ferramenta_id')
+    if (cliente_original, ferramenta_original) == (rotina.cliente_id, rotina.ferramenta_id):
+        return
+    variacoes = Counter()
+    por_dia = ValidacaoBackup.objects.filter(rotina=rotina).annotate(
+        dia=TruncDate('created_at', tzinfo=timezone.get_current_timezone())
+    ).values('dia', 'status').annotate(quantidade=Count('id')).order_by()
+    for linha in por_dia:
+        variacoes[(linha['dia'], rotina.pk, cliente_original, ferramenta_original, linha['status'])] -= linha['quantidade']
+        variacoes[(linha['dia'], rotina.pk, rotina.cliente_id, rotina.ferramenta_id, linha['status'])] += linha['quantidade']
+    aplicar(variacoes)
+
+
+# --- RECONSTRUÇÃO ---
+
+def _intervalo(inicio, fim):
+    """Datas locais [inicio, fim] -> timestamps [de, ate) para filtrar created_at pelo índice."""
+    de = timezone.make_aware(datetime.datetime.combine(inicio, datetime.time.min))
+    ate = timezone.make_aware(datetime.datetime.combine(fim + datetime.timedelta(days=1), datetime.time.min))
+    return de, ate
+
+
+def _proximo_mes(mes):
+    return (mes + datetime.timedelta(days=32)).replace(day=1)
+
+
+def _reconstruir_dias(inicio, fim):
+    """ResumoDiario e ResumoDiarioFerramenta de [inicio, fim] (uma transação)."""
+    de, ate = _intervalo(inicio, fim)
+    linhas = ValidacaoBackup.objects.filter(created_at__gte=de, created_at__lt=ate).annotate(
+        dia=TruncDate('created_at', tzinfo=timezone.get_current_timezone())
+    ).values('dia', 'rotina__cliente_id', 'rotina__ferramenta_id', 'status').annotate(
+        quantidade=Count('id')
+    ).order_by()
+    diarios = [
+        ResumoDiario(
+            dia=linha['dia'], cliente_id=linha['rotina__cliente_id'], ferramenta_id=linha['rotina__ferramenta_id'],
+            status=linha['status'], quantidade=linha['quantidade'],
+        )
+        for linha in linhas
+    ]
+    por_ferramenta = Counter()
+    for resumo in diarios:
+        por_ferramenta[(resumo.dia, resumo.ferramenta_id, resumo.status)] += resumo.quantidade
+    with transaction.atomic():
+        ResumoDiario.objects.filter(dia__gte=inicio, dia__lte=fim).delete()
+        ResumoDiarioFerramenta.objects.filter(dia__gte=inicio, dia__lte=fim).delete()
+        return len(ResumoDiario.objects.bulk_create(diarios, batch_size=TAMANHO_LOTE)) + len(
+            ResumoDiarioFerramenta.objects.bulk_create(
+                (
+                    ResumoDiarioFerramenta(dia=dia, ferramenta_id=ferramenta_id, status=status, quantidade=quantidade)
+                    for (dia, ferramenta_id, status), quantidade in por_ferramenta.items()
+                ),
+                batch_size=TAMANHO_LOTE,
+            )
+        )
+
+
+def _reconstruir_mes(mes):
+    """ResumoMensalRotina de um mês inteiro (uma transação)."""
+    de, ate = _intervalo(mes, _proximo_mes(mes) - datetime.timedelta(days=1))
+    linhas = ValidacaoBackup.objects.filter(
+        status__in=STATUS_FALHA, created_at__gte=de, created_at__lt=ate
+    ).values('rotina_id', 'status').annotate(quantidade=Count('id')).order_by()
+    with transaction.atomic():
+        ResumoMensalRotina.objects.filter(mes=mes).delete()
+        return len(ResumoMensalRotina.objects.bulk_create(
+            (
+                ResumoMensalRotina(mes=mes, rotina_id=linha['rotina_id'], status=linha['status'], quantidade=linha['quantidade'])
+                for linha in linhas
+            ),
+            batch_size=TAMANHO_LOTE,
+        ))
+
+
+def reconstruir_resumos(inicio=None, fim=None, dias_por_bloco=DIAS_POR_BLOCO):
+    """
+    Recalcula os resumos entre as datas `inicio` e `fim` (incluídas; sem elas, todo o
+    histórico), um bloco de dias por transação com um único GROUP BY cada. O resumo
+    das rotinas é refeito por mês inteiro, inclusive nos meses da borda. Retorna a
+    quantidade de linhas de resumo gravadas.
+    """
+    if inicio is None or fim is None:
+        datas = ValidacaoBackup.objects.order_by().aggregate(primeira=Min('created_at'), ultima=Max('created_at'))
+        if datas['primeira'] is None:
+            ResumoDiario.objects.all().delete()
+            ResumoDiarioFerramenta.objects.all().delete()
+            ResumoMensalRotina.objects.all().delete()
+            return 0
+        inicio = inicio or _dia(datas['primeira'])
+        fim = fim or _dia(datas['ultima'])
+
+    total = 0
+    bloco = inicio
+    while bloco <= fim:
+        fim_bloco = min(bloco + datetime.timedelta(days=dias_por_bloco - 1), fim)
+        total += _reconstruir_dias(bloco, fim_bloco)
+        bloco = fim_bloco + datetime.timedelta(days=1)
+    mes = inicio.replace(day=1)
+    while mes <= fim:
+        total += _reconstruir_mes(mes)
+        mes = _proximo_mes(mes)
+    return total
+
+
+# --- CONSULTAS ---
+
+def contagens(inicio=None, fim=None, periodo=None, agrupar_por=(), clientes_ids=None, ferramentas_ids=None):
+    """
+    Validações por status entre as datas `inicio` e `fim` (incluídas), só com os resumos.
+    `periodo` ('dia', 'semana' ou 'mes') quebra o resultado no tempo; `agrupar_por`
+    combina 'cliente', 'ferramenta' e 'status'. Retorna dicts com as chaves do
+    agrupamento e 'total', 'sucesso', 'alerta', 'erro' e as taxas 'taxa_sucesso',
+    'taxa_alerta' e 'taxa_erro' (0 a 1); sem agrupamento, um único dict com os totais.
+    """
+    if clientes_ids is None and 'cliente' not in agrupar_por:
+        resumos = ResumoDiarioFerramenta.objects.all()
+    else:
+        resumos = ResumoDiario.objects.all()
+    if inicio:
+        resumos = resumos.filter(dia__gte=inicio)
+    if fim:
+        resumos = resumos.filter(dia__lte=fim)
+    if clientes_ids is not None:
+        resumos = resumos.filter(cliente_id__in=clientes_ids)
+    if ferramentas_ids is not None:
+        resumos = resumos.filter(ferramenta_id__in=ferramentas_ids)
+
+    campos = [AGRUPAMENTOS[campo] for campo in agrupar_por]
+    if periodo:
+        truncar = PERIODOS[periodo]
+        resumos = resumos.annotate(periodo=truncar('dia') if truncar else F('dia'))
+        campos.insert(0, 'periodo')
+
+    somas = {
+        'total': Sum('quantidade', default=0),
+        'sucesso': Sum('quantidade', filter=Q(status='SUCESSO'), default=0),
+        'alerta': Sum('quantidade', filter=Q(status='ALERTA'), default=0),
+        'erro': Sum('quantidade', filter=Q(status='ERRO'), default=0),
+    }
+    if campos:
+        linhas = list(resumos.values(*campos).annotate(**somas).order_by(*campos))
+    else:
+        linhas = [resumos.aggregate(**somas)]
+    return [com_taxas(linha) for linha in linhas]
+
+
+def com_taxas(contagem):
+    """Acrescenta 'taxa_sucesso', 'taxa_alerta' e 'taxa_erro' (0 a 1) a um dict de contagens."""
+    for status in ('sucesso', 'alerta', 'erro'):
+        contagem[f'taxa_{status}'] = contagem[status] / contagem['total'] if contagem['total'] else 0
+    return contagem
+
+
+def _inicio_periodo(dia, periodo):
+    if periodo == 'semana':
+        return dia - datetime.timedelta(days=dia.weekday())
+    if periodo == 'mes':
+        return dia.replace(day=1)
+    return dia
+
+
+def _somar(linhas):
+    soma = {'total': 0, 'sucesso': 0, 'alerta': 0, 'erro': 0}
+    for linha in linhas:
+        for campo in soma:
+            soma[campo] += linha[campo]
+    return com_taxas(soma)
+
+
+def serie_indicadores(inicio, fim, periodo='dia', clientes_ids=None, ferramentas_ids=None):
+    """
+    Contagens (ver `contagens`) no período, por `periodo` e por ferramenta:
+    {'totais', 'serie': [{'periodo', ...}], 'ferramentas': [{'id', 'nome', ...}]}.
+    A série é lida por dia e somada aqui em semanas ou meses: no SQLite, o date_trunc
+    do Django é uma função Python chamada a cada linha.
+    """
+    por_periodo = defaultdict(list)
+    dias = contagens(inicio, fim, 'dia', (), clientes_ids, ferramentas_ids)
+    for linha in dias:
+        por_periodo[_inicio_periodo(linha['periodo'], periodo)].append(linha)
+    ferramentas = contagens(inicio, fim, None, ('ferramenta',), clientes_ids, ferramentas_ids)
+    nomes = dict(FerramentaBackup.objects.filter(
+        pk__in=[linha['ferramenta_id'] for linha in ferramentas]
+    ).values_list('id', 'nome'))
+    for linha in ferramentas:
+        linha['id'] = linha.pop('ferramenta_id')
+        linha['nome'] = nomes.get(linha['id'], '')
+    return {
+        'totais': _somar(dias),
+        'serie': [{'periodo': chave.isoformat(), **_somar(itens)} for chave, itens in sorted(por_periodo.items())],
+        'ferramentas': sorted(ferramentas, key=lambda ferramenta: ferramenta['nome']),
+    }
+
+
+def rotinas_com_falha(inicio, fim, clientes_ids=None, ferramentas_ids=None, limite=10):
+    """
+    As `limite` rotinas com mais erros nos meses entre `inicio` e `fim` (meses inteiros:
+    o resumo das rotinas é mensal), com o total de alertas no mesmo intervalo. Retorna
+    dicts com 'id', 'descricao', 'cliente_id', 'cliente', 'ferramenta', 'erro' e 'alerta'.
+    """
+    resumos = ResumoMensalRotina.objects.filter(mes__gte=inicio.replace(day=1), mes__lte=fim)
+    if clientes_ids is not None:
+        resumos = resumos.filter(rotina__cliente_id__in=clientes_ids)
+    if ferramentas_ids is not None:
+        resumos = resumos.filter(rotina__ferramenta_id__in=ferramentas_ids)
+
+    erros = dict(
+        resumos.filter(status='ERRO').values('rotina_id').annotate(erro=Sum('quantidade'))
+        .order_by('-erro', 'rotina_id').values_list('rotina_id', 'erro')[:limite]
+    )
+    if not erros:
+        return []
+    alertas = dict(
+        resumos.filter(status='ALERTA', rotina_id__in=list(erros)).values('rotina_id')
+        .annotate(alerta=Sum('quantidade')).order_by().values_list('rotina_id', 'alerta')
+    )
+    rotinas = {
+        rotina_id: {'id': rotina_id, 'descricao': descricao, 'cliente_id': cliente_id, 'cliente': cliente, 'ferramenta': ferramenta}
+        for rotina_id, descricao, cliente_id, cliente, ferramenta in RotinaBackup.objects.filter(
+            pk__in=list(erros)
+        ).values_list('id', 'descricao', 'cliente_id', 'cliente__nome_fantasia', 'ferramenta__nome')
+    }
+    return [
+        {**rotinas[rotina_id], 'erro': erro, 'alerta': alertas.get(rotina_id, 0)}
+        for rotina_id, erro in erros.items() if rotina_id in rotinas
+    ]
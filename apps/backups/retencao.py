@@ -0,0 +1,147 @@
+"""
+Conformidade de retenção: dentro dos últimos `retencao_dias` da rotina, as validações
+com sucesso (pontos de restauração) precisam cobrir a janela sem buracos maiores que o
+intervalo entre execuções da frequência mais o prazo de validação
+(AGENDA_PRAZO_VALIDACAO_HORAS). Contam os intervalos entre pontos consecutivos, do
+início da janela (ou do cadastro da rotina, se for mais recente) ao primeiro ponto e do
+último ponto até agora.
+
+O resultado de cada rotina fica em ConformidadeRetencao e só é recalculado quando:
+- as validações ou a agenda da rotina mudam (os signals marcam `alterado_em`);
+- o passar do tempo pode mudar o resultado (`valido_ate`): o último ponto envelhece
+  além do permitido, ou a lacuna mais antiga sai da janela.
+O recálculo roda no comando `atualizar_conformidade` (agendado, ex.: cron a cada 15
+minutos); o resumo por cliente do dashboard só lê o último resultado.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .agenda import PERIODO_DIAS, Epoch
+from .models import ConformidadeRetencao, RotinaBackup, ValidacaoBackup
+
+TAMANHO_LOTE = 500
+
+
+def intervalo_permitido(frequencia):
+    """Maior intervalo sem ponto de restauração aceito para a frequência, em segundos."""
+    return PERIODO_DIAS.get(frequencia, 1) * 86400 + int(settings.AGENDA_PRAZO_VALIDACAO_HORAS * 3600)
+
+
+def avaliar(pontos, inicio, agora, permitido, retencao):
+    """
+    Conformidade de uma rotina. `pontos`: segundos das validações com sucesso desde
+    `inicio`, em ordem. Retorna (conforme, lacunas, maior intervalo, valido_ate); todos
+    os tempos em segundos, valido_ate None = até a próxima alteração da rotina.
+    """
+    marcos = [inicio, *pontos, agora]
+    lacunas = 0
+    maior = 0
+    primeira_lacuna = None
+    for anterior, atual in zip(marcos, marcos[1:]):
+        intervalo = atual - anterior
+        maior = max(maior, intervalo)
+        if intervalo > permitido:
+            lacunas += 1
+            if primeira_lacuna is None and atual != agora:
+                primeira_lacuna = atual
+
+    candidatos = []
+    if agora - marcos[-2] <= permitido:
+        # Sem ponto novo, o intervalo até agora passa do permitido neste momento
+        candidatos.append(marcos[-2] + permitido + 1)
+    if primeira_lacuna is not None:
+        # A lacuna deixa de contar quando o início da janela chega perto do ponto que a fecha
+        candidatos.append(primeira_lacuna - permitido + retencao)
+    return not lacunas, lacunas, maior, min(candidatos) if candidatos else None
+
+
+def _data(segundos):
+    return datetime.datetime.fromtimestamp(segundos, tz=datetime.timezone.utc)
+
+
+def _pendentes(agora):
+    """Rotinas sem resultado, alteradas depois do último cálculo ou com o resultado vencido."""
+    return RotinaBackup.objects.filter(
+        Q(conformidade_retencao__isnull=True)
+        | Q(conformidade_retencao__alterado_em__gte=F('conformidade_retencao__calculado_em'))
+        | Q(conformidade_retencao__valido_ate__lte=agora)
+    )
+
+
+def _calcular(rotinas, agora):
+    segundos_agora = int(agora.timestamp())
+    janelas = {
+        rotina['id']: max(segundos_agora - rotina['retencao_dias'] * 86400, int(rotina['created_at'].timestamp()))
+        for rotina in rotinas
+    }
+    pontos = {rotina_id: [] for rotina_id in janelas}
+    validacoes = ValidacaoBackup.objects.filter(
+        rotina_id__in=list(janelas), status='SUCESSO',
+        created_at__gte=_data(min(janelas.values())), created_at__lte=agora,
+    ).order_by('rotina_id', 'created_at').values_list('rotina_id', Epoch('created_at'))
+    for rotina_id, segundos in validacoes:
+        if segundos >= janelas[rotina_id]:
+            pontos[rotina_id].append(segundos)
+
+    resultados = []
+    for rotina in rotinas:
+        inicio = janelas[rotina['id']]
+        conforme, lacunas, maior, valido_ate = avaliar(
+            pontos[rotina['id']], inicio, segundos_agora,
+            intervalo_permitido(rotina['frequencia']), rotina['retencao_dias'] * 86400,
+        )
+        ultimo = pontos[rotina['id']][-1] if pontos[rotina['id']] else None
+        resultados.append(ConformidadeRetencao(
+            rotina_id=rotina['id'], conforme=conforme, pontos=len(pontos[rotina['id']]), lacunas=lacunas,
+            maior_intervalo=datetime.timedelta(seconds=maior),
+            ultimo_ponto=_data(ultimo) if ultimo is not None else None,
+            calculado_em=agora, valido_ate=_data(valido_ate) if valido_ate is not None else None,
+            # Só vale no INSERT: sem linha, uma marcação feita durante este cálculo não teria
+            # onde ficar; com alterado_em = calculado_em a rotina é refeita na próxima passada
+            alterado_em=agora,
+        ))
+    # alterado_em fica de fora do UPDATE: uma marcação feita durante o cálculo continua valendo
+    ConformidadeRetencao.objects.bulk_create(
+        resultados, update_conflicts=True, unique_fields=['rotina'],
+        update_fields=['conforme', 'pontos', 'lacunas', 'maior_intervalo', 'ultimo_ponto', 'calculado_em', 'valido_ate'],
+    )
+
+
+def atualizar_conformidade(completo=False, agora=None):
+    """Recalcula as rotinas pendentes (ou todas, com `completo`). Retorna quantas."""
+    agora = agora or timezone.now()
+    rotinas = RotinaBackup.objects.all() if completo else _pendentes(agora)
+    rotinas = list(rotinas.order_by('id').values('id', 'frequencia', 'retencao_dias', 'created_at'))
+    for inicio in range(0, len(rotinas), TAMANHO_LOTE):
+        _calcular(rotinas[inicio:inicio + TAMANHO_LOTE], agora)
+    return len(rotinas)
+
+
+def marcar_alteradas(*rotinas_ids):
+    """Chamado pelos signals: as rotinas serão recalculadas na próxima atualizar_conformidade."""
+    ids = [rotina_id for rotina_id in set(rotinas_ids) if rotina_id]
+    if ids:
+        ConformidadeRetencao.objects.filter(rotina_id__in=ids).update(alterado_em=timezone.now())
+
+
+def resumo_por_cliente(clientes_ids=None):
+    """
+    {cliente_id: {'rotinas', 'conformes', 'nao_conformes': [ConformidadeRetencao...]}}
+    com o último resultado calculado (ver atualizar_conformidade). Não grava nada.
+    """
+    conformidades = ConformidadeRetencao.objects.filter(rotina__cliente__ativo=True)
+    if clientes_ids is not None:
+        conformidades = conformidades.filter(rotina__cliente_id__in=clientes_ids)
+
+    resumo = {
+        item['rotina__cliente_id']: {'rotinas': item['rotinas'], 'conformes': item['conformes'], 'nao_conformes': []}
+        for item in conformidades.values('rotina__cliente_id').annotate(
+            rotinas=Count('pk'), conformes=Count('pk', filter=Q(conforme=True))
+        )
+    }
+    for conformidade in conformidades.filter(conforme=False).select_related('rotina').order_by('rotina__descricao'):
+        resumo[conformidade.rotina.cliente_id]['nao_conformes'].append(conformidade)
+    return resumo
@@ -0,0 +1,116 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from apps.clientes.models import Cliente, Servidor
+from . import evidencias, resumos, retencao, snapshots
+from .lote import validacoes_criadas
+from .models import FerramentaBackup, RotinaBackup, ValidacaoBackup
+from .versao_dados import registrar_alteracao
+
+
+def _chaves_das_rotinas(*rotinas_ids):
+    """{rotina_id: (cliente_id, ferramenta_id)} numa consulta."""
+    return {
+        rotina_id: (cliente_id, ferramenta_id)
+        for rotina_id, cliente_id, ferramenta_id in RotinaBackup.objects.filter(
+            pk__in=[rotina_id for rotina_id in rotinas_ids if rotina_id]
+        ).values_list('id', 'cliente_id', 'ferramenta_id')
+    }
+
+
+# --- VALIDAÇÕES ---
+# Um receiver por evento para tudo que depende das validações (snapshots, referências
+# das evidências, resumos, retenção e versão dos dados): a rotina, e a original numa
+# edição que a troca, é consultada uma vez para todos e as escritas vão numa transação.
+
+@receiver(post_save, sender=ValidacaoBackup)
+def validacao_salva(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    rotina = instance.rotina
+    rotina_original = instance.valor_original('rotina_id')
+    chave_original = (rotina.cliente_id, rotina.ferramenta_id)
+    if rotina_original and rotina_original != instance.rotina_id:
+        chave_original = _chaves_das_rotinas(rotina_original).get(rotina_original)
+    with transaction.atomic():
+        snapshots.validacao_salva(instance, created)
+        evidencias.evidencia_salva(instance)
+        resumos.validacao_salva(instance, created, chave_original)
+        retencao.marcar_alteradas(instance.rotina_id, rotina_original)
+        registrar_alteracao(rotina.cliente_id, chave_original and chave_original[0])
+
+
+@receiver(post_delete, sender=ValidacaoBackup)
+def validacao_excluida(sender, instance, **kwargs):
+    chave = _chaves_das_rotinas(instance.rotina_id).get(instance.rotina_id)
+    cliente_id = chave and chave[0]
+    with transaction.atomic():
+        snapshots.validacao_excluida(instance, cliente_id)
+        evidencias.evidencia_excluida(instance)
+        resumos.validacao_excluida(instance, chave)
+        retencao.marcar_alteradas(instance.rotina_id, instance.valor_original('rotina_id'))
+        registrar_alteracao(cliente_id)
+
+
+# --- VALIDAÇÕES CRIADAS EM LOTE (bulk_create não dispara post_save) ---
+
+@receiver(validacoes_criadas, sender=ValidacaoBackup)
+def atualizar_apos_lote(sender, validacoes, **kwargs):
+    snapshots.validacoes_criadas(validacoes)
+    evidencias.evidencias_criadas(validacoes)
+    resumos.validacoes_criadas(validacoes)
+    retencao.marcar_alteradas(*{v.rotina_id for v in validacoes})
+    registrar_alteracao(*{v.rotina.cliente_id for v in validacoes})
+
+
+# --- ROTINAS ---
+
+@receiver(post_save, sender=RotinaBackup)
+def rotina_salva(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    with transaction.atomic():
+        if not created:
+            snapshots.rotina_alterada(instance)
+            resumos.rotina_alterada(instance)
+        retencao.marcar_alteradas(instance.pk)
+        registrar_alteracao(instance.cliente_id, instance.valor_original('cliente_id'))
+
+
+@receiver(post_delete, sender=RotinaBackup)
+def rotina_excluida(sender, instance, **kwargs):
+    registrar_alteracao(instance.cliente_id, instance.valor_original('cliente_id'))
+
+
+# --- VERSÃO DOS DADOS (cache de relatórios) ---
+
+@receiver(m2m_changed, sender=RotinaBackup.servidores.through)
+def versionar_servidores_da_rotina(sender, instance, action, **kwargs):
+    # Tanto RotinaBackup quanto Servidor (lado reverso) têm cliente_id
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        registrar_alteracao(instance.cliente_id)
+
+
+@receiver(post_save, sender=Cliente)
+@receiver(post_delete, sender=Cliente)
+def versionar_cliente(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    registrar_alteracao(instance.pk)
+
+
+@receiver(post_save, sender=Servidor)
+@receiver(post_delete, sender=Servidor)
+def versionar_servidor(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    registrar_alteracao(instance.cliente_id)
+
+
+@receiver(post_save, sender=FerramentaBackup)
+@receiver(post_delete, sender=FerramentaBackup)
+def versionar_ferramenta(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    registrar_alteracao()
@@ -0,0 +1,198 @@
+"""
+Manutenção dos snapshots de "última validação" por cliente e por rotina.
+
+As funções daqui são chamadas pelos signals de ValidacaoBackup e RotinaBackup
+(apps.backups.signals) e pelo comando `reconstruir_snapshots`, que refaz tudo em lote.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import UltimaValidacaoCliente, UltimaValidacaoRotina, ValidacaoBackup
+
+TAMANHO_LOTE = 1000
+
+
+def _promover(modelo, chave, validacao):
+    """
+    Aponta o snapshot para `validacao` se ela for a mais recente (created_at, id).
+    Também cobre a edição da própria validação já apontada pelo snapshot.
+    """
+    atualizados = modelo.objects.filter(**chave).filter(
+        Q(validado_em__lt=validacao.created_at) |
+        Q(validado_em=validacao.created_at, validacao_id__lte=validacao.pk)
+    ).update(validacao=validacao, status=validacao.status, validado_em=validacao.created_at)
+
+    if not atualizados:
+        try:
+            with transaction.atomic():
+                modelo.objects.create(
+                    validacao=validacao, status=validacao.status, validado_em=validacao.created_at, **chave
+                )
+        except IntegrityError:
+            # Já existe um snapshot apontando para uma validação mais recente
+            pass
+
+
+def _recalcular(modelo, chave, filtro_validacoes):
+    ultima = ValidacaoBackup.objects.filter(**filtro_validacoes).order_by('-created_at', '-id').first()
+    if ultima is None:
+        modelo.objects.filter(**chave).delete()
+        return
+    modelo.objects.update_or_create(
+        defaults={'validacao': ultima, 'status': ultima.status, 'validado_em': ultima.created_at},
+        **chave
+    )
+
+
+def recalcular_rotina(rotina_id):
+    _recalcular(UltimaValidacaoRotina, {'rotina_id': rotina_id}, {'rotina_id': rotina_id})
+
+
+def recalcular_cliente(cliente_id):
+    _recalcular(UltimaValidacaoCliente, {'cliente_id': cliente_id}, {'rotina__cliente_id': cliente_id})
+
+
+def validacao_salva(validacao, created=False):
+    cliente_id = validacao.rotina.cliente_id
+
+    _promover(UltimaValidacaoRotina, {'rotina_id': validacao.rotina_id}, validacao)
+    if cliente_id:
+        _promover(UltimaValidacaoCliente, {'cliente_id': cliente_id}, validacao)
+    if created:
+        # Nenhum snapshot antigo pode apontar para uma validação recém-criada
+        return
+
+    # Se a validação mudou de rotina, os snapshots antigos que apontavam para ela ficaram inválidos
+    for rotina_id in UltimaValidacaoRotina.objects.filter(validacao=validacao).exclude(
+        rotina_id=validacao.rotina_id
+    ).values_list('rotina_id', flat=True):
+        recalcular_rotina(rotina_id)
+
+    antigos = UltimaValidacaoCliente.objects.filter(validacao=validacao)
+    if cliente_id:
+        antigos = antigos.exclude(cliente_id=cliente_id)
+    for antigo_id in antigos.values_list('cliente_id', flat=True):
+        recalcular_cliente(antigo_id)
+
+
+def rotina_alterada(rotina):
+    """
+    Rotina mudou de cliente: o snapshot do cliente antigo pode apontar para uma validação
+    dela (recalculado) e a última validação da rotina pode ser a mais recente do novo.
+    """
+    cliente_original = rotina.valor_original('cliente_id')
+    if cliente_original == rotina.cliente_id:
+        return
+    if cliente_original:
+        recalcular_cliente(cliente_original)
+    ultima = UltimaValidacaoRotina.objects.filter(rotina=rotina).select_related('validacao').first()
+    if ultima and rotina.cliente_id:
+        _promover(UltimaValidacaoCliente, {'cliente_id': rotina.cliente_id}, ultima.validacao)
+
+
+def _promover_em_lote(modelo, campo, ultimas):
+    """
+    _promover para várias chaves de uma vez ({chave: validação}): uma leitura travando
+    os snapshots existentes e dois INSERTs em lote, um com ON CONFLICT DO UPDATE para
+    os que avançam (bem mais leve que o CASE WHEN do bulk_update) e outro para os novos.
+    """
+    atuais = modelo.objects.select_for_update().in_bulk(list(ultimas))
+    alterados = []
+    novos = []
+    for chave, validacao in ultimas.items():
+        snapshot = atuais.get(chave)
+        if snapshot is None:
+            novos.append(modelo(
+                validacao=validacao, status=validacao.status, validado_em=validacao.created_at, **{campo: chave}
+            ))
+        elif (snapshot.validado_em, snapshot.validacao_id) <= (validacao.created_at, validacao.pk):
+            snapshot.validacao = validacao
+            snapshot.status = validacao.status
+            snapshot.validado_em = validacao.created_at
+            alterados.append(snapshot)
+    modelo.objects.bulk_create(
+        alterados, batch_size=TAMANHO_LOTE, update_conflicts=True,
+        unique_fields=[modelo._meta.pk.name], update_fields=['validacao', 'status', 'validado_em'],
+    )
+    # Conflito = snapshot criado por outra transação depois da leitura; como no _promover, fica o dela
+    modelo.objects.bulk_create(novos, batch_size=TAMANHO_LOTE, ignore_conflicts=True)
+
+
+def validacoes_criadas(validacoes):
+    """
+    Equivalente a validacao_salva para um lote de validações novas (bulk_create):
+    só a mais recente de cada rotina/cliente precisa ser promovida.
+    """
+    por_rotina = {}
+    por_cliente = {}
+    for validacao in validacoes:
+        chave = (validacao.created_at, validacao.pk)
+        atual = por_rotina.get(validacao.rotina_id)
+        if atual is None or chave > (atual.created_at, atual.pk):
+            por_rotina[validacao.rotina_id] = validacao
+        cliente_id = validacao.rotina.cliente_id
+        atual = por_cliente.get(cliente_id)
+        if cliente_id and (atual is None or chave > (atual.created_at, atual.pk)):
+            por_cliente[cliente_id] = validacao
+
+    _promover_em_lote(UltimaValidacaoRotina, 'rotina_id', por_rotina)
+    _promover_em_lote(UltimaValidacaoCliente, 'cliente_id', por_cliente)
+
+
+def validacao_excluida(validacao, cliente_id):
+    """
+    O snapshot que apontava para a validação excluída já foi removido em cascata;
+    só recalculamos quando ele não existe mais. `cliente_id` é o da rotina, consultado
+    pelo signal.
+    """
+    if not UltimaValidacaoRotina.objects.filter(rotina_id=validacao.rotina_id).exists():
+        recalcular_rotina(validacao.rotina_id)
+
+    if cliente_id and not UltimaValidacaoCliente.objects.filter(cliente_id=cliente_id).exists():
+        recalcular_cliente(cliente_id)
+
+
+def _ultimas_por(particao, queryset):
+    return queryset.annotate(
+        posicao=Window(
+            RowNumber(),
+            partition_by=F(particao),
+            order_by=[F('created_at').desc(), F('id').desc()],
+        )
+    ).filter(posicao=1).values_list(particao, 'id', 'status', 'created_at')
+
+
+def _inserir_em_lotes(modelo, campo, linhas):
+    lote = []
+    total = 0
+    for chave, validacao_id, status, created_at in linhas.iterator(chunk_size=TAMANHO_LOTE):
+        lote.append(modelo(**{campo: chave}, validacao_id=validacao_id, status=status, validado_em=created_at))
+        if len(lote) >= TAMANHO_LOTE:
+            modelo.objects.bulk_create(lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        modelo.objects.bulk_create(lote)
+        total += len(lote)
+    return total
+
+
+@transaction.atomic
+def reconstruir_snapshots():
+    """
+    Refaz todos os snapshots com uma consulta por tabela (ROW_NUMBER por rotina/cliente).
+    Retorna a quantidade de snapshots gravados (rotinas, clientes).
+    """
+    UltimaValidacaoRotina.objects.all().delete()
+    UltimaValidacaoCliente.objects.all().delete()
+
+    rotinas = _inserir_em_lotes(
+        UltimaValidacaoRotina, 'rotina_id',
+        _ultimas_por('rotina_id', ValidacaoBackup.objects.all())
+    )
+    clientes = _inserir_em_lotes(
+        UltimaValidacaoCliente, 'cliente_id',
+        _ultimas_por('rotina__cliente_id', ValidacaoBackup.objects.filter(rotina__cliente__isnull=False))
+    )
+    return rotinas, clientes
@@ -0,0 +1,1653 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+import openpyxl
+from PIL import Image, ImageFilter
+from pypdf import PdfReader
+
+from apps.clientes.models import Cliente, Servidor
+from apps.common.models import Contador
+from apps.common.pagination import paginate_keyset
+
+from . import agenda, indice_texto, parsers, retencao
+from .fila_relatorios import (
+    aplicar_limite_cache, enfileirar_relatorio, liberar_jobs_travados, processar_job, reservar_proximo_job,
+)
+from .evidencias import anotar_versoes
+from .forms import ValidacaoForm
+from .ingestao import ingerir
+from .leitura_logs import ingerir_pasta, logs_pendentes
+from .lote import criar_sem_duplicar, criar_validacoes
+from .models import (
+    ArquivoEvidencia, ConformidadeRetencao, FerramentaBackup, RelatorioJob, ResumoDiario, ResumoDiarioFerramenta, ResumoMensalRotina,
+    RotinaBackup, UltimaValidacaoCliente, UltimaValidacaoRotina, ValidacaoBackup,
+)
+from .relatorios import CABECALHOS, CAMPOS_EXPORTACAO, _em_ordem, escrever_excel, escrever_pdf, filtrar_validacoes
+from .resumos import contagens, reconstruir_resumos
+from .retencao import atualizar_conformidade
+from .versao_dados import carimbo_versao
+
+
+class DadosMixin:
+    """Cadastros mínimos para os testes: clientes, rotinas e validações."""
+
+    @classmethod
+    def criar_usuario(cls, username='tecnico'):
+        return User.objects.create_user(username=username, password='x')
+
+    @classmethod
+    def criar_cliente(cls, indice=0):
+        return Cliente.objects.create(
+            razao_social=f"Cliente {indice} Ltda", nome_fantasia=f"Cliente {indice}", cnpj=f"{indice:014d}",
+            contato_tecnico="Suporte", email_contato="suporte@exemplo.com.br",
+        )
+
+    @classmethod
+    def criar_rotina(cls, cliente, ferramenta=None, descricao='Rotina diária'):
+        ferramenta = ferramenta or FerramentaBackup.objects.get_or_create(nome='Veeam')[0]
+        return RotinaBackup.objects.create(
+            cliente=cliente, ferramenta=ferramenta, descricao=descricao, frequencia='DIARIO',
+            horario_execucao=datetime.time(2), retencao_dias=7,
+        )
+
+    @classmethod
+    def criar_servidor(cls, rotina, hostname='srv-01'):
+        servidor = Servidor.objects.create(
+            cliente_id=rotina.cliente_id, hostname=hostname, ip_address='10.0.0.1', sistema_operacional='Linux',
+        )
+        rotina.servidores.add(servidor)
+        return servidor
+
+    @classmethod
+    def criar_validacao(cls, rotina, usuario, status='SUCESSO', **campos):
+        return ValidacaoBackup.objects.create(rotina=rotina, usuario=usuario, status=status, **campos)
+
+
+class MediaTemporariaMixin:
+    """MEDIA_ROOT em um diretório temporário, apagado ao fim de cada teste."""
+
+    def setUp(self):
+        super().setUp()
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(MEDIA_ROOT=diretorio.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+
+class BuscaObservacaoTests(DadosMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = cls.criar_usuario()
+        cls.rotina = cls.criar_rotina(cls.criar_cliente())
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', "Triggers do FTS5 só existem no SQLite")
+    def test_triggers_do_fts_existem_depois_das_migracoes(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'backups_validacaobackup'")
+            gatilhos = {nome for nome, in cursor.fetchall()}
+        self.assertTrue(
+            {'backups_validacao_busca_ai', 'backups_validacao_busca_ad', 'backups_validacao_busca_au'} <= gatilhos
+        )
+
+    def test_migracoes_que_alteram_a_tabela_recriam_os_triggers(self):
+        # No SQLite alterar a tabela de validações a recria sem os triggers do FTS5 da 0012
+        for (app, nome), migracao in MigrationLoader(None, ignore_no_migrations=True).disk_migrations.items():
+            alteram = any(getattr(op, 'model_name', None) == 'validacaobackup' for op in migracao.operations)
+            if app == 'backups' and nome > '0012' and alteram:
+                with self.subTest(migracao=nome):
+                    ultima = migracao.operations[-1]
+                    self.assertEqual(getattr(getattr(ultima, 'code', None), '__name__', None), 'recriar_gatilhos')
+
+    def test_validacao_criada_depois_das_migracoes_aparece_na_busca(self):
+        validacao = self.criar_validacao(self.rotina, self.usuario, observacao="Falha quuxzzy no job")
+        self.criar_validacao(self.rotina, self.usuario, observacao="Tudo certo")
+        self.assertEqual(list(filtrar_validacoes({'busca': 'quuxzzy'})), [validacao])
+
+    def test_observacao_editada_e_excluida_atualiza_a_busca(self):
+        validacao = self.criar_validacao(self.rotina, self.usuario, observacao="Primeira versão")
+        validacao.observacao = "Texto zzyqux corrigido"
+        validacao.save()
+        self.assertEqual(filtrar_validacoes({'busca': 'Primeira'}).count(), 0)
+        self.assertEqual(filtrar_validacoes({'busca': 'zzyqux'}).count(), 1)
+        validacao.delete()
+        self.assertEqual(filtrar_validacoes({'busca': 'zzyqux'}).count(), 0)
+
+
+class IngestaoIdempotenteTests(DadosMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agente_a = cls.criar_usuario('agente_a')
+        cls.agente_b = cls.criar_usuario('agente_b')
+        cls.criar_rotina(cls.criar_cliente(1))
+        cls.criar_rotina(cls.criar_cliente(2))
+
+    def _item(self, cliente, chave='job-1', status='SUCESSO'):
+        return {'cnpj': f"{cliente:014d}", 'rotina': 'Rotina diária', 'status': status, 'chave': chave}
+
+    def test_reenvio_do_mesmo_usuario_nao_duplica(self):
+        primeiro = ingerir(enumerate([self._item(1)], 1), self.agente_a)
+        reenvio = ingerir(enumerate([self._item(1), self._item(1, 'job-2')], 1), self.agente_a)
+        self.assertEqual((primeiro['criados'], primeiro['duplicados']), (1, 0))
+        self.assertEqual((reenvio['criados'], reenvio['duplicados']), (1, 1))
+        self.assertEqual(ValidacaoBackup.objects.count(), 2)
+
+    def test_mesma_chave_de_usuarios_diferentes_grava_as_duas(self):
+        ingerir(enumerate([self._item(1)], 1), self.agente_a)
+        resultado = ingerir(enumerate([self._item(2)], 1), self.agente_b)
+        self.assertEqual((resultado['criados'], resultado['duplicados']), (1, 0))
+        self.assertEqual(
+            set(ValidacaoBackup.objects.values_list('usuario__username', 'rotina__cliente__cnpj')),
+            {('agente_a', f"{1:014d}"), ('agente_b', f"{2:014d}")},
+        )
+
+    def test_chave_repetida_no_mesmo_lote_conta_como_duplicada(self):
+        resultado = ingerir(enumerate([self._item(1), self._item(1, status='ERRO')], 1), self.agente_a)
+        self.assertEqual((resultado['criados'], resultado['duplicados']), (1, 1))
+
+    def test_chave_gravada_por_outra_requisicao_durante_o_insert_e_duplicada(self):
+        rotina = RotinaBackup.objects.first()
+        bulk_create = ValidacaoBackup.objects.bulk_create
+
+        def outra_requisicao_grava_antes(validacoes, **kwargs):
+            ValidacaoBackup.objects.create(
+                rotina=rotina, usuario=self.agente_a, status='SUCESSO', chave_idempotencia='job-1',
+            )
+            return bulk_create(validacoes, **kwargs)
+
+        novas = [
+            ValidacaoBackup(rotina=rotina, usuario=self.agente_a, status='ERRO', chave_idempotencia=chave)
+            for chave in ('job-1', 'job-2')
+        ]
+        # Dentro de uma transação de quem chamou, que continua utilizável depois do conflito
+        with transaction.atomic(), mock.patch.object(
+            ValidacaoBackup.objects, 'bulk_create', side_effect=outra_requisicao_grava_antes,
+        ):
+            criadas, duplicadas = criar_sem_duplicar(novas)
+            self.assertEqual(ValidacaoBackup.objects.count(), 2)
+        self.assertEqual([validacao.chave_idempotencia for validacao in criadas], ['job-2'])
+        self.assertIsNotNone(criadas[0].pk)
+        self.assertEqual(duplicadas, {(self.agente_a.pk, 'job-1')})
+        self.assertEqual(ValidacaoBackup.objects.get(chave_idempotencia='job-1').status, 'SUCESSO')
+
+
+class OrcamentoQueriesTests(MediaTemporariaMixin, DadosMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = cls.criar_usuario()
+        cls.cliente = cls.criar_cliente()
+        cls.rotina = cls.criar_rotina(cls.cliente)
+        cls.criar_servidor(cls.rotina)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+        # Processamento/indexação das evidências roda em threads, fora do orçamento da requisição
+        agendamento = mock.patch('apps.backups.evidencias._submeter')
+        agendamento.start()
+        self.addCleanup(agendamento.stop)
+
+    def _queries(self, url, **kwargs):
+        # Os callbacks de on_commit (evidências) também contam no orçamento da requisição
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            resposta = self.client.post(url, **kwargs) if 'data' in kwargs else self.client.get(url)
+        self.assertLess(resposta.status_code, 400)
+        return len(consultas)
+
+    def test_previa_do_painel_de_relatorios_nao_consulta_por_linha(self):
+        url = reverse('painel_relatorios')
+        for indice in range(3):
+            self.criar_validacao(self.rotina, self.usuario)
+        poucas = self._queries(url)
+        for indice in range(3, 30):
+            rotina = self.criar_rotina(self.criar_cliente(indice + 1), descricao=f"Rotina {indice}")
+            self.criar_servidor(rotina, f"srv-{indice}")
+            self.criar_validacao(rotina, self.usuario)
+        self.assertEqual(self._queries(url), poucas)
+        self.assertLessEqual(poucas, settings.METRICAS_ORCAMENTO_QUERIES['painel_relatorios'])
+        self.assertContains(self.client.get(url), 'srv-29')
+
+    def test_nova_validacao_dentro_do_orcamento(self):
+        # Contadores de versão já existentes, como em produção
+        self.criar_validacao(self.rotina, self.usuario)
+        total = self._queries(reverse('nova_validacao', args=[self.cliente.pk]), data={
+            'rotina': self.rotina.pk, 'status': 'SUCESSO', 'observacao': 'ok',
+            'evidencia': SimpleUploadedFile('job.txt', b'Job finished: Success'),
+        })
+        self.assertEqual(ValidacaoBackup.objects.count(), 2)
+        self.assertLessEqual(total, settings.METRICAS_ORCAMENTO_QUERIES['nova_validacao'])
+
+
+class DashboardQueriesTests(DadosMixin, TestCase):
+    CLIENTES = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = cls.criar_usuario()
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def _popular(self, inicio, quantidade):
+        for indice in range(inicio, inicio + quantidade):
+            rotina = self.criar_rotina(self.criar_cliente(indice))
+            self.criar_servidor(rotina, f"srv-{indice}")
+            for status in ('SUCESSO', 'ERRO'):
+                self.criar_validacao(rotina, self.usuario, status=status)
+
+    def _consultas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+        return len(consultas)
+
+    def test_numero_de_queries_nao_cresce_com_os_clientes(self):
+        self._popular(0, self.CLIENTES)
+        self._consultas()
+        poucos = self._consultas()
+        self.assertLessEqual(poucos, settings.METRICAS_ORCAMENTO_QUERIES['dashboard'])
+
+        self._popular(self.CLIENTES, 9 * self.CLIENTES)
+        # Primeiro acesso depois das escritas: refaz a agenda (versão dos dados nova)
+        self._consultas()
+        with self.assertNumQueries(poucos):
+            resposta = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(resposta.context['clientes']), 10 * self.CLIENTES)
+
+    def test_primeiro_acesso_depois_de_escritas_nao_cresce_com_os_clientes(self):
+        self._popular(0, self.CLIENTES)
+        poucos = self._consultas()
+        self._popular(self.CLIENTES, 9 * self.CLIENTES)
+        self.assertEqual(self._consultas(), poucos)
+
+    def test_dashboard_nao_grava_nada(self):
+        self._popular(0, self.CLIENTES)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('dashboard'))
+        escritas = [
+            consulta['sql'] for consulta in consultas
+            if consulta['sql'].split(None, 1)[0].upper() in ('INSERT', 'UPDATE', 'DELETE')
+            and 'django_session' not in consulta['sql']
+        ]
+        self.assertEqual(escritas, [])
+
+    def test_agenda_so_e_refeita_quando_os_dados_mudam(self):
+        self._popular(0, self.CLIENTES)
+        with mock.patch('apps.backups.views.verificar_agenda', return_value={}) as verificar:
+            self._consultas()
+            self._consultas()
+            self.assertEqual(verificar.call_count, 1)
+            self._popular(self.CLIENTES, 1)
+            self._consultas()
+            self.assertEqual(verificar.call_count, 2)
+
+
+class HistoricoGlobalTests(DadosMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = cls.criar_usuario()
+        cls.rotina = cls.criar_rotina(cls.criar_cliente())
+        for indice in range(25):
+            cls.criar_validacao(cls.rotina, cls.usuario, 'ERRO' if indice % 5 == 0 else 'SUCESSO')
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_total_vem_dos_resumos_e_nao_do_tamanho_da_pagina(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('historico_global'), {'por_pagina': 10})
+        self.assertEqual(resposta.context['total_registros'], 25)
+        self.assertContains(resposta, '25 registros')
+        self.assertFalse([c['sql'] for c in consultas if 'COUNT(' in c['sql'] and 'backups_validacaobackup' in c['sql']])
+        self.assertLessEqual(len(consultas), settings.METRICAS_ORCAMENTO_QUERIES['historico_global'])
+        resposta = self.client.get(reverse('historico_global'), {'status': 'ERRO'})
+        self.assertEqual(resposta.context['total_registros'], 5)
+
+    def test_busca_textual_nao_mostra_total(self):
+        resposta = self.client.get(reverse('historico_global'), {'busca': 'Rotina', 'por_pagina': 10})
+        self.assertIsNone(resposta.context['total_registros'])
+        self.assertNotContains(resposta, 'registros')
+
+
+class IndicesValidacaoMixin(DadosMixin):
+    """
+    EXPLAIN das consultas principais de ValidacaoBackup: cada uma deve usar o índice
+    composto pensado para ela (ver ValidacaoBackup.Meta.indexes).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = cls.criar_cliente()
+        cls.rotina = cls.criar_rotina(cls.cliente)
+        hoje = timezone.localdate()
+        cls.periodo = {'data_inicio': (hoje - datetime.timedelta(days=30)).isoformat(), 'data_fim': hoje.isoformat()}
+
+    def assertUsaIndice(self, queryset, indice):
+        plano = queryset.explain()
+        self.assertIn(indice, plano, f"{indice} não aparece no plano:\n{plano}")
+
+    def test_historico_sem_filtros(self):
+        self.assertUsaIndice(ValidacaoBackup.objects.order_by('-created_at', '-id')[:51], 'validacao_data_id_idx')
+
+    def test_relatorio_por_periodo(self):
+        self.assertUsaIndice(filtrar_validacoes(self.periodo)[:51], 'validacao_data_id_idx')
+
+    def test_relatorio_por_status_e_periodo(self):
+        self.assertUsaIndice(
+            filtrar_validacoes({'status': 'ERRO', **self.periodo})[:51], 'validacao_status_data_idx'
+        )
+
+    def test_relatorio_por_cliente_e_periodo(self):
+        self.assertUsaIndice(
+            filtrar_validacoes({'cliente': self.cliente.pk, **self.periodo})[:51], 'validacao_rotina_data_idx'
+        )
+
+    def test_validacoes_de_uma_rotina_por_periodo(self):
+        self.assertUsaIndice(
+            ValidacaoBackup.objects.filter(
+                rotina_id=self.rotina.pk, created_at__gte=timezone.now() - datetime.timedelta(days=30)
+            ).order_by('-created_at')[:51],
+            'validacao_rotina_data_idx',
+        )
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "Planos esperados do SQLite")
+class IndicesValidacaoSQLiteTests(IndicesValidacaoMixin, TestCase):
+    pass
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "Planos esperados do PostgreSQL")
+class IndicesValidacaoPostgreSQLTests(IndicesValidacaoMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Em bases pequenas o PostgreSQL prefere seq scan; aqui interessa se o índice é utilizável.
+        # SET LOCAL vale até o fim da transação que envolve cada teste
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+
+class RelatorioPdfTests(DadosMixin, TestCase):
+    def test_janela_limita_as_tarefas_pendentes(self):
+        lidos = []
+
+        def itens():
+            for item in range(20):
+                lidos.append(item)
+                yield item
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            resultados = []
+            for resultado in _em_ordem(pool, lambda item: item * 2, itens(), janela=4):
+                # Até 4 pendentes, mais o item lido que espera a vaga
+                self.assertLessEqual(len(lidos), len(resultados) + 5)
+                resultados.append(resultado)
+        self.assertEqual(resultados, [item * 2 for item in range(20)])
+
+    def test_pdf_em_partes_paralelas_tem_todas_as_paginas_numeradas(self):
+        usuario = self.criar_usuario()
+        rotina = self.criar_rotina(self.criar_cliente())
+        for _ in range(5):
+            self.criar_validacao(rotina, usuario)
+
+        destino = io.BytesIO()
+        self.assertTrue(escrever_pdf(filtrar_validacoes({}), destino, 'tecnico', workers=2, linhas_por_parte=2))
+        paginas = PdfReader(io.BytesIO(destino.getvalue())).pages
+        self.assertEqual(len(paginas), 3)
+        self.assertIn("Página 3 de 3", paginas[-1].extract_text())
+
+
+class ExportacaoTests(DadosMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = cls.criar_usuario()
+        cls.cliente = cls.criar_cliente()
+        cls.rotina = cls.criar_rotina(cls.cliente, descricao='Cópia "diária", completa')
+        cls.servidor = cls.criar_servidor(cls.rotina)
+        cls.outra_rotina = cls.criar_rotina(cls.criar_cliente(1))
+        cls.erro = cls.criar_validacao(cls.rotina, cls.usuario, 'ERRO', observacao='Disco cheio;\nfita "LTO-7", 85,5% usada')
+        cls.sucesso = cls.criar_validacao(cls.outra_rotina, cls.usuario)
+        # 01:30 UTC do dia 10 ainda é o dia 9 em São Paulo
+        ValidacaoBackup.objects.filter(pk=cls.erro.pk).update(
+            created_at=datetime.datetime(2026, 3, 10, 1, 30, tzinfo=datetime.timezone.utc)
+        )
+        ValidacaoBackup.objects.filter(pk=cls.sucesso.pk).update(
+            created_at=datetime.datetime(2026, 3, 10, 12, 0, 0, 250000, tzinfo=datetime.timezone.utc)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def _exportar(self, **params):
+        resposta = self.client.get(reverse('exportar_validacoes'), params)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta, b''.join(resposta.streaming_content).decode()
+
+    def test_csv_tem_cabecalho_e_campos_com_aspas(self):
+        resposta, corpo = self._exportar(formato='csv')
+        self.assertEqual(resposta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertRegex(resposta['Content-Disposition'], r'^attachment; filename="Validacoes_\d{2}-\d{2}-\d{4}\.csv"$')
+
+        cabecalho, *linhas = list(csv.reader(io.StringIO(corpo, newline='')))
+        self.assertEqual(cabecalho, CAMPOS_EXPORTACAO)
+        self.assertEqual([int(linha[0]) for linha in linhas], [self.sucesso.pk, self.erro.pk])
+        erro = dict(zip(cabecalho, linhas[1]))
+        self.assertEqual(erro['rotina'], 'Cópia "diária", completa')
+        self.assertEqual(erro['observacao'], 'Disco cheio;\nfita "LTO-7", 85,5% usada')
+        self.assertEqual(erro['servidor'], 'srv-01')
+        self.assertEqual(erro['status'], 'ERRO')
+        self.assertEqual(dict(zip(cabecalho, linhas[0]))['servidor'], '')
+
+    def test_ndjson_um_objeto_por_linha(self):
+        resposta, corpo = self._exportar(formato='ndjson')
+        self.assertEqual(resposta['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertTrue(corpo.endswith('\n'))
+        self.assertIn('Cópia', corpo)
+
+        sucesso, erro = [json.loads(linha) for linha in corpo.splitlines()]
+        self.assertEqual(list(erro), CAMPOS_EXPORTACAO)
+        self.assertEqual(erro['id'], self.erro.pk)
+        self.assertEqual(erro['cliente_id'], self.cliente.pk)
+        self.assertEqual(erro['rotina_id'], self.rotina.pk)
+        self.assertIsNone(sucesso['servidor'])
+        self.assertEqual(erro['observacao'], 'Disco cheio;\nfita "LTO-7", 85,5% usada')
+
+    def test_datas_em_iso_8601_com_fuso(self):
+        _, corpo = self._exportar(formato='ndjson')
+        sucesso, erro = [json.loads(linha) for linha in corpo.splitlines()]
+        self.assertEqual(erro['created_at'], '2026-03-10T01:30:00+00:00')
+        self.assertEqual(
+            datetime.datetime.fromisoformat(sucesso['created_at']),
+            datetime.datetime(2026, 3, 10, 12, 0, 0, 250000, tzinfo=datetime.timezone.utc),
+        )
+
+    def test_filtros(self):
+        for params, esperados in (
+            ({'status': 'ERRO'}, [self.erro.pk]),
+            ({'cliente': self.cliente.pk}, [self.erro.pk]),
+            ({'data_inicio': '2026-03-09', 'data_fim': '2026-03-09'}, [self.erro.pk]),
+            ({'data_inicio': '2026-03-10'}, [self.sucesso.pk]),
+            ({'data_fim': '2026-03-08'}, []),
+            ({'busca': 'LTO-7'}, [self.erro.pk]),
+        ):
+            with self.subTest(params):
+                _, corpo = self._exportar(formato='ndjson', **params)
+                self.assertEqual([json.loads(linha)['id'] for linha in corpo.splitlines()], esperados)
+        _, corpo = self._exportar(formato='csv', status='ALERTA')
+        self.assertEqual(corpo, ','.join(CAMPOS_EXPORTACAO) + '\r\n')
+
+    def test_formato_invalido(self):
+        resposta = self.client.get(reverse('exportar_validacoes'), {'formato': 'xml'})
+        self.assertEqual(resposta.status_code, 400)
+
+    def test_excel_relido_pelo_openpyxl(self):
+        destino = io.BytesIO()
+        escrever_excel(filtrar_validacoes({}), destino)
+        planilha = openpyxl.load_workbook(io.BytesIO(destino.getvalue()))['Relatório de Backups']
+
+        cabecalho, *linhas = planilha.iter_rows(values_only=True)
+        self.assertEqual(list(cabecalho), CABECALHOS)
+        self.assertTrue(planilha['A1'].font.b)
+        self.assertEqual(planilha.column_dimensions['E'].width, 42)
+        self.assertEqual(linhas, [
+            ('10/03/2026 09:00', 'Cliente 1', '-', 'Veeam', 'Rotina diária', '✅ Sucesso', 'tecnico'),
+            ('09/03/2026 22:30', 'Cliente 0', 'srv-01', 'Veeam', 'Cópia "diária", completa', '❌ Erro', 'tecnico'),
+        ])
+
+
+class VersaoDadosTests(DadosMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = cls.criar_usuario()
+        cls.cliente = cls.criar_cliente()
+        cls.rotina = cls.criar_rotina(cls.cliente)
+
+    def test_versao_muda_junto_com_a_escrita(self):
+        outro = self.criar_cliente(2)
+        carimbos = carimbo_versao(), carimbo_versao(self.cliente.pk), carimbo_versao(outro.pk)
+        with transaction.atomic():
+            self.criar_validacao(self.rotina, self.usuario)
+            # Quem enxerga a validação nova já enxerga a versão nova
+            self.assertNotEqual(carimbo_versao(), carimbos[0])
+            self.assertNotEqual(carimbo_versao(self.cliente.pk), carimbos[1])
+        self.assertEqual(carimbo_versao(outro.pk), carimbos[2])
+        # Só contadores por cliente e o compartilhado: nenhuma linha disputada por todos
+        self.assertFalse(Contador.objects.filter(chave='dados:versao').exists())
+
+    def test_alteracao_desfeita_nao_muda_a_versao(self):
+        carimbos = carimbo_versao(), carimbo_versao(self.cliente.pk)
+        try:
+            with transaction.atomic():
+                self.criar_validacao(self.rotina, self.usuario)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual((carimbo_versao(), carimbo_versao(self.cliente.pk)), carimbos)
+
+    def test_alteracao_compartilhada_muda_a_versao_de_todos(self):
+        carimbos = carimbo_versao(), carimbo_versao(self.cliente.pk)
+        self.rotina.ferramenta.save()
+        self.assertNotEqual(carimbo_versao(), carimbos[0])
+        self.assertNotEqual(carimbo_versao(self.cliente.pk), carimbos[1])
+
+
+class SnapshotsTests(DadosMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = cls.criar_usuario()
+        cls.cliente_a = cls.criar_cliente(1)
+        cls.cliente_b = cls.criar_cliente(2)
+
+    def _ultima(self, cliente):
+        return UltimaValidacaoCliente.objects.filter(cliente=cliente).values_list('validacao_id', flat=True).first()
+
+    def test_rotina_que_muda_de_cliente_atualiza_os_dois_snapshots(self):
+        antiga = self.criar_validacao(self.criar_rotina(self.cliente_a, descricao='Arquivos'), self.usuario)
+        movida = self.criar_rotina(self.cliente_a, descricao='SQL')
+        recente = self.criar_validacao(movida, self.usuario, status='ERRO')
+        self.assertEqual(self._ultima(self.cliente_a), recente.pk)
+
+        movida = RotinaBackup.objects.get(pk=movida.pk)
+        movida.cliente = self.cliente_b
+        movida.save()
+        self.assertEqual(self._ultima(self.cliente_a), antiga.pk)
+        self.assertEqual(self._ultima(self.cliente_b), recente.pk)
+
+    def test_cliente_sem_outras_rotinas_fica_sem_snapshot(self):
+        rotina = self.criar_rotina(self.cliente_a)
+        validacao = self.criar_validacao(rotina, self.usuario)
+        rotina = RotinaBackup.objects.get(pk=rotina.pk)
+        rotina.cliente = self.cliente_b
+        rotina.save()
+        self.assertIsNone(self._ultima(self.cliente_a))
+        self.assertEqual(self._ultima(self.cliente_b), validacao.pk)
+
+
+class DadosSinteticosTests(MediaTemporariaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        indexacao = mock.patch('apps.backups.evidencias._submeter')
+        indexacao.start()
+        self.addCleanup(indexacao.stop)
+
+    def _gerar(self, validacoes):
+        call_command(
+            'gerar_dados_sinteticos', clientes=2, servidores=2, validacoes=validacoes, dias=3, lote=4,
+            stdout=io.StringIO(),
+        )
+
+    def test_evidencia_sintetica_tem_as_referencias_das_validacoes(self):
+        self._gerar(10)
+        self._gerar(5)
+        nomes = set(ValidacaoBackup.objects.values_list('evidencia', flat=True))
+        self.assertEqual(len(nomes), 1)
+        arquivo = ArquivoEvidencia.objects.get(caminho=nomes.pop())
+        self.assertEqual(arquivo.referencias, 15)
+        self.assertTrue(ValidacaoBackup._meta.get_field('evidencia').storage.exists(arquivo.caminho))
+
+    def test_limpar_libera_as_referencias_e_o_arquivo(self):
+        self._gerar(10)
+        caminho = ValidacaoBackup.objects.values_list('evidencia', flat=True).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('gerar_dados_sinteticos', limpar=True, stdout=io.StringIO())
+        self.assertFalse(ValidacaoBackup.objects.exists())
+        self.assertFalse(ArquivoEvidencia.objects.filter(caminho=caminho).exists())
+        self.assertFalse(ValidacaoBackup._meta.get_field('evidencia').storage.exists(caminho))
+
+
+class ReferenciasEvidenciaTests(MediaTemporariaMixin, DadosMixin, TestCase):
+    CONTEUDO = b'Job finished: Success'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = cls.criar_usuario()
+        cls.rotina = cls.criar_rotina(cls.criar_cliente())
+
+    def setUp(self):
+        super().setUp()
+        indexacao = mock.patch('apps.backups.evidencias._submeter')
+        indexacao.start()
+        self.addCleanup(indexacao.stop)
+
+    def _enviar(self):
+        return self.criar_validacao(
+            self.rotina, self.usuario, evidencia=SimpleUploadedFile('job.txt', self.CONTEUDO)
+        )
+
+    def _existe(self, caminho):
+        return ValidacaoBackup._meta.get_field('evidencia').storage.exists(caminho)
+
+    def test_upload_conta_uma_referencia(self):
+        validacao = self._enviar()
+        self.assertEqual(ArquivoEvidencia.objects.get(caminho=validacao.evidencia.name).referencias, 1)
+
+    def test_uploads_iguais_compartilham_o_arquivo_ate_a_ultima_exclusao(self):
+        primeira, segunda = self._enviar(), self._enviar()
+        caminho = primeira.evidencia.name
+        self.assertEqual(segunda.evidencia.name, caminho)
+        self.assertEqual(ArquivoEvidencia.objects.get(caminho=caminho).referencias, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            primeira.delete()
+        self.assertTrue(self._existe(caminho))
+        with self.captureOnCommitCallbacks(execute=True):
+            segunda.delete()
+        self.assertFalse(ArquivoEvidencia.objects.filter(caminho=caminho).exists())
+        self.assertFalse(self._existe(caminho))
+
+    def test_upload_antes_da_remocao_pendente_mantem_o_arquivo(self):
+        antiga = self._enviar()
+        with self.captureOnCommitCallbacks() as remocao:
+            antiga.delete()
+        # O upload reaproveita o arquivo antes de a remoção (on_commit) rodar
+        nova = self._enviar()
+        for callback in remocao:
+            callback()
+        self.assertTrue(self._existe(nova.evidencia.name))
+        self.assertEqual(ArquivoEvidencia.objects.get(caminho=nova.evidencia.name).referencias, 1)
+
+    def test_evidencia_de_chave_duplicada_no_insert_nao_fica_referenciada(self):
+        bulk_create = ValidacaoBackup.objects.bulk_create
+
+        def outra_requisicao_grava_antes(validacoes, **kwargs):
+            self.criar_validacao(self.rotina, self.usuario, chave_idempotencia='job-1')
+            return bulk_create(validacoes, **kwargs)
+
+        nova = ValidacaoBackup(
+            rotina=self.rotina, usuario=self.usuario, status='ERRO', chave_idempotencia='job-1',
+            evidencia=SimpleUploadedFile('job.txt', self.CONTEUDO),
+        )
+        with mock.patch.object(ValidacaoBackup.objects, 'bulk_create', side_effect=outra_requisicao_grava_antes):
+            with self.captureOnCommitCallbacks(execute=True):
+                criadas, _duplicadas = criar_sem_duplicar([nova])
+        self.assertEqual(criadas, [])
+        self.assertFalse(ArquivoEvidencia.objects.filter(caminho=nova.evidencia.name).exists())
+        self.assertFalse(self._existe(nova.evidencia.name))
+
+    def test_upload_depois_da_remocao_grava_o_arquivo_de_novo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._enviar().delete()
+        nova = self._enviar()
+        self.assertTrue(self._existe(nova.evidencia.name))
+        arquivo = ArquivoEvidencia.objects.get(caminho=nova.evidencia.name)
+        self.assertEqual(arquivo.referencias, 1)
+        self.assertGreater(arquivo.tamanho, 0)
+
+
+class PaginacaoKeysetTests(DadosMixin, TestCase):
+    ORDEM = ['status', '-created_at', '-id']
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = cls.criar_usuario()
+        rotina = cls.criar_rotina(cls.criar_cliente())
+        for indice in range(11):
+            cls.criar_validacao(rotina, usuario, status='ALERTA' if indice % 3 else 'SUCESSO')
+        # Empates no created_at (e microssegundos, que o cursor não pode perder)
+        momento = timezone.now().replace(microsecond=123456)
+        ValidacaoBackup.objects.filter(pk__in=ValidacaoBackup.objects.values('pk')[:6]).update(created_at=momento)
+        cls.esperados = list(ValidacaoBackup.objects.order_by(*cls.ORDEM).values_list('pk', flat=True))
+
+    def _pagina(self, cursor=None):
+        return paginate_keyset(ValidacaoBackup.objects.all(), self.ORDEM, cursor, page_size=3)
+
+    def test_avancar_e_voltar_percorre_todas_as_linhas_sem_repetir(self):
+        paginas = [self._pagina()]
+        while paginas[-1].has_next:
+            paginas.append(self._pagina(paginas[-1].next_cursor))
+        self.assertEqual([v.pk for pagina in paginas for v in pagina], self.esperados)
+        self.assertFalse(paginas[0].has_previous)
+
+        pagina = paginas[-1]
+        for anterior in reversed(paginas[:-1]):
+            pagina = self._pagina(pagina.previous_cursor)
+            self.assertEqual([v.pk for v in pagina], [v.pk for v in anterior])
+        self.assertFalse(pagina.has_previous)
+
+    def test_cursor_invalido_levanta_value_error(self):
+        for cursor in ('nao-e-base64!', 'eyJkIjoibiJ9', self._pagina().next_cursor[:-4]):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                self._pagina(cursor)
+
+
+class FilaRelatoriosTests(MediaTemporariaMixin, DadosMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = cls.criar_usuario()
+
+    def _enfileirar(self, status):
+        return enfileirar_relatorio('EXCEL', {'status': status}, self.usuario)
+
+    def test_solicitacao_pela_view_so_enfileira(self):
+        self.client.force_login(self.usuario)
+        with mock.patch('apps.backups.fila_relatorios.escrever_excel') as escrever:
+            resposta = self.client.post(reverse('solicitar_relatorio'), {'formato': 'EXCEL', 'status': 'ERRO'})
+        self.assertEqual(resposta.status_code, 202)
+        self.assertEqual(resposta.json()['status'], 'PENDENTE')
+        escrever.assert_not_called()
+
+    def test_pedido_igual_reaproveita_o_job_pendente(self):
+        job = self._enfileirar('ERRO')
+        self.assertEqual(self._enfileirar(' ERRO ').pk, job.pk)
+        self.assertNotEqual(self._enfileirar('ALERTA').pk, job.pk)
+
+    def test_workers_reservam_jobs_diferentes_na_ordem_da_fila(self):
+        primeiro, segundo = self._enfileirar('ERRO'), self._enfileirar('ALERTA')
+        reservados = [reservar_proximo_job(), reservar_proximo_job(), reservar_proximo_job()]
+        self.assertEqual([job and job.pk for job in reservados], [primeiro.pk, segundo.pk, None])
+        self.assertEqual(RelatorioJob.objects.get(pk=primeiro.pk).status, 'PROCESSANDO')
+
+    def test_job_reservado_por_outro_worker_depois_da_consulta_e_pulado(self):
+        primeiro, segundo = self._enfileirar('ERRO'), self._enfileirar('ALERTA')
+        agora = timezone.now
+
+        def outro_worker_reserva_o_primeiro():
+            # Roda entre a lista de candidatos e o UPDATE condicional do primeiro
+            RelatorioJob.objects.filter(pk=primeiro.pk).update(status='PROCESSANDO')
+            return agora()
+
+        with mock.patch('apps.backups.fila_relatorios.timezone.now', side_effect=outro_worker_reserva_o_primeiro):
+            reservado = reservar_proximo_job()
+        self.assertEqual(reservado.pk, segundo.pk)
+
+    def test_job_travado_volta_para_a_fila(self):
+        job = self._enfileirar('ERRO')
+        reservar_proximo_job()
+        RelatorioJob.objects.filter(pk=job.pk).update(iniciado_em=timezone.now() - datetime.timedelta(minutes=31))
+        self.assertEqual(liberar_jobs_travados(30), 1)
+        self.assertEqual(reservar_proximo_job().pk, job.pk)
+
+    def _concluido(self, status, horas_atras):
+        job = self._enfileirar(status)
+        job.arquivo.save(f'{status}.xlsx', ContentFile(b'x' * 10), save=False)
+        job.status, job.tamanho = 'CONCLUIDO', 10
+        job.concluido_em = job.ultimo_acesso = timezone.now() - datetime.timedelta(hours=horas_atras)
+        job.save()
+        return job
+
+    def test_limite_do_cache_remove_primeiro_o_menos_acessado(self):
+        antigo, medio, novo = self._concluido('ERRO', 3), self._concluido('ALERTA', 2), self._concluido('SUCESSO', 1)
+        self.client.force_login(self.usuario)
+        # O download conta como acesso: o mais antigo passa a ser o mais recente
+        self.assertEqual(self.client.get(reverse('baixar_relatorio', args=[antigo.pk])).status_code, 200)
+        self.assertEqual(aplicar_limite_cache(20), 1)
+        self.assertEqual(
+            dict(RelatorioJob.objects.values_list('pk', 'status')),
+            {antigo.pk: 'CONCLUIDO', medio.pk: 'EXPIRADO', novo.pk: 'CONCLUIDO'},
+        )
+        self.assertFalse(medio.arquivo.storage.exists(medio.arquivo.name))
+
+    def test_cache_invalidado_quando_os_dados_mudam(self):
+        cliente, outro = self.criar_cliente(1), self.criar_cliente(2)
+        rotina, outra = self.criar_rotina(cliente), self.criar_rotina(outro)
+        self.criar_validacao(rotina, self.usuario, 'ERRO')
+        filtros = {'cliente': str(cliente.pk)}
+        job = enfileirar_relatorio('EXCEL', filtros, self.usuario)
+        processar_job(reservar_proximo_job())
+        self.assertEqual(enfileirar_relatorio('EXCEL', filtros, self.usuario).pk, job.pk)
+        # Escrita em outro cliente não invalida o relatório filtrado
+        self.criar_validacao(outra, self.usuario, 'ERRO')
+        self.assertEqual(enfileirar_relatorio('EXCEL', filtros, self.usuario).pk, job.pk)
+        self.criar_validacao(rotina, self.usuario, 'ERRO')
+        novo = enfileirar_relatorio('EXCEL', filtros, self.usuario)
+        self.assertNotEqual(novo.pk, job.pk)
+        self.assertEqual(novo.status, 'PENDENTE')
+
+
+class ResumosTests(DadosMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = cls.criar_usuario()
+        cls.clientes = [cls.criar_cliente(1), cls.criar_cliente(2)]
+        cls.rotina = cls.criar_rotina(cls.clientes[0])
+        cls.outra = cls.criar_rotina(cls.clientes[1], FerramentaBackup.objects.create(nome='Acronis'), 'Rotina semanal')
+
+    def _resumos(self):
+        return {
+            modelo.__name__: sorted(modelo.objects.values_list(*campos))
+            for modelo, campos in (
+                (ResumoDiario, ('dia', 'cliente_id', 'ferramenta_id', 'status', 'quantidade')),
+                (ResumoDiarioFerramenta, ('dia', 'ferramenta_id', 'status', 'quantidade')),
+                (ResumoMensalRotina, ('mes', 'rotina_id', 'status', 'quantidade')),
+            )
+        }
+
+    def assertResumosIguaisAosRecalculados(self):
+        mantidos = self._resumos()
+        reconstruir_resumos()
+        self.assertEqual(mantidos, self._resumos())
+
+    def test_escritas_mantem_os_resumos_iguais_aos_recalculados(self):
+        erro = self.criar_validacao(self.rotina, self.usuario, 'ERRO')
+        alerta = self.criar_validacao(self.rotina, self.usuario, 'ALERTA')
+        self.criar_validacao(self.outra, self.usuario)
+        criar_validacoes([
+            ValidacaoBackup(rotina=rotina, usuario=self.usuario, status=status)
+            for rotina, status in ((self.rotina, 'SUCESSO'), (self.outra, 'ERRO'), (self.outra, 'ERRO'))
+        ])
+        self.assertResumosIguaisAosRecalculados()
+
+        erro.status = 'SUCESSO'
+        erro.save()
+        alerta.rotina = self.outra
+        alerta.save()
+        self.assertResumosIguaisAosRecalculados()
+
+        alerta.delete()
+        self.assertResumosIguaisAosRecalculados()
+
+    def test_rotina_que_muda_de_cliente_leva_as_contagens(self):
+        for status in ('SUCESSO', 'ERRO', 'ERRO'):
+            self.criar_validacao(self.rotina, self.usuario, status)
+        self.rotina.cliente = self.clientes[1]
+        self.rotina.save()
+        self.assertResumosIguaisAosRecalculados()
+
+        hoje = timezone.localdate()
+        [primeiro] = contagens(hoje, hoje, clientes_ids=[self.clientes[0].pk])
+        [segundo] = contagens(hoje, hoje, clientes_ids=[self.clientes[1].pk])
+        self.assertEqual((primeiro['total'], segundo['total'], segundo['erro']), (0, 3, 2))
+        self.assertAlmostEqual(segundo['taxa_erro'], 2 / 3)
+
+    def test_dependentes_da_validacao_sao_gravados_juntos(self):
+        self.criar_validacao(self.rotina, self.usuario)
+        resumos_antes = self._resumos()
+        snapshot = UltimaValidacaoRotina.objects.get(rotina=self.rotina).validacao_id
+        with mock.patch('apps.backups.signals.registrar_alteracao', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.criar_validacao(self.rotina, self.usuario, 'ERRO')
+        # A falha no último passo desfaz snapshots e resumos gravados antes dele
+        self.assertEqual(self._resumos(), resumos_antes)
+        self.assertEqual(UltimaValidacaoRotina.objects.get(rotina=self.rotina).validacao_id, snapshot)
+
+
+class AgendaTests(SimpleTestCase):
+    """_avaliar sobre um calendário montado à mão (sem banco); fuso America/Sao_Paulo."""
+    PRAZO = 12 * 3600
+
+    def _local(self, *partes):
+        return timezone.make_aware(datetime.datetime(*partes))
+
+    def _avaliar(self, frequencia, criada, validacoes, agora, inicio, fim, horario=datetime.time(2)):
+        calendario = agenda._Calendario(inicio, fim, agenda.PERIODO_DIAS[frequencia])
+        rotina = {
+            'id': 1, 'descricao': 'Rotina', 'frequencia': frequencia, 'horario_execucao': horario, 'created_at': criada,
+        }
+        linhas = [(1, int(validacao.timestamp())) for validacao in validacoes]
+        return agenda._avaliar(calendario, rotina, linhas, int(agora.timestamp()), self.PRAZO)
+
+    def _diario(self, validacoes, agora=None, criada=None):
+        return self._avaliar(
+            'DIARIO', criada or self._local(2026, 2, 1), validacoes, agora or self._local(2026, 3, 11),
+            datetime.date(2026, 3, 1), datetime.date(2026, 3, 10),
+        )
+
+    def test_diario_em_dia_atrasada_e_faltando(self):
+        resultado = self._diario([
+            self._local(2026, 3, 1, 3),   # 1h depois: em dia
+            self._local(2026, 3, 2, 20),  # 18h depois: atrasada
+            self._local(2026, 3, 2, 21),  # segunda validação da mesma execução: ignorada
+        ])
+        self.assertEqual(
+            (resultado.esperadas, resultado.em_dia, resultado.atrasadas, resultado.faltando), (10, 1, 1, 8)
+        )
+        self.assertEqual(resultado.ultima_falta, int(self._local(2026, 3, 10, 2).timestamp()))
+
+    def test_prazo_no_limite_ainda_esta_em_dia(self):
+        resultado = self._diario([self._local(2026, 3, 1, 14)])
+        self.assertEqual((resultado.em_dia, resultado.atrasadas), (1, 0))
+
+    def test_execucoes_antes_do_cadastro_nao_contam(self):
+        resultado = self._diario(
+            [self._local(2026, 3, 5, 12)],  # antes da primeira execução esperada (dia 6)
+            criada=self._local(2026, 3, 5, 10),
+        )
+        self.assertEqual((resultado.esperadas, resultado.em_dia, resultado.faltando), (5, 0, 5))
+
+    def test_ultima_execucao_do_periodo_fecha_na_seguinte(self):
+        resultado = self._diario([
+            self._local(2026, 3, 10, 5),   # da última execução do período
+            self._local(2026, 3, 11, 3),   # já é da execução seguinte: fora
+        ], agora=self._local(2026, 3, 12))
+        self.assertEqual((resultado.em_dia, resultado.faltando), (1, 9))
+        self.assertEqual(resultado.ultima_falta, int(self._local(2026, 3, 9, 2).timestamp()))
+
+    def test_execucao_ainda_no_prazo_nao_conta_como_faltando(self):
+        resultado = self._diario([], agora=self._local(2026, 3, 10, 10))
+        self.assertEqual((resultado.esperadas, resultado.faltando), (9, 9))
+
+    def test_ultima_falta_volta_pelas_execucoes_cobertas_do_fim(self):
+        resultado = self._diario([self._local(2026, 3, dia, 3) for dia in (8, 9, 10)])
+        self.assertEqual((resultado.em_dia, resultado.faltando), (3, 7))
+        self.assertEqual(resultado.ultima_falta, int(self._local(2026, 3, 7, 2).timestamp()))
+
+    def test_sem_faltas_nao_tem_ultima_falta(self):
+        resultado = self._diario([self._local(2026, 3, dia, 3) for dia in range(1, 11)])
+        self.assertEqual((resultado.em_dia, resultado.faltando, resultado.ultima_falta), (10, 0, None))
+
+    def test_semanal_no_dia_da_semana_do_cadastro(self):
+        quarta = self._local(2026, 2, 4, 9)
+        resultado = self._avaliar(
+            'SEMANAL', quarta, [self._local(2026, 3, 4, 3), self._local(2026, 3, 12, 3)],
+            self._local(2026, 4, 1), datetime.date(2026, 3, 1), datetime.date(2026, 3, 31),
+        )
+        # Quartas de março: 4, 11, 18 e 25; a validação do dia 12 é da execução do dia 11
+        self.assertEqual(
+            (resultado.esperadas, resultado.em_dia, resultado.atrasadas, resultado.faltando), (4, 1, 1, 2)
+        )
+        self.assertEqual(resultado.ultima_falta, int(self._local(2026, 3, 25, 2).timestamp()))
+
+    def test_mensal_usa_o_ultimo_dia_em_meses_mais_curtos(self):
+        calendario = agenda._Calendario(datetime.date(2026, 2, 1), datetime.date(2026, 4, 30), 31)
+        horarios, no_periodo = calendario.execucoes('MENSAL', 31, 0)
+        datas = [timezone.localtime(agenda._data_local(segundos)).date() for segundos in horarios]
+        self.assertEqual(no_periodo, 3)
+        self.assertEqual(datas[:3], [datetime.date(2026, 2, 28), datetime.date(2026, 3, 31), datetime.date(2026, 4, 30)])
+
+        resultado = self._avaliar(
+            'MENSAL', self._local(2026, 1, 31, 9), [self._local(2026, 3, 1, 1)],
+            self._local(2026, 5, 1), datetime.date(2026, 2, 1), datetime.date(2026, 4, 30),
+        )
+        self.assertEqual((resultado.esperadas, resultado.atrasadas, resultado.faltando), (3, 1, 2))
+
+    def test_horario_de_verao_desloca_a_execucao_em_uma_hora(self):
+        # Documentado em _Calendario: a hora é somada à meia-noite local
+        with timezone.override('America/New_York'):
+            calendario = agenda._Calendario(datetime.date(2026, 3, 7), datetime.date(2026, 3, 9), 1)
+            horarios, no_periodo = calendario.execucoes('DIARIO', 0, 3 * 3600)
+            horas = [timezone.localtime(agenda._data_local(segundos)).hour for segundos in horarios[:no_periodo]]
+        self.assertEqual(horas, [3, 4, 3])
+
+    def test_dez_mil_rotinas_em_noventa_dias(self):
+        # Meta da verificação: ~1 s para 10 mil rotinas em 90 dias (aqui, só a avaliação,
+        # sem a consulta; o tempo total pode ser medido com benchmark_views)
+        fim = datetime.date(2026, 6, 30)
+        inicio = fim - datetime.timedelta(days=89)
+        agora = int(self._local(2026, 7, 1).timestamp())
+        criada = self._local(2025, 1, 1, 10)
+        frequencias = ('DIARIO', 'SEMANAL', 'MENSAL')
+        rotinas = [
+            {
+                'id': indice, 'descricao': '', 'frequencia': frequencias[indice % 3],
+                'horario_execucao': datetime.time(indice % 24, indice % 60), 'created_at': criada,
+            }
+            for indice in range(10000)
+        ]
+        tempos = []
+        for _ in range(3):  # o melhor de três: outro processo na máquina não derruba o teste
+            comeco = time.perf_counter()
+            calendario = agenda._Calendario(inicio, fim, 31)
+            for rotina in rotinas:
+                validacoes = (
+                    (rotina['id'], meia_noite + rotina['id'] % 24 * 3600 + 1800)
+                    for meia_noite in calendario.meias_noites[:90]
+                )
+                agenda._avaliar(calendario, rotina, validacoes, agora, self.PRAZO)
+            tempos.append(time.perf_counter() - comeco)
+        self.assertLess(min(tempos), 1.0)
+
+
+class IndicadoresTests(DadosMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = cls.criar_usuario()
+        cls.clientes = [cls.criar_cliente(indice) for indice in range(5)]
+        cls.rotinas = [cls.criar_rotina(cliente) for cliente in cls.clientes]
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def _get(self, nome='indicadores', **cabecalhos):
+        return self.client.get(reverse(nome), {'dias': 30}, headers=cabecalhos)
+
+    def _validar(self, rotina):
+        self.criar_validacao(rotina, self.usuario, 'ERRO')
+
+    def test_revalidacao_sem_mudanca_responde_304_sem_calcular(self):
+        self._validar(self.rotinas[0])
+        for nome in ('indicadores', 'indicadores_rotinas'):
+            with self.subTest(nome):
+                primeira = self._get(nome)
+                self.assertEqual(primeira.status_code, 200)
+                self.assertEqual(primeira['Cache-Control'], 'private, no-cache')
+                with mock.patch('apps.backups.views.serie_indicadores') as serie, \
+                        mock.patch('apps.backups.views.rotinas_com_falha') as ranking:
+                    with self.assertNumQueries(3):  # sessão, usuário e a versão dos dados
+                        segunda = self._get(nome, **{'If-None-Match': primeira['ETag']})
+                    serie.assert_not_called()
+                    ranking.assert_not_called()
+                self.assertEqual(segunda.status_code, 304)
+                self.assertEqual(segunda['ETag'], primeira['ETag'])
+                self.assertEqual(
+                    self._get(nome, **{'If-Modified-Since': primeira['Last-Modified']}).status_code, 304
+                )
+
+    def test_alteracao_dos_dados_invalida_o_etag(self):
+        self._validar(self.rotinas[0])
+        etag = self._get()['ETag']
+        self._validar(self.rotinas[1])
+        resposta = self._get(**{'If-None-Match': etag})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotEqual(resposta['ETag'], etag)
+        self.assertEqual(resposta.json()['totais']['erro'], 2)
+
+    def test_etag_filtrado_por_cliente_so_muda_com_o_cliente(self):
+        url = reverse('indicadores')
+        filtro = {'dias': 30, 'cliente': self.clientes[0].pk}
+        etag = self.client.get(url, filtro)['ETag']
+        self._validar(self.rotinas[1])
+        self.assertEqual(self.client.get(url, filtro, headers={'If-None-Match': etag}).status_code, 304)
+        self._validar(self.rotinas[0])
+        self.assertEqual(self.client.get(url, filtro, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_um_ano_de_resumos_em_menos_de_50_ms(self):
+        ferramenta = self.rotinas[0].ferramenta
+        fim = timezone.localdate()
+        dias = [fim - datetime.timedelta(days=indice) for indice in range(365)]
+        status = [codigo for codigo, _ in ValidacaoBackup.STATUS_CHOICES]
+        ResumoDiarioFerramenta.objects.bulk_create(
+            ResumoDiarioFerramenta(dia=dia, ferramenta=ferramenta, status=codigo, quantidade=10)
+            for dia in dias for codigo in status
+        )
+        ResumoDiario.objects.bulk_create(
+            ResumoDiario(dia=dia, cliente=cliente, ferramenta=ferramenta, status=codigo, quantidade=2)
+            for dia in dias for cliente in self.clientes for codigo in status
+        )
+        for filtros in ({'dias': 365}, {'dias': 365, 'cliente': self.clientes[0].pk, 'periodo': 'semana'}):
+            with self.subTest(filtros):
+                tempos = []
+                for _ in range(3):  # o melhor de três: outro processo na máquina não derruba o teste
+                    comeco = time.perf_counter()
+                    resposta = self.client.get(reverse('indicadores'), filtros)
+                    tempos.append(time.perf_counter() - comeco)
+                self.assertEqual(resposta.status_code, 200)
+                self.assertGreater(resposta.json()['totais']['total'], 0)
+                self.assertLess(min(tempos), 0.05)
+
+
+AMOSTRAS_LOG = os.path.join(os.path.dirname(__file__), 'amostras_log')
+
+REGRAS_REGEX = {
+    'sucesso': 'Backup finalizado', 'erro': '^ERRO|falha', 'alerta': '^AVISO', 'job': 'Tarefa: (.+)',
+    'bytes': r'Copiados ([\d.,]+) ?(\w+)', 'duracao': r'Tempo: (\d+):(\d+):(\d+)',
+}
+
+
+class LeitoresLogTests(SimpleTestCase):
+    """Leitores de log sobre as amostras em amostras_log/."""
+
+    def _analisar(self, arquivo, chave, regras=None):
+        resultado, _, tamanho = parsers.analisar_arquivo(os.path.join(AMOSTRAS_LOG, arquivo), chave, regras)
+        self.assertEqual(tamanho, os.path.getsize(os.path.join(AMOSTRAS_LOG, arquivo)))
+        return resultado
+
+    def assertResultado(self, resultado, status, job, bytes_transferidos, duracao, erros=0, alertas=0):
+        self.assertEqual(
+            (resultado.status, resultado.job, resultado.bytes_transferidos, resultado.duracao,
+             resultado.total_erros, resultado.total_alertas),
+            (status, job, bytes_transferidos, duracao, erros, alertas),
+        )
+
+    def test_veeam_sessao_com_aviso_no_final(self):
+        resultado = self._analisar('veeam_sessao.log', 'veeam')
+        # O "finished with Warning" decide, mesmo com uma linha de erro antes
+        self.assertResultado(resultado, 'ALERTA', 'Backup Diário SRV01', int(10.5 * 1024 ** 3), 41 * 60 + 32, 1, 1)
+        self.assertIn('Failed to process VM APP02', resultado.erros[0])
+
+    def test_veeam_relatorio_por_email(self):
+        resultado = self._analisar('veeam_relatorio.txt', 'veeam')
+        # "Error 0" é contador do relatório, não mensagem de erro; duração com dias
+        self.assertResultado(resultado, 'SUCESSO', 'Backup Semanal ERP', int(1.234 * 1024 ** 2), 93784)
+
+    def test_rsync_codigo_23_e_alerta(self):
+        resultado = self._analisar('rsync_parcial.log', 'rsync')
+        self.assertResultado(resultado, 'ALERTA', None, 1234567, 300.0, 2, 1)
+        self.assertIn('Permission denied', resultado.erros[0])
+        self.assertIn('file has vanished', resultado.alertas[0])
+
+    def test_rsync_sem_log_file_conclui_pelas_estatisticas(self):
+        self.assertResultado(self._analisar('rsync_sucesso.log', 'rsync'), 'SUCESSO', None, int(2.5 * 1024 ** 3), None)
+
+    def test_wsb_em_utf16_e_portugues(self):
+        resultado = self._analisar('wsb_falha_utf16.log', 'wsb')
+        self.assertResultado(resultado, 'ERRO', None, None, 900.0, 2)
+        self.assertIn('Acesso negado', resultado.erros[0])
+
+    def test_wsb_sucesso(self):
+        self.assertResultado(self._analisar('wsb_sucesso.log', 'wsb'), 'SUCESSO', None, None, 1845.0)
+
+    def test_regex_com_todas_as_regras(self):
+        resultado = self._analisar('regex_aviso.log', 'regex', REGRAS_REGEX)
+        self.assertResultado(resultado, 'ALERTA', 'Cópia noturna NAS', int(3.5 * 1024 ** 3), 3723, 0, 1)
+        self.assertNotIn('Erros', resultado.resumo())
+        self.assertIn('Alertas (1):\n- AVISO arquivo em uso ignorado', resultado.resumo())
+
+    def test_log_inconclusivo_fica_sem_status(self):
+        resultado = parsers.obter('wsb').analisar(['Iniciando a operação de backup para F:.'])
+        self.assertIsNone(resultado.status)
+        self.assertIn('inconclusiva', resultado.resumo())
+
+
+class IngerirLogsTests(MediaTemporariaMixin, DadosMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = cls.criar_usuario()
+        cls.cliente = cls.criar_cliente(1)
+        veeam = FerramentaBackup.objects.create(nome='Veeam B&R', parser='veeam')
+        cls.rotina = cls.criar_rotina(cls.cliente, veeam, 'Backup Diário')
+        cls.criar_rotina(cls.cliente, FerramentaBackup.objects.create(nome='Manual'), 'Sem leitor')
+
+    def setUp(self):
+        super().setUp()
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.pasta = diretorio.name
+
+    def _colocar(self, cnpj, rotina, amostra, nome=None):
+        destino = os.path.join(self.pasta, cnpj, rotina)
+        os.makedirs(destino, exist_ok=True)
+        caminho = shutil.copy(os.path.join(AMOSTRAS_LOG, amostra), os.path.join(destino, nome or amostra))
+        # Mais antigo que a idade mínima: o agente já terminou de escrever
+        os.utime(caminho, (time.time() - 120, time.time() - 120))
+        return caminho
+
+    def _ingerir(self):
+        saida = io.StringIO()
+        call_command('ingerir_logs', self.pasta, usuario='tecnico', workers=1, stdout=saida, stderr=io.StringIO())
+        return saida.getvalue()
+
+    def test_logs_viram_validacoes_e_saem_da_fila(self):
+        self._colocar(self.cliente.cnpj, 'BACKUP DIÁRIO', 'veeam_sessao.log')
+        self._colocar('99999999999999', 'Backup Diário', 'veeam_relatorio.txt')
+        self._colocar(self.cliente.cnpj, 'Sem leitor', 'veeam_relatorio.txt')
+        self.assertIn("1 validação(ões) criada(s), 0 já registrada(s), 2 com erro", self._ingerir())
+
+        validacao = ValidacaoBackup.objects.get()
+        self.assertEqual((validacao.rotina_id, validacao.status, validacao.usuario), (self.rotina.pk, 'ALERTA', self.usuario))
+        self.assertIn('Job: Backup Diário SRV01', validacao.observacao)
+        self.assertRegex(validacao.evidencia.name, r'\.txt(\.gz)?$')
+        processado = os.path.join(self.pasta, 'processados', self.cliente.cnpj, 'BACKUP DIÁRIO', 'veeam_sessao.log')
+        self.assertTrue(os.path.exists(processado))
+        with open(os.path.join(self.pasta, 'com_erro', '99999999999999', 'Backup Diário', 'veeam_relatorio.txt.erro.txt')) as erro:
+            self.assertIn('não encontrado', erro.read())
+        self.assertTrue(os.path.exists(
+            os.path.join(self.pasta, 'com_erro', self.cliente.cnpj, 'Sem leitor', 'veeam_relatorio.txt.erro.txt')
+        ))
+        self.assertEqual(list(logs_pendentes(self.pasta, 0)), [])
+
+    def test_mesmo_arquivo_reprocessado_nao_duplica(self):
+        caminho = self._colocar(self.cliente.cnpj, 'Backup Diário', 'veeam_sessao.log')
+        carimbo = os.stat(caminho).st_mtime_ns
+        self._ingerir()
+        # Queda antes de mover: o mesmo arquivo volta para a fila
+        caminho = self._colocar(self.cliente.cnpj, 'Backup Diário', 'veeam_sessao.log')
+        os.utime(caminho, ns=(carimbo, carimbo))
+        self.assertIn("0 validação(ões) criada(s), 1 já registrada(s)", self._ingerir())
+        self.assertEqual(ValidacaoBackup.objects.count(), 1)
+
+    def test_leitura_em_paralelo_mantem_a_ordem_e_os_erros(self):
+        self._colocar(self.cliente.cnpj, 'Backup Diário', 'veeam_sessao.log')
+        self._colocar(self.cliente.cnpj, 'Backup Diário', 'wsb_sucesso.log', 'inconclusivo.log')
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            contagem = ingerir_pasta(self.pasta, self.usuario, executor=executor, idade_minima=0, tamanho_lote=1)
+        self.assertEqual((contagem.criados, contagem.com_erro), (1, 1))
+        self.assertIn('não identificou o resultado', contagem.erros[0][1])
+
+    def test_arquivo_recente_fica_para_a_proxima_passada(self):
+        caminho = self._colocar(self.cliente.cnpj, 'Backup Diário', 'veeam_sessao.log')
+        os.utime(caminho)
+        self.assertEqual(list(logs_pendentes(self.pasta)), [])
+
+
+class StatusPeloLogTests(DadosMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = cls.criar_cliente()
+        cls.rotina = cls.criar_rotina(cls.cliente, FerramentaBackup.objects.create(nome='rsync', parser='rsync'))
+
+    def _form(self, amostra, **dados):
+        with open(os.path.join(AMOSTRAS_LOG, amostra), 'rb') as arquivo:
+            evidencia = SimpleUploadedFile('job.txt', arquivo.read(), content_type='text/plain')
+        return ValidacaoForm(self.cliente.pk, {'rotina': self.rotina.pk, **dados}, {'evidencia': evidencia})
+
+    def test_sem_status_o_log_decide_e_resume_na_observacao(self):
+        form = self._form('rsync_parcial.log', observacao='Conferido no servidor.')
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['status'], 'ALERTA')
+        self.assertTrue(form.cleaned_data['observacao'].startswith('Conferido no servidor.\n\nLeitura automática do log (rsync): ALERTA.'))
+        self.assertEqual(form.instance.status, 'ALERTA')
+
+    def test_status_escolhido_prevalece_sobre_o_log(self):
+        form = self._form('rsync_parcial.log', status='SUCESSO', observacao='ok')
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual((form.cleaned_data['status'], form.cleaned_data['observacao']), ('SUCESSO', 'ok'))
+
+    def test_log_inconclusivo_pede_o_status(self):
+        form = self._form('wsb_sucesso.log')
+        self.assertFalse(form.is_valid())
+        self.assertIn('não foi possível identificá-lo pelo log', form.errors['status'][0])
+
+
+class ValidacaoEmLoteTests(MediaTemporariaMixin, DadosMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = cls.criar_usuario()
+        cls.cliente = cls.criar_cliente(1)
+        rsync = FerramentaBackup.objects.create(nome='rsync', parser='rsync')
+        cls.rotinas = [
+            cls.criar_rotina(cls.cliente, descricao='A - Banco'),
+            cls.criar_rotina(cls.cliente, rsync, 'B - Arquivos'),
+            cls.criar_rotina(cls.cliente, descricao='C - ERP'),
+        ]
+        cls.de_outro_cliente = cls.criar_rotina(cls.criar_cliente(2))
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+        agendamento = mock.patch('apps.backups.evidencias._submeter')
+        agendamento.start()
+        self.addCleanup(agendamento.stop)
+
+    def _enviar(self, linhas, arquivos=None):
+        """`linhas`: {índice: campos} sobre as linhas da página (uma por rotina, em ordem)."""
+        dados = {
+            'form-TOTAL_FORMS': len(self.rotinas), 'form-INITIAL_FORMS': 0,
+            'form-MIN_NUM_FORMS': 0, 'form-MAX_NUM_FORMS': 1000,
+        }
+        for indice, rotina in enumerate(self.rotinas):
+            dados[f'form-{indice}-rotina_id'] = rotina.pk
+            for campo, valor in linhas.get(indice, {}).items():
+                dados[f'form-{indice}-{campo}'] = valor
+        dados.update(arquivos or {})
+        return self.client.post(reverse('validacao_em_lote', args=[self.cliente.pk]), dados)
+
+    def _evidencia(self, amostra='rsync_parcial.log'):
+        with open(os.path.join(AMOSTRAS_LOG, amostra), 'rb') as arquivo:
+            return SimpleUploadedFile('job.txt', arquivo.read(), content_type='text/plain')
+
+    def test_linhas_em_branco_sao_ignoradas(self):
+        resposta = self._enviar({0: {'status': 'SUCESSO'}, 2: {'status': 'ERRO', 'observacao': 'Disco cheio'}})
+        self.assertRedirects(resposta, reverse('dashboard'))
+        self.assertEqual(
+            sorted(ValidacaoBackup.objects.values_list('rotina_id', 'status', 'usuario_id')),
+            sorted([(self.rotinas[0].pk, 'SUCESSO', self.usuario.pk), (self.rotinas[2].pk, 'ERRO', self.usuario.pk)]),
+        )
+
+    def test_lote_sem_nenhuma_linha_preenchida(self):
+        resposta = self._enviar({})
+        self.assertContains(resposta, "Preencha o resultado de pelo menos uma rotina.")
+        self.assertFalse(ValidacaoBackup.objects.exists())
+
+    def test_mesma_rotina_em_duas_linhas_e_rejeitada(self):
+        resposta = self._enviar({
+            0: {'status': 'SUCESSO'}, 1: {'rotina_id': self.rotinas[0].pk, 'status': 'ERRO'},
+        })
+        self.assertContains(resposta, "A mesma rotina foi enviada mais de uma vez.")
+        self.assertFalse(ValidacaoBackup.objects.exists())
+
+    def test_rotina_de_outro_cliente_e_rejeitada(self):
+        resposta = self._enviar({0: {'rotina_id': self.de_outro_cliente.pk, 'status': 'SUCESSO'}})
+        self.assertContains(resposta, "Rotina inválida para este cliente.")
+        self.assertFalse(ValidacaoBackup.objects.exists())
+
+    def test_status_pelo_log_so_quando_a_ferramenta_tem_leitor(self):
+        resposta = self._enviar({0: {'observacao': 'sem resultado'}})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.context['formset'].forms[0].errors['status'], ["Este campo é obrigatório."])
+
+        resposta = self._enviar({}, {'form-1-evidencia': self._evidencia()})
+        self.assertRedirects(resposta, reverse('dashboard'))
+        self.assertEqual(ValidacaoBackup.objects.get().status, 'ALERTA')
+
+    def test_lote_atualiza_snapshots_referencias_e_resumos(self):
+        self._enviar({0: {'status': 'ERRO'}, 2: {'status': 'SUCESSO'}}, {
+            'form-0-evidencia': self._evidencia(), 'form-2-evidencia': self._evidencia(),
+        })
+        validacoes = {v.rotina_id: v for v in ValidacaoBackup.objects.all()}
+        self.assertEqual(len(validacoes), 2)
+        for rotina_id, validacao in validacoes.items():
+            self.assertEqual(UltimaValidacaoRotina.objects.get(rotina_id=rotina_id).validacao_id, validacao.pk)
+        self.assertEqual(
+            UltimaValidacaoCliente.objects.get(cliente=self.cliente).validacao_id,
+            max(validacoes.values(), key=lambda v: (v.created_at, v.pk)).pk,
+        )
+        # Mesmo conteúdo nas duas linhas: um arquivo com duas referências
+        [arquivo] = ArquivoEvidencia.objects.all()
+        self.assertEqual(arquivo.referencias, 2)
+        self.assertEqual({v.evidencia.name for v in validacoes.values()}, {arquivo.caminho})
+        hoje = timezone.localdate()
+        [totais] = contagens(hoje, hoje, clientes_ids=[self.cliente.pk])
+        self.assertEqual((totais['total'], totais['erro'], totais['sucesso']), (2, 1, 1))
+
+
+class ValidacaoFormTests(DadosMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = cls.criar_cliente()
+        cls.rotina = cls.criar_rotina(cls.cliente)
+
+    def test_sem_leitor_de_log_o_status_e_obrigatorio(self):
+        form = ValidacaoForm(self.cliente.pk, {'rotina': self.rotina.pk}, {
+            'evidencia': SimpleUploadedFile('job.txt', b'Job finished', content_type='text/plain'),
+        })
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['status'], ["Este campo é obrigatório."])
+
+
+class RetencaoTests(DadosMixin, TestCase):
+    """Rotina diária com 7 dias de retenção: intervalo permitido de 1 dia + 12h de prazo."""
+    PERMITIDO = datetime.timedelta(days=1, hours=12)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = cls.criar_usuario()
+        cls.rotina = cls.criar_rotina(cls.criar_cliente())
+        cls.agora = timezone.now().replace(microsecond=0)
+        RotinaBackup.objects.filter(pk=cls.rotina.pk).update(created_at=cls.agora - datetime.timedelta(days=30))
+
+    def _ponto(self, atras, status='SUCESSO'):
+        validacao = self.criar_validacao(self.rotina, self.usuario, status)
+        ValidacaoBackup.objects.filter(pk=validacao.pk).update(created_at=self.agora - atras)
+        return validacao
+
+    def _conformidade(self):
+        return ConformidadeRetencao.objects.get(rotina=self.rotina)
+
+    def _primeiro_calculo(self):
+        self.assertEqual(atualizar_conformidade(agora=self.agora - datetime.timedelta(seconds=1)), 1)
+        # A primeira gravação sai marcada como alterada: refeita uma vez (ver _calcular)
+        self.assertEqual(atualizar_conformidade(agora=self.agora), 1)
+        self.assertEqual(atualizar_conformidade(agora=self.agora), 0)
+        return self._conformidade()
+
+    def test_lacuna_detectada_e_janela_deslizando(self):
+        for dias in (8, 7, 5, 4, 3, 2, 1):
+            self._ponto(datetime.timedelta(days=dias))
+        self._ponto(datetime.timedelta(minutes=1))
+        self._ponto(datetime.timedelta(days=6), 'ERRO')  # só sucesso é ponto de restauração
+        conformidade = self._primeiro_calculo()
+        self.assertEqual(
+            (conformidade.conforme, conformidade.lacunas, conformidade.pontos, conformidade.maior_intervalo),
+            (False, 1, 7, datetime.timedelta(days=2)),
+        )
+        # A lacuna (de -7d a -5d) sai da janela antes de o último ponto envelhecer
+        self.assertEqual(conformidade.valido_ate, self.agora - datetime.timedelta(days=5) - self.PERMITIDO + datetime.timedelta(days=7))
+
+        self.assertEqual(atualizar_conformidade(agora=conformidade.valido_ate - datetime.timedelta(seconds=1)), 0)
+        self.assertEqual(atualizar_conformidade(agora=conformidade.valido_ate), 1)
+        conformidade = self._conformidade()
+        self.assertEqual((conformidade.conforme, conformidade.lacunas, conformidade.pontos), (True, 0, 6))
+
+    def test_ultimo_ponto_vence_com_o_tempo(self):
+        RotinaBackup.objects.filter(pk=self.rotina.pk).update(created_at=self.agora - datetime.timedelta(hours=2))
+        self._ponto(datetime.timedelta(hours=1))
+        conformidade = self._primeiro_calculo()
+        self.assertTrue(conformidade.conforme)
+        vencimento = self.agora - datetime.timedelta(hours=1) + self.PERMITIDO + datetime.timedelta(seconds=1)
+        self.assertEqual(conformidade.valido_ate, vencimento)
+
+        self.assertEqual(atualizar_conformidade(agora=vencimento - datetime.timedelta(seconds=1)), 0)
+        self.assertEqual(atualizar_conformidade(agora=vencimento), 1)
+        self.assertFalse(self._conformidade().conforme)
+        self.assertEqual(self._conformidade().lacunas, 1)
+
+    def test_alteracao_marcada_e_recalculada(self):
+        self._ponto(datetime.timedelta(hours=1))
+        self._primeiro_calculo()
+
+        self.criar_validacao(self.rotina, self.usuario)
+        conformidade = self._conformidade()
+        self.assertGreaterEqual(conformidade.alterado_em, conformidade.calculado_em)
+        depois = timezone.now()
+        self.assertEqual(atualizar_conformidade(agora=depois), 1)
+        self.assertEqual(self._conformidade().pontos, 2)
+        self.assertEqual(atualizar_conformidade(agora=depois), 0)
+
+    def test_validacao_gravada_durante_o_primeiro_calculo_nao_se_perde(self):
+        avaliar = retencao.avaliar
+
+        def validacao_concorrente(*args):
+            # Entre a leitura das validações e a gravação do resultado: ainda não há
+            # linha de ConformidadeRetencao para o signal marcar
+            self._ponto(datetime.timedelta(minutes=1))
+            return avaliar(*args)
+
+        self._ponto(datetime.timedelta(hours=1))
+        with mock.patch('apps.backups.retencao.avaliar', side_effect=validacao_concorrente):
+            atualizar_conformidade(agora=self.agora - datetime.timedelta(seconds=1))
+        self.assertEqual(self._conformidade().pontos, 1)
+        self.assertEqual(atualizar_conformidade(agora=self.agora), 1)
+        self.assertEqual(self._conformidade().pontos, 2)
+
+
+class VerEvidenciaTests(MediaTemporariaMixin, DadosMixin, TestCase):
+    LOG = b''.join(b'%05d Job finished: Success\n' % linha for linha in range(2000))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = cls.criar_usuario()
+        cls.cliente = cls.criar_cliente()
+        cls.rotina = cls.criar_rotina(cls.cliente)
+        # Snapshots, resumos e contadores já existentes, como em produção
+        cls.criar_validacao(cls.rotina, cls.usuario)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+        agendamento = mock.patch('apps.backups.evidencias._submeter')
+        agendamento.start()
+        self.addCleanup(agendamento.stop)
+
+    def _enviar(self):
+        compressoes = []
+        original = gzip.GzipFile
+
+        def contar(*args, **kwargs):
+            if kwargs.get('mode') == 'wb':
+                compressoes.append(kwargs)
+            return original(*args, **kwargs)
+
+        with mock.patch('apps.common.storage.gzip.GzipFile', side_effect=contar):
+            self.client.post(reverse('nova_validacao', args=[self.cliente.pk]), {
+                'rotina': self.rotina.pk, 'status': 'SUCESSO',
+                'evidencia': SimpleUploadedFile('job.txt', self.LOG, content_type='text/plain'),
+            })
+        return ValidacaoBackup.objects.exclude(evidencia='').get(), len(compressoes)
+
+    def test_upload_de_log_comprimido_uma_vez(self):
+        validacao, compressoes = self._enviar()
+        self.assertTrue(validacao.evidencia.name.endswith('.txt.gz'))
+        self.assertEqual(compressoes, 1)
+
+    def test_gzip_so_para_quem_aceita(self):
+        validacao, _ = self._enviar()
+        url = reverse('ver_evidencia', args=[validacao.pk])
+        for cabecalho, comprimida in (
+            ('gzip, deflate, br', True), ('br;q=1.0, GZIP ; q=0.5', True), ('*', True),
+            ('gzip;q=0', False), ('gzip; q=0.000', False), ('identity', False), ('', False),
+        ):
+            with self.subTest(cabecalho):
+                resposta = self.client.get(url, headers={'Accept-Encoding': cabecalho})
+                self.assertEqual(resposta.status_code, 200)
+                corpo = b''.join(resposta.streaming_content)
+                self.assertEqual(resposta.get('Content-Encoding') == 'gzip', comprimida)
+                self.assertEqual(gzip.decompress(corpo) if comprimida else corpo, self.LOG)
+                self.assertIn('Accept-Encoding', resposta['Vary'])
+                self.assertEqual(resposta['Content-Type'], 'text/plain; charset=utf-8')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "Trechos destacados pelo FTS5 do SQLite")
+class IndiceTextoTests(MediaTemporariaMixin, DadosMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = cls.criar_usuario()
+        cls.cliente = cls.criar_cliente()
+        cls.rotina = cls.criar_rotina(cls.cliente)
+
+    def setUp(self):
+        super().setUp()
+        indexacao = mock.patch('apps.backups.evidencias._submeter')
+        indexacao.start()
+        self.addCleanup(indexacao.stop)
+
+    def _enviar(self, conteudo, nome='job.txt', indexar=True):
+        validacao = self.criar_validacao(
+            self.rotina, self.usuario, evidencia=SimpleUploadedFile(nome, conteudo)
+        )
+        if indexar:
+            indice_texto.indexar_arquivo(ArquivoEvidencia.objects.get(caminho=validacao.evidencia.name).pk)
+        return validacao
+
+    def _extrair(self, validacao):
+        storage = ValidacaoBackup._meta.get_field('evidencia').storage
+        return indice_texto.extrair_texto(storage, validacao.evidencia.name)
+
+    def test_extrai_log_comprimido_inteiro(self):
+        validacao = self._enviar('Cópia concluída\nJob finished: Success\n'.encode(), indexar=False)
+        self.assertTrue(validacao.evidencia.name.endswith('.gz'))
+        self.assertEqual(self._extrair(validacao), ('Cópia concluída\nJob finished: Success\n', False))
+
+    def test_extrai_utf16_e_remove_nul_e_marcadores(self):
+        validacao = self._enviar('Falha\x00 no \x02volume\x03 D:'.encode('utf-16'), indexar=False)
+        self.assertEqual(self._extrair(validacao), ('Falha no volume D:', False))
+
+    @override_settings(EVIDENCIAS_INDICE_MAX_BYTES=64)
+    def test_log_grande_guarda_inicio_e_fim(self):
+        log = 'início ' + 'x' * 500 + ' erro no fim'
+        for codificacao in ('utf-8', 'utf-16'):
+            with self.subTest(codificacao):
+                texto, truncado = self._extrair(self._enviar(log.encode(codificacao), indexar=False))
+                self.assertTrue(truncado)
+                inicio, fim = texto.split('\n[...]\n')
+                self.assertTrue(inicio.startswith('início'))
+                self.assertTrue(fim.endswith('erro no fim'))
+                self.assertNotIn('�', texto)
+
+    @override_settings(EVIDENCIAS_INDICE_MAX_BYTES=66)
+    def test_log_utf16_truncado_em_byte_impar_continua_alinhado(self):
+        log = 'início ' + 'x' * 500 + ' erro no fim'
+        texto, _ = self._extrair(self._enviar(log.encode('utf-16'), indexar=False))
+        self.assertNotIn('�', texto)
+        self.assertTrue(texto.endswith('erro no fim'))
+
+    def test_filtro_por_frase(self):
+        com_erro = self._enviar(b'Disk full: backup aborted\n')
+        self._enviar(b'Job finished: Success\n')
+        sem_log = self.criar_validacao(self.rotina, self.usuario)
+        todas = ValidacaoBackup.objects.all()
+
+        self.assertEqual(list(indice_texto.filtrar_por_texto(todas, 'disk full')), [com_erro])
+        self.assertFalse(indice_texto.filtrar_por_texto(todas, 'full disk').exists())
+        self.assertFalse(indice_texto.filtrar_por_texto(todas, '"; --').exists())
+        self.assertIn(sem_log, indice_texto.filtrar_por_texto(todas, '   '))
+
+    def test_trecho_escapa_o_html_do_log(self):
+        validacao = self._enviar(b'<script>alert(1)</script> Disk full </mark><img src=x onerror=alert(1)>\n')
+        digest = ArquivoEvidencia.objects.get(caminho=validacao.evidencia.name).hash
+
+        trecho = indice_texto.trechos('disk full', [digest, None])[digest]
+        self.assertIn('<mark>Disk full</mark>', trecho)
+        self.assertIn('&lt;script&gt;', trecho)
+        self.assertNotIn('<script>', trecho)
+        self.assertNotIn('<img', trecho)
+        self.assertEqual(trecho.count('</mark>'), 1)
+        self.assertEqual(indice_texto.trechos('disk full', []), {})
+        self.assertEqual(indice_texto.trechos('...', [digest]), {})
+
+    def test_historico_e_busca_mostram_o_trecho_escapado(self):
+        self._enviar(b'<script>alert(1)</script> Disk full\n')
+        self.client.force_login(self.usuario)
+
+        resposta = self.client.get(reverse('historico_global'), {'texto_log': 'disk full'})
+        self.assertContains(resposta, '&lt;script&gt;')
+        self.assertNotContains(resposta, '<script>alert')
+        resultado, = self.client.get(reverse('buscar_texto_evidencias'), {'q': 'disk full'}).json()['resultados']
+        self.assertIn('&lt;script&gt;', resultado['trecho'])
+        self.assertIn('<mark>Disk full</mark>', resultado['trecho'])
+
+
+class VersoesImagemTests(MediaTemporariaMixin, DadosMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = cls.criar_usuario()
+        cls.rotina = cls.criar_rotina(cls.criar_cliente())
+        # Ruído suavizado: o PNG fica grande e a versão de exibição em JPEG sai menor
+        ruido = Image.frombytes('RGB', (1800, 900), os.urandom(1800 * 900 * 3)).filter(ImageFilter.GaussianBlur(2))
+        destino = io.BytesIO()
+        ruido.save(destino, format='PNG')
+        cls.PNG = destino.getvalue()
+
+    def setUp(self):
+        super().setUp()
+        agendamento = mock.patch('apps.backups.evidencias._submeter')
+        self.submeter = agendamento.start()
+        self.addCleanup(agendamento.stop)
+
+    def _enviar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            validacao = self.criar_validacao(
+                self.rotina, self.usuario, evidencia=SimpleUploadedFile('tela.png', self.PNG, content_type='image/png')
+            )
+        return ArquivoEvidencia.objects.get(caminho=validacao.evidencia.name)
+
+    def _abrir(self, caminho):
+        with default_storage.open(caminho) as arquivo:
+            return Image.open(io.BytesIO(arquivo.read()))
+
+    def test_upload_so_marca_como_pendente(self):
+        arquivo = self._enviar()
+        self.assertEqual(arquivo.processamento, 'PENDENTE')
+        self.submeter.assert_not_called()
+
+    def test_comando_gera_miniatura_e_exibicao(self):
+        arquivo = self._enviar()
+        call_command('processar_imagens_evidencias', workers=1, stdout=io.StringIO())
+
+        arquivo.refresh_from_db()
+        self.assertEqual(arquivo.processamento, 'CONCLUIDO')
+        miniatura, exibicao = self._abrir(arquivo.miniatura), self._abrir(arquivo.exibicao)
+        self.assertEqual((miniatura.format, miniatura.size), ('JPEG', (320, 160)))
+        self.assertEqual((exibicao.format, exibicao.size), ('JPEG', (1600, 800)))
+        validacao = anotar_versoes(ValidacaoBackup.objects.all()).get()
+        self.assertEqual((validacao.evidencia_miniatura, validacao.evidencia_exibicao), (arquivo.miniatura, arquivo.exibicao))
+
+    def test_comando_continuo_pega_os_novos_uploads(self):
+        primeira = self._enviar()
+        enviadas = []
+
+        def esperar(segundos):
+            if enviadas:
+                raise KeyboardInterrupt
+            enviadas.append(self._enviar())
+
+        saida = io.StringIO()
+        with mock.patch('apps.backups.management.commands.processar_imagens_evidencias.time.sleep', side_effect=esperar):
+            call_command('processar_imagens_evidencias', workers=1, continuo=True, stdout=saida)
+        self.assertIn('Encerrando.', saida.getvalue())
+        self.assertEqual(
+            set(ArquivoEvidencia.objects.filter(pk__in=[primeira.pk, enviadas[0].pk]).values_list('processamento', flat=True)),
+            {'CONCLUIDO'},
+        )
@@ -8,11 +8,20 @@ urlpatterns = [
     
     # Nova Tela de Relatórios
     path('relatorios/', views.painel_relatorios, name='painel_relatorios'),
-    path('relatorios/excel/', views.gerar_relatorio_excel, name='gerar_excel'),
-    path('relatorios/pdf/', views.gerar_relatorio_pdf, name='gerar_pdf'),
+    path('relatorios/exportar/', views.exportar_validacoes, name='exportar_validacoes'),
+    path('relatorios/solicitar/', views.solicitar_relatorio, name='solicitar_relatorio'),
+    path('relatorios/jobs/<int:job_id>/', views.status_relatorio, name='status_relatorio'),
+    path('relatorios/jobs/<int:job_id>/download/', views.baixar_relatorio, name='baixar_relatorio'),
 
     # Validação e APIs
     path('nova-validacao/<int:cliente_id>/', views.nova_validacao, name='nova_validacao'),
+    path('nova-validacao/<int:cliente_id>/lote/', views.validacao_em_lote, name='validacao_em_lote'),
+    path('evidencias/<int:pk>/', views.ver_evidencia, name='ver_evidencia'),
     path('api/servidores-por-cliente/', views.get_servidores_por_cliente, name='get_servidores_por_cliente'),
+    path('api/evidencias/busca/', views.buscar_texto_evidencias, name='buscar_texto_evidencias'),
+    path('api/ingestao/validacoes/', views.ingerir_validacoes, name='ingerir_validacoes'),
+    path('api/agenda/', views.agenda_validacoes, name='agenda_validacoes'),
+    path('api/indicadores/', views.indicadores, name='indicadores'),
+    path('api/indicadores/rotinas/', views.indicadores_rotinas, name='indicadores_rotinas'),
     path('api/rotinas-cliente/<int:cliente_id>/', views.get_rotinas_cliente, name='get_rotinas_cliente'),
 ]
\ No newline at end of file
@@ -0,0 +1,52 @@
+"""
+Carimbo de versão dos dados usados nos relatórios.
+
+Toda alteração em validações, rotinas, clientes ou servidores incrementa o contador do
+cliente afetado (ver apps.backups.signals); alterações que atingem todos os clientes
+(ex.: renomear uma ferramenta) incrementam o contador compartilhado. A versão global é
+a soma de todos eles.
+
+Os incrementos rodam na própria transação da escrita: a versão nova fica visível junto
+com os dados, então ninguém lê dados novos com a versão antiga (e recebe um relatório
+do cache gerado antes da escrita). Não há contador global: escritas em clientes
+diferentes não disputam a mesma linha; os de um mesmo lote são travados em ordem.
+"""
+from apps.common import contadores
+
+PREFIXO = 'dados:versao:'
+CHAVE_COMPARTILHADA = 'dados:versao:compartilhada'
+
+
+def chave_cliente(cliente_id):
+    return f'dados:versao:cliente:{cliente_id}'
+
+
+def registrar_alteracao(*clientes_ids):
+    """Marca os dados como alterados; sem clientes, a alteração vale para todos."""
+    ids = sorted({cliente_id for cliente_id in clientes_ids if cliente_id})
+    if not ids:
+        contadores.incrementar(CHAVE_COMPARTILHADA)
+    for cliente_id in ids:
+        contadores.incrementar(chave_cliente(cliente_id))
+
+
+def carimbo_versao(cliente_id=None):
+    """
+    Versão dos dados que um relatório enxerga: filtrando por cliente, só mudanças
+    nesse cliente (ou compartilhadas) invalidam o carimbo.
+    """
+    return versao_e_data(cliente_id)[0]
+
+
+def versao_e_data(cliente_id=None):
+    """
+    (carimbo, data da última alteração ou None) numa consulta: base do ETag e do
+    Last-Modified das respostas que dependem dos dados (ex.: API de indicadores).
+    """
+    if not cliente_id:
+        total, data = contadores.soma_por_prefixo(PREFIXO)
+        return str(total), data
+    chave = chave_cliente(cliente_id)
+    atuais = contadores.valores_e_datas([CHAVE_COMPARTILHADA, chave])
+    carimbo = f"{atuais[CHAVE_COMPARTILHADA][0]}.{atuais[chave][0]}"
+    return carimbo, max((data for _, data in atuais.values() if data), default=None)
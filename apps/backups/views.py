@@ -1,30 +1,105 @@
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment
-from xhtml2pdf import pisa
+import csv
+import json
+import mimetypes
+import os
+from collections import defaultdict
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse
-from django.utils.dateparse import parse_date
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, JsonResponse, HttpResponse, StreamingHttpResponse
 from django.utils import timezone
-from django.template.loader import render_to_string
-from .models import RotinaBackup, ValidacaoBackup
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date
+from django.urls import reverse
+from django.core.exceptions import RequestDataTooBig
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.db.models import F, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
+from .models import ArquivoEvidencia, RelatorioJob, RotinaBackup, ValidacaoBackup
 from apps.clientes.models import Cliente, Servidor
-from .forms import ValidacaoForm
+from .forms import ValidacaoForm, ValidacaoLoteFormSet
+from .lote import criar_validacoes
+from .relatorios import (
+    CAMPOS_EXPORTACAO, com_servidor, contar_validacoes, filtrar_validacoes, linhas_exportacao,
+)
+from .fila_relatorios import CONTENT_TYPES, enfileirar_relatorio, nome_download, registrar_acesso
+from .evidencias import anotar_versoes
+from .indice_texto import anotar_hash, trechos
+from .ingestao import TIPOS_NDJSON, autenticar, ingerir, itens_json, itens_ndjson
+from .agenda import periodo, verificar_agenda
+from .retencao import resumo_por_cliente
+from .resumos import PERIODOS, rotinas_com_falha, serie_indicadores
+from .versao_dados import carimbo_versao, versao_e_data
+from apps.common.pagination import paginate_keyset
+from apps.common.arquivos import responder_arquivo
+from apps.common.storage import comprimido, hash_do_caminho, nome_original
+
+TAMANHO_PAGINA = 50
+TAMANHO_PAGINA_MAX = 200
+
+# Linhas agrupadas por pedaço enviado na exportação em streaming
+LINHAS_POR_BLOCO = 500
+
+# Dias da agenda (execuções sem validação ou validadas com atraso) mostrados no dashboard
+AGENDA_DIAS_DASHBOARD = 7
+
+# Período padrão dos indicadores (gráficos do painel de relatórios)
+INDICADORES_DIAS_PADRAO = 90
+# Rotinas no ranking de falhas
+INDICADORES_ROTINAS = 10
+
+def _agenda_dashboard():
+    """
+    verificar_agenda dos últimos AGENDA_DIAS_DASHBOARD dias, guardada no cache pela versão
+    dos dados: só é refeita depois de uma escrita ou quando expira (AGENDA_CACHE_SEGUNDOS).
+    """
+    chave = f"dashboard:agenda:{timezone.localdate().isoformat()}:{carimbo_versao()}"
+    agenda = cache.get(chave)
+    if agenda is None:
+        agenda = verificar_agenda(*periodo(dias=AGENDA_DIAS_DASHBOARD))
+        cache.set(chave, agenda, settings.AGENDA_CACHE_SEGUNDOS)
+    return agenda
 
 @login_required
 def dashboard(request):
-    clientes = Cliente.objects.filter(ativo=True).order_by('nome_fantasia').prefetch_related('servidores', 'rotinas')
-    
+    # Status atual lido do snapshot mantido a cada escrita (UltimaValidacaoCliente)
+    clientes = list(
+        Cliente.objects.filter(ativo=True).order_by('nome_fantasia').annotate(
+            ultimo_status=Coalesce(F('ultima_validacao__status'), Value('PENDENTE'))
+        )
+    )
+
+    # Últimas 5 validações de cada cliente em uma única consulta (ROW_NUMBER por cliente)
+    historico = ValidacaoBackup.objects.filter(
+        rotina__cliente__ativo=True
+    ).annotate(
+        posicao=Window(
+            RowNumber(),
+            partition_by=F('rotina__cliente_id'),
+            order_by=[F('created_at').desc(), F('id').desc()],
+        )
+    ).filter(posicao__lte=5).select_related(
+        'rotina', 'rotina__ferramenta', 'usuario'
+    ).order_by('rotina__cliente_id', 'posicao')
+    historico = anotar_versoes(historico)
+
+    historico_por_cliente = defaultdict(list)
+    for validacao in historico:
+        historico_por_cliente[validacao.rotina.cliente_id].append(validacao)
+
+    agenda = _agenda_dashboard()
+    # Só leitura: quem recalcula a conformidade é o comando atualizar_conformidade (agendado)
+    retencao = resumo_por_cliente()
     for cliente in clientes:
-        ultima_validacao = ValidacaoBackup.objects.filter(
-            rotina__cliente=cliente
-        ).order_by('-created_at').first()
-        
-        cliente.ultimo_status = ultima_validacao.status if ultima_validacao else 'PENDENTE'
-        
-        cliente.historico_recente = ValidacaoBackup.objects.filter(
-            rotina__cliente=cliente
-        ).select_related('rotina', 'rotina__ferramenta', 'usuario').order_by('-created_at')[:5]
+        cliente.historico_recente = historico_por_cliente.get(cliente.pk, [])
+        cliente.agenda = agenda.get(cliente.pk)
+        cliente.retencao = retencao.get(cliente.pk)
 
     ultimas_validacoes = ValidacaoBackup.objects.select_related(
         'rotina', 'rotina__ferramenta', 'rotina__cliente'
@@ -32,52 +107,71 @@ def dashboard(request):
     
     return render(request, 'dashboard.html', {
         'clientes': clientes,
-        'ultimas_validacoes': ultimas_validacoes
+        'ultimas_validacoes': ultimas_validacoes,
+        'agenda_dias': AGENDA_DIAS_DASHBOARD,
+        'agenda_faltando': sum(item['faltando'] for item in agenda.values()),
+        'agenda_atrasadas': sum(item['atrasadas'] for item in agenda.values()),
     })
 
 @login_required
 def historico_global(request):
-    validacoes = ValidacaoBackup.objects.all().select_related(
-        'rotina', 'rotina__ferramenta', 'rotina__cliente', 'usuario'
-    )
-
-    cliente_id = request.GET.get('cliente')
-    status = request.GET.get('status')
-    data_inicio = request.GET.get('data_inicio')
-    data_fim = request.GET.get('data_fim')
+    validacoes = filtrar_validacoes(request.GET)
     ordenacao = request.GET.get('ordenacao', 'recente')
 
-    if cliente_id:
-        validacoes = validacoes.filter(rotina__cliente_id=cliente_id)
-    if status:
-        validacoes = validacoes.filter(status=status)
-    if data_inicio:
-        data_i = parse_date(data_inicio)
-        if data_i:
-            validacoes = validacoes.filter(created_at__date__gte=data_i)
-    if data_fim:
-        data_f = parse_date(data_fim)
-        if data_f:
-            validacoes = validacoes.filter(created_at__date__lte=data_f)
-
+    # Toda ordenação termina em um campo único (id) para o cursor ser estável
     mapa_ordenacao = {
-        'recente': '-created_at',
-        'antigo': 'created_at',
-        'cliente_az': 'rotina__cliente__nome_fantasia',
-        'cliente_za': '-rotina__cliente__nome_fantasia',
-        'status': 'status',
+        'recente': ['-created_at', '-id'],
+        'antigo': ['created_at', 'id'],
+        'cliente_az': ['cliente_nome', '-created_at', '-id'],
+        'cliente_za': ['-cliente_nome', '-created_at', '-id'],
+        'status': ['status', '-created_at', '-id'],
     }
-    campo_ordem = mapa_ordenacao.get(ordenacao, '-created_at')
-    validacoes = validacoes.order_by(campo_ordem)
+    campos_ordem = mapa_ordenacao.get(ordenacao, mapa_ordenacao['recente'])
+    validacoes = anotar_versoes(validacoes).annotate(
+        cliente_nome=Coalesce('rotina__cliente__nome_fantasia', Value('')),
+    )
+    validacoes = com_servidor(validacoes)
+
+    try:
+        por_pagina = min(max(int(request.GET.get('por_pagina', TAMANHO_PAGINA)), 1), TAMANHO_PAGINA_MAX)
+    except ValueError:
+        por_pagina = TAMANHO_PAGINA
+
+    texto_log = request.GET.get('texto_log', '').strip()
+    if texto_log:
+        validacoes = anotar_hash(validacoes)
+
+    try:
+        pagina = paginate_keyset(validacoes, campos_ordem, request.GET.get('cursor'), por_pagina)
+    except ValueError:
+        pagina = paginate_keyset(validacoes, campos_ordem, None, por_pagina)
+
+    if texto_log:
+        # Trechos destacados só para as linhas da página (uma consulta)
+        encontrados = trechos(texto_log, [v.evidencia_hash for v in pagina])
+        for validacao in pagina:
+            validacao.trecho_log = encontrados.get(validacao.evidencia_hash)
+
+    def url_cursor(cursor):
+        params = request.GET.copy()
+        params['cursor'] = cursor
+        return f"?{params.urlencode()}"
 
     clientes = Cliente.objects.filter(ativo=True).order_by('nome_fantasia')
     status_choices = ValidacaoBackup.STATUS_CHOICES
 
+    # Total pelos resumos diários; com busca textual só um COUNT completo saberia, então não mostra
+    total_registros = None
+    if not request.GET.get('busca', '').strip() and not texto_log:
+        total_registros = contar_validacoes(request.GET)
+
     context = {
-        'validacoes': validacoes,
+        'validacoes': pagina,
+        'total_registros': total_registros,
         'clientes': clientes,
         'status_choices': status_choices,
-        'total_registros': validacoes.count(),
+        'url_proxima': url_cursor(pagina.next_cursor) if pagina.has_next else None,
+        'url_anterior': url_cursor(pagina.previous_cursor) if pagina.has_previous else None,
         'filtros_atuais': request.GET
     }
     return render(request, 'historico_global.html', context)
@@ -104,6 +198,103 @@ def nova_validacao(request, cliente_id):
         'rotinas': rotinas
     })
 
+@login_required
+def validacao_em_lote(request, cliente_id):
+    """Validação de várias rotinas do cliente em um envio, gravadas juntas (apps.backups.lote)."""
+    cliente = get_object_or_404(Cliente, pk=cliente_id)
+    rotinas = list(
+        RotinaBackup.objects.filter(cliente=cliente)
+        .select_related('ferramenta', 'ultima_validacao')
+        .order_by('descricao', 'pk')
+    )
+
+    if request.method == 'POST':
+        formset = ValidacaoLoteFormSet(rotinas, request.POST, request.FILES)
+        if formset.is_valid():
+            validacoes = formset.save(commit=False)
+            for validacao in validacoes:
+                validacao.usuario = request.user
+            criar_validacoes(validacoes)
+            messages.success(request, f"{len(validacoes)} validação(ões) registrada(s) para {cliente.nome_fantasia}.")
+            return redirect('dashboard')
+    else:
+        formset = ValidacaoLoteFormSet(rotinas)
+
+    return render(request, 'validacao_lote.html', {
+        'cliente': cliente,
+        'formset': formset,
+    })
+
+# --- EVIDÊNCIAS ---
+
+def _aceita_gzip(request):
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        codificacao, _, parametros = item.strip().partition(';')
+        if codificacao.strip().lower() in ('gzip', '*'):
+            return parametros.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+VERSOES_EVIDENCIA = ('miniatura', 'exibicao')
+
+
+@login_required
+def ver_evidencia(request, pk):
+    """
+    Entrega a evidência de uma validação (ou, com ?versao=miniatura|exibicao, a versão
+    reduzida da imagem). Logs guardados com gzip vão comprimidos (Content-Encoding) para
+    quem aceita, e descomprimidos em streaming para os demais. Range, ETag e o repasse
+    para o proxy ficam em apps.common.arquivos.
+    """
+    validacao = get_object_or_404(ValidacaoBackup.objects.only('id', 'evidencia'), pk=pk)
+    if not validacao.evidencia:
+        raise Http404("Validação sem evidência.")
+    nome = validacao.evidencia.name
+    storage = validacao.evidencia.storage
+
+    versao = request.GET.get('versao')
+    if versao in VERSOES_EVIDENCIA:
+        arquivo = ArquivoEvidencia.objects.filter(caminho=nome).values('hash', versao).first()
+        if arquivo and arquivo[versao]:
+            return responder_arquivo(
+                request, default_storage, arquivo[versao],
+                content_type='image/jpeg',
+                nome_download=f"evidencia_{pk}_{versao}.jpg",
+                etag=f"{arquivo['hash']}-{versao}",
+            )
+        if versao == 'miniatura':
+            raise Http404("Evidência sem miniatura.")
+        # Sem versão de exibição (imagem já pequena): entrega o original
+
+    original = nome_original(nome)
+    content_type = mimetypes.guess_type(original)[0] or 'application/octet-stream'
+    if content_type.startswith('text/'):
+        content_type += '; charset=utf-8'
+    nome_arquivo = f"evidencia_{pk}{os.path.splitext(original)[1]}"
+
+    digest = hash_do_caminho(nome) or (
+        ArquivoEvidencia.objects.filter(caminho=nome).values_list('hash', flat=True).first()
+    )
+    if not comprimido(nome):
+        return responder_arquivo(
+            request, storage, nome,
+            content_type=content_type,
+            nome_download=nome_arquivo,
+            etag=digest,
+        )
+
+    # ETag forte é por representação: o gzip e o texto descomprimido têm tags diferentes
+    descomprimir = not _aceita_gzip(request)
+    return responder_arquivo(
+        request, storage, nome,
+        content_type=content_type,
+        nome_download=nome_arquivo,
+        etag=digest and (digest if descomprimir else f"{digest}-gzip"),
+        content_encoding=None if descomprimir else 'gzip',
+        descomprimir=descomprimir,
+        vary='Accept-Encoding',
+    )
+
 # --- APIs JSON ---
 @login_required
 def get_servidores_por_cliente(request):
@@ -113,36 +304,160 @@ def get_servidores_por_cliente(request):
     servidores = Servidor.objects.filter(cliente_id=cliente_id).values('id', 'hostname', 'descricao')
     return JsonResponse({'servidores': list(servidores)})
 
+@login_required
+def buscar_texto_evidencias(request):
+    """Validações cuja evidência de log contém `q` (frase), com o trecho destacado em HTML."""
+    termo = request.GET.get('q', '').strip()
+    if not termo:
+        return JsonResponse({'erro': 'Informe o texto em q.'}, status=400)
+    try:
+        limite = min(max(int(request.GET.get('limite', TAMANHO_PAGINA)), 1), TAMANHO_PAGINA_MAX)
+    except ValueError:
+        limite = TAMANHO_PAGINA
+
+    filtros = request.GET.copy()
+    filtros['texto_log'] = termo
+    validacoes = list(
+        anotar_hash(filtrar_validacoes(filtros)).annotate(
+            cliente_nome=F('rotina__cliente__nome_fantasia'),
+            ferramenta_nome=F('rotina__ferramenta__nome'),
+        ).values('id', 'created_at', 'status', 'cliente_nome', 'ferramenta_nome', 'rotina__descricao', 'evidencia_hash')[:limite]
+    )
+    encontrados = trechos(termo, [v['evidencia_hash'] for v in validacoes])
+    return JsonResponse({'resultados': [
+        {
+            'id': v['id'],
+            'data': timezone.localtime(v['created_at']).isoformat(),
+            'status': v['status'],
+            'cliente': v['cliente_nome'],
+            'ferramenta': v['ferramenta_nome'],
+            'rotina': v['rotina__descricao'],
+            'trecho': encontrados.get(v['evidencia_hash']),
+            'url_evidencia': reverse('ver_evidencia', args=[v['id']]),
+        }
+        for v in validacoes
+    ]})
+
+@csrf_exempt
+@require_POST
+def ingerir_validacoes(request):
+    """
+    Resultados enviados pelos agentes (token no cabeçalho Authorization: Bearer).
+    Corpo: array JSON ou NDJSON (um objeto por linha, lido aos poucos; use para lotes grandes).
+    """
+    token = autenticar(request)
+    if token is None:
+        return JsonResponse({'erro': 'Token ausente ou inválido.'}, status=401)
+
+    if request.content_type in TIPOS_NDJSON:
+        itens = itens_ndjson(request)
+    else:
+        try:
+            itens = itens_json(request.body)
+        except RequestDataTooBig:
+            return JsonResponse({'erro': 'Corpo grande demais para JSON; envie como NDJSON.'}, status=413)
+        except ValueError as exc:
+            return JsonResponse({'erro': f'Corpo inválido: {exc}'}, status=400)
+    return JsonResponse(ingerir(itens, token.usuario))
+
+@login_required
+def agenda_validacoes(request):
+    """
+    Execuções esperadas das rotinas sem validação (faltando) ou validadas depois do
+    prazo (atrasadas), por cliente. Filtros: data_inicio/data_fim (AAAA-MM-DD) ou dias
+    (até hoje), e cliente.
+    """
+    try:
+        inicio, fim = periodo(
+            parse_date(request.GET.get('data_inicio', '')),
+            parse_date(request.GET.get('data_fim', '')),
+            int(request.GET['dias']) if request.GET.get('dias') else None,
+        )
+        cliente_id = int(request.GET['cliente']) if request.GET.get('cliente') else None
+    except ValueError as exc:
+        return JsonResponse({'erro': f'Filtro inválido: {exc}'}, status=400)
+
+    agenda = verificar_agenda(inicio, fim, clientes_ids=[cliente_id] if cliente_id else None)
+    clientes = sorted(agenda.items(), key=lambda item: (-item[1]['faltando'], -item[1]['atrasadas'], item[1]['cliente']))
+    return JsonResponse({
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'prazo_horas': settings.AGENDA_PRAZO_VALIDACAO_HORAS,
+        'clientes': [{'id': cliente_id, **dados} for cliente_id, dados in clientes],
+    })
+
+def _filtros_indicadores(request):
+    """(inicio, fim, periodo, clientes_ids, ferramentas_ids) da query string; ValueError se inválidos."""
+    quebra = request.GET.get('periodo') or 'dia'
+    if quebra not in PERIODOS:
+        raise ValueError(f"período '{quebra}' (use {', '.join(PERIODOS)})")
+    inicio, fim = periodo(
+        parse_date(request.GET.get('data_inicio', '')),
+        parse_date(request.GET.get('data_fim', '')),
+        int(request.GET['dias']) if request.GET.get('dias') else INDICADORES_DIAS_PADRAO,
+    )
+    cliente_id = int(request.GET['cliente']) if request.GET.get('cliente') else None
+    ferramenta_id = int(request.GET['ferramenta']) if request.GET.get('ferramenta') else None
+    return inicio, fim, quebra, [cliente_id] if cliente_id else None, [ferramenta_id] if ferramenta_id else None
+
+def _resposta_versionada(request, nome, gerar):
+    """
+    Resposta JSON com ETag e Last-Modified da versão dos dados (do cliente filtrado, ou
+    global). Enquanto nada muda, a revalidação custa uma consulta e responde 304, sem
+    chamar `gerar(inicio, fim, periodo, clientes_ids, ferramentas_ids)`.
+    """
+    try:
+        filtros = _filtros_indicadores(request)
+    except ValueError as exc:
+        return JsonResponse({'erro': f'Filtro inválido: {exc}'}, status=400)
+    inicio, fim, _, clientes_ids, _ = filtros
+
+    carimbo, alterado_em = versao_e_data(clientes_ids[0] if clientes_ids else None)
+    # O período entra no ETag: com `dias`, a mesma URL passa a cobrir outras datas no dia seguinte
+    etag = f'"{nome}-{carimbo}-{inicio:%Y%m%d}-{fim:%Y%m%d}"'
+    ultima_modificacao = int(alterado_em.timestamp()) if alterado_em else None
+    response = get_conditional_response(request, etag=etag, last_modified=ultima_modificacao)
+    if response is None:
+        response = JsonResponse({'inicio': inicio.isoformat(), 'fim': fim.isoformat(), **gerar(*filtros)})
+    response['ETag'] = etag
+    if ultima_modificacao:
+        response['Last-Modified'] = http_date(ultima_modificacao)
+    # Dados por usuário logado: só o navegador guarda, e sempre revalida
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+@login_required
+def indicadores(request):
+    """
+    Série de validações (sucesso/alerta/erro e taxas) por dia, semana ou mês, no total
+    e por ferramenta, só a partir dos resumos. Filtros: data_inicio/data_fim
+    (AAAA-MM-DD) ou dias (até hoje), periodo (dia, semana ou mes), cliente e ferramenta.
+    """
+    def gerar(inicio, fim, quebra, clientes_ids, ferramentas_ids):
+        return {'periodo': quebra, **serie_indicadores(inicio, fim, quebra, clientes_ids, ferramentas_ids)}
+    return _resposta_versionada(request, 'indicadores', gerar)
+
+@login_required
+def indicadores_rotinas(request):
+    """
+    Rotinas com mais erros (e os alertas delas) nos meses do período. Mesmos filtros
+    de `indicadores`; periodo não altera o resultado.
+    """
+    def gerar(inicio, fim, quebra, clientes_ids, ferramentas_ids):
+        return {'rotinas': rotinas_com_falha(inicio, fim, clientes_ids, ferramentas_ids, limite=INDICADORES_ROTINAS)}
+    return _resposta_versionada(request, 'rotinas', gerar)
+
 @login_required
 def get_rotinas_cliente(request, cliente_id):
-    rotinas = RotinaBackup.objects.filter(cliente_id=cliente_id).values('id', 'descricao', 'ferramenta__nome')
+    rotinas = RotinaBackup.objects.filter(cliente_id=cliente_id).values(
+        'id', 'descricao', 'ferramenta__nome', 'ultima_validacao__status', 'ultima_validacao__validado_em'
+    )
     return JsonResponse({'rotinas': list(rotinas)})
 
 # --- RELATÓRIOS (NOVO CÓDIGO) ---
 
 def _get_queryset_filtrado(request):
-    queryset = ValidacaoBackup.objects.all().select_related(
-        'rotina', 'rotina__ferramenta', 'rotina__cliente', 'usuario'
-    ).order_by('-created_at')
-
-    cliente_id = request.GET.get('cliente')
-    status = request.GET.get('status')
-    data_inicio = request.GET.get('data_inicio')
-    data_fim = request.GET.get('data_fim')
-
-    if cliente_id:
-        queryset = queryset.filter(rotina__cliente_id=cliente_id)
-    if status:
-        queryset = queryset.filter(status=status)
-    if data_inicio:
-        data_i = parse_date(data_inicio)
-        if data_i:
-            queryset = queryset.filter(created_at__date__gte=data_i)
-    if data_fim:
-        data_f = parse_date(data_fim)
-        if data_f:
-            queryset = queryset.filter(created_at__date__lte=data_f)
-    return queryset
+    return filtrar_validacoes(request.GET)
 
 @login_required
 def painel_relatorios(request):
@@ -151,78 +466,96 @@ def painel_relatorios(request):
     status_choices = ValidacaoBackup.STATUS_CHOICES
     
     context = {
-        'validacoes': validacoes[:50],
-        'total_registros': validacoes.count(),
+        'validacoes': com_servidor(validacoes)[:50],
+        'total_registros': contar_validacoes(request.GET),
         'clientes': clientes,
         'status_choices': status_choices,
     }
     return render(request, 'painel_relatorios.html', context)
 
 @login_required
-def gerar_relatorio_excel(request):
-    validacoes = _get_queryset_filtrado(request)
-    
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    filename = f"Relatorio_Backups_{timezone.now().strftime('%d-%m-%Y')}.xlsx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Relatório de Backups"
+@require_POST
+def solicitar_relatorio(request):
+    formato = request.POST.get('formato')
+    if formato not in dict(RelatorioJob.FORMATO_CHOICES):
+        return JsonResponse({'erro': 'Formato inválido.'}, status=400)
 
-    headers = ["Data/Hora", "Cliente", "Servidor", "Ferramenta", "Rotina", "Status", "Usuário"]
-    ws.append(headers)
+    job = enfileirar_relatorio(formato, request.POST, request.user)
+    return JsonResponse(_dados_job(job), status=202)
 
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="1e293b", end_color="1e293b", fill_type="solid")
-    
-    for cell in ws[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal="center")
-
-    for item in validacoes:
-        servidor = item.rotina.servidores.first()
-        cliente_nome = servidor.cliente.nome_fantasia if servidor else "-"
-        hostname = servidor.hostname if servidor else "-"
-        
-        row = [
-            item.created_at.strftime("%d/%m/%Y %H:%M"),
-            cliente_nome,
-            hostname,
-            item.rotina.ferramenta.nome,
-            item.rotina.descricao,
-            item.get_status_display(),
-            item.usuario.username
-        ]
-        ws.append(row)
-
-    for column_cells in ws.columns:
-        length = max(len(str(cell.value) or "") for cell in column_cells)
-        ws.column_dimensions[column_cells[0].column_letter].width = length + 2
-
-    wb.save(response)
-    return response
+@login_required
+def status_relatorio(request, job_id):
+    job = get_object_or_404(RelatorioJob, pk=job_id)
+    return JsonResponse(_dados_job(job))
 
 @login_required
-def gerar_relatorio_pdf(request):
-    validacoes = _get_queryset_filtrado(request)
-    
-    context = {
-        'validacoes': validacoes,
-        'usuario': request.user.username,
-        'data_geracao': timezone.now()
+def baixar_relatorio(request, job_id):
+    job = get_object_or_404(RelatorioJob, pk=job_id, status='CONCLUIDO')
+    if not job.arquivo:
+        raise Http404("Arquivo do relatório não encontrado.")
+    registrar_acesso(job)
+    return FileResponse(
+        job.arquivo.open('rb'),
+        as_attachment=True,
+        filename=nome_download(job),
+        content_type=CONTENT_TYPES[job.formato],
+    )
+
+def _dados_job(job):
+    dados = {
+        'id': job.pk,
+        'formato': job.formato,
+        'status': job.status,
+        'url_status': reverse('status_relatorio', args=[job.pk]),
     }
-    
-    html_string = render_to_string('relatorio_pdf_template.html', context)
-    
-    response = HttpResponse(content_type='application/pdf')
-    filename = f"Relatorio_Backups_{timezone.now().strftime('%d-%m-%Y')}.pdf"
+    if job.status == 'CONCLUIDO':
+        dados['url_download'] = reverse('baixar_relatorio', args=[job.pk])
+    if job.status == 'ERRO':
+        dados['erro'] = job.erro
+    if job.status == 'EXPIRADO':
+        dados['erro'] = 'O arquivo deste relatório expirou. Solicite novamente.'
+    return dados
+
+class _Eco:
+    """Pseudo-arquivo para o csv.writer devolver a linha formatada em vez de gravá-la."""
+    def write(self, valor):
+        return valor
+
+def _em_blocos(linhas):
+    bloco = []
+    for linha in linhas:
+        bloco.append(linha)
+        if len(bloco) >= LINHAS_POR_BLOCO:
+            yield ''.join(bloco)
+            bloco = []
+    if bloco:
+        yield ''.join(bloco)
+
+@login_required
+def exportar_validacoes(request):
+    formato = request.GET.get('formato', 'csv')
+    linhas = linhas_exportacao(_get_queryset_filtrado(request))
+
+    if formato == 'csv':
+        writer = csv.writer(_Eco())
+        conteudo = (writer.writerow(linha) for linha in linhas)
+        cabecalho = [writer.writerow(CAMPOS_EXPORTACAO)]
+        content_type = 'text/csv; charset=utf-8'
+    elif formato == 'ndjson':
+        conteudo = (
+            json.dumps(dict(zip(CAMPOS_EXPORTACAO, linha)), ensure_ascii=False) + '\n'
+            for linha in linhas
+        )
+        cabecalho = []
+        content_type = 'application/x-ndjson; charset=utf-8'
+    else:
+        return HttpResponse('Formato inválido. Use csv ou ndjson.', status=400)
+
+    def gerar():
+        yield from cabecalho
+        yield from _em_blocos(conteudo)
+
+    response = StreamingHttpResponse(gerar(), content_type=content_type)
+    filename = f"Validacoes_{timezone.now().strftime('%d-%m-%Y')}.{formato}"
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    pisa_status = pisa.CreatePDF(html_string, dest=response)
-    
-    if pisa_status.err:
-        return HttpResponse('Erro ao gerar PDF', status=500)
-        
-    return response
\ No newline at end of file
+    return response
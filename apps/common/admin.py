@@ -0,0 +1,90 @@
+import io
+
+from django.contrib import admin
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+from unfold.admin import ModelAdmin
+
+from .models import Contador, PerfilRequisicao
+from .perfilador import carregar_estatisticas, estatisticas_pstats, pilhas_colapsadas
+
+
+@admin.register(Contador)
+class ContadorAdmin(ModelAdmin):
+    list_display = ('chave', 'valor', 'atualizado_em')
+    search_fields = ('chave',)
+    readonly_fields = ('chave', 'valor', 'atualizado_em')
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(PerfilRequisicao)
+class PerfilRequisicaoAdmin(ModelAdmin):
+    list_display = ('created_at', 'metodo', 'view', 'url', 'status_code', 'duracao_ms', 'quantidade_queries', 'motivo', 'usuario', 'get_downloads')
+    list_filter = ('motivo', 'view')
+    search_fields = ('url', 'view')
+    exclude = ('estatisticas', 'consultas')
+    readonly_fields = (
+        'url', 'view', 'metodo', 'status_code', 'motivo', 'usuario', 'duracao_ms', 'quantidade_queries',
+        'tempo_db_ms', 'tamanho', 'created_at', 'get_downloads', 'get_funcoes', 'get_consultas',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        # As estatísticas só são lidas no download e na página de detalhe
+        qs = super().get_queryset(request).select_related('usuario')
+        if request.resolver_match and request.resolver_match.url_name.endswith('changelist'):
+            qs = qs.defer('estatisticas', 'consultas')
+        return qs
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/pstats/', self.admin_site.admin_view(self.baixar_pstats), name='common_perfilrequisicao_pstats'),
+            path('<int:pk>/pilhas/', self.admin_site.admin_view(self.baixar_pilhas), name='common_perfilrequisicao_pilhas'),
+        ] + super().get_urls()
+
+    def _arquivo(self, pk, conteudo, extensao, content_type):
+        response = HttpResponse(conteudo, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="perfil_{pk}.{extensao}"'
+        return response
+
+    def baixar_pstats(self, request, pk):
+        perfil = get_object_or_404(PerfilRequisicao, pk=pk)
+        return self._arquivo(pk, bytes(perfil.estatisticas), 'prof', 'application/octet-stream')
+
+    def baixar_pilhas(self, request, pk):
+        perfil = get_object_or_404(PerfilRequisicao, pk=pk)
+        return self._arquivo(pk, pilhas_colapsadas(carregar_estatisticas(perfil)), 'txt', 'text/plain; charset=utf-8')
+
+    def get_downloads(self, obj):
+        return format_html(
+            '<a class="text-primary-600" href="{}">pstats</a> · <a class="text-primary-600" href="{}">flamegraph</a>',
+            reverse('admin:common_perfilrequisicao_pstats', args=[obj.pk]),
+            reverse('admin:common_perfilrequisicao_pilhas', args=[obj.pk]),
+        )
+    get_downloads.short_description = 'Downloads'
+
+    def get_funcoes(self, obj):
+        saida = io.StringIO()
+        estatisticas_pstats(obj, saida).sort_stats('cumulative').print_stats(30)
+        return format_html('<pre class="text-xs overflow-x-auto">{}</pre>', saida.getvalue())
+    get_funcoes.short_description = 'Funções (top 30 por tempo acumulado)'
+
+    def get_consultas(self, obj):
+        mais_lentas = sorted(obj.consultas, key=lambda c: c['tempo_ms'], reverse=True)[:50]
+        return format_html(
+            '<table class="text-xs">{}</table>',
+            format_html_join(
+                '', '<tr><td class="pr-4 align-top whitespace-nowrap">{} ms</td><td><code>{}</code></td></tr>',
+                ((c['tempo_ms'], c['sql']) for c in mais_lentas),
+            ),
+        )
+    get_consultas.short_description = 'Queries mais lentas'
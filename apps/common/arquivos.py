@@ -0,0 +1,157 @@
+"""
+Entrega de arquivos do storage com suporte a HTTP Range, ETag forte e requisições
+condicionais (If-None-Match / If-Modified-Since / If-Range).
+
+Com ARQUIVOS_SERVIDOR configurado, a transferência dos bytes fica com o proxy:
+'nginx' usa X-Accel-Redirect (ARQUIVOS_X_ACCEL_PREFIXO deve ser uma location
+`internal` apontando para o MEDIA_ROOT) e 'apache' usa X-Sendfile (mod_xsendfile).
+Sem proxy, o arquivo é lido em blocos pelo próprio Django.
+
+No redirecionamento interno o nginx descarta o Content-Encoding (e o ETag) da resposta
+do Django. Arquivos gzip entregues comprimidos são redirecionados pelo nome sem o .gz:
+com `gzip_static always;` na location, o nginx acha o .gz, põe o Content-Encoding e
+atende Range sobre os bytes comprimidos. Os condicionais (304) que chegam ao nginx usam
+os validadores dele.
+"""
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+TAMANHO_BLOCO = 64 * 1024
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Marca de intervalo fora do arquivo (resposta 416)
+_INSATISFAZIVEL = object()
+
+
+def _intervalo(request, tamanho, etag, ultima_modificacao):
+    """(início, fim) pedido no cabeçalho Range, None para o arquivo todo ou _INSATISFAZIVEL."""
+    cabecalho = request.headers.get('Range')
+    if not cabecalho or request.method not in ('GET', 'HEAD'):
+        return None
+
+    # If-Range: só atende o intervalo se o arquivo ainda for o mesmo que o cliente tem
+    if_range = request.headers.get('If-Range')
+    if if_range:
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            if if_range != etag:
+                return None
+        elif parse_http_date_safe(if_range) != ultima_modificacao:
+            return None
+
+    # Vários intervalos (multipart/byteranges) não são suportados: entrega o arquivo todo
+    encontrado = _RANGE.match(cabecalho.strip())
+    if not encontrado:
+        return None
+    inicio, fim = encontrado.groups()
+    if not inicio and not fim:
+        return None
+    if not inicio:
+        sufixo = int(fim)
+        if sufixo == 0 or tamanho == 0:
+            return _INSATISFAZIVEL
+        return max(tamanho - sufixo, 0), tamanho - 1
+    inicio = int(inicio)
+    fim = int(fim) if fim else tamanho - 1
+    if inicio >= tamanho or fim < inicio:
+        return _INSATISFAZIVEL
+    return inicio, min(fim, tamanho - 1)
+
+
+def _ler_intervalo(arquivo, inicio, fim):
+    with arquivo:
+        arquivo.seek(inicio)
+        restante = fim - inicio + 1
+        while restante > 0:
+            bloco = arquivo.read(min(TAMANHO_BLOCO, restante))
+            if not bloco:
+                break
+            restante -= len(bloco)
+            yield bloco
+
+
+def _ler_tudo(arquivo):
+    with arquivo:
+        while bloco := arquivo.read(TAMANHO_BLOCO):
+            yield bloco
+
+
+def responder_arquivo(request, storage, nome, *, content_type, nome_download, etag=None,
+                      content_encoding=None, descomprimir=False, vary=None):
+    """
+    Resposta para o arquivo `nome` do `storage`.
+
+    `etag` deve identificar o conteúdo entregue (ex.: hash + codificação). Com
+    `descomprimir`, o arquivo gzip é entregue descomprimido em streaming: o tamanho
+    final não é conhecido, então não há Range nem repasse para o proxy.
+    """
+    try:
+        tamanho = storage.size(nome)
+        ultima_modificacao = int(storage.get_modified_time(nome).timestamp())
+    except (FileNotFoundError, NotImplementedError):
+        raise Http404("Arquivo não encontrado.")
+    etag = f'"{etag}"' if etag else None
+
+    condicional = get_conditional_response(request, etag=etag, last_modified=ultima_modificacao)
+    if condicional is None:
+        response = _corpo(
+            request, storage, nome, tamanho, etag, ultima_modificacao, content_type, content_encoding, descomprimir
+        )
+    else:
+        response = condicional
+
+    if etag:
+        response['ETag'] = etag
+    response['Last-Modified'] = http_date(ultima_modificacao)
+    # Sempre revalida (a evidência de uma validação pode ser trocada), mas com 304 barato
+    response['Cache-Control'] = 'private, no-cache'
+    response['Accept-Ranges'] = 'none' if descomprimir else 'bytes'
+    if vary:
+        response['Vary'] = vary
+    if response.status_code in (200, 206):
+        response['Content-Disposition'] = f'inline; filename="{nome_download}"'
+        if content_encoding:
+            response['Content-Encoding'] = content_encoding
+    return response
+
+
+def _corpo(request, storage, nome, tamanho, etag, ultima_modificacao, content_type, content_encoding, descomprimir):
+    if descomprimir:
+        return StreamingHttpResponse(_ler_tudo(storage.abrir_descomprimido(nome)), content_type=content_type)
+
+    servidor = getattr(settings, 'ARQUIVOS_SERVIDOR', None)
+    if servidor == 'nginx':
+        # O nginx atende Range/If-Range sozinho a partir daqui
+        response = HttpResponse(content_type=content_type)
+        prefixo = getattr(settings, 'ARQUIVOS_X_ACCEL_PREFIXO', '/media-protegida/')
+        if content_encoding == 'gzip' and nome.endswith('.gz'):
+            nome = nome[:-len('.gz')]  # gzip_static (ver o topo do módulo)
+        response['X-Accel-Redirect'] = quote(prefixo.rstrip('/') + '/' + nome)
+        return response
+    if servidor == 'apache':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = storage.path(nome)
+        return response
+
+    intervalo = _intervalo(request, tamanho, etag, ultima_modificacao)
+    if intervalo is _INSATISFAZIVEL:
+        response = HttpResponse(status=416, content_type=content_type)
+        response['Content-Range'] = f'bytes */{tamanho}'
+        return response
+    if intervalo is None:
+        response = FileResponse(storage.open(nome, 'rb'), content_type=content_type)
+        response.block_size = TAMANHO_BLOCO
+        return response
+
+    inicio, fim = intervalo
+    response = StreamingHttpResponse(
+        _ler_intervalo(storage.open(nome, 'rb'), inicio, fim), status=206, content_type=content_type
+    )
+    response['Content-Range'] = f'bytes {inicio}-{fim}/{tamanho}'
+    response['Content-Length'] = str(fim - inicio + 1)
+    return response
@@ -0,0 +1,47 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+from .models import Contador
+
+
+def incrementar(chave, quantidade=1):
+    """Incrementa o contador no banco (UPDATE ... SET valor = valor + n), criando-o se preciso."""
+    agora = timezone.now()
+    if Contador.objects.filter(chave=chave).update(valor=F('valor') + quantidade, atualizado_em=agora):
+        return
+    try:
+        with transaction.atomic():
+            Contador.objects.create(chave=chave, valor=quantidade)
+    except IntegrityError:
+        # Criado por outro processo entre o UPDATE e o INSERT
+        Contador.objects.filter(chave=chave).update(valor=F('valor') + quantidade, atualizado_em=agora)
+
+
+def valor(chave):
+    return Contador.objects.filter(chave=chave).values_list('valor', flat=True).first() or 0
+
+
+def valores(chaves):
+    """Lê vários contadores em uma consulta; os inexistentes valem 0."""
+    encontrados = dict(Contador.objects.filter(chave__in=chaves).values_list('chave', 'valor'))
+    return {chave: encontrados.get(chave, 0) for chave in chaves}
+
+
+def valores_e_datas(chaves):
+    """{chave: (valor, atualizado_em)} em uma consulta; os inexistentes valem (0, None)."""
+    encontrados = {
+        chave: (valor, atualizado_em)
+        for chave, valor, atualizado_em in Contador.objects.filter(chave__in=chaves).values_list(
+            'chave', 'valor', 'atualizado_em'
+        )
+    }
+    return {chave: encontrados.get(chave, (0, None)) for chave in chaves}
+
+
+def soma_por_prefixo(prefixo):
+    """(soma dos valores, última atualização ou None) dos contadores cuja chave começa com `prefixo`."""
+    totais = Contador.objects.filter(chave__startswith=prefixo).aggregate(
+        valor=Sum('valor', default=0), atualizado_em=Max('atualizado_em')
+    )
+    return totais['valor'], totais['atualizado_em']
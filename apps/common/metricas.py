@@ -0,0 +1,314 @@
+"""
+Métricas de desempenho por view, expostas no formato texto do Prometheus.
+
+O MetricasMiddleware registra cada requisição aqui, agrupando pelo nome da URL
+(`dashboard`, `historico_global`, `exportar_validacoes`...). Os valores ficam em memória no
+processo; com METRICAS_DIRETORIO configurado, cada processo (ex.: workers do gunicorn)
+grava periodicamente o seu estado em um arquivo próprio nesse diretório e o endpoint
+soma todos os arquivos.
+
+O arquivo de cada processo é identificado por pid + instante de início + host, então
+um pid reaproveitado pelo sistema não sobrescreve as contagens de um worker que morreu.
+Os arquivos de processos encerrados são incorporados a um único acumulado
+(metricas_encerrados.json) e apagados: os contadores não diminuem e o diretório não
+cresce a cada reinício de worker.
+"""
+import json
+import math
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    # Sem flock (Windows) os arquivos de processos encerrados só são somados, não incorporados
+    fcntl = None
+
+from django.conf import settings
+
+PREFIXO = 'backup_manager'
+
+# Limites (le) dos histogramas
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, math.inf)
+BUCKETS_QUERIES = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, math.inf)
+
+INTERVALO_GRAVACAO_PADRAO = 5.0
+
+
+def _nova_view():
+    return {
+        'latencia': [0] * len(BUCKETS_LATENCIA),
+        'latencia_soma': 0.0,
+        'requisicoes': 0,
+        'queries': [0] * len(BUCKETS_QUERIES),
+        'queries_soma': 0,
+        'tempo_db': 0.0,
+        'bytes': 0,
+        'orcamento_excedido': 0,
+        'status': {},
+    }
+
+
+def _bucket(limites, valor):
+    for indice, limite in enumerate(limites):
+        if valor <= limite:
+            return indice
+    return len(limites) - 1
+
+
+def _somar(destino, origem):
+    """Soma as métricas de `origem` em `destino` (mesma estrutura, por view)."""
+    for view, dados in origem.items():
+        atual = destino.setdefault(view, _nova_view())
+        for campo in ('latencia', 'queries'):
+            atual[campo] = [a + b for a, b in zip(atual[campo], dados[campo])]
+        for campo in ('latencia_soma', 'requisicoes', 'queries_soma', 'tempo_db', 'bytes', 'orcamento_excedido'):
+            atual[campo] += dados[campo]
+        for status, quantidade in dados['status'].items():
+            atual['status'][status] = atual['status'].get(status, 0) + quantidade
+    return destino
+
+
+class RegistroMetricas:
+    """Acumula as métricas do processo atual (thread-safe)."""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._views = {}
+        self._ultima_gravacao = time.monotonic()
+        self._pid = os.getpid()
+        self.identificador = _identificador_processo()
+
+    def _verificar_fork(self):
+        # Um worker criado por fork herda as contagens do processo pai, que já são do pai
+        if os.getpid() != self._pid:
+            self._views = {}
+            self._pid = os.getpid()
+            self.identificador = _identificador_processo()
+
+    def registrar(self, view, duracao, queries, tempo_db, tamanho, status, orcamento_excedido=False):
+        with self._trava:
+            self._verificar_fork()
+            dados = self._views.setdefault(view, _nova_view())
+            dados['latencia'][_bucket(BUCKETS_LATENCIA, duracao)] += 1
+            dados['latencia_soma'] += duracao
+            dados['requisicoes'] += 1
+            dados['queries'][_bucket(BUCKETS_QUERIES, queries)] += 1
+            dados['queries_soma'] += queries
+            dados['tempo_db'] += tempo_db
+            dados['bytes'] += tamanho
+            dados['orcamento_excedido'] += int(orcamento_excedido)
+            chave_status = str(status)
+            dados['status'][chave_status] = dados['status'].get(chave_status, 0) + 1
+
+        diretorio = _diretorio()
+        intervalo = getattr(settings, 'METRICAS_INTERVALO_GRAVACAO', INTERVALO_GRAVACAO_PADRAO)
+        if diretorio and time.monotonic() - self._ultima_gravacao >= intervalo:
+            self.gravar(diretorio)
+
+    def copia(self):
+        with self._trava:
+            self._verificar_fork()
+            return json.loads(json.dumps(self._views))
+
+    def gravar(self, diretorio):
+        """Grava o estado deste processo em <diretorio>/metricas_<identificador>.json (troca atômica)."""
+        self._ultima_gravacao = time.monotonic()
+        os.makedirs(diretorio, exist_ok=True)
+        views = self.copia()
+        _gravar_json(diretorio, f'metricas_{self.identificador}.json', views)
+
+    def limpar(self):
+        with self._trava:
+            self._views = {}
+
+
+# --- ARQUIVOS POR PROCESSO ---
+
+ARQUIVO_ENCERRADOS = 'metricas_encerrados.json'
+ARQUIVO_TRAVA = '.metricas.lock'
+
+
+def _inicio_processo(pid):
+    """Instante de início do processo (ticks desde o boot, de /proc/<pid>/stat), ou None."""
+    try:
+        with open(f'/proc/{pid}/stat') as arquivo:
+            # O nome do executável (2º campo) pode ter espaços; o 22º campo é o início
+            return arquivo.read().rsplit(')', 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+
+def _identificador_processo():
+    pid = os.getpid()
+    # Sem /proc (fora do Linux) um uuid garante o mesmo: pid reaproveitado não colide
+    return f'{pid}_{_inicio_processo(pid) or uuid.uuid4().hex}_{socket.gethostname()}'
+
+
+def _processo_encerrado(identificador):
+    pid, _, resto = identificador.partition('_')
+    inicio, _, host = resto.partition('_')
+    if not pid.isdigit() or host != socket.gethostname() or not os.path.isdir('/proc'):
+        # Sem como saber se o processo ainda existe (outra máquina/contêiner no mesmo
+        # diretório, ou sistema sem /proc): o arquivo continua somando como está
+        return False
+    return _inicio_processo(int(pid)) != inicio
+
+
+def _gravar_json(diretorio, nome, dados):
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, prefix='.metricas_', suffix='.tmp')
+    with os.fdopen(descritor, 'w') as arquivo:
+        json.dump(dados, arquivo)
+    os.replace(temporario, os.path.join(diretorio, nome))
+
+
+def _ler_json(caminho, padrao):
+    try:
+        with open(caminho) as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        # Arquivo removido ou sendo trocado por outro processo neste instante
+        return padrao
+
+
+class _TravaDiretorio:
+    """flock exclusivo no diretório de métricas enquanto os arquivos são somados e incorporados."""
+
+    def __init__(self, diretorio):
+        self.caminho = os.path.join(diretorio, ARQUIVO_TRAVA)
+
+    def __enter__(self):
+        self.arquivo = open(self.caminho, 'a')
+        fcntl.flock(self.arquivo, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.arquivo, fcntl.LOCK_UN)
+        self.arquivo.close()
+
+
+registro = RegistroMetricas()
+
+
+def _diretorio():
+    return getattr(settings, 'METRICAS_DIRETORIO', None)
+
+
+def _somar_diretorio(diretorio, incorporar):
+    """
+    Soma o acumulado dos processos encerrados e os arquivos por processo. Com `incorporar`,
+    os arquivos de processos que já não existem entram no acumulado e são apagados.
+    """
+    encerrados = _ler_json(os.path.join(diretorio, ARQUIVO_ENCERRADOS), {})
+    total = _somar({}, encerrados.get('views', {}))
+    # Já incorporados, mas o processo caiu antes de apagá-los: não podem somar de novo
+    incorporados = set(encerrados.get('processos', []))
+    novos = []
+    for nome in sorted(os.listdir(diretorio)):
+        if not (nome.startswith('metricas_') and nome.endswith('.json')) or nome == ARQUIVO_ENCERRADOS:
+            continue
+        identificador = nome[len('metricas_'):-len('.json')]
+        caminho = os.path.join(diretorio, nome)
+        if identificador in incorporados:
+            novos.append((identificador, caminho))
+            continue
+        views = _ler_json(caminho, None)
+        if views is None:
+            continue
+        _somar(total, views)
+        if incorporar and _processo_encerrado(identificador):
+            _somar(encerrados.setdefault('views', {}), views)
+            incorporados.add(identificador)
+            novos.append((identificador, caminho))
+
+    if novos:
+        # O acumulado é gravado antes de apagar os arquivos; 'processos' cobre uma queda no meio
+        encerrados['processos'] = [identificador for identificador, _ in novos]
+        _gravar_json(diretorio, ARQUIVO_ENCERRADOS, encerrados)
+        for _, caminho in novos:
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+    return total
+
+
+def metricas_agregadas():
+    """
+    Métricas de todos os processos (modo multiprocesso) ou só do atual. Os processos já
+    encerrados continuam somando (pelo acumulado), para os contadores nunca diminuírem.
+    """
+    diretorio = _diretorio()
+    if not diretorio:
+        return registro.copia()
+
+    registro.gravar(diretorio)
+    if fcntl is None:
+        return _somar_diretorio(diretorio, incorporar=False)
+    with _TravaDiretorio(diretorio):
+        return _somar_diretorio(diretorio, incorporar=True)
+
+
+def _rotulo(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _numero(valor):
+    if valor == math.inf:
+        return '+Inf'
+    if isinstance(valor, float):
+        return repr(valor)
+    return str(valor)
+
+
+def _histograma(linhas, nome, view, limites, contagens, soma):
+    acumulado = 0
+    for limite, quantidade in zip(limites, contagens):
+        acumulado += quantidade
+        linhas.append(f'{nome}_bucket{{view="{view}",le="{_numero(limite)}"}} {acumulado}')
+    linhas.append(f'{nome}_sum{{view="{view}"}} {_numero(soma)}')
+    linhas.append(f'{nome}_count{{view="{view}"}} {acumulado}')
+
+
+def formato_prometheus(metricas):
+    """Converte as métricas agregadas no formato texto de exposição do Prometheus (0.0.4)."""
+    views = sorted(metricas.items())
+    linhas = []
+
+    nome = f'{PREFIXO}_requisicao_duracao_segundos'
+    linhas += [f'# HELP {nome} Tempo de resposta por view.', f'# TYPE {nome} histogram']
+    for view, dados in views:
+        _histograma(linhas, nome, _rotulo(view), BUCKETS_LATENCIA, dados['latencia'], dados['latencia_soma'])
+
+    nome = f'{PREFIXO}_requisicao_queries'
+    linhas += [f'# HELP {nome} Queries no banco por requisição.', f'# TYPE {nome} histogram']
+    for view, dados in views:
+        _histograma(linhas, nome, _rotulo(view), BUCKETS_QUERIES, dados['queries'], dados['queries_soma'])
+
+    contadores = (
+        ('requisicao_db_segundos_total', 'Tempo gasto em queries no banco.', 'tempo_db'),
+        ('resposta_bytes_total', 'Bytes enviados nas respostas.', 'bytes'),
+        ('orcamento_queries_excedido_total', 'Requisições acima do orçamento de queries da view.', 'orcamento_excedido'),
+    )
+    for sufixo, ajuda, campo in contadores:
+        nome = f'{PREFIXO}_{sufixo}'
+        linhas += [f'# HELP {nome} {ajuda}', f'# TYPE {nome} counter']
+        for view, dados in views:
+            linhas.append(f'{nome}{{view="{_rotulo(view)}"}} {_numero(dados[campo])}')
+
+    nome = f'{PREFIXO}_requisicoes_total'
+    linhas += [f'# HELP {nome} Requisições por view e status HTTP.', f'# TYPE {nome} counter']
+    for view, dados in views:
+        for status, quantidade in sorted(dados['status'].items()):
+            linhas.append(f'{nome}{{view="{_rotulo(view)}",status="{_rotulo(status)}"}} {quantidade}')
+
+    return '\n'.join(linhas) + '\n'
+
+
+def orcamento_queries(view):
+    """Máximo de queries esperado para a view (METRICAS_ORCAMENTO_QUERIES), ou None."""
+    orcamentos = getattr(settings, 'METRICAS_ORCAMENTO_QUERIES', {})
+    return orcamentos.get(view, getattr(settings, 'METRICAS_ORCAMENTO_PADRAO', None))
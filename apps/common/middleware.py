@@ -0,0 +1,136 @@
+import cProfile
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .metricas import orcamento_queries, registro
+from .perfilador import MAX_CONSULTAS_GUARDADAS, motivo_perfil, salvar_perfil
+
+logger = logging.getLogger('apps.common.metricas')
+
+
+class _MedidorQueries:
+    """
+    execute_wrapper que conta as queries e soma o tempo gasto no banco. Com
+    `max_consultas`, também guarda o SQL e o tempo de cada uma (até esse limite).
+    """
+
+    def __init__(self, max_consultas=0):
+        self.quantidade = 0
+        self.tempo = 0.0
+        self.max_consultas = max_consultas
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracao = time.perf_counter() - inicio
+            self.tempo += duracao
+            self.quantidade += 1
+            if len(self.consultas) < self.max_consultas:
+                self.consultas.append({'sql': sql, 'tempo_ms': round(duracao * 1000, 3)})
+
+
+class MetricasMiddleware:
+    """
+    Mede cada requisição (tempo, queries, tempo de banco, bytes e status) e registra
+    em apps.common.metricas, agrupando pelo nome da URL. Respostas em streaming são
+    medidas até o último pedaço ser enviado.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.ativo = getattr(settings, 'METRICAS_ATIVAS', True)
+
+    def __call__(self, request):
+        if not self.ativo:
+            return self.get_response(request)
+
+        medidor = _MedidorQueries()
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(medidor):
+            response = self.get_response(request)
+
+        if response.streaming and not response.has_header('Content-Length'):
+            response.streaming_content = self._medir_streaming(
+                request, response, response.streaming_content, medidor, inicio
+            )
+        else:
+            tamanho = int(response['Content-Length']) if response.has_header('Content-Length') else len(response.content)
+            self._registrar(request, response, medidor, inicio, tamanho)
+        return response
+
+    def _medir_streaming(self, request, response, conteudo, medidor, inicio):
+        tamanho = 0
+        try:
+            # As queries feitas durante o streaming (ex.: iterator()) também contam
+            with connection.execute_wrapper(medidor):
+                for pedaco in conteudo:
+                    tamanho += len(pedaco)
+                    yield pedaco
+        finally:
+            self._registrar(request, response, medidor, inicio, tamanho)
+
+    def _registrar(self, request, response, medidor, inicio, tamanho):
+        match = request.resolver_match
+        view = match.view_name if match else 'nao_resolvida'
+        duracao = time.perf_counter() - inicio
+
+        orcamento = orcamento_queries(view)
+        excedido = orcamento is not None and medidor.quantidade > orcamento
+        if excedido:
+            logger.warning(
+                "Orçamento de queries excedido em %s (%s): %d queries, limite %d.",
+                view, request.path, medidor.quantidade, orcamento,
+            )
+
+        registro.registrar(
+            view, duracao, medidor.quantidade, medidor.tempo, tamanho, response.status_code,
+            orcamento_excedido=excedido,
+        )
+
+
+class PerfilMiddleware:
+    """
+    Executa a requisição sob cProfile quando pedido por um staff (X-Perfil: 1 ou
+    ?_perfil=1) ou sorteado pela amostragem, e grava o resultado em PerfilRequisicao.
+    Precisa vir depois do AuthenticationMiddleware. Em respostas em streaming, só a
+    view é perfilada (não a geração dos pedaços).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        motivo = motivo_perfil(request)
+        if motivo is None:
+            return self.get_response(request)
+
+        perfil = cProfile.Profile()
+        medidor = _MedidorQueries(max_consultas=MAX_CONSULTAS_GUARDADAS)
+        inicio = time.perf_counter()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Outro profiler já ativo neste processo (ex.: duas requisições perfiladas ao mesmo tempo)
+            return self.get_response(request)
+        try:
+            with connection.execute_wrapper(medidor):
+                response = self.get_response(request)
+        finally:
+            perfil.disable()
+        duracao = time.perf_counter() - inicio
+
+        try:
+            registro_perfil = salvar_perfil(
+                request, response, motivo, perfil, duracao, medidor.consultas, medidor.quantidade
+            )
+        except Exception:
+            logger.exception("Falha ao gravar o perfil de %s", request.path)
+        else:
+            response['X-Perfil-Id'] = str(registro_perfil.pk)
+        return response
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerfilRequisicao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=500)),
+                ('view', models.CharField(blank=True, max_length=200)),
+                ('metodo', models.CharField(max_length=10)),
+                ('status_code', models.PositiveSmallIntegerField(null=True)),
+                ('motivo', models.CharField(choices=[('CABECALHO', 'Cabeçalho X-Perfil'), ('PARAMETRO', 'Parâmetro _perfil'), ('AMOSTRAGEM', 'Amostragem')], max_length=20)),
+                ('duracao_ms', models.FloatField(verbose_name='Duração (ms)')),
+                ('quantidade_queries', models.PositiveIntegerField(default=0, verbose_name='Queries')),
+                ('tempo_db_ms', models.FloatField(default=0, verbose_name='Tempo no banco (ms)')),
+                ('consultas', models.JSONField(blank=True, default=list)),
+                ('estatisticas', models.BinaryField()),
+                ('tamanho', models.PositiveIntegerField(default=0, verbose_name='Tamanho (bytes)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Perfil de Requisição',
+                'verbose_name_plural': 'Perfis de Requisição',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
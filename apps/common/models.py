@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 class TimeStampedModel(models.Model):
@@ -9,4 +10,73 @@ class TimeStampedModel(models.Model):
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
 
     class Meta:
-        abstract = True
\ No newline at end of file
+        abstract = True
+
+class ValoresOriginaisMixin:
+    """
+    Guarda os valores lidos do banco (e os do último save) para que os signals
+    saibam o que mudou numa edição, sem consultar o registro de novo.
+    """
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._valores_originais = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._valores_originais = {f.attname: getattr(self, f.attname) for f in self._meta.concrete_fields}
+
+    def valor_original(self, campo):
+        return getattr(self, '_valores_originais', {}).get(campo)
+
+
+class Contador(models.Model):
+    """
+    Contador nomeado e persistente (versões de dados, estatísticas de cache...).
+    Use as funções de apps.common.contadores para alterar o valor de forma atômica.
+    """
+    chave = models.CharField(max_length=150, unique=True)
+    valor = models.BigIntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+
+    class Meta:
+        verbose_name = "Contador"
+        verbose_name_plural = "Contadores"
+
+    def __str__(self):
+        return f"{self.chave} = {self.valor}"
+
+
+class PerfilRequisicao(models.Model):
+    """
+    Requisição executada sob cProfile (ver apps.common.perfilador). Guarda as estatísticas
+    no formato do pstats e a lista de queries, para análise sem acesso ao servidor.
+    """
+    MOTIVO_CHOICES = [
+        ('CABECALHO', 'Cabeçalho X-Perfil'),
+        ('PARAMETRO', 'Parâmetro _perfil'),
+        ('AMOSTRAGEM', 'Amostragem'),
+    ]
+
+    url = models.CharField(max_length=500)
+    view = models.CharField(max_length=200, blank=True)
+    metodo = models.CharField(max_length=10)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    motivo = models.CharField(max_length=20, choices=MOTIVO_CHOICES)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    duracao_ms = models.FloatField(verbose_name="Duração (ms)")
+    quantidade_queries = models.PositiveIntegerField(default=0, verbose_name="Queries")
+    tempo_db_ms = models.FloatField(default=0, verbose_name="Tempo no banco (ms)")
+    consultas = models.JSONField(default=list, blank=True)
+    estatisticas = models.BinaryField()
+    tamanho = models.PositiveIntegerField(default=0, verbose_name="Tamanho (bytes)")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Perfil de Requisição"
+        verbose_name_plural = "Perfis de Requisição"
+
+    def __str__(self):
+        return f"{self.metodo} {self.url} ({self.duracao_ms:.0f}ms)"
@@ -0,0 +1,140 @@
+import base64
+import datetime
+import json
+from functools import reduce
+from operator import and_, or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class KeysetPage:
+    """
+    Página obtida por cursor (keyset). Diferente do Paginator do Django, não usa
+    OFFSET nem COUNT: o custo da página N é o mesmo da primeira.
+    """
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    # O DjangoJSONEncoder corta microssegundos, o que quebraria a comparação do keyset
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _parse_ordering(ordering):
+    return [(campo.lstrip('-'), campo.startswith('-')) for campo in ordering]
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps({'d': direction, 'v': values}, cls=_CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(model, ordering, cursor):
+    """
+    Retorna (direção, valores) do cursor. Levanta ValueError se o cursor for inválido.
+    Os valores de campos do model são convertidos de volta com `to_python`;
+    anotações (ex.: Coalesce) são usadas como vieram.
+    """
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        direction, values = payload['d'], payload['v']
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Cursor inválido.")
+
+    campos = _parse_ordering(ordering)
+    if direction not in ('n', 'p') or not isinstance(values, list) or len(values) != len(campos):
+        raise ValueError("Cursor inválido.")
+
+    convertidos = []
+    for (nome, _desc), valor in zip(campos, values):
+        try:
+            field = model._meta.get_field(nome)
+        except FieldDoesNotExist:
+            convertidos.append(valor)
+            continue
+        try:
+            convertidos.append(field.to_python(valor))
+        except ValidationError:
+            raise ValueError("Cursor inválido.")
+    return direction, convertidos
+
+
+def _keyset_filter(campos, values):
+    """
+    Monta a condição "linha vem depois de `values`" para uma ordenação composta:
+    (a > x) OR (a = x AND b > y) OR ..., respeitando a direção de cada campo.
+    """
+    condicoes = []
+    for i, (nome, desc) in enumerate(campos):
+        iguais = [Q(**{campos[j][0]: values[j]}) for j in range(i)]
+        lookup = f"{nome}__lt" if desc else f"{nome}__gt"
+        condicoes.append(reduce(and_, iguais + [Q(**{lookup: values[i]})]))
+    return reduce(or_, condicoes)
+
+
+def paginate_keyset(queryset, ordering, cursor=None, page_size=50):
+    """
+    Pagina `queryset` por cursor sobre `ordering` (lista no formato do order_by).
+    O último campo da ordenação deve ser único (normalmente o id) e todos os campos
+    precisam estar disponíveis como atributos das instâncias (campos ou anotações).
+    """
+    campos = _parse_ordering(ordering)
+    direction, values = 'n', None
+    if cursor:
+        direction, values = decode_cursor(queryset.model, ordering, cursor)
+
+    if direction == 'p':
+        # Página anterior: percorre a ordenação invertida e desfaz a inversão no final
+        campos_busca = [(nome, not desc) for nome, desc in campos]
+    else:
+        campos_busca = campos
+
+    if values is not None:
+        queryset = queryset.filter(_keyset_filter(campos_busca, values))
+    queryset = queryset.order_by(*[f"-{nome}" if desc else nome for nome, desc in campos_busca])
+
+    objetos = list(queryset[:page_size + 1])
+    tem_mais = len(objetos) > page_size
+    objetos = objetos[:page_size]
+    if direction == 'p':
+        objetos.reverse()
+
+    if not objetos:
+        return KeysetPage([])
+
+    def cursor_de(direcao, obj):
+        return encode_cursor(direcao, [getattr(obj, nome) for nome, _desc in campos])
+
+    if direction == 'p':
+        has_next, has_previous = True, tem_mais
+    else:
+        has_next, has_previous = tem_mais, values is not None
+
+    return KeysetPage(
+        objetos,
+        next_cursor=cursor_de('n', objetos[-1]) if has_next else None,
+        previous_cursor=cursor_de('p', objetos[0]) if has_previous else None,
+    )
@@ -0,0 +1,175 @@
+"""
+Perfilamento sob demanda de requisições (cProfile).
+
+Uma requisição é perfilada quando um usuário staff envia o cabeçalho `X-Perfil: 1`
+ou o parâmetro `?_perfil=1`, ou quando cai na amostragem (PERFIL_TAXA_AMOSTRAGEM).
+O resultado fica em PerfilRequisicao, limitado por PERFIL_MAX_QUANTIDADE e
+PERFIL_MAX_BYTES, e pode ser baixado pelo admin em formato pstats (snakeviz,
+`python -m pstats`) ou em pilhas colapsadas (flamegraph.pl, speedscope).
+"""
+import marshal
+import pstats
+import random
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Sum
+
+from .models import PerfilRequisicao
+
+MAX_QUANTIDADE_PADRAO = 100
+MAX_BYTES_PADRAO = 50 * 1024 * 1024
+MAX_CONSULTAS_GUARDADAS = 1000
+
+# Limites da conversão para pilhas colapsadas (o grafo do cProfile pode ter ciclos e
+# o número de caminhos cresce exponencialmente com os chamadores em comum)
+PROFUNDIDADE_MAXIMA = 80
+TEMPO_MINIMO_US = 1
+MAX_NOS_PILHAS = 50_000
+
+
+def motivo_perfil(request):
+    """Motivo para perfilar a requisição (ver PerfilRequisicao.MOTIVO_CHOICES) ou None."""
+    usuario = getattr(request, 'user', None)
+    if usuario is not None and usuario.is_authenticated and usuario.is_staff:
+        if request.headers.get('X-Perfil') == '1':
+            return 'CABECALHO'
+        if request.GET.get('_perfil') == '1':
+            return 'PARAMETRO'
+    taxa = getattr(settings, 'PERFIL_TAXA_AMOSTRAGEM', 0)
+    if taxa and random.random() < taxa:
+        return 'AMOSTRAGEM'
+    return None
+
+
+def salvar_perfil(request, response, motivo, perfil, duracao, consultas, quantidade_queries):
+    """Grava o perfil da requisição e aplica os limites de armazenamento."""
+    perfil.create_stats()
+    estatisticas = marshal.dumps(perfil.stats)
+    match = request.resolver_match
+    usuario = getattr(request, 'user', None)
+
+    registro = PerfilRequisicao.objects.create(
+        url=request.get_full_path()[:500],
+        view=match.view_name if match else '',
+        metodo=request.method,
+        status_code=response.status_code,
+        motivo=motivo,
+        usuario=usuario if usuario is not None and usuario.is_authenticated else None,
+        duracao_ms=duracao * 1000,
+        quantidade_queries=quantidade_queries,
+        tempo_db_ms=sum(c['tempo_ms'] for c in consultas),
+        consultas=consultas,
+        estatisticas=estatisticas,
+        tamanho=len(estatisticas) + sum(len(c['sql']) for c in consultas),
+    )
+    aplicar_limites()
+    return registro
+
+
+def aplicar_limites():
+    """Remove os perfis mais antigos além de PERFIL_MAX_QUANTIDADE ou PERFIL_MAX_BYTES."""
+    max_quantidade = getattr(settings, 'PERFIL_MAX_QUANTIDADE', MAX_QUANTIDADE_PADRAO)
+    max_bytes = getattr(settings, 'PERFIL_MAX_BYTES', MAX_BYTES_PADRAO)
+
+    excedentes = PerfilRequisicao.objects.order_by('-created_at', '-id').values_list('id', flat=True)[max_quantidade:]
+    removidos, _ = PerfilRequisicao.objects.filter(id__in=list(excedentes)).delete()
+
+    total = PerfilRequisicao.objects.aggregate(total=Sum('tamanho'))['total'] or 0
+    if total > max_bytes:
+        remover = []
+        for perfil_id, tamanho in PerfilRequisicao.objects.order_by('created_at', 'id').values_list('id', 'tamanho'):
+            if total <= max_bytes:
+                break
+            remover.append(perfil_id)
+            total -= tamanho
+        removidos += PerfilRequisicao.objects.filter(id__in=remover).delete()[0]
+    return removidos
+
+
+class _EstatisticasCarregadas:
+    """Adapta o dicionário gravado para o pstats.Stats (que espera arquivo ou Profile)."""
+
+    def __init__(self, estatisticas):
+        self.stats = estatisticas
+
+    def create_stats(self):
+        pass
+
+
+def carregar_estatisticas(perfil):
+    return marshal.loads(bytes(perfil.estatisticas))
+
+
+def estatisticas_pstats(perfil, destino):
+    """Objeto pstats.Stats do perfil, imprimindo em `destino`."""
+    return pstats.Stats(_EstatisticasCarregadas(carregar_estatisticas(perfil)), stream=destino)
+
+
+def _nome_funcao(funcao):
+    arquivo, linha, nome = funcao
+    if arquivo == '~':
+        # Funções embutidas: ('~', 0, "<built-in method ...>")
+        return nome.replace(';', ',')
+    return f"{nome} ({arquivo}:{linha})".replace(';', ',')
+
+
+def pilhas_colapsadas(estatisticas):
+    """
+    Converte as estatísticas do cProfile em pilhas colapsadas ("a;b;c microssegundos").
+
+    O cProfile só guarda as arestas chamador -> chamado, então o tempo de cada função
+    é repartido entre os caminhos na proporção do tempo acumulado vindo de cada chamador.
+    Cada caminho é um nó visitado; passados MAX_NOS_PILHAS (ou PROFUNDIDADE_MAXIMA), o
+    tempo acumulado da função fica na própria pilha, sem descer aos chamados. Os chamados
+    são visitados do mais demorado para o menos, então o que perde detalhe é o menor.
+    """
+    filhos = defaultdict(list)
+    raizes = []
+    for funcao, (_cc, _nc, _tt, _ct, chamadores) in estatisticas.items():
+        if not chamadores:
+            raizes.append(funcao)
+        for chamador in chamadores:
+            filhos[chamador].append(funcao)
+
+    # A cadeia de middlewares é recursiva (inner -> __call__ -> inner...), então o ponto
+    # de entrada da requisição tem chamadores; ele é a função de maior tempo acumulado
+    if estatisticas:
+        principal = max(estatisticas, key=lambda funcao: estatisticas[funcao][3])
+        if principal not in raizes:
+            raizes.append(principal)
+
+    for funcao, chamados in filhos.items():
+        chamados.sort(key=lambda filho: estatisticas[filho][4][funcao][3], reverse=True)
+
+    pilhas = defaultdict(int)
+    nos = 0
+
+    def visitar(funcao, pilha, tempo_acumulado):
+        nonlocal nos
+        nos += 1
+        _cc, _nc, tempo_proprio, tempo_total, _chamadores = estatisticas[funcao]
+        proporcao = tempo_acumulado / tempo_total if tempo_total else 0
+        pilha = pilha + [_nome_funcao(funcao)]
+
+        if nos >= MAX_NOS_PILHAS or len(pilha) >= PROFUNDIDADE_MAXIMA:
+            microssegundos = int(tempo_acumulado * 1_000_000)
+            if microssegundos >= TEMPO_MINIMO_US:
+                pilhas[';'.join(pilha)] += microssegundos
+            return
+
+        microssegundos = int(tempo_proprio * proporcao * 1_000_000)
+        if microssegundos >= TEMPO_MINIMO_US:
+            pilhas[';'.join(pilha)] += microssegundos
+
+        for filho in filhos[funcao]:
+            if _nome_funcao(filho) in pilha:
+                continue  # recursão: o tempo já está contado no primeiro nível
+            tempo_filho = estatisticas[filho][4][funcao][3] * proporcao
+            if tempo_filho * 1_000_000 >= TEMPO_MINIMO_US:
+                visitar(filho, pilha, tempo_filho)
+
+    for raiz in raizes:
+        visitar(raiz, [], estatisticas[raiz][3])
+
+    return ''.join(f"{pilha} {valor}\n" for pilha, valor in sorted(pilhas.items()))
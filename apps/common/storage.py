@@ -0,0 +1,229 @@
+"""
+Armazenamento endereçado por conteúdo para as evidências.
+
+O nome final do arquivo é o SHA-256 do conteúdo (evidencias/ab/abcd....ext), calculado
+em blocos sem carregar o arquivo inteiro na memória. Um upload idêntico a um arquivo
+já existente não é gravado de novo: o storage devolve o caminho do existente. A
+contagem de referências fica em apps.backups.evidencias.
+
+Logs de texto (.txt) são gravados comprimidos com gzip (abcd....txt.gz); o hash continua
+sendo o do conteúdo original. Use `abrir_descomprimido` para ler o texto. O validador do
+upload já comprime para medir o tamanho (`comprimir_uma_vez`) e o storage grava esse
+mesmo resultado.
+
+Reaproveitar um arquivo existente disputa com a remoção dele quando a última referência
+some em outra transação. Com `referenciar`, o storage toma a referência antes de
+devolver o caminho (e antes de gravar); o nome devolvido é um NomeReferenciado, para
+quem salva a validação não contar a mesma referência de novo.
+"""
+import gzip
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db.models.fields.files import FieldFile
+from django.utils.module_loading import import_string
+
+TAMANHO_BLOCO_HASH = 64 * 1024
+
+PASTA_EVIDENCIAS = 'evidencias'
+
+EXTENSOES_COMPRIMIDAS = ('.txt',)
+SUFIXO_COMPRIMIDO = '.gz'
+NIVEL_COMPRESSAO = 6
+
+# Até este tamanho a versão comprimida fica em memória; acima, vai para arquivo temporário
+MAX_COMPRIMIDO_EM_MEMORIA = 1024 * 1024
+
+_CAMINHO_POR_CONTEUDO = re.compile(r'^evidencias/[0-9a-f]{2}/([0-9a-f]{64})\.\w+(\.gz)?$')
+
+
+def hash_conteudo(arquivo):
+    """SHA-256 (hex) do arquivo, lido em blocos a partir do início."""
+    sha = hashlib.sha256()
+    if hasattr(arquivo, 'seek'):
+        arquivo.seek(0)
+    for bloco in arquivo.chunks(TAMANHO_BLOCO_HASH):
+        sha.update(bloco)
+    if hasattr(arquivo, 'seek'):
+        arquivo.seek(0)
+    return sha.hexdigest()
+
+
+def caminho_por_conteudo(digest, nome_original):
+    extensao = os.path.splitext(nome_original)[1].lower() or '.bin'
+    if extensao in EXTENSOES_COMPRIMIDAS:
+        extensao += SUFIXO_COMPRIMIDO
+    return f'{PASTA_EVIDENCIAS}/{digest[:2]}/{digest}{extensao}'
+
+
+def comprimido(nome):
+    return nome.endswith(SUFIXO_COMPRIMIDO)
+
+
+def nome_original(nome):
+    """Nome sem o sufixo .gz de armazenamento."""
+    return nome[:-len(SUFIXO_COMPRIMIDO)] if comprimido(nome) else nome
+
+
+def comprimir(arquivo):
+    """
+    Comprime o arquivo com gzip em blocos, para um arquivo temporário (em memória se for
+    pequeno). mtime=0 deixa o resultado determinístico para o mesmo conteúdo.
+    """
+    destino = tempfile.SpooledTemporaryFile(max_size=MAX_COMPRIMIDO_EM_MEMORIA)
+    if hasattr(arquivo, 'seek'):
+        arquivo.seek(0)
+    with gzip.GzipFile(fileobj=destino, mode='wb', compresslevel=NIVEL_COMPRESSAO, mtime=0) as gz:
+        for bloco in arquivo.chunks(TAMANHO_BLOCO_HASH):
+            gz.write(bloco)
+    destino.seek(0)
+    return destino
+
+
+def comprimir_uma_vez(arquivo, limite=None):
+    """
+    Comprime o arquivo (como `comprimir`) e guarda o resultado nele, para o storage gravar
+    sem comprimir de novo. Retorna o tamanho comprimido; passando de `limite`, para e não
+    guarda nada (o valor devolvido então é só "maior que o limite").
+    """
+    base = _arquivo_do_storage(arquivo)
+    if base is None:
+        return tamanho_comprimido(arquivo, limite)
+    destino = tempfile.SpooledTemporaryFile(max_size=MAX_COMPRIMIDO_EM_MEMORIA)
+    total, coube = _comprimir_contando(arquivo, limite, destino)
+    if coube:
+        destino.seek(0)
+        base._comprimido = destino
+    else:
+        destino.close()
+    return total
+
+
+def _arquivo_do_storage(arquivo):
+    """O objeto que o storage vai receber, ou None se o arquivo já está gravado."""
+    # Na validação do modelo chega o FieldFile; o storage recebe o arquivo que ele embrulha
+    if isinstance(arquivo, FieldFile):
+        return None if arquivo._committed else arquivo.file
+    return arquivo
+
+
+def tamanho_comprimido(arquivo, limite=None):
+    """
+    Tamanho que o arquivo terá comprimido, sem guardar o resultado. Para assim que
+    passar de `limite` (o valor devolvido então é só "maior que o limite").
+    """
+    return _comprimir_contando(arquivo, limite)[0]
+
+
+def _comprimir_contando(arquivo, limite, destino=None):
+    """(bytes comprimidos, se coube no limite), gravando em `destino` se houver."""
+    contador = _ContadorBytes(limite, destino)
+    if hasattr(arquivo, 'seek'):
+        arquivo.seek(0)
+    coube = True
+    try:
+        with gzip.GzipFile(fileobj=contador, mode='wb', compresslevel=NIVEL_COMPRESSAO, mtime=0) as gz:
+            for bloco in arquivo.chunks(TAMANHO_BLOCO_HASH):
+                gz.write(bloco)
+    except _LimiteExcedido:
+        coube = False
+    if hasattr(arquivo, 'seek'):
+        arquivo.seek(0)
+    return contador.total, coube
+
+
+class _ArquivoDescomprimido(gzip.GzipFile):
+    """GzipFile que também fecha o arquivo do storage ao ser fechado."""
+
+    def close(self):
+        origem = self.fileobj
+        try:
+            super().close()
+        finally:
+            if origem is not None:
+                origem.close()
+
+
+class _LimiteExcedido(Exception):
+    pass
+
+
+class _ContadorBytes:
+    """Destino de escrita que conta os bytes recebidos (e os repassa a `destino`, se houver)."""
+
+    def __init__(self, limite, destino=None):
+        self.total = 0
+        self.limite = limite
+        self.destino = destino
+
+    def write(self, dados):
+        self.total += len(dados)
+        if self.limite is not None and self.total > self.limite:
+            raise _LimiteExcedido
+        if self.destino is not None:
+            self.destino.write(dados)
+        return len(dados)
+
+    def flush(self):
+        pass
+
+
+def hash_do_caminho(nome):
+    """Hash contido no caminho, se ele já estiver no formato endereçado por conteúdo."""
+    encontrado = _CAMINHO_POR_CONTEUDO.match(nome or '')
+    return encontrado.group(1) if encontrado else None
+
+
+class NomeReferenciado(str):
+    """Caminho devolvido por ArmazenamentoPorConteudo.save com a referência já contada."""
+
+
+class ArmazenamentoPorConteudo(FileSystemStorage):
+    """
+    FileSystemStorage que grava cada conteúdo uma única vez, no caminho do seu hash.
+
+    `referenciar` é o caminho de uma função (nome, gravar) que conta a referência ao
+    arquivo e então chama `gravar()`, que grava o conteúdo se ele não existir. Chamadas
+    com referenciar=False (comandos de manutenção, que recontam as referências por
+    conta própria) só gravam.
+    """
+
+    def __init__(self, *args, referenciar=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.referenciar = referenciar
+
+    def save(self, name, content, max_length=None, referenciar=True):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        nome = caminho_por_conteudo(hash_conteudo(content), name)
+        if not (referenciar and self.referenciar):
+            return self._gravar_se_ausente(nome, name, content, max_length)
+        import_string(self.referenciar)(nome, lambda: self._gravar_se_ausente(nome, name, content, max_length))
+        return NomeReferenciado(nome)
+
+    def _gravar_se_ausente(self, nome, name, content, max_length):
+        # Comprimido na validação do upload (comprimir_uma_vez): usado aqui ou descartado
+        pronto = getattr(content, '_comprimido', None)
+        if pronto is not None:
+            del content._comprimido
+        if self.exists(nome):
+            if pronto is not None:
+                pronto.close()
+            return nome
+        if comprimido(nome) and not comprimido(name):
+            with (pronto if pronto is not None else comprimir(content)) as temporario:
+                return super().save(nome, File(temporario, nome), max_length=max_length)
+        return super().save(nome, content, max_length=max_length)
+
+    def abrir_descomprimido(self, name):
+        """Abre o arquivo para leitura já descomprimido (arquivos sem .gz são abertos direto)."""
+        arquivo = self.open(name, 'rb')
+        return _ArquivoDescomprimido(fileobj=arquivo, mode='rb') if comprimido(name) else arquivo
+
+
+def armazenamento_evidencias():
+    return ArmazenamentoPorConteudo(referenciar='apps.backups.evidencias.reservar_referencia')
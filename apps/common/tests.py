@@ -0,0 +1,384 @@
+import cProfile
+import datetime
+import gzip
+import json
+import os
+import socket
+import tempfile
+import unittest
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+
+from . import metricas, perfilador
+from .arquivos import responder_arquivo
+from .models import PerfilRequisicao
+from .storage import ArmazenamentoPorConteudo, comprimir_uma_vez
+from .validators import validate_file_infection
+
+
+class MetricasMultiprocessoTests(SimpleTestCase):
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.diretorio = diretorio.name
+        configuracao = override_settings(METRICAS_DIRETORIO=self.diretorio)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        metricas.registro.limpar()
+        self.addCleanup(metricas.registro.limpar)
+
+    def _gravar_processo(self, identificador, requisicoes):
+        views = {}
+        for _ in range(requisicoes):
+            metricas._somar(views, {'dashboard': dict(metricas._nova_view(), requisicoes=1)})
+        with open(os.path.join(self.diretorio, f'metricas_{identificador}.json'), 'w') as arquivo:
+            json.dump(views, arquivo)
+        return views
+
+    def _requisicoes(self):
+        return metricas.metricas_agregadas().get('dashboard', {}).get('requisicoes', 0)
+
+    def test_identificador_inclui_inicio_do_processo(self):
+        pid, inicio, host = metricas.registro.identificador.split('_', 2)
+        self.assertEqual(int(pid), os.getpid())
+        self.assertTrue(inicio)
+        self.assertEqual(host, socket.gethostname())
+
+    @unittest.skipUnless(os.path.isdir('/proc'), "Depende de /proc para saber se o processo existe")
+    def test_processo_encerrado_e_incorporado_sem_diminuir_contadores(self):
+        morto = f'{os.getpid()}_inicio-antigo_{socket.gethostname()}'
+        self._gravar_processo(morto, 3)
+        metricas.registro.registrar('dashboard', 0.01, 2, 0.001, 100, 200)
+
+        self.assertEqual(self._requisicoes(), 4)
+        arquivos = set(os.listdir(self.diretorio))
+        self.assertNotIn(f'metricas_{morto}.json', arquivos)
+        self.assertIn(metricas.ARQUIVO_ENCERRADOS, arquivos)
+
+        # Mesmo pid reaproveitado por um worker novo: nada se perde nem soma duas vezes
+        self._gravar_processo(f'{os.getpid()}_outro-inicio_{socket.gethostname()}', 1)
+        self.assertEqual(self._requisicoes(), 5)
+        self.assertEqual(self._requisicoes(), 5)
+        self.assertEqual(
+            sorted(nome for nome in os.listdir(self.diretorio) if nome.startswith('metricas_')),
+            sorted([metricas.ARQUIVO_ENCERRADOS, f'metricas_{metricas.registro.identificador}.json']),
+        )
+
+    def test_arquivo_de_outro_host_soma_mas_nao_e_incorporado(self):
+        self._gravar_processo('1_123_outra-maquina', 2)
+        self.assertEqual(self._requisicoes(), 2)
+        self.assertIn('metricas_1_123_outra-maquina.json', os.listdir(self.diretorio))
+
+    def test_arquivo_ja_incorporado_nao_soma_de_novo(self):
+        # Queda entre gravar o acumulado e apagar o arquivo do processo encerrado
+        encerrados = {'views': self._gravar_processo('7_1_outra-maquina', 2), 'processos': ['7_1_outra-maquina']}
+        with open(os.path.join(self.diretorio, metricas.ARQUIVO_ENCERRADOS), 'w') as arquivo:
+            json.dump(encerrados, arquivo)
+        self.assertEqual(self._requisicoes(), 2)
+        self.assertNotIn('metricas_7_1_outra-maquina.json', os.listdir(self.diretorio))
+
+
+class ResponderArquivoTests(SimpleTestCase):
+    CONTEUDO = b'0123456789abcdef'
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.storage = ArmazenamentoPorConteudo(location=diretorio.name)
+        self.nome = self.storage.save('job.bin', ContentFile(self.CONTEUDO))
+        self.modificado = http_date(int(self.storage.get_modified_time(self.nome).timestamp()))
+
+    def _get(self, nome=None, **cabecalhos):
+        request = RequestFactory().get('/evidencia', headers=cabecalhos)
+        kwargs = {'content_type': 'application/octet-stream', 'nome_download': 'job.bin', 'etag': 'abc'}
+        if nome:
+            kwargs.update(content_type='text/plain', content_encoding='gzip', etag='abc-gzip')
+        return responder_arquivo(request, self.storage, nome or self.nome, **kwargs)
+
+    def _corpo(self, resposta):
+        return b''.join(resposta.streaming_content) if resposta.streaming else resposta.content
+
+    def test_arquivo_inteiro_com_etag_forte(self):
+        resposta = self._get()
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(self._corpo(resposta), self.CONTEUDO)
+        self.assertEqual(resposta['ETag'], '"abc"')
+        self.assertEqual(resposta['Last-Modified'], self.modificado)
+        self.assertEqual(resposta['Accept-Ranges'], 'bytes')
+
+    def test_intervalos(self):
+        casos = {
+            'bytes=2-5': (b'2345', 'bytes 2-5/16'),
+            'bytes=10-': (b'abcdef', 'bytes 10-15/16'),
+            'bytes=-3': (b'def', 'bytes 13-15/16'),
+            'bytes=-100': (self.CONTEUDO, 'bytes 0-15/16'),
+            'bytes=14-99': (b'ef', 'bytes 14-15/16'),
+        }
+        for cabecalho, (corpo, content_range) in casos.items():
+            with self.subTest(cabecalho):
+                resposta = self._get(Range=cabecalho)
+                self.assertEqual(resposta.status_code, 206)
+                self.assertEqual(self._corpo(resposta), corpo)
+                self.assertEqual(resposta['Content-Range'], content_range)
+                self.assertEqual(resposta['Content-Length'], str(len(corpo)))
+
+    def test_intervalo_fora_do_arquivo_e_416(self):
+        for cabecalho in ('bytes=16-', 'bytes=5-2', 'bytes=-0'):
+            with self.subTest(cabecalho):
+                resposta = self._get(Range=cabecalho)
+                self.assertEqual(resposta.status_code, 416)
+                self.assertEqual(resposta['Content-Range'], 'bytes */16')
+
+    def test_intervalo_nao_suportado_entrega_o_arquivo_todo(self):
+        for cabecalho in ('bytes=0-1,4-5', 'linhas=1-2', 'bytes=-'):
+            with self.subTest(cabecalho):
+                self.assertEqual(self._get(Range=cabecalho).status_code, 200)
+
+    def test_if_range(self):
+        casos = {
+            '"abc"': 206,
+            '"outro"': 200,
+            'W/"abc"': 200,  # ETag fraca nunca vale para If-Range
+            self.modificado: 206,
+            'Thu, 01 Jan 1970 00:00:00 GMT': 200,
+        }
+        for if_range, status in casos.items():
+            with self.subTest(if_range):
+                self.assertEqual(self._get(Range='bytes=0-1', **{'If-Range': if_range}).status_code, status)
+
+    def test_condicionais_respondem_304(self):
+        for cabecalhos in ({'If-None-Match': '"abc"'}, {'If-None-Match': 'W/"abc"'}, {'If-Modified-Since': self.modificado}):
+            with self.subTest(cabecalhos):
+                resposta = self._get(**cabecalhos)
+                self.assertEqual(resposta.status_code, 304)
+                self.assertEqual(resposta['ETag'], '"abc"')
+                self.assertFalse(resposta.has_header('Content-Disposition'))
+        self.assertEqual(self._get(**{'If-None-Match': '"outro"'}).status_code, 200)
+
+    @override_settings(ARQUIVOS_SERVIDOR='nginx', ARQUIVOS_X_ACCEL_PREFIXO='/protegido/')
+    def test_nginx_recebe_o_caminho_e_atende_o_range(self):
+        resposta = self._get(Range='bytes=0-1')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta['X-Accel-Redirect'], f'/protegido/{self.nome}')
+        self.assertEqual(resposta.content, b'')
+
+    @override_settings(ARQUIVOS_SERVIDOR='apache')
+    def test_apache_recebe_o_caminho_no_disco(self):
+        resposta = self._get()
+        self.assertEqual(resposta['X-Sendfile'], self.storage.path(self.nome))
+        self.assertEqual(resposta.content, b'')
+
+    def _log_comprimido(self):
+        return self.storage.save('job.txt', ContentFile(b'Job finished: Success\n' * 50))
+
+    def test_gzip_com_range_sobre_os_bytes_comprimidos(self):
+        nome = self._log_comprimido()
+        with self.storage.open(nome, 'rb') as arquivo:
+            comprimidos = arquivo.read()
+        resposta = self._get(nome, Range='bytes=0-9')
+        self.assertEqual(resposta.status_code, 206)
+        self.assertEqual(resposta['Content-Encoding'], 'gzip')
+        self.assertEqual(self._corpo(resposta), comprimidos[:10])
+        self.assertEqual(resposta['Content-Range'], f'bytes 0-9/{len(comprimidos)}')
+
+    @override_settings(ARQUIVOS_SERVIDOR='nginx', ARQUIVOS_X_ACCEL_PREFIXO='/protegido/')
+    def test_gzip_pelo_nginx_usa_gzip_static(self):
+        nome = self._log_comprimido()
+        resposta = self._get(nome)
+        # O nginx descarta o Content-Encoding do Django: o gzip_static acha o .gz e o recoloca
+        self.assertEqual(resposta['X-Accel-Redirect'], f'/protegido/{nome[:-len(".gz")]}')
+        self.assertEqual(resposta['Content-Encoding'], 'gzip')
+
+    def test_descomprimido_em_streaming_sem_range(self):
+        nome = self._log_comprimido()
+        request = RequestFactory().get('/evidencia', headers={'Range': 'bytes=0-9'})
+        resposta = responder_arquivo(
+            request, self.storage, nome, content_type='text/plain', nome_download='job.txt', etag='abc',
+            descomprimir=True, vary='Accept-Encoding',
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta['Accept-Ranges'], 'none')
+        self.assertFalse(resposta.has_header('Content-Encoding'))
+        self.assertEqual(self._corpo(resposta), b'Job finished: Success\n' * 50)
+
+
+class CompressaoEvidenciaTests(SimpleTestCase):
+    TEXTO = ''.join(f"{linha:05d} Processing VM APP{linha % 7} ... ok\n" for linha in range(5000)).encode()
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.storage = ArmazenamentoPorConteudo(location=diretorio.name)
+
+    def _upload(self, conteudo=None):
+        return SimpleUploadedFile('job.txt', conteudo or self.TEXTO, content_type='text/plain')
+
+    def test_log_gravado_comprimido_e_lido_de_volta(self):
+        nome = self.storage.save('job.txt', ContentFile(self.TEXTO))
+        self.assertTrue(nome.endswith('.txt.gz'))
+        with self.storage.open(nome, 'rb') as arquivo:
+            bruto = arquivo.read()
+        self.assertLess(len(bruto), len(self.TEXTO) // 5)
+        self.assertEqual(gzip.decompress(bruto), self.TEXTO)
+        with self.storage.abrir_descomprimido(nome) as arquivo:
+            self.assertEqual(arquivo.read(), self.TEXTO)
+
+    def test_upload_validado_e_comprimido_uma_vez_so(self):
+        upload = self._upload()
+        escritas = []
+        original = gzip.GzipFile
+
+        def contar(*args, **kwargs):
+            if kwargs.get('mode') == 'wb':
+                escritas.append(kwargs)
+            return original(*args, **kwargs)
+
+        with mock.patch('apps.common.storage.gzip.GzipFile', side_effect=contar):
+            validate_file_infection(upload)
+            nome = self.storage.save('job.txt', upload)
+        self.assertEqual(len(escritas), 1)
+        self.assertFalse(hasattr(upload, '_comprimido'))
+        with self.storage.abrir_descomprimido(nome) as arquivo:
+            self.assertEqual(arquivo.read(), self.TEXTO)
+        # Mesmo resultado da compressão feita pelo próprio storage (mtime=0)
+        outro = ArmazenamentoPorConteudo(location=tempfile.mkdtemp(dir=self.storage.location))
+        with outro.open(outro.save('job.txt', ContentFile(self.TEXTO)), 'rb') as esperado, \
+                self.storage.open(nome, 'rb') as gravado:
+            self.assertEqual(gravado.read(), esperado.read())
+
+    def test_acima_do_limite_nada_fica_guardado(self):
+        upload = self._upload(os.urandom(64 * 1024))
+        self.assertGreater(comprimir_uma_vez(upload, limite=1024), 1024)
+        self.assertFalse(hasattr(upload, '_comprimido'))
+        self.assertEqual(upload.tell(), 0)
+
+    def test_arquivo_reaproveitado_descarta_a_compressao(self):
+        self.storage.save('job.txt', ContentFile(self.TEXTO))
+        upload = self._upload()
+        validate_file_infection(upload)
+        pronto = upload._comprimido
+        self.storage.save('job.txt', upload)
+        self.assertTrue(pronto.closed)
+
+    def test_conteudo_nao_textual_e_rejeitado(self):
+        with self.assertRaises(ValidationError):
+            validate_file_infection(SimpleUploadedFile('job.txt', b'MZ\x90\x00' + os.urandom(4096)))
+
+
+def _funcao(nome):
+    return ('app.py', 1, nome)
+
+
+def _estatisticas(arestas, proprio):
+    """Estatísticas no formato do cProfile a partir de {(chamador, chamado): tempo acumulado}."""
+    estatisticas = {}
+    for funcao, tempo_proprio in proprio.items():
+        chamadores = {
+            chamador: (1, 1, 0, tempo) for (chamador, chamado), tempo in arestas.items() if chamado == funcao
+        }
+        tempo_total = sum(t for _, _, _, t in chamadores.values()) or tempo_proprio + sum(
+            tempo for (chamador, _), tempo in arestas.items() if chamador == funcao
+        )
+        estatisticas[funcao] = (1, 1, tempo_proprio, tempo_total, chamadores)
+    return estatisticas
+
+
+def _ler_pilhas(texto):
+    pilhas = {}
+    for linha in texto.splitlines():
+        pilha, valor = linha.rsplit(' ', 1)
+        pilhas[pilha] = int(valor)
+    return pilhas
+
+
+class PilhasColapsadasTests(SimpleTestCase):
+    def test_tempo_repartido_pelos_caminhos(self):
+        a, b, dormir = _funcao('a'), _funcao('b'), ('~', 0, '<built-in method time.sleep>')
+        estatisticas = _estatisticas(
+            {(a, b): 0.006, (a, dormir): 0.004, (b, dormir): 0.004},
+            {a: 0.001, b: 0.002, dormir: 0.008},
+        )
+        pilhas = _ler_pilhas(perfilador.pilhas_colapsadas(estatisticas))
+        esperado = {
+            'a (app.py:1)': 1000,
+            'a (app.py:1);<built-in method time.sleep>': 4000,
+            'a (app.py:1);b (app.py:1)': 2000,
+            'a (app.py:1);b (app.py:1);<built-in method time.sleep>': 4000,
+        }
+        self.assertEqual(list(pilhas), list(esperado))
+        for pilha, valor in esperado.items():
+            self.assertAlmostEqual(pilhas[pilha], valor, delta=1)
+
+    def test_perfil_real(self):
+        def fatorial(n):
+            return 1 if n <= 1 else n * fatorial(n - 1)
+
+        perfil = cProfile.Profile()
+        perfil.runcall(lambda: [fatorial(50) for _ in range(200)])
+        perfil.create_stats()
+        texto = perfilador.pilhas_colapsadas(perfil.stats)
+        self.assertTrue(texto.endswith('\n'))
+        self.assertRegex(texto, r'(?m)^\S.*;fatorial \(.*tests\.py:\d+\) \d+$')
+        self.assertEqual(len(_ler_pilhas(texto)), len(texto.splitlines()))
+
+    def test_caminhos_exponenciais_ficam_limitados(self):
+        # 30 camadas de 2 funções, cada uma chamada pelas duas da camada anterior: 2^30 caminhos
+        raiz = _funcao('raiz')
+        camadas = [[_funcao(f'f{camada}{lado}') for lado in 'ab'] for camada in range(30)]
+        arestas = {(raiz, funcao): 0.5 for funcao in camadas[0]}
+        for anterior, atual in zip(camadas, camadas[1:]):
+            arestas.update({(chamador, chamado): 0.25 for chamador in anterior for chamado in atual})
+        proprio = {raiz: 0, **{funcao: 0 for camada in camadas[:-1] for funcao in camada}}
+        proprio.update({funcao: 0.5 for funcao in camadas[-1]})
+
+        with mock.patch.object(perfilador, 'MAX_NOS_PILHAS', 2000):
+            pilhas = _ler_pilhas(perfilador.pilhas_colapsadas(_estatisticas(arestas, proprio)))
+        self.assertLessEqual(len(pilhas), 2000)
+        # Sem descer além do limite, o tempo acumulado fica na pilha; só se perdem os
+        # caminhos abaixo de TEMPO_MINIMO_US
+        self.assertAlmostEqual(sum(pilhas.values()), 1_000_000, delta=1_000_000 * 0.01)
+
+    def test_profundidade_maxima_mantem_o_tempo(self):
+        cadeia = [_funcao(f'f{indice}') for indice in range(120)]
+        arestas = {(chamador, chamado): 0.1 for chamador, chamado in zip(cadeia, cadeia[1:])}
+        proprio = {funcao: 0 for funcao in cadeia[:-1]}
+        proprio[cadeia[-1]] = 0.1
+
+        pilhas = _ler_pilhas(perfilador.pilhas_colapsadas(_estatisticas(arestas, proprio)))
+        pilha, = pilhas
+        self.assertEqual(pilha.count(';') + 1, perfilador.PROFUNDIDADE_MAXIMA)
+        self.assertAlmostEqual(pilhas[pilha], 100_000, delta=1)
+
+
+class LimitesPerfisTests(TestCase):
+    def setUp(self):
+        agora = timezone.now()
+        for indice in range(5):
+            perfil = PerfilRequisicao.objects.create(
+                url=f'/p/{indice}', metodo='GET', motivo='CABECALHO', duracao_ms=1, estatisticas=b'', tamanho=10,
+            )
+            PerfilRequisicao.objects.filter(pk=perfil.pk).update(created_at=agora + datetime.timedelta(seconds=indice))
+
+    def _urls(self):
+        return list(PerfilRequisicao.objects.order_by('created_at').values_list('url', flat=True))
+
+    @override_settings(PERFIL_MAX_QUANTIDADE=3, PERFIL_MAX_BYTES=1000)
+    def test_remove_os_mais_antigos_alem_da_quantidade(self):
+        self.assertEqual(perfilador.aplicar_limites(), 2)
+        self.assertEqual(self._urls(), ['/p/2', '/p/3', '/p/4'])
+
+    @override_settings(PERFIL_MAX_QUANTIDADE=100, PERFIL_MAX_BYTES=25)
+    def test_remove_os_mais_antigos_ate_caber_no_limite_de_bytes(self):
+        self.assertEqual(perfilador.aplicar_limites(), 3)
+        self.assertEqual(self._urls(), ['/p/3', '/p/4'])
+
+    @override_settings(PERFIL_MAX_QUANTIDADE=5, PERFIL_MAX_BYTES=50)
+    def test_dentro_dos_limites_nada_muda(self):
+        self.assertEqual(perfilador.aplicar_limites(), 0)
+        self.assertEqual(len(self._urls()), 5)
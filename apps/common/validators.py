@@ -1,6 +1,7 @@
 import os
 import uuid
 import magic
+from .storage import EXTENSOES_COMPRIMIDAS, comprimir_uma_vez
 from django.core.exceptions import ValidationError
 import re
 from django.core.exceptions import ValidationError
@@ -11,6 +12,7 @@ def validate_file_infection(file):
     """
     # 1. Configurações
     MAX_SIZE_MB = 5
+    MAX_TEXT_SIZE_MB = 100
     VALID_MIME_TYPES = [
         'image/jpeg', 
         'image/png', 
@@ -18,15 +20,23 @@ def validate_file_infection(file):
     ]
     VALID_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.txt']
 
-    # 2. Validação de Tamanho
-    if file.size > MAX_SIZE_MB * 1024 * 1024:
-        raise ValidationError(f"O arquivo é muito grande ({file.size/1024/1024:.1f}MB). O limite máximo é {MAX_SIZE_MB}MB.")
-
-    # 3. Validação de Extensão
+    # 2. Validação de Extensão
     ext = os.path.splitext(file.name)[1].lower()
     if ext not in VALID_EXTENSIONS:
         raise ValidationError("Extensão não permitida. Use apenas: .txt, .jpg ou .png")
 
+    # 3. Validação de Tamanho
+    # Logs de texto são guardados comprimidos (apps.common.storage): o limite vale para o
+    # tamanho comprimido, com um teto para o original. O resultado fica no arquivo e o
+    # storage grava o mesmo, sem comprimir de novo.
+    if ext in EXTENSOES_COMPRIMIDAS:
+        if file.size > MAX_TEXT_SIZE_MB * 1024 * 1024:
+            raise ValidationError(f"O log é muito grande ({file.size/1024/1024:.1f}MB). O limite máximo é {MAX_TEXT_SIZE_MB}MB.")
+        if comprimir_uma_vez(file, limite=MAX_SIZE_MB * 1024 * 1024) > MAX_SIZE_MB * 1024 * 1024:
+            raise ValidationError(f"O log comprimido passa do limite de {MAX_SIZE_MB}MB.")
+    elif file.size > MAX_SIZE_MB * 1024 * 1024:
+        raise ValidationError(f"O arquivo é muito grande ({file.size/1024/1024:.1f}MB). O limite máximo é {MAX_SIZE_MB}MB.")
+
     # 4. Validação de Conteúdo Real (Magic Numbers)
     # Lê o início do arquivo para garantir que não é um .exe renomeado
     initial_pos = file.tell()
@@ -38,6 +48,8 @@ def validate_file_infection(file):
         raise ValidationError(f"Conteúdo do arquivo inválido ({mime_type}). Envie apenas Logs de texto ou Imagens.")
 
 def evidence_upload_path(instance, filename):
+    # O nome definitivo é o hash do conteúdo (ver apps.common.storage.ArmazenamentoPorConteudo);
+    # daqui só a extensão é aproveitada.
     ext = filename.split('.')[-1]
     filename = f"{uuid.uuid4()}.{ext}"
     return os.path.join('evidencias/', filename)
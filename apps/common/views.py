@@ -0,0 +1,22 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .metricas import formato_prometheus, metricas_agregadas
+
+
+def _token_valido(request):
+    token = getattr(settings, 'METRICAS_TOKEN', '')
+    cabecalho = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(cabecalho, f'Bearer {token}')
+
+
+def metricas(request):
+    """Métricas no formato do Prometheus: só para staff ou para o scraper com METRICAS_TOKEN."""
+    if not (request.user.is_authenticated and request.user.is_staff) and not _token_valido(request):
+        return HttpResponseForbidden("Acesso restrito.")
+    return HttpResponse(
+        formato_prometheus(metricas_agregadas()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -44,11 +44,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.common.middleware.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.common.middleware.PerfilMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -104,6 +106,63 @@ LOGOUT_REDIRECT_URL = '/accounts/login/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# --- RELATÓRIOS ---
+# Espaço máximo em disco para os relatórios gerados (cache LRU)
+RELATORIOS_CACHE_MAX_BYTES = int(os.environ.get('RELATORIOS_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+# Processos usados para renderizar as partes dos PDFs grandes (None = número de CPUs)
+RELATORIOS_PDF_WORKERS = int(os.environ['RELATORIOS_PDF_WORKERS']) if os.environ.get('RELATORIOS_PDF_WORKERS') else None
+
+# --- EVIDÊNCIAS ---
+# Threads que indexam os logs depois do upload; as imagens ficam com o processar_imagens_evidencias
+EVIDENCIAS_INDEXACAO_WORKERS = 2
+# Texto indexado por log para a busca; acima disso ficam o início e o fim. No PostgreSQL
+# o tsvector tem limite de 1MB, então não convém aumentar muito.
+EVIDENCIAS_INDICE_MAX_BYTES = int(os.environ.get('EVIDENCIAS_INDICE_MAX_BYTES', 1024 * 1024))
+
+# Quem transfere os bytes das evidências baixadas pela view protegida:
+# '' (o próprio Django, em blocos), 'nginx' (X-Accel-Redirect) ou 'apache' (X-Sendfile).
+# No nginx, o prefixo deve ser uma location interna apontando para o MEDIA_ROOT:
+#   location /media-protegida/ { internal; alias /caminho/do/media/; gzip_static always; }
+# (gzip_static: os logs .txt.gz saem com Content-Encoding: gzip, ver apps.common.arquivos)
+ARQUIVOS_SERVIDOR = os.environ.get('ARQUIVOS_SERVIDOR', '')
+ARQUIVOS_X_ACCEL_PREFIXO = os.environ.get('ARQUIVOS_X_ACCEL_PREFIXO', '/media-protegida/')
+
+# --- AGENDA DAS ROTINAS ---
+# Horas após o horário de execução de um backup para a validação ser considerada em dia
+AGENDA_PRAZO_VALIDACAO_HORAS = float(os.environ.get('AGENDA_PRAZO_VALIDACAO_HORAS', 12))
+# Segundos que o resumo da agenda do dashboard fica no cache (por versão dos dados): as
+# execuções que passam do prazo sem validação aparecem com até este atraso
+AGENDA_CACHE_SEGUNDOS = int(os.environ.get('AGENDA_CACHE_SEGUNDOS', 300))
+
+# --- MÉTRICAS ---
+METRICAS_ATIVAS = os.environ.get('METRICAS_ATIVAS', 'True') == 'True'
+# Com vários processos (gunicorn), cada um grava suas métricas aqui e o endpoint soma todos
+METRICAS_DIRETORIO = os.environ.get('METRICAS_DIRETORIO') or None
+METRICAS_INTERVALO_GRAVACAO = 5.0
+# Token opcional para o scraper do Prometheus (Authorization: Bearer <token>)
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')
+# Máximo de queries esperado por view; acima disso a requisição é logada e contada
+METRICAS_ORCAMENTO_PADRAO = 50
+METRICAS_ORCAMENTO_QUERIES = {
+    'dashboard': 15,
+    'historico_global': 10,
+    'painel_relatorios': 10,
+    'indicadores': 6,
+    'indicadores_rotinas': 6,
+    'solicitar_relatorio': 15,
+    'exportar_validacoes': 10,
+    'nova_validacao': 20,
+    # Cresce com o tamanho do lote enviado pelo agente
+    'ingerir_validacoes': None,
+}
+
+# --- PERFILAMENTO (cProfile) ---
+# Fração das requisições perfiladas automaticamente (0 = só sob demanda: X-Perfil: 1 ou ?_perfil=1)
+PERFIL_TAXA_AMOSTRAGEM = float(os.environ.get('PERFIL_TAXA_AMOSTRAGEM', 0))
+# Perfis guardados: os mais antigos são removidos além destes limites
+PERFIL_MAX_QUANTIDADE = 100
+PERFIL_MAX_BYTES = 50 * 1024 * 1024
+
 # --- CONFIGURAÇÃO VISUAL DO UNFOLD (ADMIN) ---
 # --- CONFIGURAÇÃO VISUAL DO UNFOLD (ADMIN) ---
 UNFOLD = {
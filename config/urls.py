@@ -3,6 +3,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from apps.common.views import metricas
+
 # --- CONFIGURAÇÕES NATIVAS DO ADMIN ---
 # Definimos o Header (Título da aba)
 admin.site.site_header = "MaiLou Cloud"
@@ -15,6 +17,7 @@ admin.site.site_url = None
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metricas/', metricas, name='metricas'),
     path('accounts/', include('django.contrib.auth.urls')),
     
     path('clientes/', include('apps.clientes.urls')),